@@ -10,6 +10,11 @@ S3_VECTOR_BUCKET_NAME='bedrock-mm-vector-bucket'
 S3_VECTOR_INDEX_NAME='nova-mme-video-clip-1024'
 S3_VECTOR_INDEX_NOVA_MME_FIXED = "nova-mme-video-async-1024"
 EMBEDDING_DIM_DEFAULT='1024'
+# Coarse index of the leading dimensions of the shot embeddings, first stage of re-ranked searches
+S3_VECTOR_INDEX_NAME_COARSE='nova-mme-video-clip-256'
+EMBEDDING_DIM_COARSE='256'
+SEARCH_RETRIEVAL_MODE='exact'
+SEARCH_RERANK_CANDIDATES_FACTOR='4'
 
 LAMBDA_LAYER_SOURCE_S3_KEY_SCENE_DETECT="layer/scenedetect_layer.zip"
 LAMBDA_LAYER_SOURCE_S3_KEY_MOVIEPY="layer/moviepy_layer.zip"
@@ -21,9 +26,21 @@ DYNAMO_VIDEO_TRANS_TABLE="bedrock_mm_extr_srv_video_transcript"
 DYNAMO_VIDEO_FRAME_TABLE="bedrock_mm_extr_srv_video_frame"
 DYNAMO_VIDEO_SHOT_TABLE="bedrock_mm_extr_srv_video_shot"
 DYNAMO_VIDEO_USAGE_TABLE="bedrock_mm_usage"
+DYNAMO_VIDEO_USAGE_ROLLUP_TABLE="bedrock_mm_usage_rollup"
+DYNAMO_VIDEO_DATA_SIZE_TABLE="bedrock_mm_extr_srv_video_data_size"
+DYNAMO_VIDEO_TASK_QUEUE_TABLE="bedrock_mm_extr_srv_video_task_queue"
 
 VIDEO_UPLOAD_S3_PREFIX='upload'
 VIDEO_SAMPLE_CHUNK_DURATION_S="600"
+VIDEO_SAMPLE_CHUNK_TARGET_WALL_S="120"
+VIDEO_SAMPLE_CHUNK_MAX_CONCURRENCY="20"
+LAMBDA_FRAME_SAMPLE_VIDEO_TIMEOUT_S="900"
+LAMBDA_FRAME_DEDUP_ORB_TIMEOUT_S="60"
+LAMBDA_FRAME_DEDUP_MME_TIMEOUT_S="300"
+FRAME_EXTRACTION_MAX_WORKERS="4"
+TASK_CACHE_TTL_S="300"
+SHOT_BATCH_MAX_WORKERS="4"
+SHOT_VECTOR_DTYPE="float32"
 VIDEO_SAMPLE_S3_PREFIX="video_frame_"
 VIDEO_FRAME_SIMILAIRTY_THRESHOLD_DEFAULT_MME='0.2'
 VIDEO_FRAME_SIMILAIRTY_THRESHOLD_DEFAULT_ORB='0.325'
@@ -32,8 +49,22 @@ TRANSCRIBE_OUTPUT_PREFIX='transcribe'
 
 MODEL_ID_BEDROCK_MME='amazon.nova-2-multimodal-embeddings-v1:0'
 MODEL_ID_IMAGE_UNDERSTANDING="amazon.nova-lite-v1:0"
+THUMBNAIL_MODEL_TIEBREAK="false"
 
 STEP_FUNCTIONS_FRAME_BASED_FLOW_TIMEOUT_HR="3"
 STEP_FUNCTIONS_CLIP_BASED_FLOW_TIMEOUT_HR="3"
 
-S3_PRESIGNED_URL_EXPIRY_S="3600"
\ No newline at end of file
+# Task admission budgets, shared by the frame and clip based workflows
+TASK_SCHEDULER_MAX_RUNNING_TASKS="4"
+TASK_SCHEDULER_MAX_RUNNING_TASKS_PER_USER="2"
+TASK_SCHEDULER_MAX_RUNNING_TOKENS="20000000"
+TASK_SCHEDULER_MAX_RUNNING_REQUESTS="20000"
+TASK_SCHEDULER_SCHEDULE_MIN="5"
+# Queue priority (0-9) of the Cognito user pool groups, e.g. '{"priority": 5, "admin": 9}'. Other users get 0
+TASK_PRIORITY_BY_GROUP='{}'
+# Requests estimated above this number of model calls are rejected by start-task
+TASK_MAX_ESTIMATED_REQUESTS="50000"
+
+S3_PRESIGNED_URL_EXPIRY_S="3600"
+
+DATA_SIZE_RECONCILE_SCHEDULE_HR="24"
\ No newline at end of file
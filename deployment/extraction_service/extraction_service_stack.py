@@ -13,13 +13,29 @@ from aws_cdk import (
     RemovalPolicy,
     custom_resources as cr,
     aws_logs as logs,
+    aws_events as _events,
+    aws_events_targets as _targets,
 )
 from aws_cdk.aws_apigateway import IdentitySource
 
 from constructs import Construct
-import os, re
+import os, re, shutil, tempfile
 from extraction_service.constant import *
 
+# Passes the request body through and adds the Cognito user of the call
+CALLER_REQUEST_TEMPLATE = """#set($body = $input.path('$'))
+{
+#foreach($key in $body.keySet())
+#if($key != "Caller")
+"$util.escapeJavaScript($key)": $input.json("$['$key']"),
+#end
+#end
+"Caller": {
+    "Username": "$util.escapeJavaScript($context.authorizer.claims['cognito:username'])",
+    "Groups": "$util.escapeJavaScript($context.authorizer.claims['cognito:groups'])"
+}
+}"""
+
 class ExtrServiceStack(NestedStack):
     account_id = None
     region = None
@@ -34,6 +50,13 @@ class ExtrServiceStack(NestedStack):
     moviepy_layer = None
     opencv_layer = None
     aws_layer = None
+    transcript_parser_layer = None
+    task_cache_layer = None
+    pricing_layer = None
+    data_access_layer = None
+    lambda_runtime_layer = None
+    embedding_store_layer = None
+    video_probe_layer = None
 
     cognito_authorizer = None
 
@@ -173,6 +196,47 @@ class ExtrServiceStack(NestedStack):
             projection_type=_dynamodb.ProjectionType.ALL 
         )
 
+        # Video usage rollup table: usage counters per task (task#{task_id}) and per day (day#{YYYY-MM-DD}), by model and usage type
+        video_usage_rollup_table = _dynamodb.Table(self, 
+            id='video-usage-rollup-table', 
+            table_name=DYNAMO_VIDEO_USAGE_ROLLUP_TABLE, 
+            partition_key=_dynamodb.Attribute(name='rollup_key', type=_dynamodb.AttributeType.STRING),
+            sort_key=_dynamodb.Attribute(name='rollup_item', type=_dynamodb.AttributeType.STRING),
+            point_in_time_recovery=True,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Video data size table: per-task byte and record counters maintained by the workflow
+        video_data_size_table = _dynamodb.Table(self, 
+            id='video-data-size-table', 
+            table_name=DYNAMO_VIDEO_DATA_SIZE_TABLE, 
+            partition_key=_dynamodb.Attribute(name='task_id', type=_dynamodb.AttributeType.STRING),
+            sort_key=_dynamodb.Attribute(name='data_type', type=_dynamodb.AttributeType.STRING),
+            point_in_time_recovery=True,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+
+        # Video task queue table: admission queue for the workflows
+        video_task_queue_table = _dynamodb.Table(self, 
+            id='video-task-queue-table', 
+            table_name=DYNAMO_VIDEO_TASK_QUEUE_TABLE, 
+            partition_key=_dynamodb.Attribute(name='Id', type=_dynamodb.AttributeType.STRING),
+            point_in_time_recovery=True,
+            removal_policy=RemovalPolicy.DESTROY
+        )
+        video_task_queue_table.add_global_secondary_index(
+            index_name="queue_status-enqueue_ts-index",
+            partition_key=_dynamodb.Attribute(
+                name="queue_status",
+                type=_dynamodb.AttributeType.STRING
+            ),
+            sort_key=_dynamodb.Attribute(
+                name="enqueue_ts",
+                type=_dynamodb.AttributeType.STRING
+            ),
+            projection_type=_dynamodb.ProjectionType.ALL 
+        )
+
     def deploy_cognito(self):
         user_pool = _cognito.UserPool.from_user_pool_id(
             self, "WebUserPool",
@@ -209,10 +273,55 @@ class ExtrServiceStack(NestedStack):
             compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
             description="python3.13 opencv-python-headless 4.12.0.88"
         )
+        self.transcript_parser_layer = _lambda.LayerVersion(self, 'TranscriptParserLayer',
+            code=_lambda.Code.from_asset(os.path.join("../source/", "extraction_service/layer/transcript_parser"), exclude=["pyproject.toml", "build", "python/*.egg-info"]),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
+            description="python3.13 streaming WebVTT transcript parser"
+        )
+        self.task_cache_layer = _lambda.LayerVersion(self, 'TaskCacheLayer',
+            code=_lambda.Code.from_asset(os.path.join("../source/", "extraction_service/layer/task_cache")),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
+            description="python3.13 per-container workflow task cache"
+        )
+        self.pricing_layer = _lambda.LayerVersion(self, 'PricingLayer',
+            code=_lambda.Code.from_asset(self.stage_pricing_layer()),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
+            description="python3.13 model and Transcribe pricing and task estimates"
+        )
+        self.data_access_layer = _lambda.LayerVersion(self, 'DataAccessLayer',
+            code=_lambda.Code.from_asset(os.path.join("../source/", "extraction_service/layer/data_access")),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
+            description="python3.13 DynamoDB repositories and document codec"
+        )
+        self.lambda_runtime_layer = _lambda.LayerVersion(self, 'LambdaRuntimeLayer',
+            code=_lambda.Code.from_asset(os.path.join("../source/", "extraction_service/layer/lambda_runtime")),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
+            description="python3.13 lazy imports, pooled AWS clients and cold start metrics"
+        )
+        self.embedding_store_layer = _lambda.LayerVersion(self, 'EmbeddingStoreLayer',
+            code=_lambda.Code.from_asset(os.path.join("../source/", "extraction_service/layer/embedding_store"), exclude=["pyproject.toml", "build", "python/*.egg-info"]),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
+            description="python3.13 compact binary shot embedding store"
+        )
+        self.video_probe_layer = _lambda.LayerVersion(self, 'VideoProbeLayer',
+            code=_lambda.Code.from_asset(os.path.join("../source/", "extraction_service/layer/video_probe")),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
+            description="python3.13 container header video probe and streaming upload parts"
+        )
         self.aws_layer = _lambda.LayerVersion.from_layer_version_arn(self, "AwsLayerPowerTool", 
             layer_version_arn=f"arn:aws:lambda:{self.region}:336392948345:layer:AWSSDKPandas-Python313:4"
         )
 
+    def stage_pricing_layer(self):
+        # The web UI pricing config is the only copy: it is added to the pricing layer at synth time, so the
+        # Lambdas and the web UI price usage with the same file
+        staging_dir = tempfile.mkdtemp(prefix="pricing-layer-")
+        shutil.copytree(os.path.join("../source/", "extraction_service/layer/pricing"), staging_dir,
+            dirs_exist_ok=True, ignore=shutil.ignore_patterns("__pycache__"))
+        shutil.copyfile(os.path.join("../source/", "frontend/web/src/resources/pricing-config.json"),
+            os.path.join(staging_dir, "python", "pricing_config.json"))
+        return staging_dir
+
     def deploy_step_function(self):
         # Step Function - start
         # Lambda: extr-srv-wf-frame-video-metadata
@@ -227,12 +336,28 @@ class ExtrServiceStack(NestedStack):
                 'DYNAMO_VIDEO_FRAME_TABLE': DYNAMO_VIDEO_FRAME_TABLE,
                 'MODEL_ID_IMAGE_UNDERSTANDING': MODEL_ID_IMAGE_UNDERSTANDING,
                 'VIDEO_SAMPLE_CHUNK_DURATION_S': VIDEO_SAMPLE_CHUNK_DURATION_S,
+                'VIDEO_SAMPLE_CHUNK_TARGET_WALL_S': VIDEO_SAMPLE_CHUNK_TARGET_WALL_S,
+                'VIDEO_SAMPLE_CHUNK_MAX_CONCURRENCY': VIDEO_SAMPLE_CHUNK_MAX_CONCURRENCY,
+                'LAMBDA_FRAME_SAMPLE_VIDEO_TIMEOUT_S': LAMBDA_FRAME_SAMPLE_VIDEO_TIMEOUT_S,
+                'LAMBDA_FRAME_DEDUP_ORB_TIMEOUT_S': LAMBDA_FRAME_DEDUP_ORB_TIMEOUT_S,
+                'LAMBDA_FRAME_DEDUP_MME_TIMEOUT_S': LAMBDA_FRAME_DEDUP_MME_TIMEOUT_S,
                 'VIDEO_SAMPLE_S3_PREFIX': VIDEO_SAMPLE_S3_PREFIX,
                 'VIDEO_SAMPLE_S3_BUCKET': self.s3_bucket_name_extraction,
-                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE
+                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                'DYNAMO_VIDEO_USAGE_ROLLUP_TABLE': DYNAMO_VIDEO_USAGE_ROLLUP_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE,
+                'THUMBNAIL_MODEL_TIEBREAK': THUMBNAIL_MODEL_TIEBREAK
             }, 
             timeout_s=15*60, memory_size=10240, ephemeral_storage_size=10240,
-            layers=[self.moviepy_layer]
+            layers=[self.moviepy_layer, self.task_cache_layer, self.video_probe_layer]
+        )
+        # The chunk planner reads the unreserved account concurrency
+        lambda_extration_srv_metadata_role.add_to_policy(
+            _iam.PolicyStatement(
+                effect=_iam.Effect.ALLOW,
+                actions=["lambda:GetAccountSettings"],
+                resources=["*"]
+            )
         )
 
         # Lambda: extr-srv-wf-frame-sample-video
@@ -243,14 +368,16 @@ class ExtrServiceStack(NestedStack):
             lambda_extration_srv_wf_frame_sample_video_role, 
             {
                 'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
+                'TASK_CACHE_TTL_S': TASK_CACHE_TTL_S,
                 'DYNAMO_VIDEO_TRANS_TABLE': DYNAMO_VIDEO_TRANS_TABLE,
                 'DYNAMO_VIDEO_FRAME_TABLE': DYNAMO_VIDEO_FRAME_TABLE,
                 'VIDEO_SAMPLE_CHUNK_DURATION_S': VIDEO_SAMPLE_CHUNK_DURATION_S,
                 'VIDEO_SAMPLE_S3_PREFIX': VIDEO_SAMPLE_S3_PREFIX,
                 'VIDEO_SAMPLE_S3_BUCKET': self.s3_bucket_name_extraction,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE
             }, 
-            timeout_s=15*60, memory_size=10240, ephemeral_storage_size=10240,
-            layers=[self.moviepy_layer]
+            timeout_s=int(LAMBDA_FRAME_SAMPLE_VIDEO_TIMEOUT_S), memory_size=10240, ephemeral_storage_size=10240,
+            layers=[self.moviepy_layer, self.task_cache_layer, self.video_probe_layer]
         )
 
         # Lambda: extr-srv-fw-frame-sample-dedup-mme
@@ -262,13 +389,16 @@ class ExtrServiceStack(NestedStack):
             {
                 'DYNAMO_VIDEO_FRAME_TABLE': DYNAMO_VIDEO_FRAME_TABLE,
                 'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
+                'TASK_CACHE_TTL_S': TASK_CACHE_TTL_S,
                 'VIDEO_FRAME_SIMILAIRTY_THRESHOLD': VIDEO_FRAME_SIMILAIRTY_THRESHOLD_DEFAULT_MME,
                 'VIDEO_SAMPLE_S3_PREFIX': VIDEO_SAMPLE_S3_PREFIX,
                 'BEDROCK_MME_MODEL_ID': MODEL_ID_BEDROCK_MME,
-                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE
+                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                'DYNAMO_VIDEO_USAGE_ROLLUP_TABLE': DYNAMO_VIDEO_USAGE_ROLLUP_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE
             }, 
-            timeout_s=300, memory_size=10240, ephemeral_storage_size=1024,
-            layers=[self.aws_layer],
+            timeout_s=int(LAMBDA_FRAME_DEDUP_MME_TIMEOUT_S), memory_size=10240, ephemeral_storage_size=1024,
+            layers=[self.aws_layer, self.task_cache_layer],
         )
 
         # Lambda: extr-srv-fw-frame-sample-dedup-orb
@@ -280,11 +410,13 @@ class ExtrServiceStack(NestedStack):
             {
                 'DYNAMO_VIDEO_FRAME_TABLE': DYNAMO_VIDEO_FRAME_TABLE,
                 'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
+                'TASK_CACHE_TTL_S': TASK_CACHE_TTL_S,
                 'VIDEO_FRAME_SIMILAIRTY_THRESHOLD_DEFAULT': VIDEO_FRAME_SIMILAIRTY_THRESHOLD_DEFAULT_ORB,
                 'VIDEO_SAMPLE_FILE_PREFIX': VIDEO_SAMPLE_S3_PREFIX,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE
             }, 
-            timeout_s=60, memory_size=10240, ephemeral_storage_size=1024,
-            layers=[self.opencv_layer],
+            timeout_s=int(LAMBDA_FRAME_DEDUP_ORB_TIMEOUT_S), memory_size=10240, ephemeral_storage_size=1024,
+            layers=[self.opencv_layer, self.task_cache_layer],
         )
 
         # Lambda: extr-srv-wf-frame-extraction
@@ -296,11 +428,15 @@ class ExtrServiceStack(NestedStack):
             {
                 'DYNAMO_VIDEO_FRAME_TABLE': DYNAMO_VIDEO_FRAME_TABLE,
                 'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
+                'TASK_CACHE_TTL_S': TASK_CACHE_TTL_S,
                 'DYNAMO_VIDEO_TRANS_TABLE': DYNAMO_VIDEO_TRANS_TABLE,
-                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE
+                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                'DYNAMO_VIDEO_USAGE_ROLLUP_TABLE': DYNAMO_VIDEO_USAGE_ROLLUP_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE,
+                'FRAME_EXTRACTION_MAX_WORKERS': FRAME_EXTRACTION_MAX_WORKERS
             }, 
             timeout_s=300, memory_size=1024, ephemeral_storage_size=1024,
-            layers=[self.opencv_layer],
+            layers=[self.opencv_layer, self.task_cache_layer],
         )
 
         # Lambda: extr-srv-wf-start-transcribe
@@ -318,6 +454,32 @@ class ExtrServiceStack(NestedStack):
             timeout_s=30,
         )
 
+        # Lambda: extr-srv-fw-transcribe-callback
+        lambda_key = "extr-srv-fw-transcribe-callback"
+        lambda_extr_srv_fw_transcribe_callback_role = self.create_role(lambda_key, ["s3","transcribe","states_callback"])
+        lambda_extr_srv_fw_transcribe_callback = self.create_lambda(
+            lambda_key, 
+            lambda_extr_srv_fw_transcribe_callback_role, 
+            {
+                'TRANSCRIBE_JOB_PREFIX': TRANSCRIBE_JOB_PREFIX,
+                'S3_BUCKET_DATA': self.s3_bucket_name_extraction,
+            }, 
+            timeout_s=30,
+        )
+
+        # Complete the waiting workflow as soon as Transcribe reports the job finished
+        transcribe_job_state_rule = _events.Rule(self, "ExtrSrvTranscribeJobStateRule",
+            event_pattern=_events.EventPattern(
+                source=["aws.transcribe"],
+                detail_type=["Transcribe Job State Change"],
+                detail={
+                    "TranscriptionJobStatus": ["COMPLETED", "FAILED"],
+                    "TranscriptionJobName": [{"prefix": TRANSCRIBE_JOB_PREFIX}]
+                }
+            )
+        )
+        transcribe_job_state_rule.add_target(_targets.LambdaFunction(lambda_extr_srv_fw_transcribe_callback))
+
         # Lambda: extr-srv-wf-transcrip-post-process
         lambda_key = "extr-srv-wf-transcrip-post-process" 
         lambda_extr_srv_wf_transcrip_post_process_role = self.create_role(lambda_key, ["s3","dynamodb","transcribe"])
@@ -327,9 +489,12 @@ class ExtrServiceStack(NestedStack):
             {             
                 'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
                 'DYNAMO_VIDEO_TRANS_TABLE': DYNAMO_VIDEO_TRANS_TABLE,
-                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE
+                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                'DYNAMO_VIDEO_USAGE_ROLLUP_TABLE': DYNAMO_VIDEO_USAGE_ROLLUP_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE
             }, 
             timeout_s=60*15, memory_size=10240, ephemeral_storage_size=10240,
+            layers=[self.transcript_parser_layer]
         )
         
         # Lambda: extr-srv-fw-update-task-status
@@ -340,8 +505,10 @@ class ExtrServiceStack(NestedStack):
             lambda_extr_srv_fw_update_task_statu_role, 
             {
                 'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE
             }, 
             timeout_s=10, memory_size=128, ephemeral_storage_size=512,
+            layers=[self.task_cache_layer],
         )
 
         # Lambda: extr-srv-wf-clip-video-metadata
@@ -357,22 +524,29 @@ class ExtrServiceStack(NestedStack):
                 'VIDEO_SAMPLE_S3_PREFIX': VIDEO_SAMPLE_S3_PREFIX,
                 'VIDEO_SAMPLE_S3_BUCKET': self.s3_bucket_name_extraction,
                 'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                'DYNAMO_VIDEO_USAGE_ROLLUP_TABLE': DYNAMO_VIDEO_USAGE_ROLLUP_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE,
+                'THUMBNAIL_MODEL_TIEBREAK': THUMBNAIL_MODEL_TIEBREAK
             }, 
             timeout_s=15*60, memory_size=10240, ephemeral_storage_size=10240,
-            layers=[self.moviepy_layer]
+            layers=[self.moviepy_layer, self.task_cache_layer, self.video_probe_layer]
         )
 
         # extr-srv-fw-clip-gen-shot-duration 
         lambda_key = "extr-srv-fw-clip-gen-shot-duration"
-        lambda_extration_srv_metadata_role = self.create_role(lambda_key, ["s3","dynamodb"])
+        lambda_extration_srv_metadata_role = self.create_role(lambda_key, ["s3","dynamodb","s3vectors"])
         lambda_extr_srv_fw_clip_gen_shot_durtion = self.create_lambda(
             lambda_key, 
             lambda_extration_srv_metadata_role, 
             {
                 'DYNAMO_VIDEO_SHOT_TABLE': DYNAMO_VIDEO_SHOT_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE,
+                'S3_VECTOR_BUCKET': S3_VECTOR_BUCKET_NAME, 
+                'S3_VECTOR_INDEX':S3_VECTOR_INDEX_NAME,
+                'S3_VECTOR_INDEX_COARSE': S3_VECTOR_INDEX_NAME_COARSE,
             }, 
             timeout_s=15*60, memory_size=10240, ephemeral_storage_size=10240,
-            layers=[self.scenedetect_layer],
+            layers=[self.scenedetect_layer, self.embedding_store_layer],
         )
         
         # extr-srv-wf-clip-gen-shot-video 
@@ -384,45 +558,64 @@ class ExtrServiceStack(NestedStack):
             {
                 'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
                 'DYNAMO_VIDEO_SHOT_TABLE': DYNAMO_VIDEO_SHOT_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE
             }, 
             timeout_s=15*60, memory_size=10240, ephemeral_storage_size=10240,
             layers=[self.moviepy_layer],
         )
 
-        ## extr-srv-wf-clip-shot-understanding
-        lambda_key = "extr-srv-wf-clip-shot-understanding"
-        lambda_extr_srv_wf_clip_shot_understanding_role = self.create_role(lambda_key, ["s3","dynamodb","bedrock"])
-        lambda_extr_srv_fw_clip_shot_understanding = self.create_lambda(
+        # Lambda: extr-srv-wf-clip-shot-batch (shot understanding and embedding)
+        lambda_key = "extr-srv-wf-clip-shot-batch"
+        lambda_extr_srv_wf_clip_shot_batch_role = self.create_role(lambda_key, ["s3","dynamodb","bedrock","s3vectors"])
+        lambda_extr_srv_wf_clip_shot_batch = self.create_lambda(
             lambda_key, 
-            lambda_extr_srv_wf_clip_shot_understanding_role, 
+            lambda_extr_srv_wf_clip_shot_batch_role, 
             {
+                'MME_MODEL_ID': MODEL_ID_BEDROCK_MME,
+                'S3_VECTOR_BUCKET': S3_VECTOR_BUCKET_NAME, 
+                'S3_VECTOR_INDEX':S3_VECTOR_INDEX_NAME,
+                'S3_VECTOR_INDEX_COARSE': S3_VECTOR_INDEX_NAME_COARSE,
+                'COARSE_EMBEDDING_DIM': EMBEDDING_DIM_COARSE,
+                'EMBEDDING_DIM': EMBEDDING_DIM_DEFAULT,
                 'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
+                'TASK_CACHE_TTL_S': TASK_CACHE_TTL_S,
                 'DYNAMO_VIDEO_SHOT_TABLE': DYNAMO_VIDEO_SHOT_TABLE,
                 'S3_BUCKET_DATA': self.s3_bucket_name_extraction,
                 'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                'DYNAMO_VIDEO_USAGE_ROLLUP_TABLE': DYNAMO_VIDEO_USAGE_ROLLUP_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE,
+                'SHOT_BATCH_MAX_WORKERS': SHOT_BATCH_MAX_WORKERS,
+                'SHOT_VECTOR_DTYPE': SHOT_VECTOR_DTYPE
             }, 
-            timeout_s=300, memory_size=4096, ephemeral_storage_size=4096,
-            layers=[self.moviepy_layer],
+            timeout_s=15*60, memory_size=10240, ephemeral_storage_size=4096,
+            layers=[self.task_cache_layer, self.embedding_store_layer],
         )
 
-        # extr-srv-wf-clip-shot-embedding 
-        lambda_key = "extr-srv-wf-clip-shot-embedding"
-        lambda_extr_srv_wf_clip_shot_embed_role = self.create_role(lambda_key, ["s3","dynamodb","bedrock","s3vectors"])
-        lambda_extr_srv_wf_clip_shot_embed = self.create_lambda(
+        # Lambda: extr-srv-fw-data-size-reconcile
+        lambda_key = "extr-srv-fw-data-size-reconcile"
+        lambda_extr_srv_fw_data_size_reconcile_role = self.create_role(lambda_key, ["s3","dynamodb","lambda"])
+        lambda_extr_srv_fw_data_size_reconcile = self.create_lambda(
             lambda_key, 
-            lambda_extr_srv_wf_clip_shot_embed_role, 
+            lambda_extr_srv_fw_data_size_reconcile_role, 
             {
-                'MME_MODEL_ID': MODEL_ID_BEDROCK_MME,
-                'S3_VECTOR_BUCKET': S3_VECTOR_BUCKET_NAME, 
-                'S3_VECTOR_INDEX':S3_VECTOR_INDEX_NAME,
-                'EMBEDDING_DIM': EMBEDDING_DIM_DEFAULT,
+                'S3_BUCKET': self.s3_bucket_name_extraction,
                 'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
-                'S3_BUCKET_DATA': self.s3_bucket_name_extraction,
-                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE
+                'DYNAMO_VIDEO_FRAME_TABLE': DYNAMO_VIDEO_FRAME_TABLE,
+                'DYNAMO_VIDEO_SHOT_TABLE': DYNAMO_VIDEO_SHOT_TABLE,
+                'DYNAMO_VIDEO_TRANS_TABLE': DYNAMO_VIDEO_TRANS_TABLE,
+                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE
             }, 
-            timeout_s=30, memory_size=10240, ephemeral_storage_size=4096,
-            layers=[self.moviepy_layer],
+            timeout_s=15*60, memory_size=512, ephemeral_storage_size=512,
         )
+        # One reconciliation runs at a time, it continues itself until every task is reconciled
+        lambda_extr_srv_fw_data_size_reconcile.node.default_child.reserved_concurrent_executions = 1
+
+        # Reconcile data size counters against S3 and DynamoDB on a schedule to repair drift
+        data_size_reconcile_rule = _events.Rule(self, "ExtrSrvDataSizeReconcileRule",
+            schedule=_events.Schedule.rate(Duration.hours(int(DATA_SIZE_RECONCILE_SCHEDULE_HR)))
+        )
+        data_size_reconcile_rule.add_target(_targets.LambdaFunction(lambda_extr_srv_fw_data_size_reconcile))
 
         # StepFunctions 
         sf_key = "extr-srv-frame-based-flow"
@@ -439,6 +632,7 @@ class ExtrServiceStack(NestedStack):
             #sm_frame_based_flow_json = sm_frame_based_flow_json.replace("##LAMBDA_WF_FRAME_SHOT_ANALYSIS##", lambda_extr_srv_wf_frame_shot_analysis.function_arn)
             #sm_frame_based_flow_json = sm_frame_based_flow_json.replace("##LAMBDA_WF_FRAME_SHOT_SUMMARY##", lambda_extr_srv_fw_frame_shot_summary.function_arn)
             sm_frame_based_flow_json = sm_frame_based_flow_json.replace("##LAMBDA_WF_START_TRANSCRIBE##", lambda_extr_srv_wf_start_transcribe.function_arn)
+            sm_frame_based_flow_json = sm_frame_based_flow_json.replace("##LAMBDA_WF_TRANSCRIBE_CALLBACK##", lambda_extr_srv_fw_transcribe_callback.function_arn)
             sm_frame_based_flow_json = sm_frame_based_flow_json.replace("##LAMBDA_WF_TRANSCRIPT_POST_PROCESS##", lambda_extr_srv_wf_transcrip_post_process.function_arn)
             sm_frame_based_flow_json = sm_frame_based_flow_json.replace("##LAMBDA_WF_UPADATE_TASK_STATUS##", lambda_extr_srv_fw_update_task_status.function_arn)
             
@@ -456,6 +650,17 @@ class ExtrServiceStack(NestedStack):
                         effect=_iam.Effect.ALLOW,
                         actions=["states:StartExecution","states:ListExecutions"],
                         resources=[f"arn:aws:states:{self.region}:{self.account_id}:stateMachine:{STEP_FUNCTIONS_NAME_PREFIX}{sf_key}"]
+                    ),
+                    # Distributed Map child executions and result writer
+                    _iam.PolicyStatement(
+                        effect=_iam.Effect.ALLOW,
+                        actions=["states:DescribeExecution","states:StopExecution"],
+                        resources=[f"arn:aws:states:{self.region}:{self.account_id}:execution:{STEP_FUNCTIONS_NAME_PREFIX}{sf_key}/*"]
+                    ),
+                    _iam.PolicyStatement(
+                        effect=_iam.Effect.ALLOW,
+                        actions=["s3:AbortMultipartUpload","s3:ListMultipartUploadParts"],
+                        resources=[f"arn:aws:s3:::{self.s3_bucket_name_extraction}/*"]
                     ),
                      _iam.PolicyStatement(
                         effect=_iam.Effect.ALLOW,
@@ -513,9 +718,9 @@ class ExtrServiceStack(NestedStack):
             sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_CLIP_METADATA##", lambda_extr_srv_fw_clip_metadata.function_arn)
             sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_CLIP_GEN_SHOT_DURATION##", lambda_extr_srv_fw_clip_gen_shot_durtion.function_arn)
             sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_CLIP_GEN_SHOT_VIDEO##", lambda_extr_srv_wf_clip_gen_shot_video.function_arn)
-            sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_CLIP_SHOT_UNDERSTANDING##", lambda_extr_srv_fw_clip_shot_understanding.function_arn)
-            sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_CLIP_SHOT_EMBED##", lambda_extr_srv_wf_clip_shot_embed.function_arn)
+            sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_CLIP_SHOT_BATCH##", lambda_extr_srv_wf_clip_shot_batch.function_arn)
             sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_START_TRANSCRIBE##", lambda_extr_srv_wf_start_transcribe.function_arn)
+            sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_TRANSCRIBE_CALLBACK##", lambda_extr_srv_fw_transcribe_callback.function_arn)
             sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_TRANSCRIPT_POST_PROCESS##", lambda_extr_srv_wf_transcrip_post_process.function_arn)
             sm_clip_based_flow_json = sm_clip_based_flow_json.replace("##LAMBDA_WF_UPADATE_TASK_STATUS##", lambda_extr_srv_fw_update_task_status.function_arn)
             
@@ -534,6 +739,12 @@ class ExtrServiceStack(NestedStack):
                         actions=["states:StartExecution","states:ListExecutions"],
                         resources=[f"arn:aws:states:{self.region}:{self.account_id}:stateMachine:{STEP_FUNCTIONS_NAME_PREFIX}{sf_key}"]
                     ),
+                    # Distributed Map child executions
+                    _iam.PolicyStatement(
+                        effect=_iam.Effect.ALLOW,
+                        actions=["states:DescribeExecution","states:StopExecution"],
+                        resources=[f"arn:aws:states:{self.region}:{self.account_id}:execution:{STEP_FUNCTIONS_NAME_PREFIX}{sf_key}/*"]
+                    ),
                     _iam.PolicyStatement(
                         effect=_iam.Effect.ALLOW,
                         actions=["sns:Publish"],
@@ -625,10 +836,14 @@ class ExtrServiceStack(NestedStack):
                 'S3_BUCKET_DATA': self.s3_bucket_name_extraction,
                 'S3_VECTOR_BUCKET': S3_VECTOR_BUCKET_NAME,
                 'S3_VECTOR_INDEX': S3_VECTOR_INDEX_NAME,
-                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE
+                'S3_VECTOR_INDEX_COARSE': S3_VECTOR_INDEX_NAME_COARSE,
+                'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                'DYNAMO_VIDEO_USAGE_ROLLUP_TABLE': DYNAMO_VIDEO_USAGE_ROLLUP_TABLE,
+                'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE,
+                'DYNAMO_VIDEO_TASK_QUEUE_TABLE': DYNAMO_VIDEO_TASK_QUEUE_TABLE,
             }, 
             timeout_s=120, memory_size=10240, ephemeral_storage_size=4096,
-            layers=[self.moviepy_layer],
+            layers=[self.moviepy_layer, self.embedding_store_layer],
         )
 
         # POST v1/extraction/video/delete-task
@@ -700,16 +915,29 @@ class ExtrServiceStack(NestedStack):
         
         # POST /v1/extraction/video/manage-s3-presigned-url
         lambda_key='extr-srv-api-manage-s3-presigned-url'
-        lambda_es_manage_s3_url_role = self.create_role(lambda_key, ["s3"])
+        lambda_es_manage_s3_url_role = self.create_role(lambda_key, ["s3","lambda","dynamodb"])
+        # Streaming uploads are assembled from their part objects with a multipart copy
+        lambda_es_manage_s3_url_role.add_to_policy(
+            _iam.PolicyStatement(
+                effect=_iam.Effect.ALLOW,
+                actions=["s3:AbortMultipartUpload"],
+                resources=[f"arn:aws:s3:::{self.s3_bucket_name_extraction}/*"]
+            )
+        )
+        # Waits for start-task, within the API Gateway integration timeout
         self.create_api_endpoint(id=f'{lambda_key}-ep', root=ex_video, path1="manage-s3-presigned-url", method="POST", auth=self.cognito_authorizer, 
                 role=lambda_es_manage_s3_url_role,
                 lambda_file_name=lambda_key,
-                memory_m=128, timeout_s=10, ephemeral_storage_size=512,
+                memory_m=256, timeout_s=29, ephemeral_storage_size=512,
                 evns={
                     'S3_PRESIGNED_URL_EXPIRY_S': S3_PRESIGNED_URL_EXPIRY_S,
                     'VIDEO_UPLOAD_S3_BUCKET': self.s3_bucket_name_extraction,
-                    'VIDEO_UPLOAD_S3_PREFIX': VIDEO_UPLOAD_S3_PREFIX
+                    'VIDEO_UPLOAD_S3_PREFIX': VIDEO_UPLOAD_S3_PREFIX,
+                    'LAMBDA_START_TASK': f'{LAMBDA_NAME_PREFIX}extr-srv-api-start-task',
+                    'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
                 },
+                layers=[self.video_probe_layer],
+                caller=True
             )   
               
         # POST /v1/extraction/search-task
@@ -739,22 +967,96 @@ class ExtrServiceStack(NestedStack):
                     'MODEL_ID': MODEL_ID_BEDROCK_MME,
                     'NOVA_S3_VECTOR_BUCKET': S3_VECTOR_BUCKET_NAME,
                     'NOVA_S3_VECTOR_INDEX': S3_VECTOR_INDEX_NAME,
+                    'NOVA_S3_VECTOR_INDEX_COARSE': S3_VECTOR_INDEX_NAME_COARSE,
+                    'COARSE_EMBEDDING_DIM': EMBEDDING_DIM_COARSE,
+                    'SEARCH_RETRIEVAL_MODE': SEARCH_RETRIEVAL_MODE,
+                    'SEARCH_RERANK_CANDIDATES_FACTOR': SEARCH_RERANK_CANDIDATES_FACTOR,
                     'S3_BUCKET_DATA': self.s3_bucket_name_extraction,
                     'S3_PRE_SIGNED_URL_EXPIRY_S': S3_PRESIGNED_URL_EXPIRY_S
+                },
+                layers=[self.embedding_store_layer]
+        )
+
+        # Lambda: extr-srv-fw-task-scheduler
+        lambda_key = "extr-srv-fw-task-scheduler"
+        lambda_extr_srv_fw_task_scheduler = self.create_lambda(
+            lambda_key, 
+            self.create_role(lambda_key, ["dynamodb","states"]), 
+            {
+                'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
+                'DYNAMO_VIDEO_TASK_QUEUE_TABLE': DYNAMO_VIDEO_TASK_QUEUE_TABLE,
+                'TASK_SCHEDULER_MAX_RUNNING_TASKS': TASK_SCHEDULER_MAX_RUNNING_TASKS,
+                'TASK_SCHEDULER_MAX_RUNNING_TASKS_PER_USER': TASK_SCHEDULER_MAX_RUNNING_TASKS_PER_USER,
+                'TASK_SCHEDULER_MAX_RUNNING_TOKENS': TASK_SCHEDULER_MAX_RUNNING_TOKENS,
+                'TASK_SCHEDULER_MAX_RUNNING_REQUESTS': TASK_SCHEDULER_MAX_RUNNING_REQUESTS,
+            }, 
+            timeout_s=60,
+        )
+        # Admission rounds run one at a time
+        lambda_extr_srv_fw_task_scheduler.node.default_child.reserved_concurrent_executions = 1
+
+        # Admit the next task as soon as a workflow execution ends
+        task_execution_state_rule = _events.Rule(self, "ExtrSrvTaskExecutionStateRule",
+            event_pattern=_events.EventPattern(
+                source=["aws.states"],
+                detail_type=["Step Functions Execution Status Change"],
+                detail={
+                    "status": ["SUCCEEDED", "FAILED", "TIMED_OUT", "ABORTED"],
+                    "stateMachineArn": [self.sf_frame_based_flow.state_machine_arn, self.sf_clip_based_flow.state_machine_arn]
                 }
+            )
         )
+        task_execution_state_rule.add_target(_targets.LambdaFunction(lambda_extr_srv_fw_task_scheduler))
+
+        # Periodic admission round in case an event is missed
+        task_scheduler_rule = _events.Rule(self, "ExtrSrvTaskSchedulerRule",
+            schedule=_events.Schedule.rate(Duration.minutes(int(TASK_SCHEDULER_SCHEDULE_MIN)))
+        )
+        task_scheduler_rule.add_target(_targets.LambdaFunction(lambda_extr_srv_fw_task_scheduler))
 
         # POST /v1/extraction/video/start-task
         lambda_key='extr-srv-api-start-task'
         self.create_api_endpoint(id=f'{lambda_key}-ep', root=ex_video, path1="start-task", method="POST", auth=self.cognito_authorizer, 
-                role=self.create_role(lambda_key, ["s3","dynamodb","states"]), 
+                role=self.create_role(lambda_key, ["s3","dynamodb","lambda"]), 
                 lambda_file_name=lambda_key,
-                memory_m=128, timeout_s=30, ephemeral_storage_size=512,
+                memory_m=1024, timeout_s=30, ephemeral_storage_size=512,
                 evns={
                     'STEP_FUNCTIONS_STATE_MACHINE_ARN_FRAME': self.sf_frame_based_flow.state_machine_arn,
                     'STEP_FUNCTIONS_STATE_MACHINE_ARN_CLIP': self.sf_clip_based_flow.state_machine_arn,
                     'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
+                    'DYNAMO_VIDEO_TASK_QUEUE_TABLE': DYNAMO_VIDEO_TASK_QUEUE_TABLE,
+                    'LAMBDA_TASK_SCHEDULER': lambda_extr_srv_fw_task_scheduler.function_name,
+                    # Shared task_estimate settings, as estimate-task
+                    'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                    'MODEL_ID_IMAGE_UNDERSTANDING': MODEL_ID_IMAGE_UNDERSTANDING,
+                    'MODEL_ID_BEDROCK_MME': MODEL_ID_BEDROCK_MME,
+                    'TASK_MAX_ESTIMATED_REQUESTS': TASK_MAX_ESTIMATED_REQUESTS,
+                    'VIDEO_SAMPLE_CHUNK_TARGET_WALL_S': VIDEO_SAMPLE_CHUNK_TARGET_WALL_S,
+                    'FRAME_EXTRACTION_MAX_WORKERS': FRAME_EXTRACTION_MAX_WORKERS,
+                    'SHOT_BATCH_MAX_WORKERS': SHOT_BATCH_MAX_WORKERS,
+                    'TASK_PRIORITY_BY_GROUP': TASK_PRIORITY_BY_GROUP,
                 },
+                layers=[self.moviepy_layer, self.pricing_layer],
+                caller=True
+            )
+
+        # POST /v1/extraction/video/estimate-task
+        lambda_key='extr-srv-api-estimate-task'
+        self.create_api_endpoint(id=f'{lambda_key}-ep', root=ex_video, path1="estimate-task", method="POST", auth=self.cognito_authorizer, 
+                role=self.create_role(lambda_key, ["s3","dynamodb"]), 
+                lambda_file_name=lambda_key,
+                memory_m=1024, timeout_s=30, ephemeral_storage_size=512,
+                evns={
+                    'DYNAMO_VIDEO_TASK_TABLE': DYNAMO_VIDEO_TASK_TABLE,
+                    'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                    'MODEL_ID_IMAGE_UNDERSTANDING': MODEL_ID_IMAGE_UNDERSTANDING,
+                    'MODEL_ID_BEDROCK_MME': MODEL_ID_BEDROCK_MME,
+                    'TASK_MAX_ESTIMATED_REQUESTS': TASK_MAX_ESTIMATED_REQUESTS,
+                    'VIDEO_SAMPLE_CHUNK_TARGET_WALL_S': VIDEO_SAMPLE_CHUNK_TARGET_WALL_S,
+                    'FRAME_EXTRACTION_MAX_WORKERS': FRAME_EXTRACTION_MAX_WORKERS,
+                    'SHOT_BATCH_MAX_WORKERS': SHOT_BATCH_MAX_WORKERS,
+                },
+                layers=[self.moviepy_layer, self.pricing_layer]
             )
         
         # POST /v1/extraction/video/extr-srv-api-get-sm-url
@@ -777,6 +1079,19 @@ class ExtrServiceStack(NestedStack):
                 evns={
                     'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
                 },
+                layers=[self.pricing_layer]
+            )
+
+        # POST /v1/extraction/video/get-usage-summary
+        lambda_key = "extr-srv-api-get-usage-summary"
+        self.create_api_endpoint(id=f'{lambda_key}-ep', root=ex_video, path1="get-usage-summary", method="POST", auth=self.cognito_authorizer, 
+                role=self.create_role(lambda_key, ["dynamodb"]), 
+                lambda_file_name=lambda_key,
+                memory_m=512, timeout_s=30, ephemeral_storage_size=512,
+                evns={
+                    'DYNAMO_VIDEO_USAGE_ROLLUP_TABLE': DYNAMO_VIDEO_USAGE_ROLLUP_TABLE,
+                },
+                layers=[self.pricing_layer]
             )
 
         # POST /v1/extraction/video/get-data-size
@@ -792,6 +1107,7 @@ class ExtrServiceStack(NestedStack):
                     'DYNAMO_VIDEO_SHOT_TABLE': DYNAMO_VIDEO_SHOT_TABLE,
                     'DYNAMO_VIDEO_TRANS_TABLE': DYNAMO_VIDEO_TRANS_TABLE,
                     'DYNAMO_VIDEO_USAGE_TABLE': DYNAMO_VIDEO_USAGE_TABLE,
+                    'DYNAMO_VIDEO_DATA_SIZE_TABLE': DYNAMO_VIDEO_DATA_SIZE_TABLE
                 },
             )
 
@@ -828,11 +1144,16 @@ class ExtrServiceStack(NestedStack):
                             f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_SHOT_TABLE}/index/*",
                             f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_TRANS_TABLE}/index/*",
                             f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_USAGE_TABLE}/index/*",
+                            f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_DATA_SIZE_TABLE}/index/*",
+                            f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_TASK_QUEUE_TABLE}/index/*",
                             f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_TASK_TABLE}",
                             f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_TRANS_TABLE}",
                             f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_FRAME_TABLE}",
                             f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_SHOT_TABLE}",
                             f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_USAGE_TABLE}",
+                            f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_USAGE_ROLLUP_TABLE}",
+                            f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_DATA_SIZE_TABLE}",
+                            f"arn:aws:dynamodb:{self.region}:{self.account_id}:table/{DYNAMO_VIDEO_TASK_QUEUE_TABLE}",
                         ]
                     ))
         if "bedrock" in policies:
@@ -862,6 +1183,21 @@ class ExtrServiceStack(NestedStack):
                         resources=[f"arn:aws:states:{self.region}:{self.account_id}:stateMachine:*"]
                     )
             )
+            statements.append(
+                _iam.PolicyStatement(
+                        effect=_iam.Effect.ALLOW,
+                        actions=["states:DescribeExecution"],
+                        resources=[f"arn:aws:states:{self.region}:{self.account_id}:execution:*"]
+                    )
+            )
+        if "states_callback" in policies:
+            statements.append(
+                _iam.PolicyStatement(
+                        effect=_iam.Effect.ALLOW,
+                        actions=["states:SendTaskSuccess","states:SendTaskFailure"],
+                        resources=[f"arn:aws:states:{self.region}:{self.account_id}:stateMachine:{STEP_FUNCTIONS_NAME_PREFIX}*"]
+                    )
+            )
         if "s3vectors" in policies:
             statements.append(
                 _iam.PolicyStatement(
@@ -884,7 +1220,7 @@ class ExtrServiceStack(NestedStack):
             statements.append(
                 _iam.PolicyStatement(
                         effect=_iam.Effect.ALLOW,
-                        actions=["transcribe:StartTranscriptionJob", "transcribe:DeleteTranscriptionJob","transcribe:GetTranscriptionJob"],
+                        actions=["transcribe:StartTranscriptionJob", "transcribe:DeleteTranscriptionJob","transcribe:GetTranscriptionJob","transcribe:TagResource"],
                         resources=["*"]
                     ),
             )
@@ -918,10 +1254,10 @@ class ExtrServiceStack(NestedStack):
             ephemeral_storage_size=Size.mebibytes(ephemeral_storage_size),
             role=role,
             environment=environment,
-            layers=layers,
+            layers=[self.lambda_runtime_layer, self.data_access_layer] + (layers or []),
         )
 
-    def create_api_endpoint(self, id, root, path1, method, auth, role, lambda_file_name, memory_m, timeout_s, ephemeral_storage_size, evns, layers=None):
+    def create_api_endpoint(self, id, root, path1, method, auth, role, lambda_file_name, memory_m, timeout_s, ephemeral_storage_size, evns, layers=None, caller=False):
         lambda_function = _lambda.Function(self, 
             id=f'{lambda_file_name}-lambda', 
             function_name=f'{LAMBDA_NAME_PREFIX}{lambda_file_name}', 
@@ -933,7 +1269,7 @@ class ExtrServiceStack(NestedStack):
             ephemeral_storage_size=Size.mebibytes(ephemeral_storage_size),
             role=role,
             environment=evns,
-            layers=layers,
+            layers=[self.lambda_runtime_layer, self.data_access_layer] + (layers or []),
         )
 
         resource = root.add_resource(
@@ -948,6 +1284,8 @@ class ExtrServiceStack(NestedStack):
             _apigw.LambdaIntegration(
                 lambda_function,
                 proxy=False,
+                # With caller, the authenticated user is added to the request as Caller, a client cannot set it
+                request_templates={"application/json": CALLER_REQUEST_TEMPLATE} if caller else None,
                 integration_responses=[
                     _apigw.IntegrationResponse(
                         status_code="200",
@@ -7,10 +7,12 @@ AGENTCORE_RUNTIME_NAME_PREFIX='bedrock_mm_video_understanding_agent'
 
 S3_VECTOR_BUCKET_NAME='bedrock-mm-vector-bucket'
 S3_VECTOR_INDEX_NAME='nova-mme-video-clip-1024'
+S3_VECTOR_INDEX_NAME_COARSE='nova-mme-video-clip-256'
 S3_VECTOR_INDEX_NOVA_MME_FIXED = "nova-mme-video-async-1024"
 S3_VECTOR_INDEX_TLABS_27 = 'tlabs-video-1024'
 S3_VECTOR_INDEX_TLABS_30 = 'tlabs-video-512'
 EMBEDDING_DIM_DEFAULT_NOVA_MME = '1024'
+EMBEDDING_DIM_COARSE_NOVA_MME = '256'
 EMBEDDING_DIM_DEFAULT_27='1024'
 EMBEDDING_DIM_DEFAULT_30='512'
 
@@ -286,6 +286,11 @@ class ServicePreStack(NestedStack):
                                     "IndexName": S3_VECTOR_INDEX_NAME,
                                     "IndexDim": EMBEDDING_DIM_DEFAULT_NOVA_MME
                                 },
+                                {
+                                    "BucketName": S3_VECTOR_BUCKET_NAME,
+                                    "IndexName": S3_VECTOR_INDEX_NAME_COARSE,
+                                    "IndexDim": EMBEDDING_DIM_COARSE_NOVA_MME
+                                },
                                 {
                                     "BucketName": S3_VECTOR_BUCKET_NAME,
                                     "IndexName": S3_VECTOR_INDEX_NOVA_MME_FIXED,
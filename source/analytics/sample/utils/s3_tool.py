@@ -1,7 +1,11 @@
 # Get video task metadata from DynamoDB / S3
 import boto3
 import json
-import re
+
+# The streaming VTT parser and the shot embedding store of the extraction service Lambda layers,
+# installed with the sample requirements (requirements.txt)
+import transcript_parser
+import embedding_store
 
 S3_BUCKET_NAME_TEMPLATE_DATA = 'bedrock-mm-{account_id}-{region}'
 S3_KEY_TEMPLATE_TRANSCRIPT_VTT = "tasks/{task_id}/transcribe/{task_id}_transcribe.vtt"
@@ -40,46 +44,12 @@ def get_transcripts(task_id, s3_bucket=S3_BUCKET_NAME):
 
     subtitles = []
     try:
-        s3_clientobj = s3.Object(s3_bucket, s3_key)
-        s3_clientdata = s3_clientobj.get()["Body"].read().decode("utf-8")
-    
-        
-        blocks = re.split(r'\n{2,}', s3_clientdata.strip())
-        for block in blocks:
-            lines = block.split('\n')
-            if len(lines) <= 1:
-                continue
-    
-            index = int(lines[0]) if lines[0].isdigit() else None
-            timecodes = re.findall(r'(\d{2}:\d{2}:\d{2}\.\d{3}) --> (\d{2}:\d{2}:\d{2}\.\d{3})', lines[1])
-            text = '\n'.join(lines[2:]).strip() if len(lines) > 2 else None
-    
-            if index is not None and timecodes and text is not None:
-                start_ts, end_ts = timecodes[0]
-                subtitles.append({
-                    "start_ts": convert_timestamp_to_ms(start_ts),
-                    "end_ts": convert_timestamp_to_ms(end_ts),
-                    "transcription": text
-                })
+        subtitles = list(transcript_parser.iter_s3_vtt_cues(s3.meta.client, s3_bucket, s3_key))
     except Exception as ex:
         print("No audio transcription")
 
     return subtitles
 
-def convert_timestamp_to_ms(timestamp):
-    try:
-        # Split the timestamp into hours, minutes, seconds, and milliseconds
-        hours, minutes, seconds_ms = timestamp.split(':')
-        seconds, milliseconds = seconds_ms.split('.')
-        
-        # Convert to float and format the result
-        result = float(hours) * 3600 + float(minutes) * 60 + float(seconds) + float(f"0.{milliseconds}")
-        
-        return round(result, 2)  # Round to 2 decimal places
-    except ValueError as e:
-        print(f"Error converting timestamp: {e}")
-        return None
-
 
 def get_all_s3_files(s3_bucket, prefix):
     """
@@ -122,6 +92,21 @@ def get_shot_clips(task_id, s3_bucket=S3_BUCKET_NAME):
     return get_all_s3_files(s3_bucket, s3_prefix)
 
 
+def get_shot_embeddings(task_id, s3_bucket=S3_BUCKET_NAME):
+    """
+    Load the shot embeddings of a task from its compact embedding store in S3. Requires numpy.
+
+    Args:
+        task_id (str): Task ID.
+        s3_bucket (str): S3 bucket name.
+
+    Returns:
+        tuple: (rows, matrix). rows is a list of dicts with 'key', 'index', 'startSec' and 'endSec' in shot
+               index order, matrix the float32 numpy array with one row per shot, or None if there are no embeddings.
+    """
+    return embedding_store.load(s3.meta.client, s3_bucket, task_id)
+
+
 def get_frame_images(task_id, s3_bucket=S3_BUCKET_NAME):
     """
     Get all extracted video frame images for a task from S3.
@@ -0,0 +1,233 @@
+# Benchmark cases for the media hot paths
+# Each case loads the Lambda code it measures from the source tree, prepares its input outside the timed
+# region and returns a run() callable that processes the input once and returns the number of units processed.
+# S3 is replaced by a local stand-in, nothing calls AWS.
+import os
+import sys
+import shutil
+import tempfile
+import importlib.util
+
+import media
+
+EXTRACTION_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(EXTRACTION_SERVICE_DIR, "lambda")
+LAYER_DIR = os.path.join(EXTRACTION_SERVICE_DIR, "layer")
+LAYERS = ["lambda_runtime", "data_access", "task_cache", "transcript_parser", "pricing", "video_probe", "embedding_store"]
+
+CASES = {}
+
+
+def case(name, unit, inputs):
+    """
+    Register a benchmark case.
+
+    Parameters:
+    - name: Case name, used in reports and baselines
+    - unit: What run() counts, e.g. "frames"
+    - inputs: "video" to run once per benchmark video, or a list of input sizes
+    """
+    def decorator(func):
+        CASES[name] = {"name": name, "unit": unit, "inputs": inputs, "func": func}
+        return func
+    return decorator
+
+
+def setup_environment():
+    # Layers are on the Lambda path in AWS. Dummy region and credentials keep boto3 offline.
+    for layer in LAYERS:
+        path = os.path.join(LAYER_DIR, layer, "python")
+        if path not in sys.path:
+            sys.path.append(path)
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    os.environ.setdefault("AWS_EC2_METADATA_DISABLED", "true")
+
+
+def load_lambda(function_name, environment=None):
+    """Import a Lambda function module from the source tree."""
+    setup_environment()
+    os.environ.update(environment or {})
+    path = os.path.join(LAMBDA_DIR, function_name)
+    sys.path.insert(0, path)
+    try:
+        spec = importlib.util.spec_from_file_location(function_name.replace("-", "_"), os.path.join(path, f"{function_name}.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(path)
+    return module
+
+
+class LocalS3:
+    """S3 stand-in for the calls the measured functions make. Objects are written under a local directory."""
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        path = os.path.join(self.root, bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def upload_file(self, file_path, bucket, key):
+        shutil.copyfile(file_path, self._path(bucket, key))
+
+    def put_object(self, Bucket, Key, Body):
+        with open(self._path(Bucket, Key), "wb") as f:
+            f.write(Body if isinstance(Body, bytes) else Body.encode("utf-8"))
+
+
+def read_frames(video, every_s=1.0, grayscale=False):
+    """Decode one frame every every_s seconds with OpenCV, as PNG bytes are decoded in the dedup Lambdas."""
+    import cv2
+
+    capture = cv2.VideoCapture(video.path)
+    frames = []
+    try:
+        ts = 0.0
+        while ts < video.duration:
+            capture.set(cv2.CAP_PROP_POS_MSEC, ts * 1000)
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if grayscale else frame)
+            ts += every_s
+    finally:
+        capture.release()
+    return frames
+
+
+@case("sample_video_at_timestamps", unit="frames", inputs="video")
+def sample_video_at_timestamps(video):
+    work_dir = tempfile.mkdtemp(prefix="bench_sample_")
+    module = load_lambda("extr-srv-wf-frame-sample-video", {
+        "VIDEO_SAMPLE_S3_BUCKET": "bench-bucket",
+        "VIDEO_SAMPLE_S3_PREFIX": "video_frame_",
+    })
+    module.s3 = LocalS3(work_dir)
+    module.local_path = work_dir + "/"
+    need_resize = video.width > module.IMAGE_MAX_WIDTH or video.height > module.IMAGE_MAX_HEIGHT
+    timestamps = module.generate_sample_timestamps({"SampleMode": "even", "SampleIntervalS": 1}, video.duration, -1, video.duration)
+
+    def run():
+        video_clip = module.moviepy.VideoFileClip(video.path, audio=False)
+        try:
+            return len(module.sample_video_at_timestamps(video_clip, timestamps, "bench", need_resize, 0))
+        finally:
+            video_clip.close()
+    return run
+
+
+@case("orb_similarity", unit="pairs", inputs="video")
+def orb_similarity(video):
+    module = load_lambda("extr-srv-fw-frame-sample-dedup-orb")
+    frames = read_frames(video, grayscale=True)
+
+    def run():
+        for previous, current in zip(frames, frames[1:]):
+            module.orb_similarity(previous, current)
+        return len(frames) - 1
+    return run
+
+
+@case("segment_video_opencv", unit="video_s", inputs="video")
+def segment_video_opencv(video):
+    module = load_lambda("extr-srv-fw-clip-gen-shot-duration", {"DYNAMO_VIDEO_SHOT_TABLE": "bench_video_shot"})
+
+    def run():
+        module.segment_video_opencv(video.path, video.duration)
+        return video.duration
+    return run
+
+
+@case("write_videofile_clips", unit="video_s", inputs="video")
+def write_videofile_clips(video):
+    work_dir = tempfile.mkdtemp(prefix="bench_clip_")
+    module = load_lambda("extr-srv-wf-clip-gen-shot-video")
+    clip_s = media.VIDEO_SCENE_S
+    shots = [(start, min(start + clip_s, video.duration)) for start in range(0, int(video.duration), clip_s)]
+
+    def run():
+        with module.moviepy.VideoFileClip(video.path) as source:
+            for i, (start, end) in enumerate(shots):
+                dest = os.path.join(work_dir, f"clip_{i}.mp4")
+                module.cut_clip(source, start, end, dest)
+                os.remove(dest)
+        return sum(end - start for start, end in shots)
+    return run
+
+
+@case("cosine_distance_chain", unit="pairs", inputs=[256, 1024])
+def cosine_distance_chain(dim):
+    module = load_lambda("extr-srv-fw-frame-sample-dedup-mme")
+    vectors = media.synthetic_vectors(2000, dim)
+
+    def run():
+        for previous, current in zip(vectors, vectors[1:]):
+            module.cosine_distance(previous, current)
+        return len(vectors) - 1
+    return run
+
+
+@case("iter_vtt_cues", unit="cues", inputs=[1000, 20000])
+def iter_vtt_cues(cue_count):
+    setup_environment()
+    import transcript_parser
+    lines = media.synthetic_vtt(cue_count)
+
+    def run():
+        return sum(1 for _ in transcript_parser.iter_vtt_cues(lines))
+    return run
+
+
+@case("codec_encode_frames", unit="items", inputs=[2000])
+def codec_encode_frames(count):
+    setup_environment()
+    import data_access
+    documents = media.synthetic_frame_documents(count)
+
+    def run():
+        for document in documents:
+            data_access.encode(document)
+        return len(documents)
+    return run
+
+
+@case("codec_decode_frames", unit="items", inputs=[2000])
+def codec_decode_frames(count):
+    setup_environment()
+    import data_access
+    documents = [data_access.encode(d) for d in media.synthetic_frame_documents(count)]
+
+    def run():
+        for document in documents:
+            data_access.decode(document)
+        return len(documents)
+    return run
+
+
+@case("codec_encode_vectors", unit="items", inputs=[1024])
+def codec_encode_vectors(dim):
+    setup_environment()
+    import data_access
+    documents = [{"id": f"bench_{i}", "embedding": v} for i, v in enumerate(media.synthetic_vectors(200, dim))]
+
+    def run():
+        for document in documents:
+            data_access.encode(document)
+        return len(documents)
+    return run
+
+
+@case("codec_decode_vectors", unit="items", inputs=[1024])
+def codec_decode_vectors(dim):
+    setup_environment()
+    import data_access
+    documents = [data_access.encode({"id": f"bench_{i}", "embedding": v}) for i, v in enumerate(media.synthetic_vectors(200, dim))]
+
+    def run():
+        for document in documents:
+            data_access.decode(document)
+        return len(documents)
+    return run
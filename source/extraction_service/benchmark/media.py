@@ -0,0 +1,133 @@
+# Synthetic benchmark inputs: videos with scene cuts, WebVTT transcripts and DynamoDB documents
+# Generated deterministically (fixed seeds) and cached in the work directory, so runs are comparable.
+import os
+import random
+
+# label: (duration_s, width, height)
+VIDEO_PRESETS = {
+    "10s_360p": (10, 640, 360),
+    "60s_360p": (60, 640, 360),
+    "30s_720p": (30, 1280, 720),
+    "10s_1080p": (10, 1920, 1080),
+}
+QUICK_VIDEO_PRESETS = ["10s_360p"]
+
+VIDEO_FPS = 24
+VIDEO_SCENE_S = 4
+
+
+class Video:
+    def __init__(self, label, path, duration, width, height):
+        self.label = label
+        self.path = path
+        self.duration = duration
+        self.width = width
+        self.height = height
+
+    def to_dict(self):
+        return {"label": self.label, "path": self.path, "duration": self.duration, "width": self.width, "height": self.height}
+
+
+def synthetic_video(work_dir, label):
+    """
+    Return a synthetic MP4 for a preset, writing it on first use.
+    Every VIDEO_SCENE_S seconds the palette changes (a hard cut for shot detection), in between shapes move
+    over a textured background so consecutive frames are similar but not identical.
+    """
+    import cv2
+    import numpy as np
+
+    duration, width, height = VIDEO_PRESETS[label]
+    path = os.path.join(work_dir, f"synthetic_{label}.mp4")
+    if os.path.exists(path):
+        return Video(label, path, duration, width, height)
+
+    os.makedirs(work_dir, exist_ok=True)
+    rng = np.random.default_rng(7)
+    texture = np.repeat(rng.integers(0, 48, size=(height, width, 1), dtype=np.uint8), 3, axis=2)
+    writer = cv2.VideoWriter(path + ".tmp.mp4", cv2.VideoWriter_fourcc(*"mp4v"), VIDEO_FPS, (width, height))
+    try:
+        for i in range(duration * VIDEO_FPS):
+            scene = i // (VIDEO_FPS * VIDEO_SCENE_S)
+            palette = np.array([(scene * 67) % 256, (scene * 131) % 256, (scene * 199) % 256], dtype=np.uint8)
+            frame = cv2.add(np.broadcast_to(palette, (height, width, 3)).copy(), texture)
+            t = i % (VIDEO_FPS * VIDEO_SCENE_S)
+            x, y = (t * 7) % width, (t * 3) % height
+            cv2.rectangle(frame, (x, y), (x + width // 6, y + height // 6), (255, 255, 255), -1)
+            cv2.circle(frame, (width - x - 1, height // 2), height // 8, (0, 0, 0), -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    os.replace(path + ".tmp.mp4", path)
+    return Video(label, path, duration, width, height)
+
+
+def sample_video(path):
+    """Describe a user supplied video file."""
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or VIDEO_FPS
+        duration = capture.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+        width, height = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        capture.release()
+    label = os.path.splitext(os.path.basename(path))[0]
+    return Video(label, path, round(duration, 2), width, height)
+
+
+def synthetic_vtt(cue_count, cue_s=2.5):
+    """Return WebVTT lines with cue_count cues, as read from an S3 body stream."""
+    rng = random.Random(cue_count)
+    words = ["video", "frame", "shot", "scene", "model", "bedrock", "the", "a", "of", "and", "camera", "moves"]
+    lines = [b"WEBVTT", b""]
+    for i in range(cue_count):
+        start, end = i * cue_s, (i + 1) * cue_s
+        lines.append(f"{_timecode(start)} --> {_timecode(end)} align:start".encode("utf-8"))
+        lines.append(" ".join(rng.choice(words) for _ in range(rng.randint(4, 14))).encode("utf-8"))
+        lines.append(b"")
+    return lines
+
+
+def _timecode(seconds):
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:06.3f}"
+
+
+def synthetic_vectors(count, dim, seed=11):
+    """Return count embedding vectors as lists of floats, the form the Lambdas receive from Bedrock."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    vector = rng.standard_normal(dim)
+    vectors = []
+    for _ in range(count):
+        # Random walk, consecutive frames of a video have close embeddings
+        vector = vector + 0.05 * rng.standard_normal(dim)
+        vectors.append(vector.tolist())
+    return vectors
+
+
+def synthetic_frame_documents(count, seed=5):
+    """Return video_frame table documents with nested model outputs."""
+    rng = random.Random(seed)
+    documents = []
+    for i in range(count):
+        ts = round(i * 0.5, 2)
+        documents.append({
+            "id": f"bench_{ts}",
+            "task_id": "bench",
+            "timestamp": ts,
+            "prev_timestamp": round(ts - 0.5, 2),
+            "similarity_score": rng.random(),
+            "s3_bucket": "bench-bucket",
+            "s3_key": f"tasks/bench/video_frame_/frame_{ts}.png",
+            "frame_outputs": [
+                {"name": f"prompt_{p}", "model_id": "us.amazon.nova-lite-v1:0", "value": "x" * rng.randint(50, 400),
+                 "scores": [rng.random() for _ in range(8)]}
+                for p in range(3)
+            ],
+        })
+    return documents
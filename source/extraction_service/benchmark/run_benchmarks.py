@@ -0,0 +1,184 @@
+'''
+Offline benchmark suite for the extraction service media hot paths.
+
+Every case runs in its own process (so peak RSS is per case), repeats its run() and keeps the fastest
+repetition. Results are compared with the stored baselines: a throughput drop or a peak RSS growth larger
+than the threshold is a regression and the exit code is 1.
+
+Examples:
+    python run_benchmarks.py                       # all cases, synthetic videos
+    python run_benchmarks.py --quick               # one short video, for a quick check
+    python run_benchmarks.py --video sample.mp4    # add a sample video
+    python run_benchmarks.py --case codec --save-baseline
+'''
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cases
+import media
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baselines.json")
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), "bedrock-video-benchmark")
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2
+
+
+def run_case(case_name, case_input, repeat):
+    # Runs in a fresh process
+    case = cases.CASES[case_name]
+    if isinstance(case_input, dict):
+        case_input = media.Video(**case_input)
+
+    run = case["func"](case_input)
+    timings, units = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        units = run()
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    return {
+        "best_s": round(best, 4),
+        "units": units,
+        "throughput": round(units / best, 2) if best > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def peak_rss_mb():
+    # On Linux ru_maxrss survives exec, so a spawned process would report the parent's peak. VmHWM does not.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def block_network():
+    # Cases must not reach AWS or download anything. Fail fast instead of waiting for a timeout.
+    connect = socket.socket.connect
+
+    def blocked(self, address):
+        if self.family in (socket.AF_INET, socket.AF_INET6):
+            raise RuntimeError(f"Network access is disabled in benchmarks: {address}")
+        return connect(self, address)
+    socket.socket.connect = blocked
+
+
+def select_cases(selected):
+    return [case for case in cases.CASES.values() if not selected or any(s in case["name"] for s in selected)]
+
+
+def list_runs(selected, videos):
+    runs = []
+    for case in select_cases(selected):
+        if case["inputs"] == "video":
+            runs += [(case, video.label, video.to_dict()) for video in videos]
+        else:
+            runs += [(case, str(size), size) for size in case["inputs"]]
+    return runs
+
+
+def compare(result, baseline, threshold):
+    if not baseline:
+        return "new"
+    notes = []
+    if baseline.get("throughput") and result.get("throughput"):
+        change = result["throughput"] / baseline["throughput"] - 1
+        notes.append(f"{change:+.0%} throughput")
+        if change < -threshold:
+            result["regression"] = True
+    if baseline.get("peak_rss_mb") and result.get("peak_rss_mb"):
+        change = result["peak_rss_mb"] / baseline["peak_rss_mb"] - 1
+        notes.append(f"{change:+.0%} rss")
+        if change > threshold:
+            result["regression"] = True
+    return ("REGRESSION " if result.get("regression") else "") + ", ".join(notes)
+
+
+def machine():
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the media hot paths")
+    parser.add_argument("--case", action="append", help="Run cases whose name contains this text (repeatable)")
+    parser.add_argument("--video", action="append", default=[], help="Sample video file to add (repeatable)")
+    parser.add_argument("--preset", action="append", choices=list(media.VIDEO_PRESETS), help="Synthetic video preset (repeatable)")
+    parser.add_argument("--quick", action="store_true", help=f"Only the {', '.join(media.QUICK_VIDEO_PRESETS)} synthetic video and one repetition")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed relative throughput drop or RSS growth")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR, help="Cache of the generated videos")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    presets = args.preset or (media.QUICK_VIDEO_PRESETS if args.quick else list(media.VIDEO_PRESETS))
+    repeat = 1 if args.quick else args.repeat
+
+    videos = []
+    if any(case["inputs"] == "video" for case in select_cases(args.case)):
+        videos = [media.synthetic_video(args.work_dir, label) for label in presets]
+        videos += [media.sample_video(path) for path in args.video]
+    selected_runs = list_runs(args.case, videos)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    results = {}
+    print(f"{'case':<30} {'input':<12} {'throughput':>14} {'best_s':>9} {'peak_rss_mb':>12}  vs baseline")
+    context = multiprocessing.get_context("spawn")
+    for case, label, case_input in selected_runs:
+        key = f"{case['name']}[{label}]"
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=block_network) as executor:
+                result = executor.submit(run_case, case["name"], case_input, repeat).result()
+        except Exception as ex:
+            print(f"{case['name']:<30} {label:<12} failed: {ex}")
+            results[key] = {"error": str(ex)}
+            continue
+        result["unit"] = case["unit"]
+        note = compare(result, baselines.get("results", {}).get(key), args.threshold)
+        results[key] = result
+        throughput = f"{result['throughput']} {case['unit']}/s"
+        print(f"{case['name']:<30} {label:<12} {throughput:>14} {result['best_s']:>9} {result['peak_rss_mb']:>12}  {note}")
+
+    output = {"machine": machine(), "repeat": repeat, "results": results}
+    if baselines.get("machine") and baselines["machine"] != output["machine"]:
+        print(f"Note: baselines were recorded on another machine: {baselines['machine']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(output, f, indent=2)
+    if args.save_baseline:
+        # Merge, so a subset of cases can be re-baselined
+        merged = {"machine": output["machine"], "repeat": repeat, "results": {**baselines.get("results", {}), **results}}
+        with open(args.baseline, "w") as f:
+            json.dump(merged, f, indent=2, sort_keys=True)
+        print(f"Baselines saved to {args.baseline}")
+
+    failed = [k for k, r in results.items() if r.get("regression") or r.get("error")]
+    if failed and not args.save_baseline:
+        print(f"{len(failed)} regression(s) or failure(s): {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,21 @@
 '''
 "Source": mm_embedding | text_embedding | text,
+"Retrieval": exact | rerank (default: SEARCH_RETRIEVAL_MODE)
+  exact: query the full-dimension index
+  rerank: query the lower-dimension coarse index for more candidates, then re-rank them with the full precision
+          embeddings of the task embedding stores and return the top ones
 '''
 import json
-import boto3
+import lambda_runtime
 import os
 import re
 from urllib.parse import urlparse
-import utils
 import uuid
 import time
 import base64
+import data_access
+import embedding_store
+from concurrent.futures import ThreadPoolExecutor
 
 S3_PRESIGNED_URL_EXPIRY_S = os.environ.get("S3_PRESIGNED_URL_EXPIRY_S", 3600) # Default 1 hour 
 S3_BUCKET_DATA = os.environ.get("S3_BUCKET_DATA")
@@ -20,15 +26,26 @@ MODEL_ID = os.environ.get("MODEL_ID")
 NOVA_S3_VECTOR_BUCKET = os.environ.get("NOVA_S3_VECTOR_BUCKET")
 NOVA_S3_VECTOR_INDEX = os.environ.get("NOVA_S3_VECTOR_INDEX")
 EMBEDDING_DIM = os.environ.get("EMBEDDING_DIM")
+NOVA_S3_VECTOR_INDEX_COARSE = os.environ.get("NOVA_S3_VECTOR_INDEX_COARSE")
+COARSE_EMBEDDING_DIM = int(os.environ.get("COARSE_EMBEDDING_DIM", 256))
+SEARCH_RETRIEVAL_MODE = os.environ.get("SEARCH_RETRIEVAL_MODE", "exact")
+# Coarse candidates per requested result in rerank mode
+SEARCH_RERANK_CANDIDATES_FACTOR = int(os.environ.get("SEARCH_RERANK_CANDIDATES_FACTOR", 4))
+SEARCH_RERANK_MAX_WORKERS = 8
+S3_VECTOR_QUERY_MAX_TOP_K = 100
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+shot_repo = data_access.ShotRepository(DYNAMO_VIDEO_SHOT_TABLE)
 
 EMBEDDING_DIM = int(EMBEDDING_DIM) if EMBEDDING_DIM else 1024
 
 VIDEO_CLIP_S3_KEY_TEMPLATE = "tasks/{task_id}/shot_clip/shot_{index}_{start_time}_{end_time}.mp4"
 
-s3 = boto3.client('s3')
-bedrock = boto3.client('bedrock-runtime')
-s3vectors = boto3.client('s3vectors') 
+s3 = lambda_runtime.client('s3')
+bedrock = lambda_runtime.client('bedrock-runtime')
+s3vectors = lambda_runtime.client('s3vectors') 
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     search_text = event.get("SearchText", "")
     page_size = event.get("PageSize", 10)
@@ -40,6 +57,7 @@ def lambda_handler(event, context):
     input_type = event.get("InputType")
     TOP_K = event.get("TopK", 5)
     include_video_url = event.get("IncludeVideoUrl", True)
+    retrieval = event.get("Retrieval") or SEARCH_RETRIEVAL_MODE
 
     embedding_options = event.get("EmbeddingOptions", ["AUDIO_VIDEO", "VIDEO", "AUDIO"])
 
@@ -59,7 +77,10 @@ def lambda_handler(event, context):
                 'statusCode': 500,
                 'body': 'Failed to generate input embedding'
             }
-        clips = search_embedding_s3vectors(input_embedding, NOVA_S3_VECTOR_BUCKET, NOVA_S3_VECTOR_INDEX, TOP_K, embedding_options)
+        if retrieval == "rerank" and NOVA_S3_VECTOR_INDEX_COARSE:
+            clips = search_embedding_rerank(input_embedding, NOVA_S3_VECTOR_BUCKET, NOVA_S3_VECTOR_INDEX_COARSE, TOP_K, embedding_options)
+        else:
+            clips = search_embedding_s3vectors(input_embedding, NOVA_S3_VECTOR_BUCKET, NOVA_S3_VECTOR_INDEX, TOP_K, embedding_options)
 
         result = []
         if clips:
@@ -67,11 +88,11 @@ def lambda_handler(event, context):
                 tid = clip.get("metadata",{}).get("task_id")
                 idx = clip.get("metadata",{}).get("index")
                 if tid and idx:
-                    task = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, tid, "Id")
+                    task = task_repo.get(tid)
 
                     # Get shot
                     shot_outputs = None
-                    shot = utils.get_task_shot_by_index(DYNAMO_VIDEO_SHOT_TABLE, tid, idx)
+                    shot = shot_repo.get_by_index(tid, idx)
                     if shot and "outputs" in shot:
                         shot_outputs = shot["outputs"]
                     if task:
@@ -172,4 +193,39 @@ def search_embedding_s3vectors(input_embedding, s3vector_bucket, s3vector_index,
         filter={"embeddingOption": {"$in": embedding_options}}
     )
 
-    return response["vectors"]
\ No newline at end of file
+    return response["vectors"]
+
+def search_embedding_rerank(input_embedding, s3vector_bucket, s3vector_index_coarse, top_k, embedding_options):
+    # First stage: candidates from the coarse index, queried with the leading dimensions of the input embedding
+    candidates = search_embedding_s3vectors(
+        embedding_store.truncate(input_embedding, COARSE_EMBEDDING_DIM), s3vector_bucket, s3vector_index_coarse,
+        min(top_k * SEARCH_RERANK_CANDIDATES_FACTOR, S3_VECTOR_QUERY_MAX_TOP_K), embedding_options)
+
+    # Second stage: full precision distances from the embedding stores, read in parallel per task
+    indexes_by_task = {}
+    for clip in candidates:
+        metadata = clip.get("metadata", {})
+        if metadata.get("task_id") and metadata.get("index") is not None:
+            indexes_by_task.setdefault(metadata["task_id"], set()).add(int(metadata["index"]))
+    with ThreadPoolExecutor(max_workers=SEARCH_RERANK_MAX_WORKERS) as executor:
+        vectors_by_task = dict(zip(indexes_by_task, executor.map(lambda tid: read_task_vectors(tid, indexes_by_task[tid]), indexes_by_task)))
+
+    reranked, unranked = [], []
+    for clip in candidates:
+        metadata = clip.get("metadata", {})
+        vector = vectors_by_task.get(metadata.get("task_id"), {}).get(int(metadata.get("index") or 0))
+        if vector:
+            clip["distance"] = embedding_store.cosine_distance(input_embedding, vector)
+            reranked.append(clip)
+        else:
+            # No stored embedding (tasks processed before the store), keep the coarse order after the re-ranked clips
+            unranked.append(clip)
+    reranked.sort(key=lambda clip: clip["distance"])
+    return (reranked + unranked)[:top_k]
+
+def read_task_vectors(task_id, indexes):
+    try:
+        return embedding_store.read_vectors(s3, S3_BUCKET_DATA, task_id, indexes)
+    except Exception as ex:
+        print(f'Failed to read the stored embeddings of task {task_id}', ex)
+    return {}
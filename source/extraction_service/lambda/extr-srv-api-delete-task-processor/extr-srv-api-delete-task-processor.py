@@ -5,9 +5,10 @@ Delete video task
 3. Delete from OpenSearch: video_task, video_transcription, video_frame_[task_id]
 '''
 import json
-import boto3
+import lambda_runtime
 import os
-import utils
+import data_access
+import embedding_store
 
 TRANSCRIBE_JOB_PREFIX = os.environ.get("TRANSCRIBE_JOB_PREFIX")
 
@@ -15,17 +16,28 @@ DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
 DYNAMO_VIDEO_FRAME_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
 DYNAMO_VIDEO_TRANS_TABLE = os.environ.get("DYNAMO_VIDEO_TRANS_TABLE")
 DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+DYNAMO_VIDEO_USAGE_ROLLUP_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_ROLLUP_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+DYNAMO_VIDEO_TASK_QUEUE_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_QUEUE_TABLE")
 S3_BUCKET_DATA = os.environ.get("S3_BUCKET_DATA")
 
 S3_VECTOR_BUCKET = os.environ.get("S3_VECTOR_BUCKET")
 S3_VECTOR_INDEX = os.environ.get("S3_VECTOR_INDEX")
-S3_KEY_PREFIX_VECTOR = "tasks/{task_id}/shot_vector/"
+S3_VECTOR_INDEX_COARSE = os.environ.get("S3_VECTOR_INDEX_COARSE")
 S3_KEY_PREFIX_TEMPLATE = "tasks/{task_id}/"
 
-s3 = boto3.client('s3')
-transcribe = boto3.client('transcribe')
-s3vectors = boto3.client('s3vectors') 
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+task_queue_repo = data_access.TaskQueueRepository(DYNAMO_VIDEO_TASK_QUEUE_TABLE)
+frame_repo = data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE)
+transcript_repo = data_access.TranscriptRepository(DYNAMO_VIDEO_TRANS_TABLE)
+usage_repo = data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE, DYNAMO_VIDEO_USAGE_ROLLUP_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
 
+s3 = lambda_runtime.client('s3')
+transcribe = lambda_runtime.client('transcribe')
+s3vectors = lambda_runtime.client('s3vectors') 
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
     task_id = event.get("task_id")
     if not task_id:
@@ -34,14 +46,14 @@ def lambda_handler(event, context):
             'body': 'Invalid message'
         }
 
-    task = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
+    task = task_repo.get(task_id)
     if task is None:
         print(f'Task does not exist in {DYNAMO_VIDEO_TASK_TABLE}: {task_id}')
 
     s3_prefix = S3_KEY_PREFIX_TEMPLATE.format(task_id=task_id)
 
     # Delete S3 vectors
-    delete_s3_vectors(S3_BUCKET_DATA, S3_VECTOR_BUCKET, S3_VECTOR_INDEX, task_id)
+    delete_s3_vectors(S3_BUCKET_DATA, S3_VECTOR_BUCKET, [S3_VECTOR_INDEX, S3_VECTOR_INDEX_COARSE], task_id)
 
     # Delete S3 folder
     try:
@@ -59,27 +71,45 @@ def lambda_handler(event, context):
     # Delete DB entries
     # Delete frames video_frame table
     try:
-        utils.dynamodb_delete_frames_by_taskid(DYNAMO_VIDEO_FRAME_TABLE, task_id)
+        frame_repo.delete_by_task(task_id)
     except Exception as ex:
         print(f"Failed to delete video frame entries: {DYNAMO_VIDEO_FRAME_TABLE}", ex)
 
     # Delete video_transcription entry
     try:
-        utils.delete_items_by_task_id(DYNAMO_VIDEO_TRANS_TABLE, task_id)
+        transcript_repo.delete_by_task(task_id)
     except Exception as ex:
         print(f'Failed to delete task {task_id} from index: {DYNAMO_VIDEO_TRANS_TABLE}', ex)
 
     # Delete video_task entry
     try:
-        utils.dynamodb_delete_task_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
+        task_repo.delete(task_id)
     except Exception as ex:
         print(f'Failed to delete task {task_id} from index: {DYNAMO_VIDEO_TASK_TABLE}', ex)
     
     # Delete token usage
     try:
-        utils.dynamodb_delete_usage_by_taskid(DYNAMO_VIDEO_USAGE_TABLE, task_id)
+        usage_repo.delete_by_task(task_id)
     except Exception as ex:
         print(f'Failed to delete task {task_id} from index: {DYNAMO_VIDEO_USAGE_TABLE}', ex)
+
+    # Delete token usage rollups
+    try:
+        usage_repo.delete_task_rollups(task_id)
+    except Exception as ex:
+        print(f'Failed to delete task {task_id} from index: {DYNAMO_VIDEO_USAGE_ROLLUP_TABLE}', ex)
+
+    # Delete data size counters, the task_id partition of the table
+    try:
+        data_size_repo.delete_by_task(task_id)
+    except Exception as ex:
+        print(f'Failed to delete task {task_id} from index: {DYNAMO_VIDEO_DATA_SIZE_TABLE}', ex)
+
+    # Delete task queue entry
+    try:
+        task_queue_repo.delete(task_id)
+    except Exception as ex:
+        print(f'Failed to delete task {task_id} from index: {DYNAMO_VIDEO_TASK_QUEUE_TABLE}', ex)
     
     return {
         'statusCode': 200,
@@ -105,24 +135,20 @@ def delete_s3_folder(s3_bucket, s3_prefix):
     
     return delete_responses
 
-def delete_s3_vectors(s3_bucket, s3_vector_bucket, s3_vector_index, task_id):
-    s3_prefix = S3_KEY_PREFIX_VECTOR.format(task_id=task_id)
-
-    # Get vectors Keys from S3 vector key names
-    keys = []
-    # S3 Vector key format: f'{task_id}_{embed_type}_{index}'
-    # S3 JSON file name format: f'{embed_type}_{index}.json'
-    paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=s3_bucket, Prefix=s3_prefix):
-        for obj in page.get("Contents", []):
-            key = obj["Key"]
-            if key.endswith(".json"):
-                keys.append(f'{task_id}_{key.replace(".json","")}')
-
-    # Delete vectors from S3
-    if keys:
-        response = s3vectors.delete_vectors(
-            vectorBucketName=s3_vector_bucket,
-            indexName=s3_vector_index,
-            keys=keys
-        )
\ No newline at end of file
+def delete_s3_vectors(s3_bucket, s3_vector_bucket, s3_vector_indexes, task_id):
+    # Get vectors keys from the shard manifests of the task's embedding store
+    keys = embedding_store.vector_keys(s3, s3_bucket, task_id)
+
+    # Delete vectors from the S3 vector indexes, the coarse index holds the same keys
+    for s3_vector_index in s3_vector_indexes:
+        if not s3_vector_index:
+            continue
+        try:
+            for i in range(0, len(keys), 500):
+                s3vectors.delete_vectors(
+                    vectorBucketName=s3_vector_bucket,
+                    indexName=s3_vector_index,
+                    keys=keys[i:i+500]
+                )
+        except Exception as ex:
+            print(f'Failed to delete vectors from index: {s3_vector_index}', ex)
@@ -5,13 +5,13 @@ Delete video task
 3. Delete from OpenSearch: video_task, video_transcription, video_frame_[task_id]
 '''
 import json
-import boto3
+import lambda_runtime
 import os
-import utils
 
 LAMBDA_NAME_DELETE_PROCESS = os.environ.get("LAMBDA_NAME_DELETE_PROCESS")
-lambda_client = boto3.client("lambda")
+lambda_client = lambda_runtime.client("lambda")
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     task_id = event.get("TaskId")
     delete_s3 = event.get("DeleteS3", True)
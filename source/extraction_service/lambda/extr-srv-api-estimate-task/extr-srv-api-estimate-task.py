@@ -0,0 +1,54 @@
+'''
+Pre-flight estimate of a task request: frames or shots, model calls, tokens, cost and wall-clock time.
+Accepts the same request as start-task, and uses the same estimator (task_estimate layer module) that start-task
+checks against TASK_MAX_ESTIMATED_REQUESTS. On Reprocess, only the stages start-task would re-run are counted.
+'''
+import lambda_runtime
+import os
+import data_access
+import task_estimate
+
+DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+
+@lambda_runtime.handler
+def lambda_handler(event, context):
+    if not event:
+        return {
+            'statusCode': 400,
+            'body': 'Invalid request'
+        }
+
+    # Reprocess: the video and task type of the existing task, and only its stale stages
+    stale_stages = None
+    if event.get("Reprocess") == True and event.get("TaskId"):
+        task = task_repo.get(event["TaskId"])
+        if task is None:
+            return {
+                'statusCode': 400,
+                'body': 'Task does not exist'
+            }
+        event["Video"] = task.get("Request", {}).get("Video")
+        event["TaskType"] = task.get("Request", {}).get("TaskType", "frame")
+        stale_stages = data_access.get_stale_stages(event, task.get("Fingerprints") or {})
+
+    if event.get("TaskType", "frame") not in ["frame", "clip"]:
+        return {
+            'statusCode': 400,
+            'body': 'Invalid request'
+        }
+
+    estimate = task_estimate.estimate_task(event, stale_stages)
+    if not estimate:
+        return {
+            'statusCode': 400,
+            'body': 'Invalid request. Require VideoMetaData.Duration, an existing TaskId or Video.S3Object.'
+        }
+    if stale_stages is not None:
+        estimate["StaleStages"] = [stage for stage, stale in stale_stages.items() if stale]
+
+    return {
+        'statusCode': 200,
+        'body': estimate
+    }
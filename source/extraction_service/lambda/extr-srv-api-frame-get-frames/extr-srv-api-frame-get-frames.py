@@ -2,10 +2,10 @@
 "Source": mm_embedding | text_embedding | text,
 '''
 import json
-import boto3
+import lambda_runtime
 import os
-import utils
 import re
+import data_access
 from urllib.parse import urlparse
 
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
@@ -14,8 +14,11 @@ DYNAMO_VIDEO_TRANS_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
 
 S3_PRESIGNED_URL_EXPIRY_S = os.environ.get("S3_PRESIGNED_URL_EXPIRY_S", 3600) # Default 1 hour 
 
-s3 = boto3.client('s3')
+frame_repo = data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE)
 
+s3 = lambda_runtime.client('s3')
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
     task_id = event.get("TaskId")
     page_size = event.get("PageSize", 20)
@@ -27,8 +30,8 @@ def lambda_handler(event, context):
             'body': 'TaskId required.'
         }
 
-    result = {"Frames":[], "Total": utils.count_items_by_task_id(DYNAMO_VIDEO_FRAME_TABLE, task_id)}
-    frames = utils.get_paginated_items(table_name=DYNAMO_VIDEO_FRAME_TABLE, task_id=task_id, start_index=from_index, page_size=page_size)
+    result = {"Frames":[], "Total": frame_repo.count_by_task(task_id)}
+    frames = frame_repo.page_by_task(task_id, from_index, page_size)
     for f in frames:
         try:
             frame = {
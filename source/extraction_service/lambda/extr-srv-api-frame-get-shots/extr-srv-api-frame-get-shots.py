@@ -1,15 +1,16 @@
 import json
-import boto3
+import lambda_runtime
 import os
 
 DYNAMO_VIDEO_SHOT_TABLE = os.environ.get("DYNAMO_VIDEO_SHOT_TABLE")
 S3_PRESIGNED_URL_EXPIRY_S = os.environ.get("S3_PRESIGNED_URL_EXPIRY_S", 3600) # Default 1 hour 
 DEFAULT_PAGE_SIZE = 10
 
-s3 = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+s3 = lambda_runtime.client('s3')
+dynamodb = lambda_runtime.resource('dynamodb')
 video_shot_table = dynamodb.Table(DYNAMO_VIDEO_SHOT_TABLE)
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     task_id = event.get("TaskId")
 
@@ -1,8 +1,7 @@
 import json
-import boto3
+import lambda_runtime
 import os
-import utils
-from decimal import Decimal
+import data_access
 
 S3_BUCKET = os.environ.get("S3_BUCKET")
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
@@ -10,11 +9,22 @@ DYNAMO_VIDEO_FRAME_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
 DYNAMO_VIDEO_SHOT_TABLE = os.environ.get("DYNAMO_VIDEO_SHOT_TABLE")
 DYNAMO_VIDEO_TRANS_TABLE = os.environ.get("DYNAMO_VIDEO_TRANS_TABLE")
 DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
 
-s3 = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
+# Tables whose records are counted, by data type
+repositories = {
+    'task_metadata': data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE),
+    'frame_analysis': data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE),
+    'shot_analysis': data_access.ShotRepository(DYNAMO_VIDEO_SHOT_TABLE),
+    'transcription': data_access.TranscriptRepository(DYNAMO_VIDEO_TRANS_TABLE),
+    'usage_tracking': data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE)
+}
 
+s3 = lambda_runtime.client('s3')
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
     """
     Lambda function to calculate data size information for a video processing task.
@@ -45,57 +55,18 @@ def lambda_handler(event, context):
         }
     
     try:
-        # Calculate data sizes for different data types
-        data_breakdown = {}
-        total_size = 0
-        total_files = 0
-        
-        # S3 data types and their prefixes
-        s3_data_types = {
-            'video_frame': f'tasks/{task_id}/video_frame_/',
-            'frame_outputs': f'tasks/{task_id}/frame_outputs/',
-            'frame_analysis': f'tasks/{task_id}/frame_analysis/',
-            'shot_clip': f'tasks/{task_id}/shot_clip/',
-            'shot_outputs': f'tasks/{task_id}/shot_outputs/',
-            'shot_vector': f'tasks/{task_id}/shot_vector/',
-            'transcribe': f'tasks/{task_id}/transcribe/'
-        }
-        
-        # Calculate S3 data sizes
-        for data_type, prefix in s3_data_types.items():
-            try:
-                size_info = utils.calculate_s3_prefix_size(S3_BUCKET, prefix)
-                if size_info['file_count'] > 0:  # Only include if files exist
-                    data_breakdown[data_type] = size_info
-                    total_size += size_info['size']
-                    total_files += size_info['file_count']
-            except Exception as e:
-                print(f"Error calculating S3 size for {data_type}: {str(e)}")
-                continue
-        
-        # Calculate DynamoDB data sizes
-        dynamodb_tables = {
-            'task_metadata': DYNAMO_VIDEO_TASK_TABLE,
-            'frame_analysis': DYNAMO_VIDEO_FRAME_TABLE,
-            'shot_analysis': DYNAMO_VIDEO_SHOT_TABLE,
-            'transcription': DYNAMO_VIDEO_TRANS_TABLE,
-            'usage_tracking': DYNAMO_VIDEO_USAGE_TABLE
-        }
-        
-        for data_type, table_name in dynamodb_tables.items():
-            try:
-                size_info = utils.calculate_dynamodb_task_size(table_name, task_id)
-                if size_info['record_count'] > 0:  # Only include if records exist
-                    data_breakdown[f'dynamodb_{data_type}'] = {
-                        'size': size_info['estimated_size'],
-                        'file_count': size_info['record_count'],
-                        'max_file_size': size_info['max_record_size']
-                    }
-                    total_size += size_info['estimated_size']
-                    total_files += size_info['record_count']
-            except Exception as e:
-                print(f"Error calculating DynamoDB size for {data_type}: {str(e)}")
-                continue
+        # Counters are maintained by the workflow lambdas, so a single query answers the request
+        data_breakdown = data_size_repo.query(task_id)
+
+        if not data_breakdown or any(v['size'] < 0 or v['file_count'] < 0 for v in data_breakdown.values()):
+            # Tasks created before the counters existed, or counters which drifted below zero:
+            # calculate and store the result
+            data_breakdown = data_size_repo.reconcile(task_id, s3, S3_BUCKET, repositories)
+
+        # Only include data types which have files or records
+        data_breakdown = {k: v for k, v in data_breakdown.items() if v['file_count'] > 0}
+        total_size = sum(v['size'] for v in data_breakdown.values())
+        total_files = sum(v['file_count'] for v in data_breakdown.values())
         
         return {
             'statusCode': 200,
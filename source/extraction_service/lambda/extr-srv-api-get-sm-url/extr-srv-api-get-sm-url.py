@@ -1,11 +1,12 @@
 import json
-import boto3
+import lambda_runtime
 import os, time
 
 
 SM_NOTEBOOK_INSTANCE_NAME = os.environ.get("SM_NOTEBOOK_INSTANCE_NAME")
-sm = boto3.client("sagemaker")
+sm = lambda_runtime.client("sagemaker")
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     response = sm.create_presigned_notebook_instance_url(
         NotebookInstanceName=SM_NOTEBOOK_INSTANCE_NAME
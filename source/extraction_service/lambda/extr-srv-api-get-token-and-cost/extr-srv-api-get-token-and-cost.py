@@ -1,14 +1,16 @@
 import json
-import boto3
+import lambda_runtime
 import os
-import utils
+import pricing
 from decimal import Decimal
+import data_access
 
 DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
 
-dynamodb = boto3.resource('dynamodb')
+usage_repo = data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE)
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     """
     Lambda function to retrieve token usage and cost information from DynamoDB.
@@ -36,11 +38,7 @@ def lambda_handler(event, context):
     
     try:
         # Query usage data from DynamoDB
-        usage_records = utils.query_usage_by_task_id(
-            table_name=DYNAMO_VIDEO_USAGE_TABLE,
-            task_id=task_id,
-            usage_type=usage_type
-        )
+        usage_records = list(usage_repo.query_by_task(task_id, usage_type))
         
         if not usage_records:
             return {
@@ -59,15 +57,13 @@ def lambda_handler(event, context):
                 }
             }
         
-        # Convert Decimal types to JSON serializable format
-        usage_records = utils.convert_to_json_serializable(usage_records)
-        
         return {
             'statusCode': 200,
             'body': {
                 'task_id': task_id,
                 'region': region,
                 'usage_records': usage_records,
+                'summary': summarize_usage(usage_records, region)
             }
         }
         
@@ -79,3 +75,16 @@ def lambda_handler(event, context):
                 'error': f'Error retrieving usage data: {str(e)}'
             }
         }
+
+def summarize_usage(usage_records, region):
+    # Totals over the returned records. Use get-usage-summary for large tasks, it reads the rollups only.
+    input_tokens = sum(r.get("input_tokens") or 0 for r in usage_records)
+    output_tokens = sum(r.get("output_tokens") or 0 for r in usage_records)
+    costs = [pricing.calculate_record_cost(r, region) for r in usage_records]
+    return {
+        'total_records': len(usage_records),
+        'total_input_tokens': input_tokens,
+        'total_output_tokens': output_tokens,
+        'total_tokens': input_tokens + output_tokens,
+        'total_cost_usd': round(sum(c for c in costs if c is not None), 6)
+    }
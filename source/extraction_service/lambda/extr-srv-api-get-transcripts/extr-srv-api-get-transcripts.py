@@ -2,14 +2,17 @@
 "Source": mm_embedding | text_embedding | text,
 '''
 import json
-import boto3
+import lambda_runtime
 import os
-import utils
 import re
+import data_access
 from urllib.parse import urlparse
 
 DYNAMO_VIDEO_TRANS_TABLE = os.environ.get("DYNAMO_VIDEO_TRANS_TABLE")
 
+transcript_repo = data_access.TranscriptRepository(DYNAMO_VIDEO_TRANS_TABLE)
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
     task_id = event.get("TaskId")
     page_size = event.get("PageSize", 20)
@@ -21,8 +24,8 @@ def lambda_handler(event, context):
             'body': 'TaskId required.'
         }
 
-    result = {"Transcripts":[], "Total": utils.count_items_by_task_id(table_name=DYNAMO_VIDEO_TRANS_TABLE, task_id=task_id)}
-    transcripts = utils.get_paginated_items(table_name=DYNAMO_VIDEO_TRANS_TABLE, task_id=task_id, start_index=from_index, page_size=page_size)
+    result = {"Transcripts":[], "Total": transcript_repo.count_by_task(task_id)}
+    transcripts = transcript_repo.page_by_task(task_id, from_index, page_size)
     for t in transcripts:
         try:
             result["Transcripts"].append({
@@ -0,0 +1,129 @@
+'''
+Priced usage summary read from the usage rollups only.
+Usage writers add every usage record to a per task and a per day rollup (model, usage type),
+so a summary costs one query per task or day instead of paging through every usage record.
+'''
+import json
+import lambda_runtime
+import os
+import pricing
+from datetime import datetime, timedelta
+import data_access
+
+DYNAMO_VIDEO_USAGE_ROLLUP_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_ROLLUP_TABLE")
+AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
+
+usage_repo = data_access.UsageRepository(rollup_table_name=DYNAMO_VIDEO_USAGE_ROLLUP_TABLE)
+
+USAGE_SUMMARY_MAX_DAYS = 92
+USAGE_COUNTERS = ["record_count", "input_tokens", "output_tokens", "number_of_image", "duration_s"]
+
+@lambda_runtime.handler
+def lambda_handler(event, context):
+    """
+    Parameters:
+    - task_id: Summarize a task. Or:
+    - start_date, end_date: Summarize a date range (YYYY-MM-DD, UTC, inclusive). Defaults to today.
+    - region: Optional. AWS region for pricing (defaults to Lambda's region).
+    
+    Returns:
+    - statusCode: 200 on success, 400 on invalid request
+    - body: Usage and cost per model and usage type (and per day for a date range) with totals
+    """
+    task_id = event.get("task_id") or event.get("TaskId")
+    region = event.get("region") or event.get("Region") or AWS_REGION
+
+    try:
+        if task_id:
+            items = price_items(usage_repo.query_rollups(f"task#{task_id}"), region)
+            return {
+                'statusCode': 200,
+                'body': {
+                    'task_id': task_id,
+                    'region': region,
+                    'items': items,
+                    'summary': summarize(items)
+                }
+            }
+
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        try:
+            start_date = datetime.strptime(event.get("start_date") or event.get("StartDate") or today, "%Y-%m-%d")
+            end_date = datetime.strptime(event.get("end_date") or event.get("EndDate") or today, "%Y-%m-%d")
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'body': {
+                    'error': 'Invalid request. Dates must be in the YYYY-MM-DD format.'
+                }
+            }
+        days = (end_date - start_date).days + 1
+        if days < 1 or days > USAGE_SUMMARY_MAX_DAYS:
+            return {
+                'statusCode': 400,
+                'body': {
+                    'error': f'Invalid request. The date range must be 1 to {USAGE_SUMMARY_MAX_DAYS} days.'
+                }
+            }
+
+        by_day, totals = [], {}
+        for i in range(days):
+            day = (start_date + timedelta(days=i)).strftime("%Y-%m-%d")
+            items = price_items(usage_repo.query_rollups(f"day#{day}"), region)
+            if not items:
+                continue
+            by_day.append({
+                'day': day,
+                'items': items,
+                'summary': summarize(items)
+            })
+            for item in items:
+                total = totals.setdefault((item["model_id"], item["type"]), {'model_id': item["model_id"], 'type': item["type"]})
+                for c in USAGE_COUNTERS + ["cost_usd"]:
+                    if item.get(c) is not None:
+                        total[c] = (total.get(c) or 0) + item[c]
+
+        items = list(totals.values())
+        return {
+            'statusCode': 200,
+            'body': {
+                'start_date': start_date.strftime("%Y-%m-%d"),
+                'end_date': end_date.strftime("%Y-%m-%d"),
+                'region': region,
+                'items': items,
+                'by_day': by_day,
+                'summary': summarize(items)
+            }
+        }
+
+    except Exception as e:
+        print(f"Error retrieving usage summary: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': {
+                'error': f'Error retrieving usage summary: {str(e)}'
+            }
+        }
+
+def price_items(items, region):
+    result = []
+    for item in items:
+        row = {'model_id': item.get("model_id"), 'type': item.get("type")}
+        for c in USAGE_COUNTERS:
+            row[c] = item.get(c, 0)
+        cost = pricing.calculate_record_cost(row, region)
+        row["cost_usd"] = round(cost, 6) if cost is not None else None
+        result.append(row)
+    return result
+
+def summarize(items):
+    input_tokens = sum(i.get("input_tokens", 0) for i in items)
+    output_tokens = sum(i.get("output_tokens", 0) for i in items)
+    return {
+        'total_records': sum(i.get("record_count", 0) for i in items),
+        'total_input_tokens': input_tokens,
+        'total_output_tokens': output_tokens,
+        'total_tokens': input_tokens + output_tokens,
+        'total_cost_usd': round(sum(i["cost_usd"] for i in items if i.get("cost_usd") is not None), 6),
+        'unpriced': [f'{i["model_id"]} ({i["type"]})' for i in items if i.get("cost_usd") is None]
+    }
@@ -1,20 +1,34 @@
 import json
-import boto3
+import lambda_runtime
 import uuid
 import os
+from datetime import datetime, timezone
+import data_access
+import streaming_upload
 
 S3_PRESIGNED_URL_EXPIRY_S = os.environ.get("S3_PRESIGNED_URL_EXPIRY_S", 3600) # Default 1 hour 
 VIDEO_UPLOAD_S3_BUCKET = os.environ.get("VIDEO_UPLOAD_S3_BUCKET")
 VIDEO_UPLOAD_S3_PREFIX = os.environ.get("VIDEO_UPLOAD_S3_PREFIX")
+LAMBDA_START_TASK = os.environ.get("LAMBDA_START_TASK")
+DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
 
-s3 = boto3.client('s3')
+# Task types whose state machine processes the uploaded prefix of a streaming upload
+STREAMING_TASK_TYPES = ["frame"]
 
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+
+s3 = lambda_runtime.client('s3')
+lambda_client = lambda_runtime.client('lambda')
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
     
     action = event.get("Action", "create")
     task_id = event.get("TaskId", str(uuid.uuid4()))
     file_name = event.get("FileName", task_id)
     
+    # Streaming upload: every part is a separate object, so the uploaded prefix is processed before the upload completes
+    streaming = event.get("Streaming") == True
     key = f'tasks/{task_id}/{VIDEO_UPLOAD_S3_PREFIX}/{file_name}'
     
     if action == "create":
@@ -22,22 +36,29 @@ def lambda_handler(event, context):
         upload_id = None
         
         try:
-            response = s3.create_multipart_upload(Bucket=VIDEO_UPLOAD_S3_BUCKET, Key=key)
-            upload_id = response['UploadId']
-            
             part_urls = []
-        
-            # Generate pre-signed URLs for each part
-            for part_number in range(1, num_parts + 1):
-                params = {
-                    'Bucket': VIDEO_UPLOAD_S3_BUCKET,
-                    'Key': key,
-                    'UploadId': upload_id,
-                    'PartNumber': part_number,
-                }
-                # Generate pre-signed URL with expiration time (e.g., 1 hour)
-                url = s3.generate_presigned_url('upload_part', Params=params, ExpiresIn=S3_PRESIGNED_URL_EXPIRY_S)
-                part_urls.append(url)
+            if streaming:
+                for part_number in range(1, num_parts + 1):
+                    params = {
+                        'Bucket': VIDEO_UPLOAD_S3_BUCKET,
+                        'Key': streaming_upload.part_key(key, part_number),
+                    }
+                    part_urls.append(s3.generate_presigned_url('put_object', Params=params, ExpiresIn=S3_PRESIGNED_URL_EXPIRY_S))
+            else:
+                response = s3.create_multipart_upload(Bucket=VIDEO_UPLOAD_S3_BUCKET, Key=key)
+                upload_id = response['UploadId']
+
+                # Generate pre-signed URLs for each part
+                for part_number in range(1, num_parts + 1):
+                    params = {
+                        'Bucket': VIDEO_UPLOAD_S3_BUCKET,
+                        'Key': key,
+                        'UploadId': upload_id,
+                        'PartNumber': part_number,
+                    }
+                    # Generate pre-signed URL with expiration time (e.g., 1 hour)
+                    url = s3.generate_presigned_url('upload_part', Params=params, ExpiresIn=S3_PRESIGNED_URL_EXPIRY_S)
+                    part_urls.append(url)
         
             url = s3.generate_presigned_url(
                 'put_object',
@@ -59,37 +80,77 @@ def lambda_handler(event, context):
                 "S3Bucket":VIDEO_UPLOAD_S3_BUCKET,
                 "S3Key": key,
                 "UploadId": upload_id,
-                "UploadPartUrls": part_urls
+                "UploadPartUrls": part_urls,
+                "Streaming": streaming
             }
         }
+    elif action == "part":
+        # A part of a streaming upload is stored: index the uploaded prefix, the task starts on its first complete time range
+        try:
+            return record_part(task_id, key, event.get("StartTask"), event.get("Caller"))
+        except Exception as ex:
+            return {
+                'statusCode': 500,
+                'body': f'Failed to record the uploaded part: {ex}'
+            }
     elif action == 'complete':
         upload_id = event.get("UploadId")
         multi_parts_upload = event.get("MultipartUpload")
         
         try:
-            response = s3.complete_multipart_upload(
-                Bucket = VIDEO_UPLOAD_S3_BUCKET,
-                Key = key,
-                MultipartUpload = {'Parts': multi_parts_upload},
-                UploadId= upload_id
-            )
+            if streaming:
+                if not streaming_upload.assemble(s3, VIDEO_UPLOAD_S3_BUCKET, key, len(multi_parts_upload)):
+                    return {
+                        'statusCode': 400,
+                        'body': 'Failed to complete the uploading task: a part is missing'
+                    }
+            else:
+                response = s3.complete_multipart_upload(
+                    Bucket = VIDEO_UPLOAD_S3_BUCKET,
+                    Key = key,
+                    MultipartUpload = {'Parts': multi_parts_upload},
+                    UploadId= upload_id
+                )
         except Exception as ex:
             return {
                 'statusCode': 500,
                 'body': f'Failed to complete the uploading task: {ex}'
             }
+
+        # A streaming task started during the upload processes the rest of the video now
+        task = task_repo.get(task_id) if streaming else None
+        if task and task.get("Upload"):
+            task_repo.update(task_id, {"Upload": dict(task["Upload"], Complete=True, UpdatedTs=datetime.now(timezone.utc).isoformat())}, must_exist=True)
+            return {
+                'statusCode': 200,
+                'body': {
+                    "TaskId": task_id,
+                    "Status": task.get("Status")
+                }
+            }
+
+        if event.get("StartTask"):
+            return start_task(event["StartTask"], task_id, key, event.get("Caller"))
+
         return {
                 'statusCode': 200,
                 'body': f'Uploading task completed.'
             }
             
     elif action == "abort": 
-        upload_id = event.get("UploadId")
-        response = s3.abort_multipart_upload(
-            Bucket = VIDEO_UPLOAD_S3_BUCKET,
-            Key = key,
-            UploadId = upload_id
-        )
+        if streaming:
+            streaming_upload.delete_parts(s3, VIDEO_UPLOAD_S3_BUCKET, key)
+            # A task started during the upload fails instead of waiting for the rest of the video
+            task = task_repo.get(task_id)
+            if task and task.get("Upload"):
+                task_repo.update(task_id, {"Upload": dict(task["Upload"], Aborted=True, UpdatedTs=datetime.now(timezone.utc).isoformat())}, must_exist=True)
+        else:
+            upload_id = event.get("UploadId")
+            response = s3.abort_multipart_upload(
+                Bucket = VIDEO_UPLOAD_S3_BUCKET,
+                Key = key,
+                UploadId = upload_id
+            )
         return {
                 'statusCode': 200,
                 'body': f'Uploading task aborted.'
@@ -98,4 +159,78 @@ def lambda_handler(event, context):
     return {
             'statusCode': 400,
             'body': 'Invalid request'
-        }
\ No newline at end of file
+        }
+
+def record_part(task_id, key, request, caller):
+    task = task_repo.get(task_id)
+    upload = (task or {}).get("Upload")
+    if task and (not upload or upload.get("Complete")):
+        return {
+            'statusCode': 200,
+            'body': {
+                "TaskId": task_id,
+                "Status": task.get("Status")
+            }
+        }
+
+    # Part boundaries are the part objects. The scan resumes where the previous part left it
+    scan, size = streaming_upload.scan(s3, VIDEO_UPLOAD_S3_BUCKET, key, (upload or {}).get("Scan"))
+    upload = {
+        "Streaming": True,
+        "Scan": scan,
+        "AvailableS": scan["AvailableS"],
+        "Bytes": size,
+        "Complete": False,
+        "UpdatedTs": datetime.now(timezone.utc).isoformat()
+    }
+    if task:
+        task_repo.update(task_id, {"Upload": upload}, must_exist=True)
+        return {
+            'statusCode': 200,
+            'body': {
+                "TaskId": task_id,
+                "Status": task.get("Status"),
+                "AvailableS": upload["AvailableS"]
+            }
+        }
+
+    # Start with the first complete time range. Other videos start when the upload completes
+    if scan["Fragmented"] and scan["AvailableS"] > 0 and request and request.get("TaskType", "frame") in STREAMING_TASK_TYPES:
+        result = start_task(request, task_id, key, caller, upload)
+        # Started by a concurrent part, record this one on the task
+        if result.get("statusCode") == 409:
+            return record_part(task_id, key, None, caller)
+        return result
+    return {
+        'statusCode': 200,
+        'body': {
+            "TaskId": task_id,
+            "Status": "uploading",
+            "AvailableS": upload["AvailableS"]
+        }
+    }
+
+def start_task(request, task_id, key, caller, upload=None):
+    # Wait for start-task, so its validation and estimate errors reach the client
+    request["TaskId"] = task_id
+    # The authenticated user of this call, the API adds it to this request only
+    request["Caller"] = caller
+    request["Video"] = {
+        "S3Object": {
+            "Bucket": VIDEO_UPLOAD_S3_BUCKET,
+            "Key": key
+        }
+    }
+    if upload:
+        request["Upload"] = upload
+    try:
+        response = lambda_client.invoke(FunctionName=LAMBDA_START_TASK, InvocationType='RequestResponse', Payload=json.dumps(request))
+        result = json.loads(response["Payload"].read())
+        if response.get("FunctionError"):
+            raise Exception(result.get("errorMessage", result))
+        return result
+    except Exception as ex:
+        return {
+            'statusCode': 500,
+            'body': f'Failed to start the task: {ex}'
+        }
@@ -2,10 +2,10 @@
 "Source": mm_embedding | text_embedding | text,
 '''
 import json
-import boto3
+import lambda_runtime
 import os
-import utils
 import re
+import data_access
 from urllib.parse import urlparse
 
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
@@ -14,8 +14,11 @@ DYNAMO_VIDEO_TRANS_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
 
 S3_PRESIGNED_URL_EXPIRY_S = os.environ.get("S3_PRESIGNED_URL_EXPIRY_S", 3600) # Default 1 hour 
 
-s3 = boto3.client('s3')
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
 
+s3 = lambda_runtime.client('s3')
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
     search_text = event.get("SearchText", "")
     page_size = event.get("PageSize", 10)
@@ -29,7 +32,7 @@ def lambda_handler(event, context):
     if len(search_text) > 0:
         search_text = search_text.strip()
 
-    tasks = utils.scan_task_with_pagination(DYNAMO_VIDEO_TASK_TABLE, keyword=search_text, start_index=0, page_size=1000)
+    tasks = task_repo.search(search_text, limit=1000)
     result = []
     if tasks:
         for task in tasks:
@@ -1,21 +1,34 @@
 import json
-import boto3
+import lambda_runtime
 import uuid
-import utils
 import os
 from datetime import datetime, timezone
+import data_access
+import task_estimate
 
 STEP_FUNCTIONS_STATE_MACHINE_ARN_FRAME = os.environ.get("STEP_FUNCTIONS_STATE_MACHINE_ARN_FRAME")
 STEP_FUNCTIONS_STATE_MACHINE_ARN_CLIP = os.environ.get("STEP_FUNCTIONS_STATE_MACHINE_ARN_CLIP")
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
+DYNAMO_VIDEO_TASK_QUEUE_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_QUEUE_TABLE")
+LAMBDA_TASK_SCHEDULER = os.environ.get("LAMBDA_TASK_SCHEDULER")
+# Queue priority of the Cognito user pool groups, e.g. {"admin": 9}
+TASK_PRIORITY_BY_GROUP = json.loads(os.environ.get("TASK_PRIORITY_BY_GROUP") or "{}")
 
-stepfunctions = boto3.client('stepfunctions')
-bedrock = boto3.client('bedrock-runtime')
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+task_queue_repo = data_access.TaskQueueRepository(DYNAMO_VIDEO_TASK_QUEUE_TABLE)
 
+TASK_PRIORITY_MIN = 0
+TASK_PRIORITY_MAX = 9
+
+TASK_RUNNING_STATUS = ["queued", "processing"]
+# Statuses of a finished run: completed, or failed, timed out or aborted (set by the task scheduler)
+TASK_REPROCESS_STATUS = ["extraction_completed", "failed"]
+
+lambda_client = lambda_runtime.client('lambda')
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
-    if event is None \
-            or "Video" not in event \
-            or "S3Object" not in event["Video"]:
+    if event is None:
         return {
             'statusCode': 400,
             'body': 'Invalid request'
@@ -28,6 +41,45 @@ def lambda_handler(event, context):
             'statusCode': 400,
             'body': 'Invalid request'
         }
+
+    # The priority and requester come from the authenticated caller the API adds, not from the request body
+    caller = event.pop("Caller", None) or {}
+    event.pop("Priority", None)
+    if caller.get("Username"):
+        event["RequestBy"] = caller["Username"]
+
+    # Reprocess: re-run the stages of an existing task whose settings changed, on its stored artifacts
+    event.pop("StaleStages", None)
+    # Streaming upload state, set when the task starts before its upload completes
+    upload = event.pop("Upload", None)
+    task = None
+    if event.get("Reprocess") == True:
+        task = task_repo.get(task_id)
+        if task is None:
+            return {
+                'statusCode': 400,
+                'body': 'Task does not exist'
+            }
+        if task.get("Status") in TASK_RUNNING_STATUS:
+            return {
+                'statusCode': 409,
+                'body': 'Task is still queued or running'
+            }
+        if task.get("Status") not in TASK_REPROCESS_STATUS:
+            return {
+                'statusCode': 400,
+                'body': f'Task in status {task.get("Status")} cannot be reprocessed'
+            }
+        event["Video"] = task.get("Request", {}).get("Video")
+        event["TaskType"] = task.get("Request", {}).get("TaskType", "frame")
+
+    if "Video" not in event \
+            or not event["Video"] \
+            or "S3Object" not in event["Video"]:
+        return {
+            'statusCode': 400,
+            'body': 'Invalid request'
+        }
     
     extra_option = event.get("TaskType", "frame")
     if extra_option not in ["frame","clip"]:
@@ -43,52 +95,110 @@ def lambda_handler(event, context):
     elif extra_option == "clip":
         step_fun_arn = STEP_FUNCTIONS_STATE_MACHINE_ARN_CLIP
 
-    # Check if there are already running executions (threshold = 1)
-    if step_fun_arn:
-        try:
-            running_executions = stepfunctions.list_executions(
-                stateMachineArn=step_fun_arn,
-                statusFilter='RUNNING'
-            )
-            
-            if len(running_executions['executions']) >= 1:
-                return {
-                    'statusCode': 409,
-                    'body': {
-                        'error': 'There is a task in progress. Please wait until it completes before starting a new task.'
-                    }
+    # Each execution needs a unique name, the first one is named after the task
+    execution_name = task_id
+    if task is None:
+        # Store to DB
+        doc = {
+            "Id": task_id,
+            "Request": event,
+            "RequestTs": datetime.now(timezone.utc).isoformat(),
+            "RequestBy": event.get("RequestBy"),
+            "Name": event.get("Name", event.get("FileName")),
+            "MetaData": {
+                "TrasnscriptionOutput": None
+            }
+        }
+        if upload:
+            doc["Upload"] = upload
+    else:
+        stale_stages = data_access.get_stale_stages(event, task.get("Fingerprints") or {})
+        if not any(stale_stages.values()):
+            return {
+                'statusCode': 200,
+                'body': {
+                    "TaskId": task_id,
+                    "Status": task.get("Status"),
+                    "StaleStages": []
                 }
-        except Exception as e:
-            print(f"Error checking running executions: {str(e)}")
-            # Continue with execution if we can't check status
+            }
+        event["StaleStages"] = stale_stages
+        execution_name = f'{task_id}_{datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")}'
+        doc = task
+        doc["Request"] = event
+        doc["RequestTs"] = datetime.now(timezone.utc).isoformat()
 
-    # Store to DB
-    doc = {
-        "Id": task_id,
-        "Request": event,
-        "RequestTs": datetime.now(timezone.utc).isoformat(),
-        "RequestBy": event.get("RequestBy"),
-        "Name": event.get("Name", event.get("FileName")),
-        "MetaData": {
-            "TrasnscriptionOutput": None
+    doc["Status"] = "queued"
+
+    # Reject runaway requests before anything is stored, with the estimate estimate-task returns
+    estimated_tokens, estimated_requests = 0, 0
+    estimate = task_estimate.estimate_task(event, event.get("StaleStages"))
+    if estimate:
+        estimated_tokens = estimate["Total"]["InputTokens"] + estimate["Total"]["OutputTokens"]
+        estimated_requests = estimate["Total"]["Calls"]
+        if estimate["ExceedsLimit"]:
+            return {
+                'statusCode': 400,
+                'body': f'The request needs about {estimated_requests} model calls, above the limit of {estimate["MaxRequests"]}. Use a longer sample interval or fewer prompts. See estimate-task for details.'
+            }
+
+    # Update DB. A new task must not exist, a reprocessed one must still be finished, so a concurrent or
+    # repeated request does not overwrite a task and reset its queue entry while it runs
+    if task is None:
+        stored = task_repo.create(doc)
+    else:
+        stored = task_repo.put_if(doc, "#s IN (" + ", ".join(f":s{i}" for i in range(len(TASK_REPROCESS_STATUS))) + ")",
+                                  {"#s": "Status"}, {f":s{i}": status for i, status in enumerate(TASK_REPROCESS_STATUS)})
+    if not stored:
+        return {
+            'statusCode': 409,
+            'body': 'Task already exists' if task is None else 'Task is still queued or running'
         }
-    }
 
-    if step_fun_arn:
-        # Start stepfunction workflow
-        stepfunctions.start_execution(
-            stateMachineArn=step_fun_arn,
-            input=json.dumps({"Request":event})
-        )
+    # Enqueue the task. The scheduler admits it when the concurrency and usage budgets allow
+    priority = get_priority(caller)
+    queue_item = {
+        "Id": task_id,
+        "queue_status": "queued",
+        "enqueue_ts": doc["RequestTs"],
+        "priority": priority,
+        "request_by": event.get("RequestBy") or "anonymous",
+        "task_type": extra_option,
+        "state_machine_arn": step_fun_arn,
+        "execution_name": execution_name,
+        "request": event,
+        "estimated_tokens": estimated_tokens,
+        "estimated_requests": estimated_requests
+    }
+    task_queue_repo.put(queue_item)
 
-    doc["Status"] = "processing"
+    # Trigger an admission round without waiting for it
+    try:
+        lambda_client.invoke(FunctionName=LAMBDA_TASK_SCHEDULER, InvocationType='Event', Payload=json.dumps({"TaskId": task_id}))
+    except Exception as ex:
+        print(f"Failed to trigger the task scheduler: {ex}")
 
-    # Update DB
-    response = utils.dynamodb_table_upsert(DYNAMO_VIDEO_TASK_TABLE, doc)
-        
     return {
         'statusCode': 200,
         'body': {
-            "TaskId": task_id
+            "TaskId": task_id,
+            "Status": "queued",
+            "StaleStages": [stage for stage, stale in (event.get("StaleStages") or {}).items() if stale]
         }
-    }
\ No newline at end of file
+    }
+
+def get_priority(caller):
+    """
+    Return the queue priority of the caller: the highest of its user pool groups in TASK_PRIORITY_BY_GROUP.
+
+    Parameters:
+    - caller: {"Username", "Groups"} added by the API, Groups as the cognito:groups claim, e.g. "admin,priority"
+    """
+    groups = (caller.get("Groups") or "").strip("[]").replace(",", " ").split()
+    priority = TASK_PRIORITY_MIN
+    for group in groups:
+        try:
+            priority = max(priority, int(TASK_PRIORITY_BY_GROUP.get(group, TASK_PRIORITY_MIN)))
+        except (TypeError, ValueError):
+            print(f"Invalid priority of group {group}: {TASK_PRIORITY_BY_GROUP.get(group)}")
+    return min(priority, TASK_PRIORITY_MAX)
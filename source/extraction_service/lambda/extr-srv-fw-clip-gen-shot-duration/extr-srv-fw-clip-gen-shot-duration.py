@@ -1,11 +1,13 @@
 import json
-import boto3
+import lambda_runtime
+import instrumentation
 import os
 import base64
-import utils
-from scenedetect import detect, ContentDetector
 import numbers,decimal
-from boto3.dynamodb.conditions import Key
+import data_access
+import embedding_store
+
+scenedetect = lambda_runtime.lazy_import("scenedetect")
 
 '''
 layer:
@@ -25,20 +27,28 @@ layer:
 ]
 '''
 DYNAMO_VIDEO_SHOT_TABLE = os.environ.get("DYNAMO_VIDEO_SHOT_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+S3_VECTOR_BUCKET = os.environ.get("S3_VECTOR_BUCKET")
+S3_VECTOR_INDEX = os.environ.get("S3_VECTOR_INDEX")
+S3_VECTOR_INDEX_COARSE = os.environ.get("S3_VECTOR_INDEX_COARSE")
 SHOT_GROUP_SIZE = 10
+SHOT_OUTPUT_S3_FOLDERS = ["shot_clip", "shot_outputs", "shot_vector"]
 
-s3 = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+s3 = lambda_runtime.client('s3')
+s3vectors = lambda_runtime.client('s3vectors')
 
-video_analysis_table = dynamodb.Table(DYNAMO_VIDEO_SHOT_TABLE)
+shot_repo = data_access.ShotRepository(DYNAMO_VIDEO_SHOT_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
 
 local_path = '/tmp/'
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     if event is None or "Request" not in event:
         return 'Invalid request'
     
     task_id = event["Request"].get("TaskId")
+    instrumentation.set_task(task_id)
     s3_bucket, s3_key = None, None
     start_sec, length_sec, use_fixed_length_sec, min_clip_sec = None, None, None, None
     video_duration = None
@@ -60,10 +70,28 @@ def lambda_handler(event, context):
         print(ex)
         return 'Invalid Request'
 
+    # StaleStages is only set on reprocess. Unchanged shot settings keep the stored shot clips
+    stale_stages = event["Request"].get("StaleStages")
+    if stale_stages and not stale_stages.get("Shot", True):
+        return {
+            "TaskId": task_id,
+            "TaskVersion": event.get("Version"),
+            "ShotAnalysisEnabled": stale_stages.get("Understanding", True) or stale_stages.get("Embedding", True),
+            "shot_groups": [],
+            "s3_bucket_clip_output": s3_bucket,
+            "s3_prefix_clip_output": f'tasks/{task_id}/shot_clip/'
+        }
+    if stale_stages:
+        try:
+            delete_previous_shots(task_id, s3_bucket)
+        except Exception as ex:
+            print(f"Failed to remove the previous shots: {ex}")
+
     # Download video to local disk
     local_file_path = local_path + s3_key.split('/')[-1]
-    s3.download_file(s3_bucket, s3_key, local_file_path)
-    print(f"{s3_bucket}{s3_key}")
+    with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+        s3.download_file(s3_bucket, s3_key, local_file_path)
+        stage.add_bytes(os.path.getsize(local_file_path))
     
     # Generate shots
     shots = []
@@ -75,15 +103,16 @@ def lambda_handler(event, context):
         )
     else:
         # Use OpenCV
-        shots = segment_video_opencv(local_file_path, video_duration)
+        with instrumentation.stage(instrumentation.STAGE_DECODE):
+            shots = segment_video_opencv(local_file_path, video_duration)
 
     if start_sec or length_sec or min_clip_sec:
-        print("!!!!",start_sec, length_sec, min_clip_sec)
         shots = apply_clip_params(shots, start_sec, length_sec, min_clip_sec)
 
     # Store shots to database
+    shot_dbs = []
     for shot in shots:
-        shot_db = {
+        shot_dbs.append({
             "id": f'{task_id}_shot_{shot["index"]}',
             "task_id":task_id,
             "index": shot["index"],
@@ -91,8 +120,12 @@ def lambda_handler(event, context):
             "end_time": shot["end_time"],
             "duration": shot["duration"],
             "analysis_type": 'shot'
-        }
-        resposne = video_analysis_table.put_item(Item=convert_to_dynamo_format(shot_db))
+        })
+    shot_repo.put_many(shot_dbs)
+    record_sizes = [data_access.estimate_item_size(shot_db) for shot_db in shot_dbs]
+
+    if record_sizes:
+        data_size_repo.add(task_id, "dynamodb_shot_analysis", sum(record_sizes), len(record_sizes), max(record_sizes))
 
     # Group the shots into multiple items for parallel processing in the next step.
     groups = []
@@ -105,16 +138,49 @@ def lambda_handler(event, context):
             "s3_key": s3_key,
         })
 
-    event["shot_groups"] = groups
-    event["s3_bucket_clip_output"] = s3_bucket
-    event["s3_prefix_clip_output"] = f'tasks/{task_id}/shot_clip/'
-    
-    return event
+    # Pass a task reference, downstream Lambdas read Request and MetaData from the task table
+    return {
+        "TaskId": task_id,
+        "TaskVersion": event.get("Version"),
+        "ShotAnalysisEnabled": True,
+        "shot_groups": groups,
+        "s3_bucket_clip_output": s3_bucket,
+        "s3_prefix_clip_output": f'tasks/{task_id}/shot_clip/'
+    }
+
+def delete_previous_shots(task_id, s3_bucket):
+    """
+    Remove the shots of the previous run before they are regenerated:
+    shot records, clips, understanding outputs, embeddings and their vectors.
+    """
+    folders = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for folder in SHOT_OUTPUT_S3_FOLDERS:
+        folders[folder] = []
+        for page in paginator.paginate(Bucket=s3_bucket, Prefix=f'tasks/{task_id}/{folder}/'):
+            folders[folder] += [obj['Key'] for obj in page.get('Contents', [])]
+
+    # Vector keys are listed in the manifests of the embedding store
+    vector_keys = embedding_store.vector_keys(s3, s3_bucket, task_id, folders["shot_vector"])
+    for i in range(0, len(vector_keys), 500):
+        s3vectors.delete_vectors(vectorBucketName=S3_VECTOR_BUCKET, indexName=S3_VECTOR_INDEX, keys=vector_keys[i:i+500])
+    if S3_VECTOR_INDEX_COARSE:
+        try:
+            for i in range(0, len(vector_keys), 500):
+                s3vectors.delete_vectors(vectorBucketName=S3_VECTOR_BUCKET, indexName=S3_VECTOR_INDEX_COARSE, keys=vector_keys[i:i+500])
+        except Exception as ex:
+            print(f'Failed to delete vectors from the coarse index {S3_VECTOR_INDEX_COARSE}', ex)
+
+    keys = [key for folder in SHOT_OUTPUT_S3_FOLDERS for key in folders[folder]]
+    for i in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=s3_bucket, Delete={'Objects': [{'Key': key} for key in keys[i:i+1000]]})
+
+    shot_repo.delete_by_task(task_id)
 
 def segment_video_opencv(local_file_path, video_duration):
     # Use OpenCV
     segments = []
-    scene_list = detect(local_file_path, ContentDetector())
+    scene_list = scenedetect.detect(local_file_path, scenedetect.ContentDetector())
     for i, (start_time, end_time) in enumerate(scene_list):
         start_seconds = start_time.get_seconds()
  
@@ -201,18 +267,3 @@ def apply_clip_params(segments, start_sec=None, length_sec=None, min_clip_sec=No
         seg["index"] = i
 
     return filtered
-
-def convert_to_dynamo_format(item):
-    """
-    Recursively convert an object to a DynamoDB item format.
-    """
-    if isinstance(item, dict):
-        return {k: convert_to_dynamo_format(v) for k, v in item.items()}
-    elif isinstance(item, list):
-        return [convert_to_dynamo_format(v) for v in item]
-    elif isinstance(item, float):
-        return decimal.Decimal(str(item))
-    #elif isinstance(item, decimal.Decimal):
-    #    return float(item)
-    else:
-        return item
\ No newline at end of file
@@ -0,0 +1,104 @@
+'''
+Reconcile the per-task data size counters
+The workflow lambdas maintain the counters with atomic ADD updates. Retries, overwritten
+records and failed writes make them drift over time, so this job recalculates the
+breakdown from S3 and DynamoDB and overwrites the counters.
+Tasks are reconciled page by page. When an invocation runs low on time it invokes itself
+asynchronously to continue from the last reconciled task.
+'''
+import json
+import lambda_runtime
+import os
+import data_access
+
+S3_BUCKET = os.environ.get("S3_BUCKET")
+DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
+DYNAMO_VIDEO_FRAME_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
+DYNAMO_VIDEO_SHOT_TABLE = os.environ.get("DYNAMO_VIDEO_SHOT_TABLE")
+DYNAMO_VIDEO_TRANS_TABLE = os.environ.get("DYNAMO_VIDEO_TRANS_TABLE")
+DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+
+# Tasks read per scan page
+PAGE_SIZE = 50
+# Stop and continue in a new invocation when less time than this is left, a large task takes minutes to list
+TIME_MARGIN_MS = 5 * 60 * 1000
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
+# Tables whose records are counted, by data type
+repositories = {
+    'task_metadata': task_repo,
+    'frame_analysis': data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE),
+    'shot_analysis': data_access.ShotRepository(DYNAMO_VIDEO_SHOT_TABLE),
+    'transcription': data_access.TranscriptRepository(DYNAMO_VIDEO_TRANS_TABLE),
+    'usage_tracking': data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE)
+}
+
+s3 = lambda_runtime.client('s3')
+lambda_client = lambda_runtime.client('lambda')
+
+@lambda_runtime.handler
+def lambda_handler(event, context):
+    """
+    Lambda function to recalculate the data size counters.
+
+    Parameters:
+    - task_id: Optional. Reconcile a single task. All tasks are reconciled when not provided.
+    - StartKey: Optional. Task table key to continue the scan from, set when the job invokes itself.
+
+    Returns:
+    - statusCode: 200 on success
+    - body: Number of reconciled tasks, and the key the next invocation continues from
+    """
+    event = event or {}
+    task_id = event.get("task_id") or event.get("TaskId")
+    if task_id:
+        return {
+            'statusCode': 200,
+            'body': {
+                'reconciled_tasks': 1 if reconcile_task(task_id) else 0
+            }
+        }
+
+    reconciled, processed = 0, 0
+    start_key = event.get("StartKey")
+    out_of_time = False
+    while not out_of_time:
+        tasks, next_key = task_repo.scan_page("Id", start_key, PAGE_SIZE)
+        for task in tasks:
+            # Every invocation reconciles at least one task, so the job always progresses
+            if processed and context.get_remaining_time_in_millis() < TIME_MARGIN_MS:
+                # The next invocation continues after the last reconciled task
+                out_of_time = True
+                break
+            if reconcile_task(task["Id"]):
+                reconciled += 1
+            processed += 1
+            start_key = {"Id": task["Id"]}
+        if not out_of_time:
+            start_key = next_key
+            if not start_key:
+                break
+
+    if start_key:
+        try:
+            lambda_client.invoke(FunctionName=context.function_name, InvocationType='Event', Payload=json.dumps({"StartKey": start_key}))
+        except Exception as e:
+            print(f"Failed to continue the reconciliation from {start_key}: {str(e)}")
+
+    return {
+        'statusCode': 200,
+        'body': {
+            'reconciled_tasks': reconciled,
+            'next_key': start_key
+        }
+    }
+
+def reconcile_task(task_id):
+    try:
+        data_size_repo.reconcile(task_id, s3, S3_BUCKET, repositories)
+        return True
+    except Exception as e:
+        print(f"Error reconciling data size for task {task_id}: {str(e)}")
+        return False
@@ -1,9 +1,12 @@
 import json
-import boto3
+import lambda_runtime
+import instrumentation
 import os
-import utils
+import task_cache
 import base64
-import numpy as np
+import data_access
+
+np = lambda_runtime.lazy_import("numpy")
 
 DYNAMO_VIDEO_FRAME_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
@@ -11,10 +14,18 @@ VIDEO_FRAME_SIMILAIRTY_THRESHOLD = float(os.environ.get("VIDEO_FRAME_SIMILAIRTY_
 VIDEO_SAMPLE_S3_PREFIX = os.environ.get("VIDEO_SAMPLE_S3_PREFIX")
 BEDROCK_MME_MODEL_ID = os.environ.get("BEDROCK_MME_MODEL_ID")
 DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+DYNAMO_VIDEO_USAGE_ROLLUP_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_ROLLUP_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+frame_repo = data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE)
+usage_repo = data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE, DYNAMO_VIDEO_USAGE_ROLLUP_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
 
-s3 = boto3.client('s3')
-bedrock = boto3.client('bedrock-runtime') 
+s3 = lambda_runtime.client('s3')
+bedrock = lambda_runtime.client('bedrock-runtime') 
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     task_id, start_ts, end_ts = None, None, None
     try:
@@ -25,7 +36,8 @@ def lambda_handler(event, context):
         print(ex)
         return 'Invalid request'
 
-    task = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
+    instrumentation.set_task(task_id)
+    task = task_cache.get_task(task_id, lambda: task_repo.get(task_id), event.get("task_version"))
     if task is None:
         return 'Invalid request'
 
@@ -54,15 +66,19 @@ def lambda_handler(event, context):
     timestamps = generate_sample_timestamps(task["Request"].get("PreProcessSetting"), video_duration, start_ts, end_ts)
 
     prev_ts, prev_vector, total_sampled = start_ts, None, 0
+    removed_size, removed_count, removed_record_size, usage_size, usage_count = 0, 0, 0, 0, 0
     for ts in timestamps:
         cur_ts = ts["ts"]
         try:
             s3_key = f"{s3_prefix}/{VIDEO_SAMPLE_S3_PREFIX}{cur_ts}.png"
             # Get image base64 str
-            base64_encoded_image = None
+            base64_encoded_image, image_size = None, 0
             try:
-                response = s3.get_object(Bucket=s3_bucket, Key=s3_key)
-                image_data = response['Body'].read()
+                with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+                    response = s3.get_object(Bucket=s3_bucket, Key=s3_key)
+                    image_data = response['Body'].read()
+                    image_size = len(image_data)
+                    stage.add_bytes(image_size)
                 base64_encoded_image = base64.b64encode(image_data).decode('utf-8')
             except Exception as ex:
                 print(ex)
@@ -73,7 +89,9 @@ def lambda_handler(event, context):
 
                 if cur_vector:
                     # Store usage
-                    update_usage_to_db(task_id, cur_ts, BEDROCK_MME_MODEL_ID, 1)
+                    usage = update_usage_to_db(task_id, cur_ts, BEDROCK_MME_MODEL_ID, 1)
+                    usage_size += data_access.estimate_item_size(usage)
+                    usage_count += 1
                 
                 # similarity score: compare with previous image
                 #score = similarity_check(task_id, prev_ts, prev_vector, cur_ts, cur_vector)
@@ -85,7 +103,11 @@ def lambda_handler(event, context):
 
                     # Delete from DB video_frame table
                     frame_id = f'{task_id}_{cur_ts}'
-                    response = utils.dynamodb_delete_by_id(DYNAMO_VIDEO_FRAME_TABLE, frame_id, task_id)
+                    frame_repo.delete(frame_id, task_id)
+
+                    removed_size += image_size
+                    removed_count += 1
+                    removed_record_size += data_access.estimate_item_size({"s3_bucket": s3_bucket, "s3_key": s3_key, "timestamp": cur_ts, "prev_timestamp": prev_ts, "task_id": task_id, "id": frame_id})
 
                 else:
                     # set current image as prev
@@ -96,21 +118,18 @@ def lambda_handler(event, context):
                     
                     # update frame in db: include similarity score
                     if score:
-                        response = utils.update_item_with_similarity_score(DYNAMO_VIDEO_FRAME_TABLE, f'{task_id}_{cur_ts}', task_id, score)
+                        frame_repo.update(f'{task_id}_{cur_ts}', {"similarity_score": score}, sort_key=task_id, must_exist=True)
 
         except Exception as e:
             print(e)
 
-    # update video_task table
-    try:
-        # Get task from DB
-        task_db = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
-        sampled = float(task_db["MetaData"]["VideoFrameS3"]["TotalFramesSampled"])
-        task_db["MetaData"]["VideoFrameS3"]["TotalFramesSampled"] = sampled + float(total_sampled)
-        # Update DB
-        utils.dynamodb_table_upsert(DYNAMO_VIDEO_TASK_TABLE, task_db)
-    except Exception as ex:
-        print(ex)
+    # Update data size counters: removed frames and dedup usage
+    data_size_repo.add(task_id, "video_frame", -removed_size, -removed_count)
+    data_size_repo.add(task_id, "dynamodb_frame_analysis", -removed_record_size, -removed_count)
+    data_size_repo.add(task_id, "dynamodb_usage_tracking", usage_size, usage_count)
+
+    # update video_task table. The chunks of a task are deduplicated concurrently, add to the counter in place
+    task_repo.add_metadata_counter(task_id, "VideoFrameS3", "TotalFramesSampled", total_sampled)
 
 def similarity_check(task_id, pre_ts, pre_vector, cur_ts, cur_vector, input_text=None):
     if pre_vector is None or cur_vector is None:
@@ -168,12 +187,13 @@ def get_mm_vector(base64_encoded_image):
             }
         }
 
-        response = bedrock.invoke_model(
-            body=json.dumps(request_body),
-            modelId=BEDROCK_MME_MODEL_ID,
-            accept="application/json",
-            contentType="application/json",
-        )
+        with instrumentation.stage(instrumentation.STAGE_MODEL_CALL):
+            response = bedrock.invoke_model(
+                body=json.dumps(request_body),
+                modelId=BEDROCK_MME_MODEL_ID,
+                accept="application/json",
+                contentType="application/json",
+            )
 
         # Decode the response body.
         response_body = json.loads(response.get("body").read())
@@ -211,5 +231,5 @@ def update_usage_to_db(task_id, index, model_id, number_of_image):
         "model_id": model_id,
         "number_of_image": number_of_image
     }
-    utils.dynamodb_table_upsert(DYNAMO_VIDEO_USAGE_TABLE, usage)    
+    usage_repo.put(usage)    
     return usage
\ No newline at end of file
@@ -1,18 +1,27 @@
 import json
-import boto3
+import lambda_runtime
+import instrumentation
 import os
-import utils
+import task_cache
 import base64
-import cv2
-import numpy as np
+import data_access
+
+cv2 = lambda_runtime.lazy_import("cv2")
+np = lambda_runtime.lazy_import("numpy")
 
 DYNAMO_VIDEO_FRAME_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
 VIDEO_FRAME_SIMILAIRTY_THRESHOLD_DEFAULT = float(os.environ.get("VIDEO_FRAME_SIMILAIRTY_THRESHOLD_DEFAULT","0.1"))
 VIDEO_SAMPLE_FILE_PREFIX = os.environ.get("VIDEO_SAMPLE_FILE_PREFIX")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+frame_repo = data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
 
-s3 = boto3.client('s3')
+s3 = lambda_runtime.client('s3')
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     task_id, start_ts, end_ts = None, None, None
     try:
@@ -23,7 +32,8 @@ def lambda_handler(event, context):
         print(ex)
         return 'Invalid request'
 
-    task = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
+    instrumentation.set_task(task_id)
+    task = task_cache.get_task(task_id, lambda: task_repo.get(task_id), event.get("task_version"))
     if task is None:
         return 'Invalid request'
 
@@ -52,20 +62,22 @@ def lambda_handler(event, context):
     timestamps = generate_sample_timestamps(task["Request"].get("PreProcessSetting"), video_duration, start_ts, end_ts)
     
     prev_ts, prev_data, total_sampled = start_ts, None, 0
+    removed_size, removed_count, removed_record_size = 0, 0, 0
     for ts in timestamps:
         cur_ts = ts["ts"]
         try:
             # Get current image bytes
             cur_s3_key = f"{s3_prefix}/{VIDEO_SAMPLE_FILE_PREFIX}{cur_ts}.png"
-            cur_data = read_image_from_s3(s3_bucket, cur_s3_key)
+            cur_data, cur_size = read_image_from_s3(s3_bucket, cur_s3_key)
 
             if cur_data is not None:
                 # Get previous image bytes
-                prev_data = read_image_from_s3(s3_bucket, f"{s3_prefix}/{VIDEO_SAMPLE_FILE_PREFIX}{prev_ts}.png")
+                prev_data, _ = read_image_from_s3(s3_bucket, f"{s3_prefix}/{VIDEO_SAMPLE_FILE_PREFIX}{prev_ts}.png")
 
                 if prev_data is not None:
                     # Compare: ORB (Oriented FAST and Rotated BRIEF)
-                    score, matches, kp1, kp2 = orb_similarity(prev_data, cur_data)
+                    with instrumentation.stage("compare"):
+                        score, matches, kp1, kp2 = orb_similarity(prev_data, cur_data)
                 else:
                     score = None
 
@@ -75,7 +87,11 @@ def lambda_handler(event, context):
 
                     # Delete from DB video_frame table
                     frame_id = f'{task_id}_{cur_ts}'
-                    response = utils.dynamodb_delete_by_id(DYNAMO_VIDEO_FRAME_TABLE, frame_id, task_id)
+                    frame_repo.delete(frame_id, task_id)
+
+                    removed_size += cur_size
+                    removed_count += 1
+                    removed_record_size += data_access.estimate_item_size({"s3_bucket": s3_bucket, "s3_key": cur_s3_key, "timestamp": cur_ts, "prev_timestamp": prev_ts, "task_id": task_id, "id": frame_id})
 
                 else:
                     # set current image as prev
@@ -86,36 +102,36 @@ def lambda_handler(event, context):
                     
                     # update frame in db: include similarity score
                     if score:
-                        response = utils.update_item_with_similarity_score(DYNAMO_VIDEO_FRAME_TABLE, f'{task_id}_{cur_ts}', task_id, score)
+                        frame_repo.update(f'{task_id}_{cur_ts}', {"similarity_score": score}, sort_key=task_id, must_exist=True)
                 #break
 
         except Exception as e:
             print(e)
 
-    # update video_task table
-    try:
-        # Get task from DB
-        task_db = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
-        sampled = float(task_db["MetaData"]["VideoFrameS3"]["TotalFramesSampled"])
-        task_db["MetaData"]["VideoFrameS3"]["TotalFramesSampled"] = sampled + float(total_sampled)
-        # Update DB
-        utils.dynamodb_table_upsert(DYNAMO_VIDEO_TASK_TABLE, task_db)
-    except Exception as ex:
-        print(ex)
+    # Update data size counters: removed frames
+    data_size_repo.add(task_id, "video_frame", -removed_size, -removed_count)
+    data_size_repo.add(task_id, "dynamodb_frame_analysis", -removed_record_size, -removed_count)
+
+    # update video_task table. The chunks of a task are deduplicated concurrently, add to the counter in place
+    task_repo.add_metadata_counter(task_id, "VideoFrameS3", "TotalFramesSampled", total_sampled)
 
 def read_image_from_s3(bucket, key):
-    img = None
+    img, size = None, 0
     try:
         # Get image bytes
-        obj = s3.get_object(Bucket=bucket, Key=key)
-        img_bytes = obj['Body'].read()
+        with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+            obj = s3.get_object(Bucket=bucket, Key=key)
+            img_bytes = obj['Body'].read()
+            size = len(img_bytes)
+            stage.add_bytes(size)
         
         # Convert to NumPy array
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)  # grayscale for feature detection
+        with instrumentation.stage(instrumentation.STAGE_DECODE):
+            nparr = np.frombuffer(img_bytes, np.uint8)
+            img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)  # grayscale for feature detection
     except Exception as ex:
         print(ex)
-    return img
+    return img, size
 
 def orb_similarity(img1, img2):
     # ORB detector
@@ -1,10 +1,21 @@
+'''
+Group the sampled frames of a task into shots using the similarity scores of consecutive frames.
+Shot settings (Request.AnalysisSetting.Shot):
+- SimilarityThreshold: score at which a frame starts a new shot
+- Hysteresis: score margin back below the threshold before the next shot can start (default 0: every frame over it)
+- MinShotSec: minimum shot length in seconds (default 0)
+- ChangePoint: start shots where the score deviates from its recent baseline instead of at the threshold
+- ChangePointSensitivity: deviation in robust standard deviations for ChangePoint (default 5)
+Shots are written to the analysis table in batches and to S3 as one JSON array of shots.
+'''
 import json
-import boto3
-import re
-import numbers,decimal
-from boto3.dynamodb.conditions import Key
+import lambda_runtime
+import instrumentation
 import os
-import time
+import data_access
+import shot_segmentation
+
+np = lambda_runtime.lazy_import("numpy")
 
 DYNAMO_VIDEO_ANALYSIS_TABLE = os.environ.get("DYNAMO_VIDEO_ANALYSIS_TABLE")
 DYNAMO_VIDEO_FRAME_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
@@ -12,15 +23,14 @@ EXTR_SRV_S3_BUCKET = os.environ.get("EXTR_SRV_S3_BUCKET")
 
 SHOT_SIMILARITY_THRESHOLD_DEFAULT = 0.9
 S3_KEY_PREFIX = "tasks/{task_id}/shot/"
-S3_FILE_TEMPLATE = "shot_{index}.json"
-S3_KEY_TEMPLATE = S3_KEY_PREFIX + S3_FILE_TEMPLATE
+S3_SHOTS_FILE = "shots.json"
 
-dynamodb = boto3.resource('dynamodb')
-s3 = boto3.client('s3')
+frame_repo = data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE)
+shot_repo = data_access.ShotRepository(DYNAMO_VIDEO_ANALYSIS_TABLE)
 
-video_analysis_table = dynamodb.Table(DYNAMO_VIDEO_ANALYSIS_TABLE)
-video_frame_table = dynamodb.Table(DYNAMO_VIDEO_FRAME_TABLE)
+s3 = lambda_runtime.client('s3')
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     task_id = event.get("Request",{}).get("TaskId")
     if not task_id:
@@ -28,6 +38,7 @@ def lambda_handler(event, context):
             'statusCode': 200,
             'body': 'Task Id is required.'
         }
+    instrumentation.set_task(task_id)
 
     shot_config = event.get("Request",{}).get("AnalysisSetting", {}).get("Shot")
     if not shot_config or shot_config.get("Enabled", False) == False:
@@ -38,133 +49,73 @@ def lambda_handler(event, context):
     if not similarity_method:
         similarity_method = "novamme"
     shot_similarity_threshold = float(shot_config.get("SimilarityThreshold", SHOT_SIMILARITY_THRESHOLD_DEFAULT))
-        
-    # Get all frames from DB (contains smiliarity score)
-    frames = []
-    last_evaluated_key = None
-    while True:
-        if last_evaluated_key:
-            response = video_frame_table.query(
-                IndexName='task_id-timestamp-index', 
-                KeyConditionExpression=Key('task_id').eq(task_id), 
-                ExclusiveStartKey=last_evaluated_key,
-                Limit=1000
-            )
-        else:
-            response = video_frame_table.query(
-                IndexName='task_id-timestamp-index',
-                KeyConditionExpression=Key('task_id').eq(task_id),
-                Limit=1000
-            )
-        frames.extend(response.get("Items", []))
-        last_evaluated_key = response.get('LastEvaluatedKey', None)
-        if not last_evaluated_key:
-            break
-    frames = convert_dynamo_to_json_format(frames)
-
-    # Iterating through Frames and group shots based on similiarity score
+
+    # Get all frames from DB (contains smiliarity score), ordered by timestamp
+    frames = list(frame_repo.query_by_task(task_id))
+
+    # Group shots based on similiarity score: novamme scores are distances, orb scores similarities
+    timestamps = np.array([frame["timestamp"] for frame in frames], dtype=np.float64)
+    scores = np.array([frame.get("similarity_score") if frame.get("similarity_score") is not None else np.nan for frame in frames], dtype=np.float64)
+    bounds = shot_segmentation.segment(
+        timestamps, scores, shot_similarity_threshold,
+        higher_is_change=similarity_method != "orb",
+        hysteresis=float(shot_config.get("Hysteresis") or 0),
+        min_shot_s=float(shot_config.get("MinShotSec") or 0),
+        change_point=bool(shot_config.get("ChangePoint")),
+        change_point_sensitivity=float(shot_config.get("ChangePointSensitivity") or 5.0)
+    )
+
     shots = []
-    start_ts, end_ts, shot_frames = None, None, []
-    for frame in frames:
-        ts = frame.get("timestamp")
-        if start_ts is None:
-            start_ts = ts
-        score = frame.get("similarity_score")
-        if score and ((similarity_method == "novamme" and score > shot_similarity_threshold) or (similarity_method == "orb" and score < shot_similarity_threshold)):
-            shots.append({
-                "start_ts": start_ts,
-                "end_ts": ts,
-                "duration": ts - start_ts,
-                "frames": shot_frames
-            })
-            start_ts = ts
-            shot_frames = []
-        shot_frames.append({
-            "timestamp": frame["timestamp"],
-            "s3_bucket": frame["s3_bucket"],
-            "s3_key": frame["s3_key"],
-            "frame_summary": frame.get("frame_summary"),
-            "similarity_score": score,
-        })
-    # include the last shot
-    if shot_frames:
+    for index, (first, end) in enumerate(bounds, start=1):
+        # A shot ends where the next one starts, the last one at the last frame
+        start_ts = frames[first]["timestamp"]
+        end_ts = frames[end]["timestamp"] if end < len(frames) else frames[-1]["timestamp"]
         shots.append({
-                    "start_ts": start_ts,
-                    "end_ts": ts,
-                    "duration": ts - start_ts,
-                    "frames": shot_frames
-                })
+            "id": f"{task_id}_shot_{index}",
+            "index": index,
+            "task_id": task_id,
+            "analysis_type": 'shot',
+            "start_ts": start_ts,
+            "end_ts": end_ts,
+            "duration": end_ts - start_ts,
+            "frames": [{
+                "timestamp": frame["timestamp"],
+                "s3_bucket": frame["s3_bucket"],
+                "s3_key": frame["s3_key"],
+                "frame_summary": frame.get("frame_summary"),
+                "similarity_score": frame.get("similarity_score"),
+            } for frame in frames[first:end]]
+        })
 
     # Cleanup existing shots in DB and S3
-    cleanup(task_id, EXTR_SRV_S3_BUCKET, S3_KEY_PREFIX)
-
-    # Store shots to DB
-    index = 0
-    for s in shots:
-        index += 1
-
-        # Store to DB
-        s["id"] = f"{task_id}_shot_{index}"
-        s["index"] = index
-        s["task_id"] = task_id
-        s["analysis_type"] = 'shot'
-        resposne = video_analysis_table.put_item(Item=convert_to_dynamo_format(s))
-
-        # Store to S3
-        s3.put_object(Bucket=EXTR_SRV_S3_BUCKET, 
-            Key=S3_KEY_TEMPLATE.format(task_id=task_id, index=index), 
-            Body=json.dumps(s), 
+    s3_prefix = S3_KEY_PREFIX.format(task_id=task_id)
+    cleanup(task_id, EXTR_SRV_S3_BUCKET, s3_prefix)
+
+    # Store shots to DB in batches, and to S3 as one object
+    shot_repo.put_many(shots)
+    body = json.dumps(shots).encode('utf-8')
+    with instrumentation.stage(instrumentation.STAGE_UPLOAD) as stage:
+        s3.put_object(Bucket=EXTR_SRV_S3_BUCKET,
+            Key=s3_prefix + S3_SHOTS_FILE,
+            Body=body,
             ContentType='application/json'
         )
+        stage.add_bytes(len(body))
+
     event["shot_s3_bucket"] = EXTR_SRV_S3_BUCKET
-    event["shot_s3_prefix"] = S3_KEY_PREFIX.format(task_id=task_id)[:-1]
-    #event["shots"] = shots
+    event["shot_s3_prefix"] = s3_prefix[:-1]
+    event["shot_s3_key"] = s3_prefix + S3_SHOTS_FILE
+    event["shot_count"] = len(shots)
     return event
 
-def convert_to_dynamo_format(item):
-    """
-    Recursively convert an object to a DynamoDB item format.
-    """
-    if isinstance(item, dict):
-        return {k: convert_to_dynamo_format(v) for k, v in item.items()}
-    elif isinstance(item, list):
-        return [convert_to_dynamo_format(v) for v in item]
-    elif isinstance(item, float):
-        return decimal.Decimal(str(item))
-    #elif isinstance(item, decimal.Decimal):
-    #    return float(item)
-    else:
-        return item
-
-def convert_dynamo_to_json_format(item):
-    """
-    Recursively convert a DynamoDB item to a JSON serializable format.
-    """
-    if isinstance(item, dict):
-        return {k: convert_dynamo_to_json_format(v) for k, v in item.items()}
-    elif isinstance(item, list):
-        return [convert_dynamo_to_json_format(v) for v in item]
-    elif isinstance(item, decimal.Decimal):
-        return float(item)
-    else:
-        return item
-
 def cleanup(task_id, s3_bucket, s3_prefix):
-    # Delete existing shot from DB
-    response = video_analysis_table.query(
-        IndexName='task_id-analysis_type-index',
-        KeyConditionExpression=Key('task_id').eq(task_id) & 
-                               Key('analysis_type').eq('shot')
-    )
-    for item in response['Items']:
-        video_analysis_table.delete_item(
-            Key={
-                'id': item['id'], 
-                'task_id': item['task_id']
-            }
-        )    
-    
-    # Delete s3 shot folder
-    s3_res = boto3.resource('s3')
-    bucket = s3_res.Bucket(s3_bucket)
-    bucket.objects.filter(Prefix=s3_prefix).delete()
+    # Delete existing shots from DB
+    shot_repo.delete_by_task(task_id, 'shot')
+
+    # Delete s3 shot folder, 1000 keys per request
+    keys = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=s3_bucket, Prefix=s3_prefix):
+        keys += [obj['Key'] for obj in page.get('Contents', [])]
+    for i in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=s3_bucket, Delete={'Objects': [{'Key': key} for key in keys[i:i+1000]]})
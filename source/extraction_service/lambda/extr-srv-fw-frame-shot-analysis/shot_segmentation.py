@@ -0,0 +1,107 @@
+# Shot segmentation over the similarity scores of consecutive sampled frames
+# Works on NumPy arrays of the whole sequence: a frame starts a new shot when its score signals a change from the
+# previous frame. Hysteresis keeps a gradual transition (several changed frames in a row) from producing one shot per
+# frame, a minimum shot length merges short shots, and change-point mode compares each score to its local baseline
+# instead of a fixed threshold, for videos whose score level drifts.
+import warnings
+import lambda_runtime
+
+np = lambda_runtime.lazy_import("numpy")
+
+# Rolling window of change-point mode, in frames
+CHANGE_POINT_WINDOW = 15
+# MAD to standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+
+def change_signal(scores, higher_is_change):
+    """Scores as a signal that rises on a change. Missing scores (NaN) never start a shot."""
+    scores = np.asarray(scores, dtype=np.float64)
+    return scores if higher_is_change else -scores
+
+
+def rolling_deviation(signal, window=CHANGE_POINT_WINDOW):
+    """
+    Deviation of each value from the median of the window before it, in robust standard deviations (median absolute
+    deviation). Values without enough history, or missing, are NaN.
+    """
+    deviation = np.full(signal.shape, np.nan)
+    if len(signal) <= window:
+        return deviation
+    history = np.lib.stride_tricks.sliding_window_view(signal[:-1], window)
+    with warnings.catch_warnings():
+        # Windows of missing scores give NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(history, axis=1)
+        mad = np.nanmedian(np.abs(history - median[:, None]), axis=1) * MAD_SCALE
+    scale = np.where(mad > 0, mad, np.nan)
+    deviation[window:] = (signal[window:] - median) / scale
+    return deviation
+
+
+def boundary_candidates(signal, enter, exit=None):
+    """
+    Indexes of the frames that start a shot: the signal rises above enter. With hysteresis (exit below enter), a frame
+    starts a shot only if the signal fell below exit since the previous shot start, so a run of changed frames starts
+    one shot. Without it every frame above enter starts a shot.
+    """
+    with np.errstate(invalid="ignore"):
+        fire = signal > enter
+        if exit is None or exit >= enter:
+            return np.flatnonzero(fire)
+        arm = signal < exit
+    positions = np.arange(len(signal))
+    # Position of the last re-arm and of the last candidate strictly before each frame, -1 if none; the sequence
+    # starts armed
+    last_arm = np.maximum.accumulate(np.where(arm, positions, -1))
+    last_arm = np.concatenate(([0], last_arm[:-1]))
+    last_fire = np.maximum.accumulate(np.where(fire, positions, -1))
+    last_fire = np.concatenate(([-1], last_fire[:-1]))
+    return np.flatnonzero(fire & (last_arm > last_fire))
+
+
+def enforce_min_length(starts, timestamps, min_shot_s):
+    """Drop shot starts closer than min_shot_s to the previous kept start, or to the end of the sequence."""
+    if not min_shot_s or not len(starts):
+        return starts
+    kept, previous = [], timestamps[0]
+    end = timestamps[-1]
+    for start, ts in zip(starts.tolist(), timestamps[starts].tolist()):
+        if ts - previous >= min_shot_s and end - ts >= min_shot_s:
+            kept.append(start)
+            previous = ts
+    return np.asarray(kept, dtype=np.int64)
+
+
+def segment(timestamps, scores, threshold, higher_is_change=True, hysteresis=0.0, min_shot_s=0.0,
+            change_point=False, change_point_sensitivity=5.0):
+    """
+    Split a sequence of frames into shots.
+
+    Parameters:
+    - timestamps: Frame timestamps in seconds, ascending
+    - scores: Similarity score of each frame to the previous one, NaN where missing
+    - threshold: Score at which a frame starts a new shot
+    - higher_is_change: True if a higher score means more change (distance), False for similarity scores
+    - hysteresis: Score margin the signal must fall back below the threshold before the next shot can start,
+      0 starts a shot at every frame over the threshold
+    - min_shot_s: Minimum shot length in seconds
+    - change_point: Start shots where the score deviates from its recent baseline by change_point_sensitivity robust
+      standard deviations, instead of at a fixed threshold. Re-arms when the deviation falls below half of it.
+
+    Returns:
+    - List of (first frame, end frame) index pairs, end exclusive
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if not len(timestamps):
+        return []
+    signal = change_signal(scores, higher_is_change)
+    if change_point:
+        starts = boundary_candidates(rolling_deviation(signal), change_point_sensitivity, change_point_sensitivity / 2)
+    else:
+        enter = threshold if higher_is_change else -threshold
+        starts = boundary_candidates(signal, enter, enter - hysteresis if hysteresis else None)
+    starts = starts[starts > 0]
+    starts = enforce_min_length(starts, timestamps, min_shot_s)
+    bounds = np.concatenate(([0], starts, [len(timestamps)]))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
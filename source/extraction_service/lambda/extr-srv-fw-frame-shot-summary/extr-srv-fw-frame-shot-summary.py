@@ -1,27 +1,43 @@
+'''
+Summarize a shot from its frame images with the shot prompt configs.
+The frames are downloaded in parallel, long shots are reduced to the SHOT_SUMMARY_MAX_IMAGES most visually diverse
+frames, each sent as a downscaled JPEG within the request byte budget, and the prompt configs run concurrently on the
+same images.
+'''
 import json
-import boto3
-import re
-import numbers,decimal
-from boto3.dynamodb.conditions import Key
+import lambda_runtime
+import instrumentation
 import os
 import time
+import data_access
+import frame_images
+from concurrent.futures import ThreadPoolExecutor
 
 DYNAMO_VIDEO_ANALYSIS_TABLE = os.environ.get("DYNAMO_VIDEO_ANALYSIS_TABLE")
 
 INFERENCE_CONFIG_DEFAULT = {"maxTokens": 500, "topP": 0.1, "temperature": 0.3}
 
-bedrock_runtime_client = boto3.client(service_name='bedrock-runtime')
-dynamodb = boto3.resource('dynamodb')
-s3 = boto3.client('s3')
+# Frame downloads and model calls of a shot run in parallel
+SHOT_SUMMARY_MAX_WORKERS = int(os.environ.get("SHOT_SUMMARY_MAX_WORKERS", 8))
+SHOT_SUMMARY_MAX_IMAGES = int(os.environ.get("SHOT_SUMMARY_MAX_IMAGES", 10))
+SHOT_SUMMARY_IMAGE_MAX_SIDE = int(os.environ.get("SHOT_SUMMARY_IMAGE_MAX_SIDE", 768))
+# Bytes of all images of a request, shared equally by the images
+SHOT_SUMMARY_IMAGE_BYTES_BUDGET = int(os.environ.get("SHOT_SUMMARY_IMAGE_BYTES_BUDGET", 4 * 1024 * 1024))
 
-video_analysis_table = dynamodb.Table(DYNAMO_VIDEO_ANALYSIS_TABLE)
+shot_repo = data_access.ShotRepository(DYNAMO_VIDEO_ANALYSIS_TABLE)
 
+bedrock_runtime_client = lambda_runtime.client('bedrock-runtime')
+s3 = lambda_runtime.client('s3')
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
-    if event is None or "Error" in event or "Request" not in event or "Key" not in event:
+    # A shot of the shots.json array written by the shot analysis ("Shot"), or a per-shot JSON object in S3 ("Key")
+    if event is None or "Error" in event or "Request" not in event or ("Key" not in event and "Shot" not in event):
         return {
             "Error": "Invalid Request"
         }
     task_id = event["Request"].get("TaskId")
+    instrumentation.set_task(task_id)
     s3_bucket = event["MetaData"]["VideoFrameS3"]["S3Bucket"]
     s3_key = event.get("Key")
 
@@ -32,94 +48,134 @@ def lambda_handler(event, context):
         }
 
     # Read JSON from S3
-    shot = None
-    try:
-        shot = json.loads(s3.get_object(Bucket=s3_bucket, Key=s3_key)['Body'].read().decode('utf-8'))
-    except Exception as ex:
-        print("Failed to read Shot JSON from S3:", s3_bucket, s3_key)
-        return event
+    shot = event.get("Shot")
+    if shot is None:
+        try:
+            shot = json.loads(s3.get_object(Bucket=s3_bucket, Key=s3_key)['Body'].read().decode('utf-8'))
+        except Exception as ex:
+            print("Failed to read Shot JSON from S3:", s3_bucket, s3_key)
+            return event
 
     # Shot custom output
     outputs = None
-    if shot_config.get("PromptConfigs"):
+    configs = shot_config.get("PromptConfigs")
+    if configs:
+        with ThreadPoolExecutor(max_workers=SHOT_SUMMARY_MAX_WORKERS) as executor:
+            images = load_images(shot.get("frames"), executor)
+            results = list(executor.map(lambda config: call_llm(config, images), configs))
         outputs = []
-        for config in shot_config["PromptConfigs"]:
+        for config, result in zip(configs, results):
             outputs.append({
                 "name": config.get("name"),
                 "model_id": config["modelId"],
-                "result": call_llm(config, shot.get("frames"))
+                "result": result
             })
         print(outputs)
         if outputs:
             shot["outputs"] = outputs
-        s3.put_object(Bucket=s3_bucket, 
-            Key=s3_key, 
-            Body=json.dumps(shot), 
-            ContentType='application/json'
-        )
+        # The shared shots.json is not rewritten per shot, the outputs are kept in the DB record
+        if s3_key:
+            s3.put_object(Bucket=s3_bucket,
+                Key=s3_key,
+                Body=json.dumps(shot),
+                ContentType='application/json'
+            )
 
     # Update DB record: including summary
-    db_shot = convert_dynamo_to_json_format(video_analysis_table.get_item(Key={"id": shot["id"], "task_id": task_id})["Item"])
     if outputs:
-        db_shot["outputs"] = outputs
-    resposne = video_analysis_table.put_item(Item=convert_to_dynamo_format(db_shot))
+        shot_repo.update(shot["id"], {"outputs": outputs}, task_id)
 
     #event["shots"] = shots
     return event
 
-def call_llm(config, frames):
-    if not config or not frames:
+def read_frame(frame):
+    s3_bucket, s3_key = frame.get("s3_bucket"), frame.get("s3_key")
+    if not s3_bucket or not s3_key:
+        return None, None
+    try:
+        with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+            content = s3.get_object(Bucket=s3_bucket, Key=s3_key)['Body'].read()
+            stage.add_bytes(len(content))
+    except Exception as ex:
+        print(f'Failed to read frame {s3_key}', ex)
+        return None, None
+    with instrumentation.stage(instrumentation.STAGE_DECODE):
+        return content, frame_images.thumbnail(content)
+
+def load_images(frames, executor):
+    """
+    Download the frames of a shot in parallel, keep the most diverse ones and encode them as JPEG.
+    Returns the JPEG bytes of the kept frames in time order.
+    """
+    if not frames:
+        return []
+    # Only the encoded frames and the thumbnails are kept, not the decoded images of every frame
+    loaded = [(content, thumbnail) for content, thumbnail in executor.map(read_frame, frames) if thumbnail is not None]
+    if not loaded:
+        return []
+    picked = frame_images.select_diverse([thumbnail for _, thumbnail in loaded], SHOT_SUMMARY_MAX_IMAGES)
+    max_bytes = SHOT_SUMMARY_IMAGE_BYTES_BUDGET // len(picked)
+    with instrumentation.stage(instrumentation.STAGE_ENCODE):
+        return list(executor.map(lambda i: frame_images.encode_jpeg(loaded[i][0], SHOT_SUMMARY_IMAGE_MAX_SIDE, max_bytes), picked))
+
+def call_llm(config, images):
+    if not config or not images:
         return None
 
-    # Construct messages using frame summary
+    # Construct messages using the frame images
     messages = [
         {
             "role": "user",
             "content": []
         }
     ]
-    if config.get("Prompt"):
+    if config.get("prompt"):
         messages[0]["content"].append({"text": config["prompt"]})
-    for f in frames:
-        s3_bucket = f.get("s3_bucket")
-        s3_key = f.get("s3_key")
-        if s3_bucket and s3_key:
-            file_obj = s3.get_object(Bucket=s3_bucket, Key=s3_key)
-            image_content = file_obj['Body'].read()
-            messages[0]["content"].append({
-                        "image": {
-                            "format": "png",
-                            "source": {
-                                "bytes": image_content
-                            },
-                        }
-                    })
+    for image_content in images:
+        messages[0]["content"].append({
+                    "image": {
+                        "format": "jpeg",
+                        "source": {
+                            "bytes": image_content
+                        },
+                    }
+                })
 
     response = bedrock_converse(messages=messages, model_id=config["modelId"], tool_config=config.get("toolConfig"), inference_config=config.get("inferConfig"))
     return parse_converse_response(response)
 
-def bedrock_converse(messages, model_id, max_retries=3, retry_delay=1, inference_config=INFERENCE_CONFIG_DEFAULT, tool_config=None):
+def bedrock_converse(messages, model_id, max_retries=3, retry_delay=1, inference_config=None, tool_config=None):
+    # Copy rather than mutate, the same config is shared by the concurrent calls
+    inference_config = dict(inference_config or INFERENCE_CONFIG_DEFAULT)
+    if "maxTokens" in inference_config:
+        inference_config["maxTokens"] = int(inference_config["maxTokens"])
+    if "temperature" in inference_config:
+        inference_config["temperature"] = float(inference_config["temperature"])
+    if "topP" in inference_config:
+        inference_config["topP"] = float(inference_config["topP"])
+
     retries = 0
     while retries < max_retries:
         try:
             # Call Bedrock Converse
-            if tool_config:
-                response = bedrock_runtime_client.converse(
-                    modelId=model_id,
-                    messages=messages,
-                    inferenceConfig=inference_config,
-                    toolConfig=tool_config
-                )
-            else:
-                response = bedrock_runtime_client.converse(
-                    modelId=model_id,
-                    messages=messages,
-                    inferenceConfig=inference_config,
-                )
+            with instrumentation.stage(instrumentation.STAGE_MODEL_CALL):
+                if tool_config:
+                    response = bedrock_runtime_client.converse(
+                        modelId=model_id,
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                        toolConfig=tool_config
+                    )
+                else:
+                    response = bedrock_runtime_client.converse(
+                        modelId=model_id,
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                    )
             if response["ResponseMetadata"]["HTTPStatusCode"] != 200:
                 raise Exception(f"API request failed: {response["ResponseMetadata"]['HTTPStatusCode']}")
- 
-            
+
+
             return response
 
         except Exception as ex:
@@ -140,7 +196,7 @@ def parse_converse_response(response):
             tool_use = c["toolUse"].get("input")
         elif "text" in c:
             txt_result = c["text"]
-    
+
     if tool_use:
         return json.dumps(tool_use)
     elif txt_result:
@@ -148,31 +204,3 @@ def parse_converse_response(response):
     elif "content" in response:
         return json.dumps(response["content"])
     return json.dumps(response)
-
-def convert_to_dynamo_format(item):
-    """
-    Recursively convert an object to a DynamoDB item format.
-    """
-    if isinstance(item, dict):
-        return {k: convert_to_dynamo_format(v) for k, v in item.items()}
-    elif isinstance(item, list):
-        return [convert_to_dynamo_format(v) for v in item]
-    elif isinstance(item, float):
-        return decimal.Decimal(str(item))
-    #elif isinstance(item, decimal.Decimal):
-    #    return float(item)
-    else:
-        return item
-
-def convert_dynamo_to_json_format(item):
-    """
-    Recursively convert a DynamoDB item to a JSON serializable format.
-    """
-    if isinstance(item, dict):
-        return {k: convert_dynamo_to_json_format(v) for k, v in item.items()}
-    elif isinstance(item, list):
-        return [convert_dynamo_to_json_format(v) for v in item]
-    elif isinstance(item, decimal.Decimal):
-        return float(item)
-    else:
-        return item
\ No newline at end of file
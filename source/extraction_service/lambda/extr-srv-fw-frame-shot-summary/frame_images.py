@@ -0,0 +1,59 @@
+# Frame images of a shot for a multi-image model request
+# Long shots have more frames than a request should carry, so a subset is picked by visual diversity (farthest point
+# sampling over small grayscale thumbnails), and each picked frame is downscaled and re-encoded as JPEG under a byte
+# budget.
+import io
+import lambda_runtime
+
+np = lambda_runtime.lazy_import("numpy")
+Image = lambda_runtime.lazy_import("PIL.Image")
+
+THUMBNAIL_SIZE = 16
+JPEG_QUALITIES = [85, 75, 60, 45, 30]
+
+
+def thumbnail(content):
+    """Small grayscale thumbnail of image bytes as a vector, or None if the bytes are not an image."""
+    try:
+        image = Image.open(io.BytesIO(content))
+        # Decoders that support it (JPEG) decode at a reduced size
+        image.draft("L", (THUMBNAIL_SIZE * 4, THUMBNAIL_SIZE * 4))
+        small = image.convert("L").resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.BILINEAR)
+    except Exception as ex:
+        print("Failed to decode frame image", ex)
+        return None
+    return np.asarray(small, dtype=np.float32).ravel()
+
+
+def select_diverse(thumbnails, count):
+    """
+    Pick count frames that differ most from each other: start from the first frame, then repeatedly add the frame
+    farthest from all picked ones. Returns the picked positions in their original (time) order.
+    """
+    if len(thumbnails) <= count:
+        return list(range(len(thumbnails)))
+    vectors = np.stack(thumbnails)
+    picked = [0]
+    distance = np.linalg.norm(vectors - vectors[0], axis=1)
+    for _ in range(count - 1):
+        position = int(np.argmax(distance))
+        picked.append(position)
+        distance = np.minimum(distance, np.linalg.norm(vectors - vectors[position], axis=1))
+    return sorted(picked)
+
+
+def encode_jpeg(content, max_side, max_bytes):
+    """Downscale image bytes to max_side pixels on the longer side and encode them as JPEG, lowering the quality until
+    they fit in max_bytes. Returns the smallest encoding if none fits."""
+    image = Image.open(io.BytesIO(content)).convert("RGB")
+    if max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize((max(int(image.width * scale), 1), max(int(image.height * scale), 1)), Image.Resampling.LANCZOS)
+    content = None
+    for quality in JPEG_QUALITIES:
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        content = buffer.getvalue()
+        if len(content) <= max_bytes:
+            break
+    return content
@@ -0,0 +1,149 @@
+'''
+Admit queued video tasks into the Step Functions workflows.
+Triggered by start-task (async), by Step Functions execution status change events and on a schedule.
+A task is admitted when it fits the global concurrency, per-user concurrency and estimated
+Bedrock token/request budgets. Higher priority first, then users with the fewest running tasks,
+then oldest first.
+'''
+import json
+import lambda_runtime
+import os
+import data_access
+from datetime import datetime, timezone
+
+DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
+DYNAMO_VIDEO_TASK_QUEUE_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_QUEUE_TABLE")
+
+TASK_SCHEDULER_MAX_RUNNING_TASKS = int(os.environ.get("TASK_SCHEDULER_MAX_RUNNING_TASKS", 4))
+TASK_SCHEDULER_MAX_RUNNING_TASKS_PER_USER = int(os.environ.get("TASK_SCHEDULER_MAX_RUNNING_TASKS_PER_USER", 2))
+TASK_SCHEDULER_MAX_RUNNING_TOKENS = int(os.environ.get("TASK_SCHEDULER_MAX_RUNNING_TOKENS", 20000000))
+TASK_SCHEDULER_MAX_RUNNING_REQUESTS = int(os.environ.get("TASK_SCHEDULER_MAX_RUNNING_REQUESTS", 20000))
+TASK_SCHEDULER_QUEUE_SCAN_LIMIT = 500
+
+EXECUTION_FINAL_STATUS = ["SUCCEEDED", "FAILED", "TIMED_OUT", "ABORTED"]
+# Task status of an execution that ended without success, start-task accepts it for Reprocess
+TASK_FAILED_STATUS = "failed"
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+task_queue_repo = data_access.TaskQueueRepository(DYNAMO_VIDEO_TASK_QUEUE_TABLE)
+
+stepfunctions = lambda_runtime.client('stepfunctions')
+
+@lambda_runtime.handler
+def lambda_handler(event, context):
+    # Execution finished: release its slot
+    if event and event.get("source") == "aws.states":
+        detail = event.get("detail", {})
+        if detail.get("status") in EXECUTION_FINAL_STATUS and detail.get("name"):
+            release_task(get_task_id(detail), detail["status"])
+
+    admitted = schedule()
+    return {
+        'statusCode': 200,
+        'body': {
+            'admitted': admitted
+        }
+    }
+
+def release_task(task_id, execution_status):
+    released = task_queue_repo.transition(task_id, "running", "done", {
+        "done_ts": datetime.now(timezone.utc).isoformat(),
+        "execution_status": execution_status
+    })
+    # A successful execution sets its own final status (update-task-status). Otherwise the task would stay
+    # "processing", which start-task treats as running.
+    if released and execution_status != "SUCCEEDED":
+        task_repo.update(task_id, {"Status": TASK_FAILED_STATUS, "ExecutionStatus": execution_status}, must_exist=True)
+
+def schedule():
+    running = task_queue_repo.query_by_status("running")
+
+    # Release slots whose execution ended without a status change event being processed
+    active = []
+    for item in running:
+        status = "RUNNING"
+        try:
+            status = stepfunctions.describe_execution(executionArn=item.get("execution_arn") or get_execution_arn(item))["status"]
+        except stepfunctions.exceptions.ExecutionDoesNotExist:
+            # Admission was interrupted before the execution started
+            if task_queue_repo.transition(item["Id"], "running", "queued"):
+                continue
+        except Exception as ex:
+            print(ex)
+        if status in EXECUTION_FINAL_STATUS:
+            release_task(item["Id"], status)
+        else:
+            active.append(item)
+
+    running_tasks = len(active)
+    running_tokens = sum(item.get("estimated_tokens", 0) for item in active)
+    running_requests = sum(item.get("estimated_requests", 0) for item in active)
+    running_by_user = {}
+    for item in active:
+        running_by_user[item["request_by"]] = running_by_user.get(item["request_by"], 0) + 1
+
+    queued = task_queue_repo.query_by_status("queued", limit=TASK_SCHEDULER_QUEUE_SCAN_LIMIT)
+
+    admitted = []
+    while queued and running_tasks < TASK_SCHEDULER_MAX_RUNNING_TASKS:
+        candidates = []
+        for item in queued:
+            if running_by_user.get(item["request_by"], 0) >= TASK_SCHEDULER_MAX_RUNNING_TASKS_PER_USER:
+                continue
+            # A task larger than the whole budget still runs, but only on its own
+            if running_tasks > 0 and (running_tokens + item.get("estimated_tokens", 0) > TASK_SCHEDULER_MAX_RUNNING_TOKENS
+                    or running_requests + item.get("estimated_requests", 0) > TASK_SCHEDULER_MAX_RUNNING_REQUESTS):
+                continue
+            candidates.append(item)
+        if not candidates:
+            break
+
+        item = min(candidates, key=lambda i: (-i.get("priority", 0), running_by_user.get(i["request_by"], 0), i["enqueue_ts"]))
+        queued.remove(item)
+        if not admit_task(item):
+            continue
+
+        admitted.append(item["Id"])
+        running_tasks += 1
+        running_tokens += item.get("estimated_tokens", 0)
+        running_requests += item.get("estimated_requests", 0)
+        running_by_user[item["request_by"]] = running_by_user.get(item["request_by"], 0) + 1
+
+    return admitted
+
+def get_task_id(detail):
+    # Reprocess executions are not named after the task, read the task Id from the execution input
+    try:
+        return json.loads(detail.get("input") or "{}")["Request"]["TaskId"]
+    except Exception:
+        return detail["name"]
+
+def get_execution_arn(item):
+    return f'{item["state_machine_arn"].replace(":stateMachine:", ":execution:")}:{item.get("execution_name", item["Id"])}'
+
+def admit_task(item):
+    task_id = item["Id"]
+    if not task_queue_repo.transition(task_id, "queued", "running", {
+                "admit_ts": datetime.now(timezone.utc).isoformat()
+            }):
+        # Admitted by an overlapping round
+        return False
+
+    try:
+        # The execution name is unique per queued run, so a run cannot be started twice
+        response = stepfunctions.start_execution(
+            stateMachineArn=item["state_machine_arn"],
+            name=item.get("execution_name", task_id),
+            input=json.dumps({"Request": item["request"]})
+        )
+        execution_arn = response["executionArn"]
+    except stepfunctions.exceptions.ExecutionAlreadyExists:
+        execution_arn = get_execution_arn(item)
+    except Exception as ex:
+        print(f"Failed to start task {task_id}: {ex}")
+        task_queue_repo.transition(task_id, "running", "queued")
+        return False
+
+    task_queue_repo.transition(task_id, "running", "running", {"execution_arn": execution_arn})
+    task_repo.update_status(task_id, "processing")
+    return True
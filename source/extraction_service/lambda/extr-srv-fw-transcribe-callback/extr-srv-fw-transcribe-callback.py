@@ -0,0 +1,113 @@
+import json
+import lambda_runtime
+import os
+
+TRANSCRIBE_JOB_PREFIX = os.environ.get("TRANSCRIBE_JOB_PREFIX")
+S3_BUCKET_DATA = os.environ.get("S3_BUCKET_DATA")
+
+# The task token is kept in S3 rather than on the task record, which other branches rewrite concurrently
+TASK_TOKEN_S3_KEY_TEMPLATE = "tasks/{task_id}/transcribe_callback/{job_name}.token"
+JOB_FINAL_STATUS = ["COMPLETED", "FAILED"]
+
+AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
+s3 = lambda_runtime.client('s3')
+transcribe = lambda_runtime.client('transcribe', region_name=AWS_REGION)
+sfn = lambda_runtime.client('stepfunctions')
+
+@lambda_runtime.handler
+def lambda_handler(event, context):
+    if not event:
+        return {
+            'statusCode': 400,
+            'body': 'Invalid request'
+        }
+
+    if event.get("source") == "aws.transcribe":
+        # Transcribe Job State Change event from EventBridge
+        detail = event.get("detail", {})
+        job_name = detail.get("TranscriptionJobName")
+        job_status = detail.get("TranscriptionJobStatus")
+        if not job_name or job_status not in JOB_FINAL_STATUS:
+            return {
+                'statusCode': 200,
+                'body': 'Ignored'
+            }
+        task_id = get_task_id(job_name)
+        if not task_id:
+            return {
+                'statusCode': 200,
+                'body': 'Ignored'
+            }
+        send_callback(task_id, job_name, job_status, get_task_token(task_id, job_name))
+
+    elif "TaskToken" in event:
+        # Registration from the state machine (lambda:invoke.waitForTaskToken)
+        task_id = event.get("TaskId")
+        job_name = event.get("TranscriptionJobName")
+        task_token = event["TaskToken"]
+        if not task_id or not job_name:
+            sfn.send_task_failure(taskToken=task_token, error="InvalidRequest", cause="TaskId and TranscriptionJobName are required")
+            return {
+                'statusCode': 400,
+                'body': 'Invalid request'
+            }
+
+        s3.put_object(Bucket=S3_BUCKET_DATA, Key=TASK_TOKEN_S3_KEY_TEMPLATE.format(task_id=task_id, job_name=job_name), Body=task_token)
+
+        # The job may have finished before the token was stored, in which case no further event will arrive
+        job_status = None
+        try:
+            job_status = transcribe.get_transcription_job(TranscriptionJobName=job_name)["TranscriptionJob"]["TranscriptionJobStatus"]
+        except Exception as ex:
+            print(ex)
+        if job_status in JOB_FINAL_STATUS:
+            send_callback(task_id, job_name, job_status, task_token)
+
+    return {
+        'statusCode': 200,
+        'body': True
+    }
+
+def get_task_id(job_name):
+    # The start-transcribe Lambda tags each job with its task Id
+    if TRANSCRIBE_JOB_PREFIX and not job_name.startswith(TRANSCRIBE_JOB_PREFIX):
+        return None
+    try:
+        job = transcribe.get_transcription_job(TranscriptionJobName=job_name)["TranscriptionJob"]
+        for tag in job.get("Tags", []):
+            if tag["Key"] == "TaskId":
+                return tag["Value"]
+    except Exception as ex:
+        print(ex)
+    return None
+
+def get_task_token(task_id, job_name):
+    try:
+        response = s3.get_object(Bucket=S3_BUCKET_DATA, Key=TASK_TOKEN_S3_KEY_TEMPLATE.format(task_id=task_id, job_name=job_name))
+        return response["Body"].read().decode("utf-8")
+    except Exception as ex:
+        print(f"No task token for job {job_name}", ex)
+    return None
+
+def send_callback(task_id, job_name, job_status, task_token):
+    if not task_token:
+        return False
+
+    output = {
+        "TranscriptionJob": {
+            "TranscriptionJobName": job_name,
+            "TranscriptionJobStatus": job_status
+        }
+    }
+    try:
+        sfn.send_task_success(taskToken=task_token, output=json.dumps(output))
+    except Exception as ex:
+        # Token already used (duplicate event) or the wait timed out and the poll fallback took over
+        print(ex)
+        return False
+    finally:
+        try:
+            s3.delete_object(Bucket=S3_BUCKET_DATA, Key=TASK_TOKEN_S3_KEY_TEMPLATE.format(task_id=task_id, job_name=job_name))
+        except Exception as ex:
+            print(ex)
+    return True
@@ -1,18 +1,29 @@
 import json
-import boto3
-import utils
+import lambda_runtime
+import task_cache
 import os
 from datetime import datetime, timezone
+import data_access
 
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
 
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
     if not event:
         return {
             "Error": "Invalid Request"
         }
     
+    # Branch outputs carry either the request or a task reference
+    task_id = None
     for input in event:
+        if "TaskId" in input:
+            task_id = input["TaskId"]
+            break
         if "Request" in input:
             task_id = input["Request"].get("TaskId")
             break
@@ -21,9 +32,33 @@ def lambda_handler(event, context):
             "Error": "Invalid Request"
         }
 
-    task = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
-    task["Status"] = "extraction_completed"
-    task["ExtractionCompleteTs"] = datetime.now(timezone.utc).isoformat()
-    utils.dynamodb_table_upsert(DYNAMO_VIDEO_TASK_TABLE, task)
+    task = task_repo.get(task_id)
+    if task is None:
+        # Deleted while the workflow was running
+        return {
+            "Error": "Task does not exist"
+        }
+    # Only set the completion fields: Metrics and MetaData counters are incremented in place by other Lambdas
+    fields = {
+        "Status": "extraction_completed",
+        "Version": task_cache.new_version(),
+        "ExtractionCompleteTs": datetime.now(timezone.utc).isoformat(),
+        # Settings the stored outputs were produced with, compared on reprocess to find the stale stages
+        "Fingerprints": data_access.get_stage_fingerprints(task.get("Request", {})),
+    }
+    response = task_repo.update(task_id, fields, must_exist=True)
+    task_cache.invalidate(task_id)
+    if response is None:
+        return {
+            "Error": "Failed to update the task status"
+        }
+    task.update(fields)
+
+    # The task document is final at this point, record its size
+    task_size = data_access.estimate_item_size(task)
+    data_size_repo.set(task_id, "dynamodb_task_metadata", task_size, 1, task_size)
 
-    return event
\ No newline at end of file
+    return {
+        "TaskId": task_id,
+        "Status": task["Status"]
+    }
\ No newline at end of file
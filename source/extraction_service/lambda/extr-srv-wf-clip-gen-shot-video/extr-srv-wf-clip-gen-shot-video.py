@@ -1,16 +1,23 @@
 import json
-import boto3
-import utils
+import lambda_runtime
+import instrumentation
 import os
-from moviepy import VideoFileClip
+import data_access
+
+moviepy = lambda_runtime.lazy_import("moviepy")
 
 DYNAMO_VIDEO_SHOT_TABLE = os.environ.get("DYNAMO_VIDEO_SHOT_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+
+shot_repo = data_access.ShotRepository(DYNAMO_VIDEO_SHOT_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
 
-s3 = boto3.client('s3')
+s3 = lambda_runtime.client('s3')
 
 S3_KEY_TEMPLATE = "tasks/{task_id}/shot_clip/shot_{index}_{start_time}_{end_time}.mp4"
 local_path = '/tmp/'
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     if event is None:
         return 'Invalid request'
@@ -21,21 +28,25 @@ def lambda_handler(event, context):
     shots = event.get("shots")
     if not task_id or not s3_source_bucket or not s3_source_key or not shots:
         return 'Invalid Request'
+    instrumentation.set_task(task_id)
         
     # Generate shot clip videos
     # Ensure the temporary directory exists
-    temp_dir = "/tmp"
+    temp_dir = local_path
     if not os.path.exists(temp_dir):
         os.makedirs(temp_dir)
 
     # 1. Download the video from S3
     local_source_path = os.path.join(temp_dir, os.path.basename(s3_source_key))
     print(f"Downloading {s3_source_key} from {s3_source_bucket}...")
-    s3.download_file(s3_source_bucket, s3_source_key, local_source_path)
+    with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+        s3.download_file(s3_source_bucket, s3_source_key, local_source_path)
+        stage.add_bytes(os.path.getsize(local_source_path))
 
     # 2. Open the video with MoviePy
+    clip_sizes, record_size_delta = [], 0
     try:
-        with VideoFileClip(local_source_path) as video:
+        with moviepy.VideoFileClip(local_source_path) as video:
             # 3. Generate and upload each clip
             for shot in shots:
                 i = shot["index"]
@@ -47,18 +58,14 @@ def lambda_handler(event, context):
 
                 print(f"Generating clip {i} (Start: {start_time}s, End: {end_time}s)...")
                 
-                # Use MoviePy's subclipped to cut the video
-                # The subclipped method is used in version 2.x
-                clip = video.subclipped(start_time, end_time)
-                clip.write_videofile(local_dest_path, 
-                    codec="libx264", 
-                    audio_codec="aac",
-                    temp_audiofile="/tmp/temp-audio.m4a",
-                    remove_temp=True
-                )
+                with instrumentation.stage(instrumentation.STAGE_ENCODE):
+                    cut_clip(video, start_time, end_time, local_dest_path)
                 
                 print(f"Uploading {local_dest_path} to {s3_dest_bucket}/{s3_dest_key}...")
-                s3.upload_file(local_dest_path, s3_dest_bucket, s3_dest_key)
+                with instrumentation.stage(instrumentation.STAGE_UPLOAD) as stage:
+                    s3.upload_file(local_dest_path, s3_dest_bucket, s3_dest_key)
+                    clip_sizes.append(os.path.getsize(local_dest_path))
+                    stage.add_bytes(clip_sizes[-1])
                 print(f"Upload complete for clip {i}.")
                 
                 shot["s3_bucket"] = s3_dest_bucket
@@ -69,26 +76,49 @@ def lambda_handler(event, context):
                 os.remove(local_dest_path)
 
                 # Update db to include clip s3 location
-                update_shot_to_db(task_id, i, s3_dest_bucket, s3_dest_key)
+                shot_db, prev_record_size = update_shot_to_db(task_id, i, s3_dest_bucket, s3_dest_key)
+                if shot_db:
+                    record_size_delta += data_access.estimate_item_size(shot_db) - prev_record_size
 
     except Exception as e:
         print(f"An error occurred: {e}")
     
     finally:
+        # Update data size counters once per shot group
+        if clip_sizes:
+            data_size_repo.add(task_id, "shot_clip", sum(clip_sizes), len(clip_sizes), max(clip_sizes))
+        data_size_repo.add(task_id, "dynamodb_shot_analysis", record_size_delta, 0)
+
         # 4. Clean up the local source file
         if os.path.exists(local_source_path):
             os.remove(local_source_path)
             print("Processing complete and temporary files cleaned up.")
 
-    event["shots"] = shots
-    return event
+    # Keep the Map result small, the shots are stored in the shot table
+    return {
+        "task_id": task_id,
+        "shot_count": len(shots)
+    }
+
+def cut_clip(video, start_time, end_time, local_dest_path):
+    # Use MoviePy's subclipped to cut the video
+    # The subclipped method is used in version 2.x
+    clip = video.subclipped(start_time, end_time)
+    clip.write_videofile(local_dest_path, 
+        codec="libx264", 
+        audio_codec="aac",
+        temp_audiofile=os.path.splitext(local_dest_path)[0] + "-audio.m4a",
+        remove_temp=True
+    )
 
 def update_shot_to_db(task_id, index, s3_bucket, s3_key):
     shot_id = f'{task_id}_shot_{index}'
-    shot = utils.dynamodb_get_by_id(DYNAMO_VIDEO_SHOT_TABLE, shot_id, key_name="id", sort_key_value=task_id, sort_key="task_id")
+    shot = shot_repo.get(shot_id, task_id)
+    prev_record_size = 0
     if shot:
+        prev_record_size = data_access.estimate_item_size(shot)
         shot["s3_bucket"] = s3_bucket
         shot["s3_key"] = s3_key
-        utils.dynamodb_table_upsert(DYNAMO_VIDEO_SHOT_TABLE, shot)    
-    return shot
+        shot_repo.put(shot)    
+    return shot, prev_record_size
 
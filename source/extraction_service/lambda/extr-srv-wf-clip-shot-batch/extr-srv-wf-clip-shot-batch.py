@@ -0,0 +1,415 @@
+'''
+Shot understanding and embedding for a batch of shot clips
+Invoked by the Distributed Map with a batch of clip keys and a task reference:
+{"BatchInput": {"TaskId": "...", "TaskVersion": "..."}, "Items": [{"Key": "..."}, ...]}
+Each clip is downloaded once, the understanding prompts and the embedding call share its bytes.
+'''
+import json
+import lambda_runtime
+import instrumentation
+import os
+import time 
+import task_cache
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import data_access
+import embedding_store
+
+DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
+DYNAMO_VIDEO_SHOT_TABLE = os.environ.get("DYNAMO_VIDEO_SHOT_TABLE")
+DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+DYNAMO_VIDEO_USAGE_ROLLUP_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_ROLLUP_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+S3_BUCKET_DATA = os.environ.get("S3_BUCKET_DATA")
+
+MME_MODEL_ID = os.environ.get("MME_MODEL_ID")
+S3_VECTOR_BUCKET = os.environ.get("S3_VECTOR_BUCKET")
+S3_VECTOR_INDEX = os.environ.get("S3_VECTOR_INDEX")
+# Lower-dimension index for the first stage of re-ranked searches, not written if unset
+S3_VECTOR_INDEX_COARSE = os.environ.get("S3_VECTOR_INDEX_COARSE")
+COARSE_EMBEDDING_DIM = int(os.environ.get("COARSE_EMBEDDING_DIM", 256))
+EMBEDDING_DIM = os.environ.get("EMBEDDING_DIM")
+EMBEDDING_DIM = int(EMBEDDING_DIM) if EMBEDDING_DIM else 1024
+EMBED_TYPE = "AUDIO_VIDEO"
+# Storage type of the embeddings in the task's shard store: float32, float16 or int8
+SHOT_VECTOR_DTYPE = os.environ.get("SHOT_VECTOR_DTYPE", embedding_store.DEFAULT_DTYPE)
+
+# Downloads and Bedrock calls of a batch run in parallel, DynamoDB writes stay on the handler thread
+SHOT_BATCH_MAX_WORKERS = int(os.environ.get("SHOT_BATCH_MAX_WORKERS", 4))
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+shot_repo = data_access.ShotRepository(DYNAMO_VIDEO_SHOT_TABLE)
+usage_repo = data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE, DYNAMO_VIDEO_USAGE_ROLLUP_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
+
+s3 = lambda_runtime.client('s3')
+bedrock = lambda_runtime.client('bedrock-runtime')
+s3vectors = lambda_runtime.client('s3vectors') 
+
+@lambda_runtime.handler
+def lambda_handler(event, context):
+    if not event or "Items" not in event or "TaskId" not in event.get("BatchInput", {}):
+        return {
+            'statusCode': 400,
+            'body': 'Invalid request'
+        }
+    task_id = event["BatchInput"]["TaskId"]
+    instrumentation.set_task(task_id)
+
+    # Read task from DB
+    task_db = task_cache.get_task(task_id, lambda: task_repo.get(task_id), event["BatchInput"].get("TaskVersion"))
+    if task_db is None:
+        return {
+            'statusCode': 400,
+            'body': f'Task does not exist: {task_id}'
+        }
+    shot_setting = task_db.get("Request",{}).get("ExtractionSetting", {}).get("Vision", {}).get("Shot", {})
+    # StaleStages is only set on reprocess, stages with unchanged settings keep their stored outputs
+    stale_stages = task_db.get("Request",{}).get("StaleStages") or {}
+    configs = None
+    if shot_setting.get("Understanding",{}).get("Enabled") and stale_stages.get("Understanding", True):
+        configs = shot_setting["Understanding"].get("PromptConfigs")
+    embed_model_id = None
+    if shot_setting.get("Embedding",{}).get("Enabled") and stale_stages.get("Embedding", True):
+        embed_model_id = shot_setting["Embedding"].get("ModelId") or MME_MODEL_ID
+
+    shots = []
+    for item in event["Items"]:
+        shot = parse_shot_key(item.get("Key"))
+        if shot:
+            shots.append(shot)
+    if not shots or (not configs and not embed_model_id):
+        return {
+            "TaskId": task_id,
+            "Processed": 0
+        }
+
+    with ThreadPoolExecutor(max_workers=SHOT_BATCH_MAX_WORKERS) as executor:
+        # Download each clip once
+        contents = list(executor.map(lambda shot: read_s3_bytes(S3_BUCKET_DATA, shot["s3_key"]), shots))
+
+        # Run every prompt and embedding of the batch concurrently from the shared bytes
+        futures = []
+        for shot, content in zip(shots, contents):
+            if content is None:
+                futures.append(None)
+                continue
+            futures.append({
+                "understanding": [executor.submit(bedrock_converse, config, content, shot["format"]) for config in (configs or [])],
+                "embedding": executor.submit(generate_embedding, content, shot["format"], embed_model_id) if embed_model_id else None
+            })
+
+    sizes = {"usage": [], "shot_outputs": [], "shot_vector": [], "shot_record_delta": 0, "shot_record_max": 0}
+    vectors, failed = [], []
+    # The shard is named after every shot of the batch, a retry overwrites it even if other shots fail
+    shard = embedding_store.ShardWriter(task_id, EMBED_TYPE, SHOT_VECTOR_DTYPE,
+                                        (min(shot["index"] for shot in shots), max(shot["index"] for shot in shots)))
+    for shot, future in zip(shots, futures):
+        if future is None:
+            failed.append(shot["s3_key"])
+            continue
+        try:
+            if configs:
+                store_understanding(task_id, shot, configs, [f.result() for f in future["understanding"]], sizes)
+            if future["embedding"]:
+                vector_entry = store_embedding(task_id, shot, embed_model_id, future["embedding"].result(), shard, sizes)
+                if vector_entry:
+                    vectors.append(vector_entry)
+        except Exception as ex:
+            print(f'Failed to process shot {shot["s3_key"]}', ex)
+            failed.append(shot["s3_key"])
+
+    # Store the embeddings of the batch as one shard, and to S3 vector, one request per batch
+    if vectors:
+        with instrumentation.stage(instrumentation.STAGE_UPLOAD) as stage:
+            shard_sizes = shard.put(s3, S3_BUCKET_DATA)
+            stage.add_bytes(sum(shard_sizes))
+        sizes["shot_vector"] += shard_sizes
+        with instrumentation.stage(instrumentation.STAGE_UPLOAD):
+            s3vectors.put_vectors(
+                    vectorBucketName=S3_VECTOR_BUCKET,   
+                    indexName=S3_VECTOR_INDEX,   
+                    vectors=vectors
+                )
+            if S3_VECTOR_INDEX_COARSE:
+                # Only re-ranked searches use the coarse index, a failure leaves the exact search intact
+                try:
+                    s3vectors.put_vectors(
+                        vectorBucketName=S3_VECTOR_BUCKET,
+                        indexName=S3_VECTOR_INDEX_COARSE,
+                        vectors=[dict(v, data={"float32": embedding_store.truncate(v["data"]["float32"], COARSE_EMBEDDING_DIM)}) for v in vectors]
+                    )
+                except Exception as ex:
+                    print(f'Failed to store vectors to the coarse index {S3_VECTOR_INDEX_COARSE}', ex)
+
+    # Update data size counters once per batch
+    if sizes["usage"]:
+        data_size_repo.add(task_id, "dynamodb_usage_tracking", sum(sizes["usage"]), len(sizes["usage"]))
+    if sizes["shot_outputs"]:
+        data_size_repo.add(task_id, "shot_outputs", sum(sizes["shot_outputs"]), len(sizes["shot_outputs"]), max(sizes["shot_outputs"]))
+    if sizes["shot_vector"]:
+        data_size_repo.add(task_id, "shot_vector", sum(sizes["shot_vector"]), len(sizes["shot_vector"]), max(sizes["shot_vector"]))
+    if sizes["shot_record_max"]:
+        data_size_repo.add(task_id, "dynamodb_shot_analysis", sizes["shot_record_delta"], 0, sizes["shot_record_max"])
+
+    return {
+        "TaskId": task_id,
+        "Processed": len(shots) - len(failed),
+        "Failed": failed
+    }
+
+def parse_shot_key(s3_key):
+    # tasks/{task_id}/shot_clip/shot_{index}_{start}_{end}.mp4
+    try:
+        arr = s3_key.split("/")
+        file_name = arr[-1]
+        file_ext = file_name.split(".")[-1]
+
+        arr2 = file_name.split("_")
+        return {
+            "s3_key": s3_key,
+            "format": file_ext.lower(),
+            "index": int(arr2[1]),
+            "start_time": float(arr2[2]),
+            "end_time": float(arr2[3].replace(f".{file_ext}",""))
+        }
+    except Exception as ex:
+        print(f'Invalid shot key {s3_key}', ex)
+    return None
+
+def read_s3_bytes(s3_bucket, s3_key):
+    try:
+        with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+            content = s3.get_object(Bucket=s3_bucket, Key=s3_key)['Body'].read()
+            stage.add_bytes(len(content))
+        return content
+    except Exception as ex:
+        print(f'Failed to read {s3_key}', ex)
+    return None
+
+def store_understanding(task_id, shot, configs, responses, sizes):
+    index = shot["index"]
+    outputs = []
+    for config, response in zip(configs, responses):
+        # Parse output
+        output = parse_converse_response(response)
+        if not output:
+            output = response
+        elif output.startswith('"') and output.endswith('"'):
+            output = output[1:-1]
+        outputs.append({
+            "model_id": config["modelId"],
+            "name": config["name"],
+            "value": output
+        })
+
+        # Parse usage
+        if response and "usage" in response:
+            input_tokens = response["usage"]["inputTokens"]
+            output_tokens = response["usage"]["outputTokens"]
+            total_tokens = response["usage"]["totalTokens"]
+
+            # store to the usage table
+            usage = update_usage_to_db(task_id, index, config["name"], config["modelId"], input_tokens, output_tokens, total_tokens)
+            sizes["usage"].append(data_access.estimate_item_size(usage))
+
+    if outputs:
+        # Store resutl to DB
+        shot_db, prev_record_size = update_shot_to_db(task_id, index, configs[-1]["modelId"], outputs)
+        if shot_db:
+            record_size = data_access.estimate_item_size(shot_db)
+            sizes["shot_record_delta"] += record_size - prev_record_size
+            sizes["shot_record_max"] = max(sizes["shot_record_max"], record_size)
+
+        # Store result to S3
+        output_body = json.dumps(outputs).encode('utf-8')
+        with instrumentation.stage(instrumentation.STAGE_UPLOAD) as stage:
+            s3.put_object(Bucket=S3_BUCKET_DATA, Key=f'tasks/{task_id}/shot_outputs/output_{index}_{shot["start_time"]}_{shot["end_time"]}.json', Body=output_body)
+            stage.add_bytes(len(output_body))
+        sizes["shot_outputs"].append(len(output_body))
+
+def store_embedding(task_id, shot, model_id, embedding, shard, sizes):
+    if not embedding:
+        return None
+    index, start_time, end_time = shot["index"], shot["start_time"], shot["end_time"]
+
+    # store usage
+    usage = update_embedding_usage_to_db(task_id, index, "video segment embedding", model_id, end_time-start_time)
+    sizes["usage"].append(data_access.estimate_item_size(usage))
+
+    # Add the embedding to the batch shard, written to S3 once per batch
+    key = f'{task_id}_{EMBED_TYPE}_{index}'
+    shard.append(key, index, start_time, end_time, embedding)
+
+    return {
+            "key": key,
+            "data": {"float32": embedding},
+            "metadata": {
+                "index": index,
+                "task_id": task_id, 
+                "embeddingOption": EMBED_TYPE, 
+                "startSec": start_time, 
+                "endSec": end_time
+            }
+        }
+
+def update_shot_to_db(task_id, index, model_id, outputs):
+    shot_id = f'{task_id}_shot_{index}'
+    shot = shot_repo.get(shot_id, task_id)
+    prev_record_size = 0
+    if shot:
+        prev_record_size = data_access.estimate_item_size(shot)
+        shot["modelId"] = model_id
+        shot["outputs"] = outputs
+        shot_repo.put(shot)    
+    return shot, prev_record_size
+
+def update_usage_to_db(task_id, index, name, model_id, input_tokens, output_tokens, total_tokens):
+    usage = {
+        "id": f"{task_id}_{index}_{name}_shot",
+        "index": index,
+        "type": "video_understanding",
+        "name": name,
+        "task_id": task_id,
+        "model_id": model_id,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": total_tokens
+    }
+    usage_repo.put(usage)    
+    return usage
+
+def update_embedding_usage_to_db(task_id, index, name, model_id, duration_s):
+    usage = {
+        "id": f"{task_id}_{index}_shot",
+        "index": index,
+        "type": "nova_mme_video",
+        "name": name,
+        "task_id": task_id,
+        "model_id": model_id,
+        "duration_s": duration_s
+    }
+    usage_repo.put(usage)    
+    return usage
+
+def bedrock_converse(config, input_content, input_format, max_retries=3, retry_delay=1):
+    # Copy rather than mutate, the same config is shared by the concurrent calls of a batch
+    inference_config = dict(config.get("inferConfig") or {"maxTokens": 500, "topP": 0.1, "temperature": 0.3})
+    if "maxTokens" in inference_config:
+        inference_config["maxTokens"] = int(inference_config["maxTokens"])
+    if "temperature" in inference_config:
+        inference_config["temperature"] = float(inference_config["temperature"])
+    if "topP" in inference_config:
+        inference_config["topP"] = float(inference_config["topP"])
+
+    # Construct the message with text and video content
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "text": config["prompt"]
+                },
+            ]
+        }
+    ]
+    if input_format in ["gif", "jpeg", "png", "webp"]:      
+        messages[0]["content"].append({
+                    "image": {
+                        "format": input_format,
+                        "source": {
+                            "bytes": input_content
+                        },
+                    }
+                })
+    elif input_format in ["mp4"]:
+        messages[0]["content"].append({
+                    "video": {
+                        "format": input_format,
+                        "source": {
+                            "bytes": input_content
+                        },
+                    }
+                })
+
+    retries = 0
+    while retries < max_retries:
+        try:
+            # Call Bedrock Converse
+            with instrumentation.stage(instrumentation.STAGE_MODEL_CALL):
+                if config.get("toolConfig"):
+                    response = bedrock.converse(
+                        modelId=config["modelId"],
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                        toolConfig=config["toolConfig"]
+                    )
+                else:
+                    response = bedrock.converse(
+                        modelId=config["modelId"],
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                    )
+            if response["ResponseMetadata"]["HTTPStatusCode"] != 200:
+                raise Exception(f"API request failed: {response['ResponseMetadata']['HTTPStatusCode']}")
+            
+            return response
+        except Exception as ex:
+            print(ex)
+            retries += 1
+            time.sleep(retry_delay)
+
+    return None
+
+def parse_converse_response(response):
+    if not response:
+        return None
+
+    tool_use, txt_result = None, None
+    contents = response.get("output",{}).get("message",{}).get("content",[])
+    for c in contents:
+        if "toolUse" in c:
+            tool_use = c["toolUse"].get("input")
+        elif "text" in c:
+            txt_result = c["text"]
+    
+    if tool_use:
+        return json.dumps(tool_use)
+    elif txt_result:
+        return json.dumps(txt_result)
+    elif "content" in response:
+        return json.dumps(response["content"])
+    return json.dumps(response)
+
+def generate_embedding(content, video_format, model_id):
+    try:
+        encoded = base64.b64encode(content).decode("utf-8")
+        request_body = {
+            "schemaVersion": "nova-multimodal-embed-v1",
+            "taskType": "SINGLE_EMBEDDING",
+            "singleEmbeddingParams": {
+                "embeddingPurpose": "GENERIC_INDEX",
+                "embeddingDimension": EMBEDDING_DIM,
+                "video": {
+                    "format": video_format,
+                    "source": {"bytes": encoded},
+                    "embeddingMode": "AUDIO_VIDEO_COMBINED"
+                }
+            }
+        }
+
+        # Invoke the Nova Embeddings model.
+        with instrumentation.stage(instrumentation.STAGE_MODEL_CALL):
+            response = bedrock.invoke_model(
+                body=json.dumps(request_body),
+                modelId=model_id,
+                accept="application/json",
+                contentType="application/json",
+            )
+
+        # Decode the response body.
+        response_body = json.loads(response.get("body").read())
+        return response_body["embeddings"][0]["embedding"]
+    except Exception as ex:
+        print(ex)
+        return None
@@ -1,13 +1,20 @@
 import json
-import boto3
+import lambda_runtime
+import instrumentation
 import os
 import base64
-from moviepy import VideoFileClip
-import utils
+import task_cache
+import video_probe
 import time
+import data_access
+
+np = lambda_runtime.lazy_import("numpy")
+moviepy = lambda_runtime.lazy_import("moviepy")
 
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
 DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+DYNAMO_VIDEO_USAGE_ROLLUP_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_ROLLUP_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
 
 VIDEO_SAMPLE_S3_BUCKET = os.environ.get("VIDEO_SAMPLE_S3_BUCKET")
 VIDEO_SAMPLE_S3_PREFIX = os.environ.get("VIDEO_SAMPLE_S3_PREFIX")
@@ -16,16 +23,31 @@ MODEL_ID_IMAGE_UNDERSTANDING = os.environ.get("MODEL_ID_IMAGE_UNDERSTANDING")
 IMAGE_MAX_WIDTH = 2048
 IMAGE_MAX_HEIGHT = 2048
 
-s3 = boto3.client('s3')
-bedrock = boto3.client('bedrock-runtime')
+# Local thumbnail scoring
+THUMBNAIL_MODEL_TIEBREAK = os.environ.get("THUMBNAIL_MODEL_TIEBREAK", "false").lower() == "true"
+THUMBNAIL_MODEL_TIEBREAK_CANDIDATES = 3
+THUMBNAIL_SCAN_HEAD_S = 10
+THUMBNAIL_SCORE_WIDTH = 160
+THUMBNAIL_SCORE_THRESHOLD = 0.35
+THUMBNAIL_MIN_LUMA_STD = 8
+THUMBNAIL_MIN_ENTROPY = 0.2
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+usage_repo = data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE, DYNAMO_VIDEO_USAGE_ROLLUP_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
+
+s3 = lambda_runtime.client('s3')
+bedrock = lambda_runtime.client('bedrock-runtime')
 
 local_path = '/tmp/'
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     if event is None or "Request" not in event:
         return 'Invalid request'
     
     task_id = event["Request"].get("TaskId")
+    instrumentation.set_task(task_id)
     s3_bucket, s3_key = None, None
     try:
         s3_bucket = event["Request"]["Video"]["S3Object"]["Bucket"]
@@ -33,19 +55,27 @@ def lambda_handler(event, context):
     except:
         return 'Invalid Request'
 
-    # Download video to local disk
-    local_file_path = local_path + s3_key.split('/')[-1]
-    s3.download_file(s3_bucket, s3_key, local_file_path)
-    print(f"{s3_bucket}{s3_key}")
-    
-    # Generate thumbnail and video metadata
+    task_db = task_repo.get(task_id)
+
     if "MetaData" not in event:
         event["MetaData"] = {}
-    video_metadata = get_video_metadata(event, local_file_path)
+    # On reprocess the stored shots are reused unless the shot settings changed
+    stale_stages = event["Request"].get("StaleStages")
+    if stale_stages and not stale_stages.get("Shot", True) and task_db and task_db.get("MetaData", {}).get("VideoMetaData"):
+        event["MetaData"] = task_db["MetaData"]
+        video_metadata = task_db["MetaData"]["VideoMetaData"]
+    else:
+        # Download video to local disk
+        local_file_path = local_path + s3_key.split('/')[-1]
+        with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+            s3.download_file(s3_bucket, s3_key, local_file_path)
+            stage.add_bytes(os.path.getsize(local_file_path))
+
+        # Generate thumbnail and video metadata
+        video_metadata = get_video_metadata(event, local_file_path)
     duration = video_metadata["Duration"]
 
     task = event
-    task_db = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
     if task_db:
         task["Id"] = task_db["Id"]
         task["RequestBy"] = task_db.get("RequestBy")
@@ -55,12 +85,22 @@ def lambda_handler(event, context):
     task["MetaData"]["VideoMetaData"] = video_metadata
     
     task["Status"] = "processing"
+    # New version: cached copies of the task from before this change are not reused by the Map iterations
+    task["Version"] = task_cache.new_version()
 
     try:
-        # update video_task index
-        utils.dynamodb_table_upsert(DYNAMO_VIDEO_TASK_TABLE, document=task)
+        # update video_task index. The audio branch writes MetaData concurrently, so an existing task only
+        # gets the fields of this stage
+        if task_db:
+            task_repo.update(task_id, {"Request": task["Request"], "Status": task["Status"], "Version": task["Version"]})
+            task_repo.update_metadata(task_id, {"VideoMetaData": video_metadata})
+        else:
+            task_repo.put(task)
     except Exception as ex:
         print(ex)
+
+    # The keyframe index stays on the task row, keep it out of the state machine payload
+    task["MetaData"]["VideoMetaData"].pop("KeyframesS", None)
        
     return task
         
@@ -71,32 +111,94 @@ def get_video_metadata(event, file_path):
     thumbnail_s3_key = f'{event["Request"]["Video"]["S3Object"]["Key"].replace(video_file_name, "thumbnail.jpeg")}'
     task_id = event["Request"].get("TaskId")
 
-    video_clip = VideoFileClip(file_path)    
-    # Get thumbnail - avoid black screen
-    for i in range(0, int(video_clip.duration)):
-        # Get frame and store on local disk
-        video_clip.save_frame(thumbnail_local_path, t=i)
-        # Upload to S3
+    # Probe container headers once. The result is stored on the task for downstream stages
+    with instrumentation.stage(instrumentation.STAGE_DECODE):
+        probe = video_probe.probe_video(file_path)
+
+        # The clip is only used to read thumbnail frames, audio is not needed
+        video_clip = moviepy.VideoFileClip(file_path, audio=False)
+        # Get thumbnail - avoid black screen. Frames are scored locally, the model is only an optional tie-break
+        thumbnail_t, tiebreak_candidates = select_thumbnail_time(video_clip)
+    uploaded_t = None
+    if THUMBNAIL_MODEL_TIEBREAK and tiebreak_candidates:
+        for t in tiebreak_candidates:
+            video_clip.save_frame(thumbnail_local_path, t=t)
+            s3.upload_file(thumbnail_local_path, thumbnail_s3_bucket, thumbnail_s3_key)
+            uploaded_t = t
+            if is_single_color_frame(task_id, t, thumbnail_s3_bucket, thumbnail_s3_key) == True:
+                thumbnail_t = t
+                break
+    if uploaded_t != thumbnail_t:
+        video_clip.save_frame(thumbnail_local_path, t=thumbnail_t)
         s3.upload_file(thumbnail_local_path, thumbnail_s3_bucket, thumbnail_s3_key)
-        
-        # Check if image is black frame
-        is_black_frame = is_single_color_frame(task_id, i, thumbnail_s3_bucket, thumbnail_s3_key)
-        if is_black_frame is not None and is_black_frame == True:
-            break
     
     # construct metadata
     metadata = {
         'Size': os.path.getsize(file_path),
-        'Resolution': video_clip.size,
-        'Duration': video_clip.duration,
-        'Fps': video_clip.fps,
+        'Resolution': probe["Resolution"] or video_clip.size,
+        'Duration': probe["Duration"] or video_clip.duration,
+        'Fps': probe["Fps"] or video_clip.fps,
+        'Codec': probe["Codec"],
+        'HasAudio': probe["HasAudio"],
+        'KeyframesS': probe["KeyframesS"],
         'NameFormat': file_path.split('.')[-1],
         'ThumbnailS3Bucket': thumbnail_s3_bucket,
         'ThumbnailS3Key': thumbnail_s3_key,
     }
+    video_clip.close()
 
     return metadata
 
+def score_thumbnail_frame(frame):
+    """
+    Score a video frame as a thumbnail candidate (0-1) using luminance variance,
+    edge density and histogram entropy on a downscaled grayscale copy.
+    Solid or near-blank frames score 0.
+    """
+    step = max(1, frame.shape[1] // THUMBNAIL_SCORE_WIDTH)
+    small = frame[::step, ::step, :3].astype(np.float32)
+    luma = small[:, :, 0] * 0.299 + small[:, :, 1] * 0.587 + small[:, :, 2] * 0.114
+
+    luma_std = float(luma.std())
+    hist, _ = np.histogram(luma, bins=32, range=(0, 256))
+    p = hist[hist > 0] / luma.size
+    entropy = float(-(p * np.log2(p)).sum()) / 5  # normalized by log2(32)
+    if luma_std < THUMBNAIL_MIN_LUMA_STD or entropy < THUMBNAIL_MIN_ENTROPY:
+        return 0
+
+    gradient = np.abs(np.diff(luma, axis=0))[:, :-1] + np.abs(np.diff(luma, axis=1))[:-1, :]
+    edge_density = float((gradient > 20).mean())
+
+    return 0.4 * min(luma_std / 64, 1) + 0.3 * min(edge_density * 5, 1) + 0.3 * entropy
+
+def select_thumbnail_time(video_clip):
+    """
+    Pick the thumbnail timestamp from one pass over candidate frames: one per second at the
+    start of the video, plus evenly spread samples to skip long black or blank intros.
+    Returns the first candidate above the score threshold, otherwise the best scored ones.
+    """
+    duration = int(video_clip.duration)
+    candidates = list(range(0, min(duration, THUMBNAIL_SCAN_HEAD_S)))
+    candidates += [int(duration * i / 10) for i in range(1, 10) if int(duration * i / 10) >= THUMBNAIL_SCAN_HEAD_S]
+    if not candidates:
+        candidates = [0]
+
+    scored = []
+    for t in candidates:
+        try:
+            score = score_thumbnail_frame(video_clip.get_frame(t))
+        except Exception as ex:
+            print(ex)
+            continue
+        if score >= THUMBNAIL_SCORE_THRESHOLD:
+            return t, []
+        scored.append((score, t))
+
+    scored.sort(reverse=True)
+    if not scored:
+        return 0, []
+    return scored[0][1], [t for _, t in scored[:THUMBNAIL_MODEL_TIEBREAK_CANDIDATES]]
+
 def bedrock_converse(config, max_retries=3, retry_delay=1, image_s3_bucket=None, image_s3_key=None):
     inference_config = config.get("inferConfig")
     if not inference_config:
@@ -131,19 +233,20 @@ def bedrock_converse(config, max_retries=3, retry_delay=1, image_s3_bucket=None,
                         })
 
             # Call Bedrock Converse
-            if config.get("toolConfig"):
-                response = bedrock.converse(
-                    modelId=config["modelId"],
-                    messages=messages,
-                    inferenceConfig=inference_config,
-                    toolConfig=config["toolConfig"]
-                )
-            else:
-                response = bedrock.converse(
-                    modelId=config["modelId"],
-                    messages=messages,
-                    inferenceConfig=inference_config,
-                )
+            with instrumentation.stage(instrumentation.STAGE_MODEL_CALL):
+                if config.get("toolConfig"):
+                    response = bedrock.converse(
+                        modelId=config["modelId"],
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                        toolConfig=config["toolConfig"]
+                    )
+                else:
+                    response = bedrock.converse(
+                        modelId=config["modelId"],
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                    )
             #print(parse_converse_response(response))
             if response["ResponseMetadata"]["HTTPStatusCode"] != 200:
                 raise Exception(f"API request failed: {response['ResponseMetadata']['HTTPStatusCode']}")
@@ -222,7 +325,8 @@ def is_single_color_frame(task_id, index, thumbnail_s3_bucket, thumbnail_s3_key)
             total_tokens = response["usage"]["totalTokens"]
 
             # store to the usage table
-            update_usage_to_db(task_id, index, "thumbnail", MODEL_ID_IMAGE_UNDERSTANDING, input_tokens, output_tokens, total_tokens)
+            usage = update_usage_to_db(task_id, index, "thumbnail", MODEL_ID_IMAGE_UNDERSTANDING, input_tokens, output_tokens, total_tokens)
+            data_size_repo.add(task_id, "dynamodb_usage_tracking", data_access.estimate_item_size(usage), 1)
 
         return output is None or output.get("result") == True
     except Exception as ex:
@@ -241,5 +345,5 @@ def update_usage_to_db(task_id, index, name, model_id, input_tokens, output_toke
         "output_tokens": output_tokens,
         "total_tokens": total_tokens
     }
-    utils.dynamodb_table_upsert(DYNAMO_VIDEO_USAGE_TABLE, usage)    
+    usage_repo.put(usage)    
     return usage
\ No newline at end of file
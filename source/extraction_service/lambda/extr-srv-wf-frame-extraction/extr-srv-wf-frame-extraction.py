@@ -2,52 +2,106 @@
 Call Bedrock Converse API for image understanding
 Get sutitles match frame timestamp
 Sync frame to DB
+Invoked by the Distributed Map with a batch of frame keys and a task reference:
+{"BatchInput": {"TaskId": "..."}, "Items": [{"Key": "..."}, ...]}
 '''
 import json
-import boto3
+import lambda_runtime
+import instrumentation
 import os
-import utils
+import task_cache
 import base64
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 import re
 import time
+import data_access
 
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
 DYNAMO_VIDEO_FRAME_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
 DYNAMO_VIDEO_TRANS_TABLE = os.environ.get("DYNAMO_VIDEO_TRANS_TABLE")
 DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+DYNAMO_VIDEO_USAGE_ROLLUP_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_ROLLUP_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+
+# Bedrock calls of a batch run in parallel, DynamoDB writes stay on the handler thread
+FRAME_EXTRACTION_MAX_WORKERS = int(os.environ.get("FRAME_EXTRACTION_MAX_WORKERS", 4))
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+frame_repo = data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE)
+usage_repo = data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE, DYNAMO_VIDEO_USAGE_ROLLUP_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
 
 LOCAL_PATH = '/tmp/'
 
-s3 = boto3.client('s3')
-bedrock = boto3.client('bedrock-runtime') 
+s3 = lambda_runtime.client('s3')
+bedrock = lambda_runtime.client('bedrock-runtime') 
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
-    if event is None or "Request" not in event or "Key" not in event:
+    if event is None or "Items" not in event or "TaskId" not in event.get("BatchInput", {}):
         return {
             "Error": "Invalid Request"
         }
-    task_id = event["Request"].get("TaskId")
-    setting = event["Request"].get("ExtractionSetting",{}).get("Vision",{}).get("Frame")
-    s3_bucket = event["MetaData"]["VideoFrameS3"]["S3Bucket"]
-    s3_prefix = event["MetaData"]["VideoFrameS3"]["S3Prefix"]
-    s3_key = event.get("Key")
-    file_name = event["Request"].get("FileName", "")
-
-    enabled = setting.get("Enabled")
-    if enabled == False:
-        # Ignore frame analysis
-        return event
+    task_id = event["BatchInput"]["TaskId"]
+    instrumentation.set_task(task_id)
 
-    if task_id is None or setting is None or s3_bucket is None or s3_key is None or not s3_key.endswith('.png'):
+    # Request and MetaData are read once per batch instead of travelling with every item
+    task = task_cache.get_task(task_id, lambda: task_repo.get(task_id), event["BatchInput"].get("TaskVersion"))
+    if task is None:
         return {
             "Error": "Invalid Request"
         }
+    setting = task["Request"].get("ExtractionSetting",{}).get("Vision",{}).get("Frame")
+    s3_bucket = task["MetaData"]["VideoFrameS3"]["S3Bucket"]
+
+    if setting is None or setting.get("Enabled") == False:
+        # Ignore frame analysis
+        return {
+            "TaskId": task_id,
+            "Processed": 0
+        }
+
+    s3_keys = [item.get("Key") for item in event["Items"] if item.get("Key", "").endswith('.png')]
+    promptConfigs = setting.get("PromptConfigs") or []
 
+    # Run every prompt of every frame in the batch concurrently
+    responses = {}
+    with ThreadPoolExecutor(max_workers=FRAME_EXTRACTION_MAX_WORKERS) as executor:
+        for s3_key in s3_keys:
+            for i, config in enumerate(promptConfigs):
+                responses[(s3_key, i)] = executor.submit(bedrock_converse, config=config, image_s3_bucket=s3_bucket, image_s3_key=s3_key)
+
+    sizes = {"frame_outputs": [], "usage": [], "record": [], "record_delta": [], "new_records": 0}
+    failed = []
+    for s3_key in s3_keys:
+        try:
+            process_frame(task_id, s3_bucket, s3_key, promptConfigs, [responses[(s3_key, i)].result() for i in range(len(promptConfigs))], sizes)
+        except Exception as ex:
+            print(f"Failed to process frame {s3_key}", ex)
+            failed.append(s3_key)
+
+    # Update data size counters once per batch
+    if sizes["frame_outputs"]:
+        data_size_repo.add(task_id, "frame_outputs", sum(sizes["frame_outputs"]), len(sizes["frame_outputs"]), max(sizes["frame_outputs"]))
+    if sizes["usage"]:
+        data_size_repo.add(task_id, "dynamodb_usage_tracking", sum(sizes["usage"]), len(sizes["usage"]))
+    if sizes["record"]:
+        data_size_repo.add(task_id, "dynamodb_frame_analysis", sum(sizes["record_delta"]), sizes["new_records"], max(sizes["record"]))
+
+    # Keep the result small, the Distributed Map writes it to S3
+    return {
+        "TaskId": task_id,
+        "Processed": len(s3_keys) - len(failed),
+        "Failed": failed
+    }
+
+def process_frame(task_id, s3_bucket, s3_key, promptConfigs, responses, sizes):
     frame_id = s3_key.split('/')[-1].replace('.png','')
     ts = float(frame_id.split("_")[-1])
 
-    frame = utils.get_frame_by_id(DYNAMO_VIDEO_FRAME_TABLE, f'{task_id}_{ts}', task_id)
+    frame = frame_repo.get(f'{task_id}_{ts}', task_id)
+    prev_record_size = data_access.estimate_item_size(frame) if frame else 0
     if frame is None:
         frame = {
             "id": f'{task_id}_{ts}',
@@ -58,20 +112,18 @@ def lambda_handler(event, context):
         }
 
     # Prompts - Bedrock
-    promptConfigs = setting.get("PromptConfigs")
     if promptConfigs:
         frame["frame_outputs"] = []
-        for config in promptConfigs:
-            response = bedrock_converse(config=config, image_s3_bucket=s3_bucket, image_s3_key=s3_key)
-
+        for config, response in zip(promptConfigs, responses):
             # Parse usage
-            if "usage" in response:
+            if response and "usage" in response:
                 input_tokens = response["usage"]["inputTokens"]
                 output_tokens = response["usage"]["outputTokens"]
                 total_tokens = response["usage"]["totalTokens"]
 
                 # store to the usage table
-                update_usage_to_db(task_id, ts, config["name"], config["modelId"], input_tokens, output_tokens, total_tokens)
+                usage = update_usage_to_db(task_id, ts, config["name"], config["modelId"], input_tokens, output_tokens, total_tokens)
+                sizes["usage"].append(data_access.estimate_item_size(usage))
 
             custom_output = parse_converse_response(response)
 
@@ -82,15 +134,20 @@ def lambda_handler(event, context):
             })
 
         # Store to S3
-        s3.put_object(Bucket=s3_bucket, Key=f'tasks/{task_id}/frame_outputs/output_{ts}.json', Body=json.dumps(frame["frame_outputs"]))
+        output_body = json.dumps(frame["frame_outputs"]).encode('utf-8')
+        with instrumentation.stage(instrumentation.STAGE_UPLOAD) as stage:
+            s3.put_object(Bucket=s3_bucket, Key=f'tasks/{task_id}/frame_outputs/output_{ts}.json', Body=output_body)
+            stage.add_bytes(len(output_body))
+        sizes["frame_outputs"].append(len(output_body))
 
     # Update database: video_frame
-    utils.dynamodb_table_upsert(DYNAMO_VIDEO_FRAME_TABLE, frame)
-
-    # include frame into event object
-    event["frame"] = frame
+    frame_repo.put(frame)
+    record_size = data_access.estimate_item_size(frame)
+    sizes["record"].append(record_size)
+    sizes["record_delta"].append(record_size - prev_record_size)
+    sizes["new_records"] += 0 if prev_record_size else 1
 
-    return event
+    return frame
 
 def parse_converse_response(response):
     if not response:
@@ -117,7 +174,8 @@ def bedrock_converse(config, max_retries=3, retry_delay=1, image_s3_bucket=None,
     if not inference_config:
         inference_config = {"maxTokens": 500, "topP": 0.1, "temperature": 0.3}
     if "modelId" in config and "anthropic" in config["modelId"]:
-        del inference_config["topP"]
+        # Copy rather than mutate, the same config is shared by the concurrent calls of a batch
+        inference_config = {k: v for k, v in inference_config.items() if k != "topP"}
 
     retries = 0
     while retries < max_retries:
@@ -135,8 +193,10 @@ def bedrock_converse(config, max_retries=3, retry_delay=1, image_s3_bucket=None,
             ]
 
             if image_s3_bucket and image_s3_key:
-                file_obj = s3.get_object(Bucket=image_s3_bucket, Key=image_s3_key)
-                image_content = file_obj['Body'].read()
+                with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+                    file_obj = s3.get_object(Bucket=image_s3_bucket, Key=image_s3_key)
+                    image_content = file_obj['Body'].read()
+                    stage.add_bytes(len(image_content))
                 messages[0]["content"].append({
                             "image": {
                                 "format": "png",
@@ -147,19 +207,20 @@ def bedrock_converse(config, max_retries=3, retry_delay=1, image_s3_bucket=None,
                         })
 
             # Call Bedrock Converse
-            if config.get("toolConfig"):
-                response = bedrock.converse(
-                    modelId=config["modelId"],
-                    messages=messages,
-                    inferenceConfig=inference_config,
-                    toolConfig=config["toolConfig"]
-                )
-            else:
-                response = bedrock.converse(
-                    modelId=config["modelId"],
-                    messages=messages,
-                    inferenceConfig=inference_config,
-                )
+            with instrumentation.stage(instrumentation.STAGE_MODEL_CALL):
+                if config.get("toolConfig"):
+                    response = bedrock.converse(
+                        modelId=config["modelId"],
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                        toolConfig=config["toolConfig"]
+                    )
+                else:
+                    response = bedrock.converse(
+                        modelId=config["modelId"],
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                    )
             #print(parse_converse_response(response))
             if response["ResponseMetadata"]["HTTPStatusCode"] != 200:
                 raise Exception(f"API request failed: {response["ResponseMetadata"]['HTTPStatusCode']}")
@@ -184,5 +245,5 @@ def update_usage_to_db(task_id, index, name, model_id, input_tokens, output_toke
         "output_tokens": output_tokens,
         "total_tokens": total_tokens
     }
-    utils.dynamodb_table_upsert(DYNAMO_VIDEO_USAGE_TABLE, usage)    
+    usage_repo.put(usage)    
     return usage
\ No newline at end of file
@@ -1,10 +1,14 @@
 import json
-from moviepy import VideoFileClip
-import boto3
+import lambda_runtime
+import instrumentation
 import os
-import utils
+import task_cache
 import base64
-from PIL import Image
+import data_access
+import streaming_upload
+
+moviepy = lambda_runtime.lazy_import("moviepy")
+Image = lambda_runtime.lazy_import("PIL.Image")
 
 VIDEO_SAMPLE_CHUNK_DURATION_S = float(os.environ.get("VIDEO_SAMPLE_CHUNK_DURATION_S", 600)) # default to 10 minutes
 VIDEO_SAMPLE_S3_BUCKET = os.environ.get("VIDEO_SAMPLE_S3_BUCKET")
@@ -12,14 +16,20 @@ VIDEO_SAMPLE_S3_PREFIX = os.environ.get("VIDEO_SAMPLE_S3_PREFIX")
 
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
 DYNAMO_VIDEO_FRAME_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+frame_repo = data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
 
 IMAGE_MAX_WIDTH = 2048
 IMAGE_MAX_HEIGHT = 2048
 
-s3 = boto3.client('s3')
+s3 = lambda_runtime.client('s3')
 
 local_path = '/tmp/'
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     task_id, start_ts, end_ts = None, None, None
     try:
@@ -30,19 +40,29 @@ def lambda_handler(event, context):
         print(ex)
         return 'Invalid request'
 
-    task = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
+    instrumentation.set_task(task_id)
+    task = task_cache.get_task(task_id, lambda: task_repo.get(task_id), event.get("task_version"))
     if task is None:
         return 'Invalid request'
     
-    # Download video to local disk
-    local_file_path = local_path + task["Request"]["Video"]["S3Object"]["Key"].split('/')[-1]
-    s3.download_file(task["Request"]["Video"]["S3Object"]["Bucket"], task["Request"]["Video"]["S3Object"]["Key"], local_file_path)
+    # Download video to local disk. A chunk of a streaming upload is in the uploaded prefix
+    s3_bucket, s3_key = task["Request"]["Video"]["S3Object"]["Bucket"], task["Request"]["Video"]["S3Object"]["Key"]
+    local_file_path = local_path + s3_key.split('/')[-1]
+    with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+        if event.get("streaming"):
+            streaming_upload.download_prefix(s3, s3_bucket, s3_key, local_file_path)
+        else:
+            s3.download_file(s3_bucket, s3_key, local_file_path)
+        stage.add_bytes(os.path.getsize(local_file_path))
     
-    # Load video
-    video_clip = VideoFileClip(local_file_path)
+    # Load video. Frames only, audio is not needed
+    with instrumentation.stage(instrumentation.STAGE_DECODE):
+        video_clip = moviepy.VideoFileClip(local_file_path, audio=False)
 
-    # Calculate sample timestamps based on request setting
-    timestamps = generate_sample_timestamps(task["Request"].get("PreProcessSetting"), video_clip.duration, start_ts, end_ts)
+    # Calculate sample timestamps based on request setting, reusing the probed duration from the task.
+    # The duration of a streaming upload is unknown, its chunks end within the uploaded time range
+    duration = end_ts if event.get("streaming") else task["MetaData"].get("VideoMetaData",{}).get("Duration") or video_clip.duration
+    timestamps = generate_sample_timestamps(task["Request"].get("PreProcessSetting"), float(duration), start_ts, end_ts)
 
     # Create image frames
     resolution = task["MetaData"].get("VideoMetaData",{}).get("Resolution")
@@ -54,10 +74,18 @@ def lambda_handler(event, context):
     frames = sample_video_at_timestamps(video_clip, timestamps, task_id, need_resize, start_ts)
 
     # Add to video_frame table
+    frame_sizes, record_sizes = [], []
     for f in frames:
+        frame_sizes.append(f.pop("file_size", 0))
         f["task_id"] = task_id
         f["id"] = f'{task_id}_{f["timestamp"]}'
-        utils.dynamodb_table_upsert(DYNAMO_VIDEO_FRAME_TABLE, document=f)
+        frame_repo.put(f)
+        record_sizes.append(data_access.estimate_item_size(f))
+
+    # Update data size counters once per chunk
+    if frames:
+        data_size_repo.add(task_id, "video_frame", sum(frame_sizes), len(frame_sizes), max(frame_sizes))
+        data_size_repo.add(task_id, "dynamodb_frame_analysis", sum(record_sizes), len(record_sizes), max(record_sizes))
     return event
 
 def generate_sample_timestamps(setting, duration, sample_start_s, sample_end_s):
@@ -106,20 +134,25 @@ def sample_video_at_timestamps(video_clip, timestamps, task_id, need_resize, sam
         # save frame to local disk
         output_file = f'{VIDEO_SAMPLE_S3_PREFIX}{ts["ts"]}.png'
         output_path = f'{local_path}{output_file}'
-        video_clip.save_frame(output_path, ts["ts"])
+        with instrumentation.stage(instrumentation.STAGE_DECODE):
+            video_clip.save_frame(output_path, ts["ts"])
         if need_resize:
-            resize_if_large(output_path)
+            with instrumentation.stage(instrumentation.STAGE_ENCODE):
+                resize_if_large(output_path)
 
         # upload to s3
         upload_file_key = f'tasks/{task_id}/{VIDEO_SAMPLE_S3_PREFIX}/{output_file}'
-        s3.upload_file(output_path, VIDEO_SAMPLE_S3_BUCKET, upload_file_key)
+        with instrumentation.stage(instrumentation.STAGE_UPLOAD) as stage:
+            s3.upload_file(output_path, VIDEO_SAMPLE_S3_BUCKET, upload_file_key)
+            stage.add_bytes(os.path.getsize(output_path))
         
         # include image to result
         frame = {
             "s3_bucket": VIDEO_SAMPLE_S3_BUCKET,
             "s3_key": upload_file_key,
             "timestamp": ts["ts"],
-            "prev_timestamp": prev_ts
+            "prev_timestamp": prev_ts,
+            "file_size": os.path.getsize(output_path)
         }
         result.append(frame)
         prev_ts = ts["ts"]
@@ -1,34 +1,78 @@
 import json
-import boto3
+import lambda_runtime
+import instrumentation
 import os
 import base64
-from moviepy import VideoFileClip
-import utils
+import task_cache
+import video_probe
+import streaming_upload
 import time
+import math
+import data_access
+from datetime import datetime, timezone
 
-VIDEO_SAMPLE_CHUNK_DURATION_S = float(os.environ.get("VIDEO_SAMPLE_CHUNK_DURATION_S", 600)) # default to 10 minutes
+np = lambda_runtime.lazy_import("numpy")
+moviepy = lambda_runtime.lazy_import("moviepy")
+
+# Chunk planning for the "Iterate video chunks" Map
+VIDEO_SAMPLE_CHUNK_DURATION_S = float(os.environ.get("VIDEO_SAMPLE_CHUNK_DURATION_S", 600)) # upper bound, default to 10 minutes
+VIDEO_SAMPLE_CHUNK_MIN_DURATION_S = 30
+VIDEO_SAMPLE_CHUNK_TARGET_WALL_S = float(os.environ.get("VIDEO_SAMPLE_CHUNK_TARGET_WALL_S", 120))
+VIDEO_SAMPLE_CHUNK_MAX_CONCURRENCY = int(os.environ.get("VIDEO_SAMPLE_CHUNK_MAX_CONCURRENCY", 20))
+LAMBDA_FRAME_SAMPLE_VIDEO_TIMEOUT_S = float(os.environ.get("LAMBDA_FRAME_SAMPLE_VIDEO_TIMEOUT_S", 900))
+LAMBDA_FRAME_DEDUP_ORB_TIMEOUT_S = float(os.environ.get("LAMBDA_FRAME_DEDUP_ORB_TIMEOUT_S", 60))
+LAMBDA_FRAME_DEDUP_MME_TIMEOUT_S = float(os.environ.get("LAMBDA_FRAME_DEDUP_MME_TIMEOUT_S", 300))
+# Keep a margin below each Lambda timeout and leave most of the account concurrency to other stages and tasks
+CHUNK_PLAN_TIMEOUT_MARGIN = 0.6
+CHUNK_PLAN_ACCOUNT_CONCURRENCY_SHARE = 0.1
+# Rough per-chunk and per-frame costs (seconds), measured on 10 GB Lambda
+CHUNK_COST_OVERHEAD_S = 5
+CHUNK_COST_DOWNLOAD_MB_PER_S = 80
+FRAME_COST_SAMPLE_1080P_S = 0.25
+FRAME_COST_DEDUP_S = {"orb": 0.05, "novamme": 0.4}
+# A streaming upload without a new part for this long fails the task
+STREAMING_UPLOAD_IDLE_TIMEOUT_S = float(os.environ.get("STREAMING_UPLOAD_IDLE_TIMEOUT_S", 3600))
 
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
+DYNAMO_VIDEO_FRAME_TABLE = os.environ.get("DYNAMO_VIDEO_FRAME_TABLE")
 
 VIDEO_SAMPLE_S3_BUCKET = os.environ.get("VIDEO_SAMPLE_S3_BUCKET")
 VIDEO_SAMPLE_S3_PREFIX = os.environ.get("VIDEO_SAMPLE_S3_PREFIX")
 MODEL_ID_IMAGE_UNDERSTANDING = os.environ.get("MODEL_ID_IMAGE_UNDERSTANDING")
 DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+DYNAMO_VIDEO_USAGE_ROLLUP_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_ROLLUP_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
 
 IMAGE_MAX_WIDTH = 2048
 IMAGE_MAX_HEIGHT = 2048
 
-s3 = boto3.client('s3')
-bedrock = boto3.client('bedrock-runtime')
+# Local thumbnail scoring
+THUMBNAIL_MODEL_TIEBREAK = os.environ.get("THUMBNAIL_MODEL_TIEBREAK", "false").lower() == "true"
+THUMBNAIL_MODEL_TIEBREAK_CANDIDATES = 3
+THUMBNAIL_SCAN_HEAD_S = 10
+THUMBNAIL_SCORE_WIDTH = 160
+THUMBNAIL_SCORE_THRESHOLD = 0.35
+THUMBNAIL_MIN_LUMA_STD = 8
+THUMBNAIL_MIN_ENTROPY = 0.2
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+frame_repo = data_access.FrameRepository(DYNAMO_VIDEO_FRAME_TABLE)
+usage_repo = data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE, DYNAMO_VIDEO_USAGE_ROLLUP_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
+
+s3 = lambda_runtime.client('s3')
+bedrock = lambda_runtime.client('bedrock-runtime')
 
 local_path = '/tmp/'
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     #print(event)
     if event is None or "Request" not in event:
         return 'Invalid request'
     
     task_id = event["Request"].get("TaskId")
+    instrumentation.set_task(task_id)
     s3_bucket, s3_key, sample_interval = None, None, 1
     try:
         s3_bucket = event["Request"]["Video"]["S3Object"]["Bucket"]
@@ -39,19 +83,46 @@ def lambda_handler(event, context):
     except:
         return 'Invalid Request'
 
-    # Download video to local disk
-    local_file_path = local_path + s3_key.split('/')[-1]
-    s3.download_file(s3_bucket, s3_key, local_file_path)
-    print(f"{s3_bucket}{s3_key}")
-    
-    # Generate thumbnail and video metadata
+    task_db = task_repo.get(task_id)
+    # On reprocess the stored frames are reused unless the sampling or dedup settings changed
+    resample = is_stage_stale(event["Request"], "Sample") or is_stage_stale(event["Request"], "Dedup")
+
+    # Streaming upload: the state machine runs this stage once per uploaded time range, each pass samples the
+    # chunks uploaded since the previous one. Streaming is the state of the previous pass
+    upload = (task_db or {}).get("Upload") or {}
+    upload_pending = upload.get("Streaming") == True and upload.get("Complete") != True
+    streaming = event.pop("Streaming", None)
+    sampled_until_s = float(streaming["SampledUntilS"]) if streaming else 0
+    if upload_pending:
+        check_upload(upload)
+
     if "MetaData" not in event:
         event["MetaData"] = {}
-    video_metadata = get_video_metadata(event, local_file_path)
+    if (not resample or streaming and upload_pending) and task_db and task_db.get("MetaData", {}).get("VideoMetaData"):
+        event["MetaData"] = task_db["MetaData"]
+        video_metadata = task_db["MetaData"]["VideoMetaData"]
+    else:
+        # Download video to local disk. Until the upload completes, the uploaded prefix
+        local_file_path = local_path + s3_key.split('/')[-1]
+        with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+            if upload_pending:
+                streaming_upload.download_prefix(s3, s3_bucket, s3_key, local_file_path)
+            else:
+                s3.download_file(s3_bucket, s3_key, local_file_path)
+            stage.add_bytes(os.path.getsize(local_file_path))
+
+        # Generate thumbnail and video metadata
+        video_metadata = get_video_metadata(event, local_file_path)
+        if streaming:
+            # The last pass probed the complete video, the frame counters of the previous passes are kept
+            event["MetaData"]["VideoFrameS3"] = task_db.get("MetaData", {}).get("VideoFrameS3", {})
     duration = video_metadata["Duration"]
+    if upload_pending:
+        # Plan with the duration the client reported, the probed duration only covers the uploaded prefix
+        duration = max(float(duration), float(upload.get("AvailableS") or 0),
+                       float(event["Request"].get("VideoMetaData", {}).get("Duration") or 0))
 
     task = event
-    task_db = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, task_id)
     if task_db:
         task["Id"] = task_db["Id"]
         task["RequestBy"] = task_db.get("RequestBy")
@@ -62,36 +133,158 @@ def lambda_handler(event, context):
     
     # Frame metadata
     frame_metadata = task["MetaData"].get("VideoFrameS3", {})
-    frame_metadata["TotalFramesPlaned"] = int(duration / sample_interval)
-    frame_metadata["TotalFramesSampled"] = 0
+    if resample:
+        frame_metadata["TotalFramesPlaned"] = int(duration / sample_interval)
+        if not streaming:
+            frame_metadata["TotalFramesSampled"] = 0
     frame_metadata["S3Bucket"] = VIDEO_SAMPLE_S3_BUCKET
     frame_metadata["S3Prefix"] = f'tasks/{task_id}/{VIDEO_SAMPLE_S3_PREFIX}'
     task["MetaData"]["VideoFrameS3"] = frame_metadata
 
     task["Status"] = "processing"
+    # New version: cached copies of the task from before this change are not reused by the Map iterations
+    task["Version"] = task_cache.new_version()
 
     try:
-        # update video_task index
-        utils.dynamodb_table_upsert(DYNAMO_VIDEO_TASK_TABLE, document=task)
+        # update video_task index. The audio branch writes MetaData concurrently, so an existing task only
+        # gets the fields of this stage
+        if task_db:
+            task_repo.update(task_id, {"Request": task["Request"], "Status": task["Status"], "Version": task["Version"]})
+            task_repo.update_metadata(task_id, {"VideoMetaData": video_metadata, "VideoFrameS3": frame_metadata})
+        else:
+            task_repo.put(task)
     except Exception as ex:
         print(ex)
-        
+
+    # Reprocess with new sampling settings: remove the frames sampled by the previous run
+    if resample and "StaleStages" in event["Request"]:
+        try:
+            delete_s3_prefix(frame_metadata["S3Bucket"], frame_metadata["S3Prefix"])
+            frame_repo.delete_by_task(task_id)
+        except Exception as ex:
+            print(f"Failed to remove the previously sampled frames: {ex}")
+
     # Create array for chunk iteration
+    similarity_method = event["Request"]["PreProcessSetting"].get("SimilarityMethod")
+    # Deduplication only does work when smart sampling is enabled
+    dedup_method = similarity_method if event["Request"]["PreProcessSetting"].get("SmartSample") == True else None
+    chunk_plan = plan_chunks(float(duration), video_metadata["Resolution"], video_metadata["Size"], sample_interval, dedup_method)
+    chunk_count = chunk_plan["ChunkCount"]
+    if streaming:
+        # Chunk boundaries are kept across the passes
+        chunk_plan["ChunkDurationS"] = float(streaming["ChunkDurationS"])
+        chunk_count = max(0, math.ceil((float(duration) - sampled_until_s) / chunk_plan["ChunkDurationS"]))
+    if upload_pending:
+        # Only the whole chunks of the uploaded time range, the next passes sample the rest
+        chunk_count = max(0, int((float(upload["AvailableS"]) - sampled_until_s) // chunk_plan["ChunkDurationS"]))
+    print("Chunk plan:", chunk_plan)
+
     chunks = []
-    start_ts = 0
-    while start_ts <= duration:
+    start_ts = sampled_until_s
+    while resample and len(chunks) < chunk_count:
         chunks.append({
             "start_ts": start_ts,
-            "end_ts": start_ts + VIDEO_SAMPLE_CHUNK_DURATION_S,
+            "end_ts": start_ts + chunk_plan["ChunkDurationS"],
             "task_id": task_id,
-            "similarity_method": event["Request"]["PreProcessSetting"].get("SimilarityMethod")
+            "task_version": task["Version"],
+            "similarity_method": similarity_method,
+            "streaming": upload_pending
         })
-        start_ts += VIDEO_SAMPLE_CHUNK_DURATION_S
+        start_ts += chunk_plan["ChunkDurationS"]
     
-    task["chunks"] = chunks
-    
-    return task
+    # Pass a task reference, downstream Lambdas read Request and MetaData from the task table
+    result = {
+        "TaskId": task_id,
+        "TaskVersion": task["Version"],
+        "FrameAnalysisEnabled": event["Request"].get("ExtractionSetting",{}).get("Vision",{}).get("Frame",{}).get("Enabled") != False \
+            and (resample or is_stage_stale(event["Request"], "Frame")),
+        "VideoFrameS3": {
+            "S3Bucket": frame_metadata["S3Bucket"],
+            "S3Prefix": frame_metadata["S3Prefix"]
+        },
+        "ChunkPlan": chunk_plan,
+        "chunks": chunks,
+        "UploadPending": upload_pending
+    }
+    if upload_pending:
+        # Input of the next pass
+        result["Request"] = event["Request"]
+        result["Streaming"] = {"SampledUntilS": start_ts, "ChunkDurationS": chunk_plan["ChunkDurationS"]}
+    return result
+
+def check_upload(upload):
+    if upload.get("Aborted"):
+        raise Exception("The upload of the video was aborted")
+    idle_s = (datetime.now(timezone.utc) - datetime.fromisoformat(upload["UpdatedTs"])).total_seconds()
+    if idle_s > STREAMING_UPLOAD_IDLE_TIMEOUT_S:
+        raise Exception(f"No part of the video was uploaded for {int(idle_s)} s")
         
+def is_stage_stale(request, stage):
+    # StaleStages is only set on reprocess, a new task runs every stage
+    stale_stages = request.get("StaleStages")
+    return stale_stages is None or stale_stages.get(stage, True)
+
+def delete_s3_prefix(s3_bucket, s3_prefix):
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=s3_bucket, Prefix=s3_prefix):
+        objects = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+        if objects:
+            s3.delete_objects(Bucket=s3_bucket, Delete={'Objects': objects})
+
+def get_available_concurrency():
+    # Unreserved account concurrency is shared with the other stages and tasks, only a share of it is used here
+    try:
+        settings = lambda_runtime.client('lambda').get_account_settings()
+        unreserved = settings["AccountLimit"]["UnreservedConcurrentExecutions"]
+        return max(1, int(unreserved * CHUNK_PLAN_ACCOUNT_CONCURRENCY_SHARE))
+    except Exception as ex:
+        print(ex)
+    return VIDEO_SAMPLE_CHUNK_MAX_CONCURRENCY
+
+def plan_chunks(duration, resolution, size, sample_interval, dedup_method):
+    """
+    Choose the chunk duration and Map concurrency for frame sampling and deduplication.
+    Chunks are sized to finish within the target wall-clock time in a single Map wave,
+    bounded by the sample and dedup Lambda timeouts and the available concurrency.
+    Returns {'ChunkDurationS', 'ChunkCount', 'MaxConcurrency', 'EstimatedWallS'}.
+    """
+    # Per-frame cost scales with the decoded frame size
+    pixels = float(resolution[0]) * float(resolution[1]) if resolution and len(resolution) > 1 else 1920 * 1080
+    sample_cost_s = FRAME_COST_SAMPLE_1080P_S * max(0.25, pixels / (1920 * 1080))
+    dedup_cost_s = FRAME_COST_DEDUP_S.get((dedup_method or "").lower(), 0)
+    chunk_overhead_s = CHUNK_COST_OVERHEAD_S + size / 1024 / 1024 / CHUNK_COST_DOWNLOAD_MB_PER_S
+
+    # The longest chunk each Lambda can process within its timeout
+    frames_per_s = 1 / max(sample_interval, 0.01)
+    max_chunk_s = (LAMBDA_FRAME_SAMPLE_VIDEO_TIMEOUT_S * CHUNK_PLAN_TIMEOUT_MARGIN - chunk_overhead_s) / (sample_cost_s * frames_per_s)
+    if dedup_cost_s > 0:
+        dedup_timeout_s = LAMBDA_FRAME_DEDUP_MME_TIMEOUT_S if dedup_method.lower() == "novamme" else LAMBDA_FRAME_DEDUP_ORB_TIMEOUT_S
+        max_chunk_s = min(max_chunk_s, dedup_timeout_s * CHUNK_PLAN_TIMEOUT_MARGIN / (dedup_cost_s * frames_per_s))
+    max_chunk_s = min(max(max_chunk_s, VIDEO_SAMPLE_CHUNK_MIN_DURATION_S), VIDEO_SAMPLE_CHUNK_DURATION_S)
+
+    # The chunk length that meets the target wall-clock time
+    target_chunk_s = (VIDEO_SAMPLE_CHUNK_TARGET_WALL_S - chunk_overhead_s) / ((sample_cost_s + dedup_cost_s) * frames_per_s)
+    chunk_s = min(max(target_chunk_s, VIDEO_SAMPLE_CHUNK_MIN_DURATION_S), max_chunk_s)
+
+    # More chunks than available concurrency would run in waves, so grow chunks up to the timeout bound instead
+    max_concurrency = min(VIDEO_SAMPLE_CHUNK_MAX_CONCURRENCY, get_available_concurrency())
+    if math.ceil(duration / chunk_s) > max_concurrency:
+        chunk_s = min(max(duration / max_concurrency, chunk_s), max_chunk_s)
+
+    # Align chunk boundaries with the sample interval, a short video is a single chunk
+    chunk_s = min(chunk_s, duration)
+    chunk_s = max(math.ceil(chunk_s / sample_interval) * sample_interval, sample_interval)
+    chunk_count = max(1, math.ceil(duration / chunk_s))
+    max_concurrency = max(1, min(chunk_count, max_concurrency))
+
+    waves = math.ceil(chunk_count / max_concurrency)
+    return {
+        "ChunkDurationS": chunk_s,
+        "ChunkCount": chunk_count,
+        "MaxConcurrency": max_concurrency,
+        "EstimatedWallS": round(waves * (chunk_overhead_s + min(chunk_s, duration) * frames_per_s * (sample_cost_s + dedup_cost_s)), 1),
+    }
+
 def get_video_metadata(event, file_path):
     video_file_name = event["Request"]["Video"]["S3Object"]["Key"].split('/')[-1]
     thumbnail_local_path = f'{local_path}thumbnail.jpg'
@@ -99,32 +292,94 @@ def get_video_metadata(event, file_path):
     thumbnail_s3_key = f'{event["Request"]["Video"]["S3Object"]["Key"].replace(video_file_name, "thumbnail.jpeg")}'
     task_id = event["Request"].get("TaskId")
 
-    video_clip = VideoFileClip(file_path)    
-    # Get thumbnail - avoid black screen
-    for i in range(0, int(video_clip.duration)):
-        # Get frame and store on local disk
-        video_clip.save_frame(thumbnail_local_path, t=i)
-        # Upload to S3
+    # Probe container headers once. The result is stored on the task for downstream stages
+    with instrumentation.stage(instrumentation.STAGE_DECODE):
+        probe = video_probe.probe_video(file_path)
+
+        # The clip is only used to read thumbnail frames, audio is not needed
+        video_clip = moviepy.VideoFileClip(file_path, audio=False)
+        # Get thumbnail - avoid black screen. Frames are scored locally, the model is only an optional tie-break
+        thumbnail_t, tiebreak_candidates = select_thumbnail_time(video_clip)
+    uploaded_t = None
+    if THUMBNAIL_MODEL_TIEBREAK and tiebreak_candidates:
+        for t in tiebreak_candidates:
+            video_clip.save_frame(thumbnail_local_path, t=t)
+            s3.upload_file(thumbnail_local_path, thumbnail_s3_bucket, thumbnail_s3_key)
+            uploaded_t = t
+            if is_single_color_frame(task_id, t, thumbnail_s3_bucket, thumbnail_s3_key) == True:
+                thumbnail_t = t
+                break
+    if uploaded_t != thumbnail_t:
+        video_clip.save_frame(thumbnail_local_path, t=thumbnail_t)
         s3.upload_file(thumbnail_local_path, thumbnail_s3_bucket, thumbnail_s3_key)
-        
-        # Check if image is black frame
-        is_black_frame = is_single_color_frame(task_id, i, thumbnail_s3_bucket, thumbnail_s3_key)
-        if is_black_frame is not None and is_black_frame == True:
-            break
     
     # construct metadata
     metadata = {
         'Size': os.path.getsize(file_path),
-        'Resolution': video_clip.size,
-        'Duration': video_clip.duration,
-        'Fps': video_clip.fps,
+        'Resolution': probe["Resolution"] or video_clip.size,
+        'Duration': probe["Duration"] or video_clip.duration,
+        'Fps': probe["Fps"] or video_clip.fps,
+        'Codec': probe["Codec"],
+        'HasAudio': probe["HasAudio"],
+        'KeyframesS': probe["KeyframesS"],
         'NameFormat': file_path.split('.')[-1],
         'ThumbnailS3Bucket': thumbnail_s3_bucket,
         'ThumbnailS3Key': thumbnail_s3_key,
     }
+    video_clip.close()
 
     return metadata
 
+def score_thumbnail_frame(frame):
+    """
+    Score a video frame as a thumbnail candidate (0-1) using luminance variance,
+    edge density and histogram entropy on a downscaled grayscale copy.
+    Solid or near-blank frames score 0.
+    """
+    step = max(1, frame.shape[1] // THUMBNAIL_SCORE_WIDTH)
+    small = frame[::step, ::step, :3].astype(np.float32)
+    luma = small[:, :, 0] * 0.299 + small[:, :, 1] * 0.587 + small[:, :, 2] * 0.114
+
+    luma_std = float(luma.std())
+    hist, _ = np.histogram(luma, bins=32, range=(0, 256))
+    p = hist[hist > 0] / luma.size
+    entropy = float(-(p * np.log2(p)).sum()) / 5  # normalized by log2(32)
+    if luma_std < THUMBNAIL_MIN_LUMA_STD or entropy < THUMBNAIL_MIN_ENTROPY:
+        return 0
+
+    gradient = np.abs(np.diff(luma, axis=0))[:, :-1] + np.abs(np.diff(luma, axis=1))[:-1, :]
+    edge_density = float((gradient > 20).mean())
+
+    return 0.4 * min(luma_std / 64, 1) + 0.3 * min(edge_density * 5, 1) + 0.3 * entropy
+
+def select_thumbnail_time(video_clip):
+    """
+    Pick the thumbnail timestamp from one pass over candidate frames: one per second at the
+    start of the video, plus evenly spread samples to skip long black or blank intros.
+    Returns the first candidate above the score threshold, otherwise the best scored ones.
+    """
+    duration = int(video_clip.duration)
+    candidates = list(range(0, min(duration, THUMBNAIL_SCAN_HEAD_S)))
+    candidates += [int(duration * i / 10) for i in range(1, 10) if int(duration * i / 10) >= THUMBNAIL_SCAN_HEAD_S]
+    if not candidates:
+        candidates = [0]
+
+    scored = []
+    for t in candidates:
+        try:
+            score = score_thumbnail_frame(video_clip.get_frame(t))
+        except Exception as ex:
+            print(ex)
+            continue
+        if score >= THUMBNAIL_SCORE_THRESHOLD:
+            return t, []
+        scored.append((score, t))
+
+    scored.sort(reverse=True)
+    if not scored:
+        return 0, []
+    return scored[0][1], [t for _, t in scored[:THUMBNAIL_MODEL_TIEBREAK_CANDIDATES]]
+
 def bedrock_converse(config, max_retries=3, retry_delay=1, image_s3_bucket=None, image_s3_key=None):
     inference_config = config.get("inferConfig")
     if not inference_config:
@@ -159,19 +414,20 @@ def bedrock_converse(config, max_retries=3, retry_delay=1, image_s3_bucket=None,
                         })
 
             # Call Bedrock Converse
-            if config.get("toolConfig"):
-                response = bedrock.converse(
-                    modelId=config["modelId"],
-                    messages=messages,
-                    inferenceConfig=inference_config,
-                    toolConfig=config["toolConfig"]
-                )
-            else:
-                response = bedrock.converse(
-                    modelId=config["modelId"],
-                    messages=messages,
-                    inferenceConfig=inference_config,
-                )
+            with instrumentation.stage(instrumentation.STAGE_MODEL_CALL):
+                if config.get("toolConfig"):
+                    response = bedrock.converse(
+                        modelId=config["modelId"],
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                        toolConfig=config["toolConfig"]
+                    )
+                else:
+                    response = bedrock.converse(
+                        modelId=config["modelId"],
+                        messages=messages,
+                        inferenceConfig=inference_config,
+                    )
             #print(parse_converse_response(response))
             if response["ResponseMetadata"]["HTTPStatusCode"] != 200:
                 raise Exception(f"API request failed: {response['ResponseMetadata']['HTTPStatusCode']}")
@@ -250,7 +506,8 @@ def is_single_color_frame(task_id, index, thumbnail_s3_bucket, thumbnail_s3_key)
             total_tokens = response["usage"]["totalTokens"]
 
             # store to the usage table
-            update_usage_to_db(task_id, index, "thumbnail", MODEL_ID_IMAGE_UNDERSTANDING, input_tokens, output_tokens, total_tokens)
+            usage = update_usage_to_db(task_id, index, "thumbnail", MODEL_ID_IMAGE_UNDERSTANDING, input_tokens, output_tokens, total_tokens)
+            data_size_repo.add(task_id, "dynamodb_usage_tracking", data_access.estimate_item_size(usage), 1)
 
         return output is None or output.get("result") == True
     except Exception as ex:
@@ -269,5 +526,5 @@ def update_usage_to_db(task_id, index, name, model_id, input_tokens, output_toke
         "output_tokens": output_tokens,
         "total_tokens": total_tokens
     }
-    utils.dynamodb_table_upsert(DYNAMO_VIDEO_USAGE_TABLE, usage)    
+    usage_repo.put(usage)    
     return usage
\ No newline at end of file
@@ -1,9 +1,9 @@
 import json
-import boto3
+import lambda_runtime
 import uuid
-import utils
 import os
 from datetime import datetime, timezone
+import data_access
 
 TRANSCRIBE_JOB_PREFIX = os.environ.get("TRANSCRIBE_JOB_PREFIX")
 TRANSCRIBE_OUTPUT_BUCKET = os.environ.get('TRANSCRIBE_OUTPUT_BUCKET')
@@ -12,8 +12,11 @@ TRANSCRIBE_OUTPUT_PREFIX = os.environ.get('TRANSCRIBE_OUTPUT_PREFIX')
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
 
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
-transcribe = boto3.client('transcribe', region_name=AWS_REGION)
+transcribe = lambda_runtime.client('transcribe', region_name=AWS_REGION)
 
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+
+@lambda_runtime.handler
 def lambda_handler(event, context):
     if not event\
             or "Request" not in event:
@@ -24,10 +27,19 @@ def lambda_handler(event, context):
     
     # Get task Id. Create a new one if not provided.
     task_id = event["Request"].get("TaskId")
+
+    # A transcription job reads a complete media file: a streaming upload is waited for by the state machine
+    event.pop("UploadPending", None)
+    upload = (task_repo.get(task_id) or {}).get("Upload") or {}
+    if upload.get("Aborted"):
+        raise Exception("The upload of the video was aborted")
+    if upload.get("Streaming") == True and upload.get("Complete") != True:
+        event["UploadPending"] = True
+        return event
     
     transcribe_output_key = f'tasks/{task_id}/{TRANSCRIBE_OUTPUT_PREFIX}/{task_id}_transcribe.json'
 
-    # Upsert DB
+    # Upsert DB. The vision branch writes MetaData concurrently, so an existing task only gets the fields of this stage
     doc = {
         "Id": task_id,
         "Request": event["Request"],
@@ -38,7 +50,11 @@ def lambda_handler(event, context):
         },
         "Status": "processing"
     }
-    utils.dynamodb_table_upsert(DYNAMO_VIDEO_TASK_TABLE, doc)
+    if task_repo.get(task_id):
+        task_repo.update(task_id, {"Status": doc["Status"]})
+        task_repo.update_metadata(task_id, doc["MetaData"])
+    else:
+        task_repo.put(doc)
 
     job_name = TRANSCRIBE_JOB_PREFIX + task_id[0:10]
 
@@ -64,7 +80,9 @@ def lambda_handler(event, context):
                 Subtitles = {
                     'Formats': ['vtt'],
                     'OutputStartIndex': 1 
-                }
+                },
+                # Used by the job state change handler to resolve the task
+                Tags = [{'Key': 'TaskId', 'Value': task_id}]
             ) 
         event["TranscriptionJob"] = {"TranscriptionJobName": response["TranscriptionJob"]["TranscriptionJobName"]}
     except Exception as ex:
@@ -1,17 +1,26 @@
 import json
-import boto3
+import lambda_runtime
+import instrumentation
 import os
-import utils
-import re
+import transcript_parser
+import data_access
 
 DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
 DYNAMO_VIDEO_TRANS_TABLE = os.environ.get("DYNAMO_VIDEO_TRANS_TABLE")
 DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+DYNAMO_VIDEO_USAGE_ROLLUP_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_ROLLUP_TABLE")
+DYNAMO_VIDEO_DATA_SIZE_TABLE = os.environ.get("DYNAMO_VIDEO_DATA_SIZE_TABLE")
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+transcript_repo = data_access.TranscriptRepository(DYNAMO_VIDEO_TRANS_TABLE)
+usage_repo = data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE, DYNAMO_VIDEO_USAGE_ROLLUP_TABLE)
+data_size_repo = data_access.DataSizeRepository(DYNAMO_VIDEO_DATA_SIZE_TABLE)
 
 TRANSCRIPTION_S3_PREFIX_TEMPLATE = "tasks/{task_id}/transcribe/"
 
-s3 = boto3.client('s3')
+s3 = lambda_runtime.client('s3')
 
+@lambda_runtime.handler
 def lambda_handler(event, context):
     #print(json.dumps(event))
     if not event or "Request" not in event:
@@ -29,6 +38,7 @@ def lambda_handler(event, context):
             'statusCode': 400,
             'body': f'Invalid request'
         }
+    instrumentation.set_task(task_id)
     s3_prefix = TRANSCRIPTION_S3_PREFIX_TEMPLATE.format(task_id=task_id)
     
 
@@ -36,28 +46,21 @@ def lambda_handler(event, context):
     trans_key, vtt_key = None, None
     response = s3.list_objects_v2(Bucket=s3_bucket, Prefix=s3_prefix)
     if 'Contents' in response:
+        # Transcribe writes the output files directly, record their size here. The listing holds every
+        # output file, so the counter is set rather than added to and a retry or reprocess does not count twice
+        file_sizes = [c["Size"] for c in response["Contents"] if not c["Key"].endswith('/')]
+        if file_sizes:
+            data_size_repo.set(task_id, "transcribe", sum(file_sizes), len(file_sizes), max(file_sizes))
         for c in response["Contents"]:
             if c["Key"].endswith(".json"):
                 trans_key = c["Key"]
             elif c["Key"].endswith(".vtt"):
                 vtt_key = c["Key"]
 
-    # Get transcription result from S3
-    trans_data = None
-    if trans_key:
-        response = s3.get_object(Bucket=s3_bucket, Key=trans_key)
-        file_content = response['Body'].read().decode('utf-8')
-        trans_data = json.loads(file_content)
-    
-    # Get subtitle from S3
-    subtitle_data = None
-    if vtt_key:
-        subtitle_data = read_vtt(s3_bucket, vtt_key)
-    
     # Get task doc from db
     doc = None
     try:
-        doc = utils.dynamodb_get_by_id(DYNAMO_VIDEO_TASK_TABLE, id=task_id)
+        doc = task_repo.get(task_id)
     except Exception as ex:
         print('Doc does not exist',ex)
 
@@ -67,74 +70,57 @@ def lambda_handler(event, context):
             metadata = doc.get("MetaData", {})
             if "Audio" not in metadata:
                 metadata["Audio"] = {"Language": None}
-            if not metadata["Audio"].get("Language") and trans_data:
+            # Only fetch the transcript JSON when the language is still unknown
+            trans_data = None
+            if not metadata["Audio"].get("Language") and trans_key:
+                with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as stage:
+                    response = s3.get_object(Bucket=s3_bucket, Key=trans_key)
+                    trans_data = json.load(response['Body'])
+                    stage.add_bytes(response.get('ContentLength', 0))
+            if trans_data:
                 metadata["Audio"]["Language"] = trans_data["results"]["language_code"]
 
                 doc["MetaData"] = metadata
                 event["MetaData"] = metadata
                 doc["Id"] = task_id
             
-                # update DB: video_task
-                utils.dynamodb_table_upsert(DYNAMO_VIDEO_TASK_TABLE, utils.convert_to_dynamo_format(doc))
+                # update DB: video_task. Only MetaData.Audio, the vision branch writes MetaData concurrently
+                task_repo.update_metadata(task_id, {"Audio": metadata["Audio"]})
 
-                # update DB: usage
+            # update DB: usage. This step runs after every Transcribe job, including a reprocess of a task whose
+            # language is already known
+            if trans_key:
                 duration_s = metadata.get("VideoMetaData",{}).get("Duration", 0)
-                print("!!!!!", duration_s)
-                update_usage_to_db(task_id, "amazon_transcribe", duration_s)
+                usage, old_usage = update_usage_to_db(task_id, "amazon_transcribe", duration_s)
+                # A reprocess replaces the task's usage record
+                size = data_access.estimate_item_size(usage) - (data_access.estimate_item_size(old_usage) if old_usage else 0)
+                data_size_repo.add(task_id, "dynamodb_usage_tracking", size, 0 if old_usage else 1)
         except Exception as ex:
             print('Failed to update video task status',ex)
 
         # Update transciption to DB
         try:
-            # add transcription to db: video_transcription
-            if subtitle_data:
-                for sub in subtitle_data:
-                    sub["id"] = f"{task_id}_{sub['start_ts']}_{sub['end_ts']}"
-                    sub["task_id"] = task_id
-                    utils.dynamodb_table_upsert(DYNAMO_VIDEO_TRANS_TABLE, utils.convert_to_dynamo_format(sub))
+            # add transcription to db: video_transcription, streamed from the VTT cue by cue
+            if vtt_key:
+                record_stats = {"size": 0, "max_size": 0}
+                subtitles = iter_subtitle_records(task_id, s3_bucket, vtt_key, record_stats)
+                record_count = transcript_repo.put_many(subtitles)
+                # A rerun overwrites the records of the same cues, so the counter is set to this run's records
+                data_size_repo.set(task_id, "dynamodb_transcription", record_stats["size"], record_count, record_stats["max_size"])
         except Exception as ex:
             print('Failed to update transcription to DB',ex)
 
     return event
 
-def read_vtt(s3_bucket, s3_key):
-    # Read transcription file
-    s3_clientobj = s3.get_object(Bucket=s3_bucket, Key=s3_key)
-    s3_clientdata = s3_clientobj["Body"].read().decode("utf-8")
-
-    subtitles = []
-    blocks = re.split(r'\n{2,}', s3_clientdata.strip())
-    for block in blocks:
-        lines = block.split('\n')
-        if len(lines) <= 1:
-            continue
-        # Extract index, timecodes, and text
-        index = int(lines[0]) if lines and lines[0].isdigit() else None
-        timecodes = re.findall(r'(\d{2}:\d{2}:\d{2}\.\d{3}) --> (\d{2}:\d{2}:\d{2}\.\d{3})', lines[1])
-        text = '\n'.join(lines[2:]).strip() if len(lines) > 2 else None
-
-        if index is not None and timecodes and text is not None:
-            start_ts, end_ts = timecodes[0]
-            subtitles.append({
-                "start_ts": convert_timestamp_to_ms(start_ts),
-                "end_ts": convert_timestamp_to_ms(end_ts),
-                "transcription": text
-            })
-    return subtitles
-
-def convert_timestamp_to_ms(timestamp):
-    try:
-        # Split the timestamp into hours, minutes, seconds, and milliseconds
-        hours, minutes, seconds_ms = timestamp.split(':')
-        seconds, milliseconds = seconds_ms.split('.')
-        
-        # Convert to float and format the result
-        result = float(hours) * 3600 + float(minutes) * 60 + float(seconds) + float(f"0.{milliseconds}")
-        
-        return round(result, 2)  # Round to 2 decimal places
-    except ValueError as e:
-        print(f"Error converting timestamp: {e}")
-        return None
+def iter_subtitle_records(task_id, s3_bucket, s3_key, record_stats):
+    # Yield transcription DB records from the streamed VTT, tracking their estimated size
+    for sub in transcript_parser.iter_s3_vtt_cues(s3, s3_bucket, s3_key):
+        sub["id"] = f"{task_id}_{sub['start_ts']}_{sub['end_ts']}"
+        sub["task_id"] = task_id
+        size = data_access.estimate_item_size(sub)
+        record_stats["size"] += size
+        record_stats["max_size"] = max(record_stats["max_size"], size)
+        yield sub
 
 def update_usage_to_db(task_id, model_id, duration_s):
     usage = {
@@ -146,5 +132,5 @@ def update_usage_to_db(task_id, model_id, duration_s):
         "model_id": model_id,
         "duration_s": duration_s
     }
-    utils.dynamodb_table_upsert(DYNAMO_VIDEO_USAGE_TABLE, usage)    
-    return usage
\ No newline at end of file
+    # Returns the record it replaced, if any
+    return usage, usage_repo.put(usage)
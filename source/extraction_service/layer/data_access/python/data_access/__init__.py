@@ -0,0 +1,13 @@
+# Shared data access for the extraction service Lambdas (deployed as a layer)
+from .codec import encode, decode, estimate_item_size
+from .fingerprints import STAGE_DEPENDENCIES, STAGE_FINGERPRINT_SETTINGS, get_stage_fingerprints, get_stale_stages
+from .repository import (
+    Repository,
+    TaskRepository,
+    TaskQueueRepository,
+    FrameRepository,
+    ShotRepository,
+    TranscriptRepository,
+    DataSizeRepository,
+    UsageRepository,
+)
@@ -0,0 +1,143 @@
+# DynamoDB document codec
+# encode: Python -> DynamoDB. float -> Decimal of its shortest repr, NaN/Infinity -> None
+# decode: DynamoDB -> Python. Decimal -> int when integral else float, set -> list
+# Documents are walked iteratively: containers are copied at C speed and only values whose type
+# needs converting are patched, using a per-type dispatch cache. Large homogeneous lists
+# (embedding vectors, score lists) are converted in one map() pass.
+import json
+import math
+from decimal import Decimal
+
+CODEC_BULK_MIN_ITEMS = 64
+
+_DICT, _LIST = "dict", "list"
+
+
+def _encode_float(value):
+    return Decimal(repr(value)) if math.isfinite(value) else None
+
+
+def _decode_decimal(value):
+    number = float(value)
+    return int(value) if number.is_integer() else number
+
+
+def _decode_set(value):
+    return [_decode_decimal(v) if isinstance(v, Decimal) else v for v in value]
+
+
+def _encode_floats(values):
+    if not all(map(math.isfinite, values)):
+        return None
+    return list(map(Decimal, map(repr, values)))
+
+
+def _decode_decimals(values):
+    floats = list(map(float, values))
+    if any(map(float.is_integer, floats)):
+        return None
+    return floats
+
+
+class _Dispatch:
+    """Map a value type to dict, list, None (kept as is) or a scalar converter. Subclasses are resolved once and cached."""
+
+    def __init__(self, scalars, bulk):
+        self.scalars = scalars
+        self.bulk = bulk
+        self.cache = {dict: _DICT, list: _LIST, tuple: _LIST, str: None, int: None, bool: None, type(None): None}
+        self.cache.update(scalars)
+
+    def resolve(self, value_type):
+        handler = None
+        if issubclass(value_type, dict):
+            handler = _DICT
+        elif issubclass(value_type, (list, tuple)):
+            handler = _LIST
+        else:
+            for base, converter in self.scalars.items():
+                if issubclass(value_type, base):
+                    handler = converter
+                    break
+        self.cache[value_type] = handler
+        return handler
+
+
+_ENCODE = _Dispatch({float: _encode_float}, {float: _encode_floats})
+_DECODE = _Dispatch({Decimal: _decode_decimal, set: _decode_set, frozenset: _decode_set}, {Decimal: _decode_decimals})
+
+
+def _convert_list(value, dispatch):
+    # Bulk path: a large list of one scalar type is converted in a single pass
+    if len(value) >= CODEC_BULK_MIN_ITEMS:
+        types = set(map(type, value))
+        if len(types) == 1:
+            value_type = types.pop()
+            if value_type in dispatch.bulk:
+                converted = dispatch.bulk[value_type](value)
+                if converted is not None:
+                    return converted, False
+            elif dispatch.cache.get(value_type, _DICT) is None:
+                return list(value), False
+    return list(value), True
+
+
+def _walk(item, dispatch):
+    cache = dispatch.cache
+    resolve = dispatch.resolve
+
+    handler = cache[type(item)] if type(item) in cache else resolve(type(item))
+    if handler is _DICT:
+        root = dict(item)
+    elif handler is _LIST:
+        root, pending = _convert_list(item, dispatch)
+        if not pending:
+            return root
+    elif handler is None:
+        return item
+    else:
+        return handler(item)
+
+    stack = [root]
+    while stack:
+        target = stack.pop()
+        for key, value in (target.items() if type(target) is dict else enumerate(target)):
+            value_type = type(value)
+            handler = cache[value_type] if value_type in cache else resolve(value_type)
+            if handler is None:
+                continue
+            if handler is _DICT:
+                child = target[key] = dict(value)
+                stack.append(child)
+            elif handler is _LIST:
+                child, pending = _convert_list(value, dispatch)
+                target[key] = child
+                if pending:
+                    stack.append(child)
+            else:
+                target[key] = handler(value)
+    return root
+
+
+def encode(item):
+    """
+    Convert a document (dict, list or scalar) to the DynamoDB format. The input is not modified.
+    """
+    return _walk(item, _ENCODE)
+
+
+def decode(item):
+    """
+    Convert a document read from DynamoDB to plain Python (JSON serializable) types. The input is not modified.
+    """
+    return _walk(item, _DECODE)
+
+
+def estimate_item_size(item):
+    """
+    Estimate the stored size of a document in bytes, as the length of its JSON form. Used for the data size counters.
+    """
+    try:
+        return len(json.dumps(item, default=str).encode('utf-8'))
+    except Exception:
+        return 0
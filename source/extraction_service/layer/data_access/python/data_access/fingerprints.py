@@ -0,0 +1,67 @@
+# Stage fingerprints of a task request
+# A hash of the request settings each workflow stage depends on, stored on the task when it completes and compared
+# on Reprocess to re-run only the stages whose settings changed.
+import json
+import hashlib
+from decimal import Decimal
+
+# Stages that consume the output of another stage are re-run with it
+STAGE_DEPENDENCIES = {
+    "Dedup": ["Sample"],
+    "Frame": ["Sample", "Dedup"],
+    "Understanding": ["Shot"],
+    "Embedding": ["Shot"],
+}
+
+# Request settings each workflow stage depends on, per task type
+STAGE_FINGERPRINT_SETTINGS = {
+    "frame": {
+        "Sample": [["PreProcessSetting", "SampleMode"], ["PreProcessSetting", "SampleIntervalS"]],
+        "Dedup": [["PreProcessSetting", "SmartSample"], ["PreProcessSetting", "SimilarityMethod"], ["PreProcessSetting", "SimilarityThreshold"]],
+        "Frame": [["ExtractionSetting", "Vision", "Frame"]],
+        "Transcribe": [["ExtractionSetting", "Audio"]],
+    },
+    "clip": {
+        "Shot": [["PreProcessSetting"]],
+        "Understanding": [["ExtractionSetting", "Vision", "Shot", "Understanding"]],
+        "Embedding": [["ExtractionSetting", "Vision", "Shot", "Embedding"]],
+        "Transcribe": [["ExtractionSetting", "Audio"]],
+    }
+}
+
+def get_stage_fingerprints(request):
+    """
+    Hash the settings each workflow stage depends on.
+    Returns {stage: fingerprint} for the task type of the request.
+    """
+    def normalize(value):
+        # Numbers read back from DynamoDB are Decimal, hash every number as a float
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        elif isinstance(value, list):
+            return [normalize(v) for v in value]
+        elif isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            return float(value)
+        return value
+
+    fingerprints = {}
+    for stage, paths in STAGE_FINGERPRINT_SETTINGS.get(request.get("TaskType", "frame"), {}).items():
+        values = []
+        for path in paths:
+            value = request
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            values.append(normalize(value))
+        fingerprints[stage] = hashlib.sha256(json.dumps(values, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return fingerprints
+
+def get_stale_stages(request, fingerprints):
+    """
+    Compare the stage fingerprints of the request with the ones stored on the task.
+    Returns {stage: True/False}, a stage is stale when its settings or an upstream stage changed.
+    """
+    stale_stages = {stage: fingerprints.get(stage) != fingerprint for stage, fingerprint in get_stage_fingerprints(request).items()}
+    for stage, upstream in STAGE_DEPENDENCIES.items():
+        if stage in stale_stages and any(stale_stages.get(u) for u in upstream):
+            stale_stages[stage] = True
+    return stale_stages
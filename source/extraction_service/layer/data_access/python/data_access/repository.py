@@ -0,0 +1,679 @@
+# Typed DynamoDB repositories, one per extraction service table
+# Documents are encoded on write and decoded on read with the shared codec, so every Lambda
+# reads and writes numbers the same way.
+import os
+import itertools
+import lambda_runtime
+import instrumentation
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Iterable, Iterator, Optional
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from . import codec
+
+dynamodb = lambda_runtime.resource('dynamodb')
+
+
+class Repository:
+    """
+    Access to one DynamoDB table.
+    Subclasses set the table name environment variable, the key schema and the task_id index.
+    """
+    table_env: Optional[str] = None
+    key_name: str = "Id"
+    sort_key_name: Optional[str] = None
+    task_index: Optional[str] = None
+    task_index_sort_key: Optional[str] = None
+
+    def __init__(self, table_name: Optional[str] = None, key_name: Optional[str] = None, sort_key_name: Optional[str] = None):
+        self.table_name = table_name or (os.environ.get(self.table_env) if self.table_env else None)
+        if key_name:
+            self.key_name = key_name
+        if sort_key_name:
+            self.sort_key_name = sort_key_name
+        self._table = None
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = dynamodb.Table(self.table_name)
+        return self._table
+
+    def key(self, id: str, sort_key: Optional[str] = None) -> dict:
+        key = {self.key_name: id}
+        if self.sort_key_name:
+            key[self.sort_key_name] = sort_key
+        return key
+
+    def get(self, id: str, sort_key: Optional[str] = None) -> Optional[dict]:
+        """Get a document by key, or None if it does not exist or the read failed."""
+        try:
+            response = self.table.get_item(Key=self.key(id, sort_key))
+            if 'Item' in response:
+                return codec.decode(response['Item'])
+            print(f"No item found in {self.table_name} with id: {id}")
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.get: {e}")
+        return None
+
+    def put(self, document: dict) -> Optional[dict]:
+        """Insert or replace a document. Returns the DynamoDB response, or None on error."""
+        try:
+            with instrumentation.stage(instrumentation.STAGE_DB_WRITE):
+                return self.table.put_item(Item=codec.encode(document))
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.put: {e}")
+            return None
+
+    def put_if(self, document: dict, condition: str, names: Optional[dict] = None, values: Optional[dict] = None) -> bool:
+        """
+        Insert or replace a document if the condition holds on the stored one, e.g. a status check.
+        Returns False if it does not. Other errors are raised, the caller cannot tell what is stored.
+        """
+        params = {"ConditionExpression": condition}
+        if names:
+            params["ExpressionAttributeNames"] = names
+        if values:
+            params["ExpressionAttributeValues"] = codec.encode(values)
+        try:
+            with instrumentation.stage(instrumentation.STAGE_DB_WRITE):
+                self.table.put_item(Item=codec.encode(document), **params)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def create(self, document: dict) -> bool:
+        """Insert a document that does not exist yet. Returns False if a document with its key exists."""
+        return self.put_if(document, f"attribute_not_exists({self.key_name})")
+
+    def put_many(self, documents: Iterable[dict]) -> int:
+        """
+        Write documents with a batch writer (25 items per request). Documents are consumed lazily,
+        so a generator can be loaded in bounded memory. Returns the number of documents written.
+        """
+        count = 0
+        overwrite_by_pkeys = [k for k in (self.key_name, self.sort_key_name) if k]
+        with instrumentation.stage(instrumentation.STAGE_DB_WRITE, calls=0) as stage:
+            with self.table.batch_writer(overwrite_by_pkeys=overwrite_by_pkeys) as batch:
+                for document in documents:
+                    batch.put_item(Item=codec.encode(document))
+                    count += 1
+            stage.calls = (count + 24) // 25
+        return count
+
+    def update(self, id: str, fields: dict, sort_key: Optional[str] = None, must_exist: bool = False) -> Optional[dict]:
+        """
+        Set top level fields of an existing document. With must_exist, a deleted document is not
+        re-created with only these fields, and None is returned.
+        """
+        if not fields:
+            return None
+        names = {f"#f{i}": k for i, k in enumerate(fields)}
+        values = {f":f{i}": v for i, v in enumerate(codec.encode(list(fields.values())))}
+        params = {}
+        if must_exist:
+            params["ConditionExpression"] = f"attribute_exists({self.key_name})"
+        try:
+            with instrumentation.stage(instrumentation.STAGE_DB_WRITE):
+                return self.table.update_item(
+                    Key=self.key(id, sort_key),
+                    UpdateExpression="SET " + ", ".join(f"#f{i} = :f{i}" for i in range(len(fields))),
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values,
+                    **params
+                )
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.update: {e}")
+            return None
+
+    def delete(self, id: str, sort_key: Optional[str] = None) -> None:
+        try:
+            self.table.delete_item(Key=self.key(id, sort_key))
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.delete: {e}")
+
+    def delete_if(self, id: str, sort_key: Optional[str], condition: str, names: Optional[dict] = None, values: Optional[dict] = None) -> bool:
+        """Delete a document if the condition holds on it. Returns False if it does not, other errors are raised."""
+        params = {"ConditionExpression": condition}
+        if names:
+            params["ExpressionAttributeNames"] = names
+        if values:
+            params["ExpressionAttributeValues"] = codec.encode(values)
+        try:
+            self.table.delete_item(Key=self.key(id, sort_key), **params)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def delete_by_task(self, task_id: str, sort_value: Optional[str] = None) -> int:
+        """Delete the documents of a task found through the task_id index, 25 per request. Returns the number deleted."""
+        count = 0
+        key_names = [k for k in (self.key_name, self.sort_key_name) if k]
+        with instrumentation.stage(instrumentation.STAGE_DB_WRITE, calls=0) as stage:
+            with self.table.batch_writer(overwrite_by_pkeys=key_names) as batch:
+                for document in self.query_by_task(task_id, sort_value, ProjectionExpression=", ".join(f"#k{i}" for i in range(len(key_names))),
+                                                   ExpressionAttributeNames={f"#k{i}": k for i, k in enumerate(key_names)}):
+                    batch.delete_item(Key={k: document[k] for k in key_names})
+                    count += 1
+            stage.calls = (count + 24) // 25
+        return count
+
+    def query_by_task(self, task_id: str, sort_value: Optional[str] = None, **kwargs) -> Iterator[dict]:
+        """Yield the decoded documents of a task from the task_id index, page by page."""
+        condition = Key('task_id').eq(task_id)
+        if sort_value is not None and self.task_index_sort_key:
+            condition = condition & Key(self.task_index_sort_key).eq(sort_value)
+        params = {'KeyConditionExpression': condition, **kwargs}
+        if self.task_index:
+            params['IndexName'] = self.task_index
+        while True:
+            response = self.table.query(**params)
+            for item in response.get('Items', []):
+                yield codec.decode(item)
+            if not response.get('LastEvaluatedKey'):
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def count_by_task(self, task_id: str, sort_value: Optional[str] = None) -> int:
+        """Count the documents of a task from the task_id index, every page."""
+        condition = Key('task_id').eq(task_id)
+        if sort_value is not None and self.task_index_sort_key:
+            condition = condition & Key(self.task_index_sort_key).eq(sort_value)
+        params = {'KeyConditionExpression': condition, 'Select': 'COUNT'}
+        if self.task_index:
+            params['IndexName'] = self.task_index
+        count = 0
+        while True:
+            response = self.table.query(**params)
+            count += response.get('Count', 0)
+            if not response.get('LastEvaluatedKey'):
+                return count
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def page_by_task(self, task_id: str, start_index: int, page_size: int) -> list:
+        """Return page_size documents of a task from start_index, in the order of the task_id index."""
+        return list(itertools.islice(self.query_by_task(task_id), start_index, start_index + page_size))
+
+    def scan_page(self, projection: str, start_key: Optional[dict] = None, limit: int = 100) -> tuple:
+        """
+        Scan one page of up to limit decoded documents, reading only the projected attributes.
+        Returns the documents and the key to continue from, None after the last page.
+        """
+        params = {"ProjectionExpression": projection, "Limit": limit}
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        response = self.table.scan(**params)
+        return [codec.decode(item) for item in response.get("Items", [])], response.get("LastEvaluatedKey")
+
+    def scan(self, projection: str, attribute_names: Optional[dict] = None, limit: int = 1000) -> list:
+        """
+        Scan up to limit decoded documents, reading only the projected attributes.
+        Used to sample history, documents are not returned in any particular order.
+        """
+        documents = []
+        params = {"ProjectionExpression": projection}
+        if attribute_names:
+            params["ExpressionAttributeNames"] = attribute_names
+        try:
+            while len(documents) < limit:
+                response = self.table.scan(**params)
+                documents += [codec.decode(item) for item in response.get("Items", [])]
+                if "LastEvaluatedKey" not in response:
+                    break
+                params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.scan: {e}")
+        return documents[:limit]
+
+
+class TaskRepository(Repository):
+    table_env = "DYNAMO_VIDEO_TASK_TABLE"
+
+    SEARCH_PROJECTION = "Id, #r.FileName, #r.TaskName, #r.#n, #r.TaskType, RequestTs, RequestBy, #s, #m.VideoMetaData.ThumbnailS3Bucket, #m.VideoMetaData.ThumbnailS3Key"
+    SEARCH_NAMES = {"#r": "Request", "#n": "Name", "#s": "Status", "#m": "MetaData"}
+
+    def search(self, keyword: str, limit: int = 1000) -> list:
+        """
+        Return up to limit tasks whose file name or task name contains the keyword (case-insensitive).
+        Only the attributes of the task list are read.
+        """
+        keyword = (keyword or "").lower()
+        tasks = []
+        params = {"ProjectionExpression": self.SEARCH_PROJECTION, "ExpressionAttributeNames": self.SEARCH_NAMES}
+        while len(tasks) < limit:
+            response = self.table.scan(**params)
+            for task in codec.decode(response.get("Items", [])):
+                request = task.get("Request", {})
+                if keyword in (request.get("FileName") or "").lower() or keyword in (request.get("TaskName") or "").lower():
+                    tasks.append(task)
+            if "LastEvaluatedKey" not in response:
+                break
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        return tasks[:limit]
+
+    def update_status(self, task_id: str, status: str) -> Optional[dict]:
+        return self.update(task_id, {"Status": status})
+
+    def update_metadata(self, task_id: str, fields: dict) -> Optional[dict]:
+        """
+        Set fields of the MetaData map of a task, e.g. {"Audio": {"Language": "en-US"}}.
+        The vision and audio branches write MetaData concurrently, so only the given fields are replaced.
+        """
+        if not fields:
+            return None
+        encoded = codec.encode(fields)
+        names = {"#m": "MetaData", **{f"#f{i}": k for i, k in enumerate(encoded)}}
+        values = {f":f{i}": v for i, v in enumerate(encoded.values())}
+        try:
+            with instrumentation.stage(instrumentation.STAGE_DB_WRITE):
+                try:
+                    return self.table.update_item(
+                        Key=self.key(task_id),
+                        UpdateExpression="SET " + ", ".join(f"#m.#f{i} = :f{i}" for i in range(len(encoded))),
+                        ConditionExpression=f"attribute_exists({self.key_name})",
+                        ExpressionAttributeNames=names,
+                        ExpressionAttributeValues=values,
+                    )
+                except ClientError as e:
+                    # ValidationException: the MetaData map does not exist yet
+                    if e.response["Error"]["Code"] != "ValidationException":
+                        raise
+                return self.table.update_item(
+                    Key=self.key(task_id),
+                    UpdateExpression="SET #m = if_not_exists(#m, :m)",
+                    ConditionExpression=f"attribute_exists({self.key_name})",
+                    ExpressionAttributeNames={"#m": "MetaData"},
+                    ExpressionAttributeValues={":m": encoded},
+                )
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.update_metadata: {e}")
+            return None
+
+    def add_metadata_counter(self, task_id: str, group: str, name: str, amount: float) -> None:
+        """
+        Add to a counter of a MetaData group, e.g. ("VideoFrameS3", "TotalFramesSampled", 12).
+        Concurrent chunks add to the same task, so the counter is incremented in place.
+        """
+        try:
+            with instrumentation.stage(instrumentation.STAGE_DB_WRITE):
+                self.table.update_item(
+                    Key=self.key(task_id),
+                    UpdateExpression="SET #m.#g.#c = if_not_exists(#m.#g.#c, :zero) + :n",
+                    ConditionExpression=f"attribute_exists({self.key_name})",
+                    ExpressionAttributeNames={"#m": "MetaData", "#g": group, "#c": name},
+                    ExpressionAttributeValues={":zero": 0, ":n": codec.encode(amount)},
+                )
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.add_metadata_counter: {e}")
+
+    def add_metrics(self, task_id: str, counters: dict) -> None:
+        """
+        Add counters to the Metrics map of a task, e.g. {"download_ms": 812.5, "download_bytes": 10485760}.
+        Concurrent Map iterations add to the same task, so every counter is incremented in place.
+        """
+        if not counters:
+            return
+        counters = codec.encode(counters)
+        names = {"#m": "Metrics", **{f"#c{i}": k for i, k in enumerate(counters)}}
+        values = {":zero": 0, **{f":c{i}": v for i, v in enumerate(counters.values())}}
+        for _ in range(2):
+            try:
+                self.table.update_item(
+                    Key=self.key(task_id),
+                    UpdateExpression="SET " + ", ".join(f"#m.#c{i} = if_not_exists(#m.#c{i}, :zero) + :c{i}" for i in range(len(counters))),
+                    ConditionExpression=f"attribute_exists({self.key_name})",
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values,
+                )
+                return
+            except ClientError as e:
+                code = e.response["Error"]["Code"]
+                if code == "ConditionalCheckFailedException":
+                    # Task deleted
+                    return
+                # ValidationException: the Metrics map does not exist yet
+                if code != "ValidationException":
+                    raise
+            try:
+                self.table.update_item(
+                    Key=self.key(task_id),
+                    UpdateExpression="SET #m = :m",
+                    ConditionExpression=f"attribute_exists({self.key_name}) AND attribute_not_exists(#m)",
+                    ExpressionAttributeNames={"#m": "Metrics"},
+                    ExpressionAttributeValues={":m": counters},
+                )
+                return
+            except ClientError as e:
+                # Created by a concurrent writer, add to it
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+
+
+class TaskQueueRepository(Repository):
+    table_env = "DYNAMO_VIDEO_TASK_QUEUE_TABLE"
+    status_index = "queue_status-enqueue_ts-index"
+
+    def query_by_status(self, queue_status: str, limit: Optional[int] = None) -> list:
+        """Read queue entries with the given status, oldest first."""
+        items = []
+        params = {'IndexName': self.status_index, 'KeyConditionExpression': Key('queue_status').eq(queue_status)}
+        while True:
+            response = self.table.query(**params)
+            items.extend(codec.decode(response.get('Items', [])))
+            if not response.get('LastEvaluatedKey') or (limit and len(items) >= limit):
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return items[:limit] if limit else items
+
+    def transition(self, task_id: str, from_status: str, to_status: str, attributes: Optional[dict] = None) -> bool:
+        """
+        Move a queue entry between statuses. The conditional write makes the transition
+        happen at most once when several scheduler rounds overlap.
+        Returns True if the entry was updated.
+        """
+        update_expression = "SET queue_status = :to"
+        values = {':to': to_status, ':from': from_status}
+        for i, (name, value) in enumerate((attributes or {}).items()):
+            update_expression += f", {name} = :v{i}"
+            values[f':v{i}'] = value
+        try:
+            with instrumentation.stage(instrumentation.STAGE_DB_WRITE):
+                self.table.update_item(
+                    Key=self.key(task_id),
+                    UpdateExpression=update_expression,
+                    ConditionExpression="queue_status = :from",
+                    ExpressionAttributeValues=codec.encode(values)
+                )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+
+class FrameRepository(Repository):
+    table_env = "DYNAMO_VIDEO_FRAME_TABLE"
+    key_name = "id"
+    sort_key_name = "task_id"
+    task_index = "task_id-timestamp-index"
+
+
+class ShotRepository(Repository):
+    table_env = "DYNAMO_VIDEO_SHOT_TABLE"
+    key_name = "id"
+    sort_key_name = "task_id"
+    task_index = "task_id-analysis_type-index"
+    task_index_sort_key = "analysis_type"
+    shot_index = "task_id-index-index"
+
+    def get_by_index(self, task_id: str, index: int) -> Optional[dict]:
+        """Get the first shot document of a task with the given shot index, or None."""
+        try:
+            response = self.table.query(IndexName=self.shot_index, KeyConditionExpression=Key('task_id').eq(task_id) & Key('index').eq(index))
+            items = response.get('Items', [])
+            if items:
+                return codec.decode(items[0])
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.get_by_index: {e}")
+        return None
+
+
+class TranscriptRepository(Repository):
+    table_env = "DYNAMO_VIDEO_TRANS_TABLE"
+    key_name = "id"
+    sort_key_name = "task_id"
+    task_index = "task_id-start_ts-index"
+
+
+class DataSizeRepository(Repository):
+    table_env = "DYNAMO_VIDEO_DATA_SIZE_TABLE"
+    key_name = "task_id"
+    sort_key_name = "data_type"
+
+    # S3 data types and their prefixes
+    S3_PREFIXES = {
+        'video_frame': 'tasks/{task_id}/video_frame_/',
+        'frame_outputs': 'tasks/{task_id}/frame_outputs/',
+        'frame_analysis': 'tasks/{task_id}/frame_analysis/',
+        'shot_clip': 'tasks/{task_id}/shot_clip/',
+        'shot_outputs': 'tasks/{task_id}/shot_outputs/',
+        'shot_vector': 'tasks/{task_id}/shot_vector/',
+        'transcribe': 'tasks/{task_id}/transcribe/'
+    }
+
+    def add(self, task_id: str, data_type: str, size: int, file_count: int, max_file_size: int = 0) -> Optional[dict]:
+        """
+        Atomically add to the per-task data size counters read by the get-data-size API.
+        Negative values are used when objects or records are removed. Every write bumps the
+        counter's version, so reconcile does not overwrite an increment made while it calculates.
+        """
+        if not self.table_name or not task_id or (not size and not file_count):
+            return None
+        key = self.key(task_id, data_type)
+        values = {':size': int(size), ':count': int(file_count), ':one': 1}
+        try:
+            with instrumentation.stage(instrumentation.STAGE_DB_WRITE):
+                if max_file_size and max_file_size > 0:
+                    try:
+                        return self.table.update_item(
+                            Key=key,
+                            UpdateExpression="ADD #size :size, file_count :count, version :one SET max_file_size = :max",
+                            ConditionExpression="attribute_not_exists(max_file_size) OR max_file_size < :max",
+                            ExpressionAttributeNames={'#size': 'size'},
+                            ExpressionAttributeValues={**values, ':max': int(max_file_size)},
+                        )
+                    except ClientError as e:
+                        # The current max is already larger, only add the counters
+                        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                            raise
+                return self.table.update_item(
+                    Key=key,
+                    UpdateExpression="ADD #size :size, file_count :count, version :one",
+                    ExpressionAttributeNames={'#size': 'size'},
+                    ExpressionAttributeValues=values,
+                )
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.add: {e}")
+            return None
+
+    def set(self, task_id: str, data_type: str, size: int, file_count: int, max_file_size: int = 0) -> Optional[dict]:
+        """Overwrite the per-task data size counter for a data type with a known value, e.g. on a retry."""
+        if not self.table_name or not task_id:
+            return None
+        try:
+            with instrumentation.stage(instrumentation.STAGE_DB_WRITE):
+                return self.table.update_item(
+                    Key=self.key(task_id, data_type),
+                    UpdateExpression="SET #size = :size, file_count = :count, max_file_size = :max ADD version :one",
+                    ExpressionAttributeNames={'#size': 'size'},
+                    ExpressionAttributeValues={':size': int(size), ':count': int(file_count), ':max': int(max_file_size), ':one': 1},
+                )
+        except Exception as e:
+            print(f"An error occurred, {type(self).__name__}.set: {e}")
+            return None
+
+    def query(self, task_id: str) -> dict:
+        """Return the counters of a task, data type to size, file_count and max_file_size."""
+        return {item['data_type']: {
+                    'size': item.get('size', 0),
+                    'file_count': item.get('file_count', 0),
+                    'max_file_size': item.get('max_file_size', 0)
+                } for item in self.query_by_task(task_id)}
+
+    def calculate(self, task_id: str, s3, s3_bucket: str, repositories: dict) -> dict:
+        """
+        Calculate the data size breakdown of a task by listing every S3 object and DynamoDB record.
+        This is the slow path used by reconcile.
+
+        Parameters:
+        - s3: S3 client
+        - s3_bucket: Name of the S3 data bucket
+        - repositories: Data type to the repository of its table, e.g. {"frame_analysis": FrameRepository()}
+
+        Returns:
+        - Dictionary of data type to size, file_count and max_file_size, for data types with files or records
+        """
+        data_breakdown = {}
+        paginator = s3.get_paginator('list_objects_v2')
+        for data_type, prefix in self.S3_PREFIXES.items():
+            sizes = [obj['Size'] for page in paginator.paginate(Bucket=s3_bucket, Prefix=prefix.format(task_id=task_id))
+                     for obj in page.get('Contents', []) if not obj['Key'].endswith('/')]
+            if sizes:
+                data_breakdown[data_type] = {'size': sum(sizes), 'file_count': len(sizes), 'max_file_size': max(sizes)}
+
+        for data_type, repository in repositories.items():
+            if isinstance(repository, TaskRepository):
+                documents = [document for document in [repository.get(task_id)] if document]
+            else:
+                documents = repository.query_by_task(task_id)
+            sizes = [codec.estimate_item_size(document) for document in documents]
+            if sizes:
+                data_breakdown[f'dynamodb_{data_type}'] = {'size': sum(sizes), 'file_count': len(sizes), 'max_file_size': max(sizes)}
+        return data_breakdown
+
+    def reconcile(self, task_id: str, s3, s3_bucket: str, repositories: dict) -> dict:
+        """
+        Recalculate the breakdown of a task and overwrite its counters, removing the counters of data types
+        which no longer exist. A counter written by a workflow Lambda while the breakdown is calculated keeps
+        its value, it is repaired by the next reconcile.
+
+        Parameters: as calculate
+
+        Returns:
+        - The calculated breakdown
+        """
+        # Read the versions first, any later add or set changes them
+        versions = {item['data_type']: item.get('version') for item in self.query_by_task(task_id)}
+        data_breakdown = self.calculate(task_id, s3, s3_bucket, repositories)
+
+        skipped = []
+        for data_type in set(versions) | set(data_breakdown):
+            if data_type not in versions:
+                condition, values = f"attribute_not_exists({self.key_name})", None
+            elif versions[data_type] is None:
+                condition, values = "attribute_not_exists(version)", None
+            else:
+                condition, values = "version = :v", {':v': versions[data_type]}
+            try:
+                if data_type in data_breakdown:
+                    info = data_breakdown[data_type]
+                    stored = self.put_if({
+                        'task_id': task_id,
+                        'data_type': data_type,
+                        'size': int(info['size']),
+                        'file_count': int(info['file_count']),
+                        'max_file_size': int(info['max_file_size']),
+                        'version': (versions.get(data_type) or 0) + 1
+                    }, condition, values=values)
+                else:
+                    stored = self.delete_if(task_id, data_type, condition, values=values)
+            except Exception as e:
+                print(f"An error occurred, {type(self).__name__}.reconcile: {e}")
+                stored = False
+            if not stored:
+                skipped.append(data_type)
+        if skipped:
+            print(f"Data size counters of task {task_id} changed while reconciling, kept: {', '.join(sorted(skipped))}")
+        return data_breakdown
+
+
+class UsageRepository(Repository):
+    table_env = "DYNAMO_VIDEO_USAGE_TABLE"
+    key_name = "id"
+    sort_key_name = "task_id"
+    task_index = "task_id-type-index"
+    task_index_sort_key = "type"
+
+    ROLLUP_COUNTERS = ["input_tokens", "output_tokens", "number_of_image", "duration_s"]
+
+    def __init__(self, table_name: Optional[str] = None, rollup_table_name: Optional[str] = None):
+        super().__init__(table_name)
+        self.rollup_table_name = rollup_table_name or os.environ.get("DYNAMO_VIDEO_USAGE_ROLLUP_TABLE")
+
+    def put(self, usage: dict) -> Optional[dict]:
+        """
+        Write a usage record and atomically add it to the usage rollups read by the get-usage-summary API.
+        - task#{task_id} / {model_id}#{type}: the difference to the record it replaces, so retried and
+          reprocessed runs keep the task rollup equal to the sum of the task's usage records
+        - day#{YYYY-MM-DD} / {model_id}#{type}: the full record, every call made that day is billed
+        Returns the replaced record, if any.
+        """
+        try:
+            with instrumentation.stage(instrumentation.STAGE_DB_WRITE):
+                old = self.table.put_item(Item=codec.encode(usage), ReturnValues="ALL_OLD").get("Attributes")
+        except Exception as e:
+            print(f"An error occurred, UsageRepository.put: {e}")
+            return None
+        if not self.rollup_table_name:
+            return old
+
+        task_id = usage["task_id"]
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        try:
+            task_deltas = {}
+            if old:
+                self._add_counters(task_deltas, old, -1)
+            self._add_counters(task_deltas, usage, 1)
+            for (model_id, usage_type), counters in task_deltas.items():
+                self._rollup_add(f"task#{task_id}", model_id, usage_type, counters, {"task_id": task_id})
+
+            day_counters = {}
+            self._add_counters(day_counters, usage, 1)
+            for (model_id, usage_type), counters in day_counters.items():
+                self._rollup_add(f"day#{day}", model_id, usage_type, counters, {"day": day})
+        except Exception as e:
+            print(f"An error occurred, UsageRepository.put rollup: {e}")
+        return old
+
+    def query_rollups(self, rollup_key: str) -> list:
+        """Read the rollups of a task (task#{task_id}) or a day (day#{YYYY-MM-DD}), one per model and usage type."""
+        table = dynamodb.Table(self.rollup_table_name)
+        items = []
+        params = {'KeyConditionExpression': Key('rollup_key').eq(rollup_key)}
+        while True:
+            response = table.query(**params)
+            items.extend(codec.decode(response.get('Items', [])))
+            if not response.get('LastEvaluatedKey'):
+                return items
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def delete_task_rollups(self, task_id: str) -> int:
+        """Delete the rollups of a task. The daily rollups keep the billed usage. Returns the number deleted."""
+        table = dynamodb.Table(self.rollup_table_name)
+        rollups = self.query_rollups(f"task#{task_id}")
+        with table.batch_writer() as batch:
+            for rollup in rollups:
+                batch.delete_item(Key={'rollup_key': rollup['rollup_key'], 'rollup_item': rollup['rollup_item']})
+        return len(rollups)
+
+    def _add_counters(self, rollups, record, sign):
+        counters = rollups.setdefault((record.get("model_id"), record.get("type")), {c: Decimal(0) for c in self.ROLLUP_COUNTERS + ["record_count"]})
+        for c in self.ROLLUP_COUNTERS:
+            counters[c] += sign * Decimal(str(record.get(c) or 0))
+        counters["record_count"] += sign
+
+    def _rollup_add(self, rollup_key, model_id, usage_type, counters, attributes):
+        counters = {c: v for c, v in counters.items() if v != 0}
+        if not counters:
+            return None
+        model_id, usage_type = model_id or "unknown", usage_type or "unknown"
+        names = {"#type": "type"}
+        values = {f":{c}": v for c, v in counters.items()}
+        values.update({":model_id": model_id, ":type": usage_type})
+        sets = ["model_id = :model_id", "#type = :type"]
+        for k, v in attributes.items():
+            names[f"#{k}"] = k
+            values[f":{k}"] = v
+            sets.append(f"#{k} = :{k}")
+        return dynamodb.Table(self.rollup_table_name).update_item(
+            Key={"rollup_key": rollup_key, "rollup_item": f"{model_id}#{usage_type}"},
+            UpdateExpression=f"ADD {', '.join(f'{c} :{c}' for c in counters)} SET {', '.join(sets)}",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
@@ -0,0 +1,367 @@
+# Compact binary store of the shot embeddings of a task
+# Shared by the shot embedding Lambda, the shot cleanup and delete Lambdas (as a layer) and the analytics sample tools.
+#
+# Each shot batch writes one shard under tasks/{task_id}/shot_vector/:
+#   shard_{first}_{last}.npy   rows x dim matrix in NumPy .npy format (float32, float16 or int8)
+#   shard_{first}_{last}.json  manifest: dtype, dim, the vector key, index and time range of every row, int8 scales
+# first and last are the shot index range assigned to the batch, not the shots that succeeded, so a retried batch
+# overwrites its shard whichever shots fail. Batches run concurrently, so a task has one shard per batch rather
+# than one appendable object. The manifests are also the list of S3 Vectors keys of the task.
+#
+# Writing needs only the standard library. Reading the matrices needs numpy: np.load(path, mmap_mode="r") maps a
+# downloaded shard, and read_shard() wraps downloaded bytes without copying them. read_vectors() fetches the rows of
+# a few shots with ranged GETs and no numpy, for re-ranking search candidates. It picks the shards holding the shots
+# from the index ranges in the listed names, and keeps the manifests it reads in a per-process cache by ETag.
+import ast
+import sys
+import math
+import json
+import struct
+import threading
+from array import array
+
+NPY_MAGIC = b"\x93NUMPY"
+NPY_ALIGNMENT = 64
+# .npy dtype descriptors of the supported storage types
+DTYPES = {"float32": "<f4", "float16": "<f2", "int8": "|i1"}
+ITEM_SIZES = {"float32": 4, "float16": 2, "int8": 1}
+DEFAULT_DTYPE = "float32"
+SHARD_PREFIX = "shard_"
+MANIFEST_VERSION = 1
+# Manifests kept by read_vectors across the invocations of a warm Lambda
+MANIFEST_CACHE_SIZE = 512
+
+_manifest_cache = {}
+_manifest_cache_lock = threading.Lock()
+
+
+def prefix(task_id):
+    return f"tasks/{task_id}/shot_vector/"
+
+
+def is_manifest_key(s3_key):
+    name = s3_key.split("/")[-1]
+    return name.startswith(SHARD_PREFIX) and name.endswith(".json")
+
+
+def shard_range(s3_key):
+    """
+    (first, last) shot index of a shard from its object key. last is None for shards named only after their first
+    shot, written before shards were named after the batch range, their range is only known from the manifest.
+    """
+    name = s3_key.split("/")[-1].split(".")[0][len(SHARD_PREFIX):]
+    parts = [int(part) for part in name.split("_")]
+    return parts[0], parts[1] if len(parts) > 1 else None
+
+
+def npy_header(descr, shape):
+    """Header of a version 1.0 .npy file, padded so the data starts 64-byte aligned."""
+    header = repr({"descr": descr, "fortran_order": False, "shape": tuple(shape)}).encode("latin1")
+    padding = NPY_ALIGNMENT - (len(NPY_MAGIC) + 4 + len(header) + 1) % NPY_ALIGNMENT
+    header += b" " * (padding % NPY_ALIGNMENT) + b"\n"
+    return NPY_MAGIC + b"\x01\x00" + struct.pack("<H", len(header)) + header
+
+
+def parse_npy_header(data):
+    """
+    Parse the header of .npy bytes.
+
+    Returns:
+    - (descr, shape, data_offset)
+    """
+    if bytes(data[:6]) != NPY_MAGIC:
+        raise ValueError("Not an .npy file")
+    major = data[6]
+    if major == 1:
+        header_len, offset = struct.unpack("<H", bytes(data[8:10]))[0], 10
+    else:
+        header_len, offset = struct.unpack("<I", bytes(data[8:12]))[0], 12
+    header = ast.literal_eval(bytes(data[offset:offset + header_len]).decode("latin1"))
+    if header.get("fortran_order"):
+        raise ValueError("Fortran ordered .npy files are not supported")
+    return header["descr"], tuple(header["shape"]), offset + header_len
+
+
+class ShardWriter:
+    """
+    Collects the embeddings of a shot batch and writes them as one shard.
+
+    Parameters:
+    - task_id: Task Id
+    - embedding_mode: Embedding mode of the vectors, e.g. AUDIO_VIDEO
+    - dtype: float32, float16 or int8 (symmetric per-vector quantization, the scales are kept in the manifest)
+    - index_range: (first, last) shot index of the batch, the shard name. Defaults to the range of the added rows
+    """
+    def __init__(self, task_id, embedding_mode, dtype=DEFAULT_DTYPE, index_range=None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        self.task_id = task_id
+        self.embedding_mode = embedding_mode
+        self.dtype = dtype
+        self.index_range = index_range
+        self.dim = None
+        self.rows = []
+        self.scales = []
+        self._data = bytearray()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def append(self, key, index, start_sec, end_sec, embedding):
+        if self.dim is None:
+            self.dim = len(embedding)
+        elif len(embedding) != self.dim:
+            raise ValueError(f"Embedding of shot {index} has {len(embedding)} dimensions, expected {self.dim}")
+        if self.dtype == "int8":
+            scale = max((abs(v) for v in embedding), default=0.0) / 127 or 1.0
+            self.scales.append(scale)
+            values = array("b", (max(-127, min(127, round(v / scale))) for v in embedding))
+        elif self.dtype == "float16":
+            values = struct.pack(f"<{len(embedding)}e", *embedding)
+        else:
+            values = array("f", embedding)
+        if isinstance(values, array) and sys.byteorder == "big":
+            values.byteswap()
+        self._data += values if isinstance(values, bytes) else values.tobytes()
+        self.rows.append({"key": key, "index": index, "startSec": start_sec, "endSec": end_sec})
+
+    def shard_name(self):
+        first, last = self.index_range or (min(row["index"] for row in self.rows), max(row["index"] for row in self.rows))
+        return f"{SHARD_PREFIX}{first:06d}_{last:06d}"
+
+    def manifest(self):
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "taskId": self.task_id,
+            "embeddingMode": self.embedding_mode,
+            "dtype": self.dtype,
+            "dim": self.dim,
+            "data": f"{self.shard_name()}.npy",
+            "offset": len(self._header()),
+            "rows": self.rows,
+        }
+        if self.dtype == "int8":
+            manifest["scales"] = self.scales
+        return manifest
+
+    def _header(self):
+        return npy_header(DTYPES[self.dtype], (len(self.rows), self.dim))
+
+    def npy_bytes(self):
+        return self._header() + bytes(self._data)
+
+    def put(self, s3, s3_bucket):
+        """
+        Upload the shard and its manifest. The manifest goes last, readers never see a manifest without its data.
+
+        Returns:
+        - Sizes in bytes of the uploaded objects
+        """
+        if not self.rows:
+            return []
+        name = prefix(self.task_id) + self.shard_name()
+        data = self.npy_bytes()
+        manifest = json.dumps(self.manifest()).encode("utf-8")
+        s3.put_object(Bucket=s3_bucket, Key=f"{name}.npy", Body=data, ContentType="application/octet-stream")
+        s3.put_object(Bucket=s3_bucket, Key=f"{name}.json", Body=manifest, ContentType="application/json")
+        return [len(data), len(manifest)]
+
+
+def list_objects(s3, s3_bucket, task_id):
+    keys = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=s3_bucket, Prefix=prefix(task_id)):
+        keys += [obj["Key"] for obj in page.get("Contents", [])]
+    return keys
+
+
+def read_manifests(s3, s3_bucket, task_id, keys=None):
+    """
+    Read the shard manifests of a task, ordered by first shot index.
+
+    Parameters:
+    - keys: Object keys under the shot_vector prefix if already listed
+    """
+    if keys is None:
+        keys = list_objects(s3, s3_bucket, task_id)
+    manifests = []
+    for key in sorted(k for k in keys if is_manifest_key(k)):
+        manifest = json.loads(s3.get_object(Bucket=s3_bucket, Key=key)["Body"].read())
+        manifest["s3Key"] = key
+        manifests.append(manifest)
+    return manifests
+
+
+def read_manifest(s3, s3_bucket, s3_key, etag=None):
+    """
+    Read a shard manifest, from the cache if it holds the listed version (ETag) of the object.
+    """
+    cached = _manifest_cache.get(s3_key)
+    if etag and cached and cached[0] == etag:
+        return cached[1]
+    response = s3.get_object(Bucket=s3_bucket, Key=s3_key)
+    manifest = json.loads(response["Body"].read())
+    manifest["s3Key"] = s3_key
+    if response.get("ETag"):
+        with _manifest_cache_lock:
+            _manifest_cache.pop(s3_key, None)
+            if len(_manifest_cache) >= MANIFEST_CACHE_SIZE:
+                _manifest_cache.pop(next(iter(_manifest_cache)))
+            _manifest_cache[s3_key] = (response["ETag"], manifest)
+    return manifest
+
+
+def shard_manifests_for(s3, s3_bucket, task_id, indexes):
+    """
+    Read the manifests of the shards of a task which may hold some of the shot indexes. The shard objects are listed,
+    the others are skipped by the index range in their names.
+    """
+    shards = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=s3_bucket, Prefix=prefix(task_id) + SHARD_PREFIX):
+        shards += [(obj["Key"], obj.get("ETag")) for obj in page.get("Contents", []) if is_manifest_key(obj["Key"])]
+    shards.sort()
+    manifests = []
+    for i, (key, etag) in enumerate(shards):
+        first, last = shard_range(key)
+        if last is None and i + 1 < len(shards):
+            # A shard named after its first shot ends before the next shard
+            last = shard_range(shards[i + 1][0])[0] - 1
+        if any(first <= index and (last is None or index <= last) for index in indexes):
+            manifests.append(read_manifest(s3, s3_bucket, key, etag))
+    return manifests
+
+
+def vector_keys(s3, s3_bucket, task_id, keys=None):
+    """
+    S3 Vectors keys of the shot embeddings of a task: the rows of the shard manifests, and the file names of the
+    per-shot JSON embeddings ({embed_type}_{index}.json) written before the shards.
+    """
+    if keys is None:
+        keys = list_objects(s3, s3_bucket, task_id)
+    vectors = [row["key"] for manifest in read_manifests(s3, s3_bucket, task_id, keys) for row in manifest["rows"]]
+    vectors += [f'{task_id}_{key.split("/")[-1][:-len(".json")]}' for key in keys
+                if key.endswith(".json") and not is_manifest_key(key)]
+    return vectors
+
+
+def truncate(embedding, dim):
+    """
+    First dim values of an embedding, L2 normalized. Nova multimodal embeddings are trained so that their leading
+    dimensions form a lower-dimension embedding of the same input, used for the coarse search index.
+    """
+    values = list(embedding[:dim])
+    norm = math.sqrt(sum(v * v for v in values))
+    return [v / norm for v in values] if norm else values
+
+
+def cosine_distance(a, b):
+    """Cosine distance as reported by S3 Vectors cosine indexes: 1 - cosine similarity."""
+    dot, norm_a, norm_b = 0.0, 0.0, 0.0
+    for x, y in zip(a, b):
+        dot += x * y
+        norm_a += x * x
+        norm_b += y * y
+    if not norm_a or not norm_b:
+        return 1.0
+    return 1.0 - dot / math.sqrt(norm_a * norm_b)
+
+
+def _decode_rows(data, manifest, first_row, count):
+    dtype, dim = manifest["dtype"], manifest["dim"]
+    rows = []
+    for i in range(count):
+        chunk = data[i * dim * ITEM_SIZES[dtype]:(i + 1) * dim * ITEM_SIZES[dtype]]
+        if dtype == "float16":
+            rows.append(list(struct.unpack(f"<{dim}e", chunk)))
+            continue
+        values = array("f" if dtype == "float32" else "b")
+        values.frombytes(chunk)
+        if dtype == "float32" and sys.byteorder == "big":
+            values.byteswap()
+        if dtype == "int8":
+            scale = manifest["scales"][first_row + i]
+            rows.append([v * scale for v in values])
+        else:
+            rows.append(values.tolist())
+    return rows
+
+
+def read_vectors(s3, s3_bucket, task_id, indexes, manifests=None):
+    """
+    Read the full precision embeddings of some shots of a task, with one ranged GET per shard holding them.
+    Only the manifests of the shards whose index range holds the shots are read, once per process.
+
+    Parameters:
+    - indexes: Shot indexes
+    - manifests: Shard manifests of the task if already read
+
+    Returns:
+    - {index: embedding as a list of floats}, shots without a stored embedding are left out
+    """
+    wanted = set(indexes)
+    if manifests is None:
+        manifests = shard_manifests_for(s3, s3_bucket, task_id, wanted)
+    vectors = {}
+    for manifest in manifests:
+        positions = [i for i, row in enumerate(manifest["rows"]) if row["index"] in wanted]
+        if not positions:
+            continue
+        data_key = manifest["s3Key"].rsplit("/", 1)[0] + "/" + manifest["data"]
+        offset = manifest.get("offset")
+        if offset is None:
+            head = s3.get_object(Bucket=s3_bucket, Key=data_key, Range=f"bytes=0-{4 * NPY_ALIGNMENT - 1}")["Body"].read()
+            offset = manifest["offset"] = parse_npy_header(head)[2]
+        row_size = manifest["dim"] * ITEM_SIZES[manifest["dtype"]]
+        first, last = positions[0], positions[-1]
+        start = offset + first * row_size
+        data = s3.get_object(Bucket=s3_bucket, Key=data_key, Range=f"bytes={start}-{start + (last - first + 1) * row_size - 1}")["Body"].read()
+        rows = _decode_rows(data, manifest, first, last - first + 1)
+        for position in positions:
+            vectors[manifest["rows"][position]["index"]] = rows[position - first]
+    return vectors
+
+
+def read_shard(data, manifest=None, dequantize=True):
+    """
+    Wrap the bytes of a .npy shard as a numpy matrix without copying them.
+
+    Parameters:
+    - data: Shard bytes, or a memoryview/mmap of them
+    - manifest: Shard manifest, needed to dequantize int8 shards
+    - dequantize: Return int8 shards as float32 (a copy) instead of the raw int8 codes
+
+    Returns:
+    - rows x dim numpy array
+    """
+    import numpy as np
+    descr, shape, offset = parse_npy_header(data)
+    matrix = np.frombuffer(data, dtype=np.dtype(descr), count=shape[0] * shape[1], offset=offset).reshape(shape)
+    if dequantize and matrix.dtype == np.int8 and manifest and "scales" in manifest:
+        return matrix.astype(np.float32) * np.asarray(manifest["scales"], dtype=np.float32)[:, None]
+    return matrix
+
+
+def load(s3, s3_bucket, task_id, dequantize=True):
+    """
+    Load all shot embeddings of a task.
+
+    Returns:
+    - (rows, matrix): the manifest rows in shot index order and the float32 numpy matrix (raw int8 codes
+      with dequantize=False), or ([], None) if the task has no shards
+    """
+    import numpy as np
+    rows, matrices = [], []
+    for manifest in read_manifests(s3, s3_bucket, task_id):
+        data_key = manifest["s3Key"].rsplit("/", 1)[0] + "/" + manifest["data"]
+        data = s3.get_object(Bucket=s3_bucket, Key=data_key)["Body"].read()
+        matrices.append(read_shard(data, manifest, dequantize))
+        rows += manifest["rows"]
+    if not matrices:
+        return [], None
+    matrix = np.concatenate(matrices) if len(matrices) > 1 else matrices[0]
+    order = sorted(range(len(rows)), key=lambda i: rows[i]["index"])
+    matrix = matrix[order]
+    if matrix.dtype == np.float16:
+        matrix = matrix.astype(np.float32)
+    return [rows[i] for i in order], matrix
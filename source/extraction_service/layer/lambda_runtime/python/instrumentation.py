@@ -0,0 +1,159 @@
+# Per-stage hot path metrics: duration, bytes transferred and remote call counts
+# Stages (download, decode, encode, upload, model_call, db_write, ...) are recorded during an invocation,
+# then flushed by @lambda_runtime.handler: one CloudWatch embedded metric format line per stage, and the
+# totals are added to the Metrics map of the task row so a task's time can be broken down per stage.
+import os
+import json
+import time
+import functools
+import threading
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "BedrockVideoUnderstanding")
+
+STAGE_DOWNLOAD = "download"
+STAGE_DECODE = "decode"
+STAGE_ENCODE = "encode"
+STAGE_UPLOAD = "upload"
+STAGE_MODEL_CALL = "model_call"
+STAGE_DB_WRITE = "db_write"
+
+_lock = threading.Lock()
+_stages = {}
+_task_id = None
+
+
+class Stage:
+    """
+    One timed execution of a stage. Add the bytes moved, and the remote calls made if more than one.
+    """
+    def __init__(self, name, calls=1):
+        self.name = name
+        self.bytes = 0
+        self.calls = calls
+        self._start = None
+
+    def add_bytes(self, size):
+        self.bytes += size or 0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, (time.perf_counter() - self._start) * 1000, self.bytes, self.calls, exc_type is not None)
+        return False
+
+
+def stage(name, calls=1):
+    """
+    Context manager timing a stage.
+
+    Example:
+        with instrumentation.stage(instrumentation.STAGE_DOWNLOAD) as s:
+            s3.download_file(bucket, key, path)
+            s.add_bytes(os.path.getsize(path))
+    """
+    return Stage(name, calls)
+
+
+def timed(name):
+    """Decorator timing every call of a function as one remote call of the stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name, duration_ms, size=0, calls=1, failed=False):
+    """Add a measurement to the stage totals of the current invocation. Safe to call from worker threads."""
+    with _lock:
+        totals = _stages.setdefault(name, {"duration_ms": 0.0, "bytes": 0, "calls": 0, "errors": 0})
+        totals["duration_ms"] += duration_ms
+        totals["bytes"] += size
+        totals["calls"] += calls
+        totals["errors"] += 1 if failed else 0
+
+
+def set_task(task_id):
+    """Set the task the current invocation works on. Its stage totals are added to the task row on flush."""
+    global _task_id
+    _task_id = task_id
+
+
+def emit(metrics, dimensions=None, properties=None, units=None):
+    """
+    Print one CloudWatch embedded metric format document.
+
+    Parameters:
+    - metrics: Metric name to value
+    - dimensions: Dimension name to value, FunctionName is always added
+    - properties: Extra fields logged with the metrics, not used as dimensions
+    - units: Metric name to CloudWatch unit, Milliseconds/Bytes/Count are derived from the name otherwise
+    """
+    dimensions = {"FunctionName": os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local"), **(dimensions or {})}
+    units = units or {}
+    document = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [list(dimensions)],
+                "Metrics": [{"Name": m, "Unit": units.get(m, _unit(m))} for m in metrics],
+            }],
+        },
+        **(properties or {}),
+        **dimensions,
+        **metrics,
+    }
+    print(json.dumps(document, default=str))
+
+
+def _unit(metric_name):
+    if metric_name.endswith("Ms"):
+        return "Milliseconds"
+    if metric_name.endswith("Bytes"):
+        return "Bytes"
+    return "Count"
+
+
+def flush():
+    """
+    Emit the stage totals of the current invocation and add them to the task row, then reset.
+    Called by @lambda_runtime.handler after every invocation.
+    """
+    global _task_id
+    with _lock:
+        stages, task_id = dict(_stages), _task_id
+        _stages.clear()
+        _task_id = None
+    if not stages:
+        return stages
+
+    properties = {"TaskId": task_id} if task_id else None
+    for name, totals in stages.items():
+        emit({
+                "DurationMs": round(totals["duration_ms"], 1),
+                "TransferBytes": totals["bytes"],
+                "Calls": totals["calls"],
+                "Errors": totals["errors"],
+            },
+            dimensions={"Stage": name},
+            properties=properties,
+        )
+
+    if task_id and os.environ.get("DYNAMO_VIDEO_TASK_TABLE"):
+        counters = {}
+        for name, totals in stages.items():
+            counters[f"{name}_ms"] = round(totals["duration_ms"], 1)
+            counters[f"{name}_bytes"] = totals["bytes"]
+            counters[f"{name}_calls"] = totals["calls"]
+        counters = {k: v for k, v in counters.items() if v}
+        try:
+            import data_access
+            data_access.TaskRepository().add_metrics(task_id, counters)
+        except Exception as ex:
+            print(f"Failed to add stage metrics to task {task_id}: {ex}")
+    return stages
@@ -0,0 +1,178 @@
+# Lambda startup profile: lazy heavy imports, shared pooled AWS clients, cold start and stage metrics
+# Shared by the extraction service Lambdas (as a layer). Map iterations are often cold starts, so work
+# done at module load (importing moviepy/cv2/numpy, creating clients) is paid again in every new container,
+# including on early-return paths that never use it.
+import os
+import time
+import functools
+import importlib
+import threading
+import instrumentation
+
+_INIT_START = time.perf_counter()
+
+import boto3
+from botocore.config import Config
+
+_BOTO3_IMPORT_MS = round((time.perf_counter() - _INIT_START) * 1000, 1)
+
+CLIENT_MAX_POOL_CONNECTIONS = int(os.environ.get("CLIENT_MAX_POOL_CONNECTIONS", 32))
+CLIENT_CONNECT_TIMEOUT_S = float(os.environ.get("CLIENT_CONNECT_TIMEOUT_S", 5))
+CLIENT_MAX_ATTEMPTS = int(os.environ.get("CLIENT_MAX_ATTEMPTS", 5))
+
+# Keep connections open between calls and invocations of a warm container, with a pool large enough
+# for the worker threads of the Lambdas that call Bedrock and S3 concurrently
+CLIENT_CONFIG = Config(
+    max_pool_connections=CLIENT_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=CLIENT_CONNECT_TIMEOUT_S,
+    retries={"max_attempts": CLIENT_MAX_ATTEMPTS, "mode": "standard"},
+)
+
+_lock = threading.Lock()
+_clients = {}
+_import_ms = {}
+_client_ms = {}
+_cold_start = True
+_client_factory = None
+
+
+class LazyModule:
+    """
+    Module proxy that imports the module on first attribute access.
+    Use for heavy modules (moviepy, cv2, numpy, PIL, scenedetect) that are not needed on every code path.
+    """
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    _import_ms[self._name] = round((time.perf_counter() - start) * 1000, 1)
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+
+class LazyClient:
+    """
+    AWS client or resource proxy, created on first use and shared by every proxy with the same arguments.
+    """
+    def __init__(self, kind, service_name, kwargs):
+        self.__dict__["_key"] = (kind, service_name, tuple(sorted(kwargs.items())))
+        self.__dict__["_target"] = None
+
+    def _load(self):
+        target = self.__dict__["_target"]
+        if target is None:
+            target = _create(*self._key)
+            self.__dict__["_target"] = target
+        return target
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy {self._key[0]} '{self._key[1]}'>"
+
+
+def lazy_import(name):
+    """
+    Return a proxy for the module name, imported on first attribute access.
+
+    Parameters:
+    - name: Module name, e.g. "cv2" or "PIL.Image"
+    """
+    return LazyModule(name)
+
+
+def client(service_name, **kwargs):
+    """
+    Return a shared boto3 client, created on first use with the pooled keep-alive configuration.
+
+    Parameters:
+    - service_name: AWS service name, e.g. "s3" or "bedrock-runtime"
+    - kwargs: Extra boto3.client arguments, e.g. region_name. A config is merged over the shared one.
+    """
+    return LazyClient("client", service_name, kwargs)
+
+
+def resource(service_name, **kwargs):
+    """
+    Return a shared boto3 resource, created on first use with the pooled keep-alive configuration.
+    """
+    return LazyClient("resource", service_name, kwargs)
+
+
+def set_client_factory(factory):
+    """
+    Create clients with factory(kind, service_name, kwargs) instead of boto3, e.g. local stand-ins for offline runs.
+    Clients created before are dropped. Pass None to go back to boto3.
+    """
+    global _client_factory
+    with _lock:
+        _client_factory = factory
+        _clients.clear()
+
+
+def _create(kind, service_name, kwargs):
+    key = (kind, service_name, kwargs)
+    target = _clients.get(key)
+    if target is not None:
+        return target
+
+    # boto3 sessions are not thread safe, create one client at a time
+    with _lock:
+        target = _clients.get(key)
+        if target is None:
+            start = time.perf_counter()
+            args = dict(kwargs)
+            if _client_factory is not None:
+                target = _client_factory(kind, service_name, args)
+            else:
+                args["config"] = CLIENT_CONFIG.merge(args["config"]) if args.get("config") else CLIENT_CONFIG
+                target = (boto3.client if kind == "client" else boto3.resource)(service_name, **args)
+            _client_ms[f"{kind}:{service_name}"] = round((time.perf_counter() - start) * 1000, 1)
+            _clients[key] = target
+    return target
+
+
+def handler(func):
+    """
+    Decorator for lambda_handler. After every invocation, flush the stage metrics recorded with instrumentation.
+    After the first invocation of a container, also emit the cold start profile: module load time, then the time
+    spent importing lazy modules and creating clients.
+    """
+    @functools.wraps(func)
+    def wrapper(event, context):
+        global _cold_start
+        cold_start, _cold_start = _cold_start, False
+        invoke_start = time.perf_counter()
+        try:
+            return func(event, context)
+        finally:
+            try:
+                instrumentation.flush()
+                if cold_start:
+                    instrumentation.emit({
+                            "InitMs": round((invoke_start - _INIT_START) * 1000, 1),
+                            "Boto3ImportMs": _BOTO3_IMPORT_MS,
+                            "LazyImportMs": round(sum(_import_ms.values()), 1),
+                            "ClientCreateMs": round(sum(_client_ms.values()), 1),
+                        },
+                        properties={"ImportMs": dict(_import_ms), "ClientMs": dict(_client_ms)},
+                    )
+            except Exception as ex:
+                print(f"Failed to emit metrics: {ex}")
+    return wrapper
@@ -0,0 +1,65 @@
+# Bedrock, embedding and Transcribe pricing
+# Shared by the API Lambdas (as a layer). The price list is the web UI pricing config
+# (source/frontend/web/src/resources/pricing-config.json), copied into the layer as pricing_config.json at synth time:
+# {region: {model_id: {usage_type: {"unit": "token"|"image"|"second", "price_per_...": ...}}}}
+import os
+import json
+
+PRICING_DEFAULT_REGION = "us-east-1"
+
+# In the layer, then in the source tree (local runs)
+PRICING_CONFIG_PATHS = [
+    os.path.join(os.path.dirname(__file__), "pricing_config.json"),
+    os.path.join(os.path.dirname(__file__), "../../../../frontend/web/src/resources/pricing-config.json"),
+]
+
+
+def load_pricing_config():
+    for path in PRICING_CONFIG_PATHS:
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+    raise FileNotFoundError(f"No pricing config found in {PRICING_CONFIG_PATHS}")
+
+
+REGIONAL_PRICING = load_pricing_config()
+
+def get_pricing(model_id, usage_type, region=None):
+    """
+    Return the price entry of a model and usage type, or None if it is not priced.
+    Regions without a price list fall back to the default region.
+    """
+    region_pricing = REGIONAL_PRICING.get(region) or REGIONAL_PRICING.get(PRICING_DEFAULT_REGION, {})
+    return region_pricing.get(model_id, {}).get(usage_type)
+
+
+def calculate_cost(model_id, usage_type, input_tokens=0, output_tokens=0, number_of_image=0, duration_s=0, region=None):
+    """
+    Calculate the cost (USD) of a usage. Arguments follow the video_usage record fields.
+
+    Returns:
+    - Cost in USD, or None if the model and usage type are not priced
+    """
+    pricing = get_pricing(model_id, usage_type, region)
+    if not pricing:
+        return None
+
+    unit = pricing.get("unit")
+    if unit == "token":
+        return float(input_tokens or 0) / 1000 * pricing["price_per_1k_input_tokens"] \
+            + float(output_tokens or 0) / 1000 * pricing["price_per_1k_output_tokens"]
+    elif unit == "image":
+        return float(number_of_image or 0) * pricing["price_per_image"]
+    elif unit == "second":
+        return float(duration_s or 0) * pricing["price_per_second"]
+    return None
+
+
+def calculate_record_cost(record, region=None):
+    # Cost of a video_usage record
+    return calculate_cost(record.get("model_id"), record.get("type"),
+        input_tokens=record.get("input_tokens"),
+        output_tokens=record.get("output_tokens"),
+        number_of_image=record.get("number_of_image"),
+        duration_s=record.get("duration_s"),
+        region=region)
@@ -0,0 +1,322 @@
+# Pre-flight estimate of a task request: frames or shots, model calls, tokens, cost and wall-clock time
+# Shared by estimate-task (returned to the caller) and start-task (admission limit and scheduler budgets), so a
+# request start-task rejects is the one estimate-task reports as over the limit.
+# The video metadata is taken, in order, from the request (VideoMetaData), from the existing task, from a
+# header-only probe of the S3 object or from its size. Tokens per call and the smart sampling keep ratio are
+# calibrated on historical usage and tasks.
+import os
+import math
+import time
+import statistics
+import lambda_runtime
+import pricing
+import data_access
+
+ffmpeg_reader = lambda_runtime.lazy_import("moviepy.video.io.ffmpeg_reader")
+
+DYNAMO_VIDEO_TASK_TABLE = os.environ.get("DYNAMO_VIDEO_TASK_TABLE")
+DYNAMO_VIDEO_USAGE_TABLE = os.environ.get("DYNAMO_VIDEO_USAGE_TABLE")
+MODEL_ID_IMAGE_UNDERSTANDING = os.environ.get("MODEL_ID_IMAGE_UNDERSTANDING")
+MODEL_ID_BEDROCK_MME = os.environ.get("MODEL_ID_BEDROCK_MME")
+TASK_MAX_ESTIMATED_REQUESTS = int(os.environ.get("TASK_MAX_ESTIMATED_REQUESTS", 50000))
+VIDEO_SAMPLE_CHUNK_TARGET_WALL_S = float(os.environ.get("VIDEO_SAMPLE_CHUNK_TARGET_WALL_S", 120))
+FRAME_EXTRACTION_MAX_WORKERS = int(os.environ.get("FRAME_EXTRACTION_MAX_WORKERS", 4))
+SHOT_BATCH_MAX_WORKERS = int(os.environ.get("SHOT_BATCH_MAX_WORKERS", 4))
+
+# Fallbacks when there is no history for a model or setting
+ESTIMATE_VIDEO_BITRATE_BPS = 4000000
+ESTIMATE_IMAGE_INPUT_TOKENS = 1500
+ESTIMATE_VIDEO_INPUT_TOKENS_PER_S = 300
+ESTIMATE_OUTPUT_TOKENS = 500
+ESTIMATE_SHOT_DURATION_S = 10
+ESTIMATE_SMART_SAMPLE_KEEP_RATIO = 0.5
+
+# Latency model (seconds), concurrency matches the workflow Map settings
+ESTIMATE_WORKFLOW_OVERHEAD_S = 30
+ESTIMATE_IMAGE_CALL_LATENCY_S = 2
+ESTIMATE_VIDEO_CALL_LATENCY_S = 6
+ESTIMATE_EMBEDDING_CALL_LATENCY_S = 1
+ESTIMATE_SHOT_DETECTION_REALTIME_FACTOR = 0.2
+ESTIMATE_TRANSCRIBE_REALTIME_FACTOR = 0.3
+FRAME_EXTRACTION_MAP_CONCURRENCY = 3
+SHOT_BATCH_MAP_CONCURRENCY = 3
+
+# Calibration on history, cached per container
+CALIBRATION_SCAN_LIMIT = 5000
+CALIBRATION_MIN_SAMPLES = 5
+CALIBRATION_TTL_S = 3600
+PROBE_URL_EXPIRY_S = 300
+
+task_repo = data_access.TaskRepository(DYNAMO_VIDEO_TASK_TABLE)
+usage_repo = data_access.UsageRepository(DYNAMO_VIDEO_USAGE_TABLE)
+
+s3 = lambda_runtime.client('s3')
+
+_calibration = {"loaded_at": 0, "tokens": {}, "keep_ratio": {}}
+
+
+def estimate_task(request, stale_stages=None):
+    """
+    Estimate a task request.
+
+    Parameters:
+    - request: The start-task request
+    - stale_stages: {stage: True/False} on Reprocess, only the stale stages are counted. None counts every stage.
+
+    Returns:
+    - The estimate with Stages, Total, Warnings, VideoMetaData, MaxRequests and ExceedsLimit,
+      or None if the video is unknown
+    """
+    task_type = request.get("TaskType", "frame")
+    video_metadata = get_video_metadata(request)
+    if not video_metadata:
+        return None
+
+    calibration = get_calibration()
+    if task_type == "clip":
+        estimate = estimate_clip_task(request, video_metadata, calibration, stale_stages)
+    else:
+        estimate = estimate_frame_task(request, video_metadata, calibration, stale_stages)
+
+    estimate["TaskType"] = task_type
+    estimate["VideoMetaData"] = video_metadata
+    estimate["MaxRequests"] = TASK_MAX_ESTIMATED_REQUESTS
+    estimate["ExceedsLimit"] = estimate["Total"]["Calls"] > TASK_MAX_ESTIMATED_REQUESTS
+    if estimate["ExceedsLimit"]:
+        estimate["Warnings"].append(f'{estimate["Total"]["Calls"]} model calls exceed the limit of {TASK_MAX_ESTIMATED_REQUESTS}, start-task will reject this request.')
+    return estimate
+
+
+def get_video_metadata(request):
+    """
+    Return {Duration, Size, Resolution, Source}, or None if the video is unknown.
+    """
+    metadata = request.get("VideoMetaData")
+    if metadata and metadata.get("Duration"):
+        return {
+            "Duration": float(metadata["Duration"]),
+            "Size": metadata.get("Size"),
+            "Resolution": metadata.get("Resolution"),
+            "Source": "request"
+        }
+
+    if request.get("TaskId"):
+        task = task_repo.get(request["TaskId"])
+        metadata = (task or {}).get("MetaData", {}).get("VideoMetaData")
+        if metadata and metadata.get("Duration"):
+            return {
+                "Duration": float(metadata["Duration"]),
+                "Size": metadata.get("Size"),
+                "Resolution": metadata.get("Resolution"),
+                "Source": "task"
+            }
+
+    s3_object = (request.get("Video") or {}).get("S3Object")
+    if not s3_object:
+        return None
+
+    # ffmpeg reads the container headers through ranged requests, the video is not downloaded
+    try:
+        url = s3.generate_presigned_url('get_object', Params={'Bucket': s3_object["Bucket"], 'Key': s3_object["Key"]}, ExpiresIn=PROBE_URL_EXPIRY_S)
+        infos = ffmpeg_reader.ffmpeg_parse_infos(url, decode_file=False)
+        duration = infos.get("video_duration", infos.get("duration"))
+        if duration:
+            return {
+                "Duration": float(duration),
+                "Size": None,
+                "Resolution": infos.get("video_size"),
+                "Source": "probe"
+            }
+    except Exception as ex:
+        print(f"Unable to probe the video: {ex}")
+
+    try:
+        size = s3.head_object(Bucket=s3_object["Bucket"], Key=s3_object["Key"])["ContentLength"]
+        return {
+            "Duration": size * 8 / ESTIMATE_VIDEO_BITRATE_BPS,
+            "Size": size,
+            "Resolution": None,
+            "Source": "size"
+        }
+    except Exception as ex:
+        print(f"Unable to read the video size: {ex}")
+    return None
+
+
+def get_calibration():
+    """
+    Calibrate tokens per call for each (usage type, model) on historical video_usage rows,
+    and the smart sampling keep ratio for each similarity method on completed frame tasks.
+    """
+    if time.time() - _calibration["loaded_at"] < CALIBRATION_TTL_S:
+        return _calibration
+
+    samples = {}
+    rows = usage_repo.scan("#t, model_id, input_tokens, output_tokens", {"#t": "type"}, CALIBRATION_SCAN_LIMIT)
+    for row in rows:
+        if row.get("input_tokens") is None:
+            continue
+        samples.setdefault((row.get("type"), row.get("model_id")), []).append((row["input_tokens"], row.get("output_tokens") or 0))
+    tokens = {}
+    for key, values in samples.items():
+        if len(values) >= CALIBRATION_MIN_SAMPLES:
+            tokens[key] = {
+                "InputTokens": statistics.median(v[0] for v in values),
+                "OutputTokens": statistics.median(v[1] for v in values),
+                "Samples": len(values)
+            }
+
+    ratios = {}
+    tasks = task_repo.scan("#s, #r.PreProcessSetting, #m.VideoFrameS3", {"#s": "Status", "#r": "Request", "#m": "MetaData"}, CALIBRATION_SCAN_LIMIT)
+    for task in tasks:
+        setting = task.get("Request", {}).get("PreProcessSetting") or {}
+        frames = task.get("MetaData", {}).get("VideoFrameS3") or {}
+        if task.get("Status") != "extraction_completed" or not setting.get("SmartSample") or not frames.get("TotalFramesPlaned"):
+            continue
+        ratios.setdefault(setting.get("SimilarityMethod"), []).append(min(1, float(frames.get("TotalFramesSampled") or 0) / float(frames["TotalFramesPlaned"])))
+    keep_ratio = {method: statistics.median(values) for method, values in ratios.items() if len(values) >= CALIBRATION_MIN_SAMPLES}
+
+    _calibration.update({"loaded_at": time.time(), "tokens": tokens, "keep_ratio": keep_ratio})
+    return _calibration
+
+
+def estimate_calls(stage, usage_type, model_id, calls, calibration, input_tokens=0, output_tokens=0, max_output_tokens=None, number_of_image=0, duration_s=0):
+    """
+    Estimate one stage. Token counts come from the calibration when history exists, otherwise the given defaults.
+    """
+    calibrated = calibration["tokens"].get((usage_type, model_id))
+    if calibrated and input_tokens:
+        input_tokens = calibrated["InputTokens"]
+        output_tokens = calibrated["OutputTokens"]
+    if max_output_tokens:
+        output_tokens = min(output_tokens, float(max_output_tokens))
+
+    usage = {
+        "Stage": stage,
+        "Type": usage_type,
+        "ModelId": model_id,
+        "Calls": int(math.ceil(calls)),
+        "InputTokens": int(calls * input_tokens),
+        "OutputTokens": int(calls * output_tokens),
+        "NumberOfImage": int(number_of_image),
+        "DurationS": round(duration_s, 1),
+        "Calibrated": calibrated is not None and bool(input_tokens),
+    }
+    usage["CostUsd"] = pricing.calculate_cost(model_id, usage_type, usage["InputTokens"], usage["OutputTokens"], number_of_image, duration_s)
+    return usage
+
+
+def is_stale(stale_stages, stage):
+    return stale_stages is None or stale_stages.get(stage, True)
+
+
+def estimate_transcribe(request, duration, stale_stages=None):
+    if not request.get("ExtractionSetting", {}).get("Audio", {}).get("Transcription") or not is_stale(stale_stages, "Transcribe"):
+        return [], 0
+    usage = {
+        "Stage": "Transcribe",
+        "Type": "transcribe",
+        "ModelId": "amazon_transcribe",
+        "Calls": 1,
+        "InputTokens": 0,
+        "OutputTokens": 0,
+        "NumberOfImage": 0,
+        "DurationS": round(duration, 1),
+        "Calibrated": False,
+        "CostUsd": pricing.calculate_cost("amazon_transcribe", "transcribe", duration_s=duration)
+    }
+    return [usage], duration * ESTIMATE_TRANSCRIBE_REALTIME_FACTOR
+
+
+def estimate_frame_task(request, video_metadata, calibration, stale_stages=None):
+    duration = video_metadata["Duration"]
+    setting = request.get("PreProcessSetting") or {}
+    sample_interval = max(float(setting.get("SampleIntervalS") or 1), 0.01)
+    planned = math.ceil(duration / sample_interval)
+
+    stages, warnings = [], []
+    frames, keep_ratio, keep_ratio_source = planned, 1, None
+    if setting.get("SmartSample"):
+        method = setting.get("SimilarityMethod")
+        keep_ratio = calibration["keep_ratio"].get(method)
+        keep_ratio_source = "history" if keep_ratio is not None else "default"
+        if keep_ratio is None:
+            keep_ratio = ESTIMATE_SMART_SAMPLE_KEEP_RATIO
+        frames = planned * keep_ratio
+        if method == "novamme" and is_stale(stale_stages, "Dedup"):
+            stages.append(estimate_calls("Dedup", "nova_mme_image", MODEL_ID_BEDROCK_MME, planned, calibration, number_of_image=planned))
+
+    frame_setting = request.get("ExtractionSetting", {}).get("Vision", {}).get("Frame") or {}
+    frame_calls = 0
+    if frame_setting.get("Enabled") != False and is_stale(stale_stages, "Frame"):
+        for config in frame_setting.get("PromptConfigs") or []:
+            stages.append(estimate_calls(f'Frame: {config.get("name")}', "image_understanding", config.get("modelId") or MODEL_ID_IMAGE_UNDERSTANDING, frames, calibration,
+                input_tokens=ESTIMATE_IMAGE_INPUT_TOKENS, output_tokens=ESTIMATE_OUTPUT_TOKENS,
+                max_output_tokens=(config.get("inferConfig") or {}).get("maxTokens")))
+            frame_calls += frames
+
+    # Sampling is planned to finish in about the target wall time, extraction calls run on the Map and worker threads
+    visual_wall_s = VIDEO_SAMPLE_CHUNK_TARGET_WALL_S + frame_calls * ESTIMATE_IMAGE_CALL_LATENCY_S / (FRAME_EXTRACTION_MAP_CONCURRENCY * FRAME_EXTRACTION_MAX_WORKERS)
+    audio, audio_wall_s = estimate_transcribe(request, duration, stale_stages)
+    stages += audio
+
+    result = summarize(stages, ESTIMATE_WORKFLOW_OVERHEAD_S + max(visual_wall_s, audio_wall_s), warnings)
+    result["Frames"] = {
+        "Planned": planned,
+        "AfterDedup": int(frames),
+        "DedupKeepRatio": round(keep_ratio, 3),
+        "DedupKeepRatioSource": keep_ratio_source
+    }
+    return result
+
+
+def estimate_clip_task(request, video_metadata, calibration, stale_stages=None):
+    duration = video_metadata["Duration"]
+    setting = request.get("PreProcessSetting") or {}
+    if setting.get("StartSec"):
+        duration = max(duration - float(setting["StartSec"]), 0)
+    if setting.get("LengthSec"):
+        duration = min(duration, float(setting["LengthSec"]))
+    shot_duration = float(setting.get("UseFixedLengthSec") or ESTIMATE_SHOT_DURATION_S)
+    shots = math.ceil(duration / max(shot_duration, float(setting.get("MinClipSec") or 0), 1))
+
+    stages, warnings = [], []
+    shot_setting = request.get("ExtractionSetting", {}).get("Vision", {}).get("Shot") or {}
+    call_latency_s = 0
+    understanding = shot_setting.get("Understanding") or {}
+    if understanding.get("Enabled") and is_stale(stale_stages, "Understanding"):
+        for config in understanding.get("PromptConfigs") or []:
+            stages.append(estimate_calls(f'Understanding: {config.get("name")}', "video_understanding", config.get("modelId"), shots, calibration,
+                input_tokens=shot_duration * ESTIMATE_VIDEO_INPUT_TOKENS_PER_S, output_tokens=ESTIMATE_OUTPUT_TOKENS,
+                max_output_tokens=(config.get("inferConfig") or {}).get("maxTokens")))
+            call_latency_s += ESTIMATE_VIDEO_CALL_LATENCY_S
+    embedding = shot_setting.get("Embedding") or {}
+    if embedding.get("Enabled") and is_stale(stale_stages, "Embedding"):
+        stages.append(estimate_calls("Embedding", "nova_mme_video", embedding.get("ModelId") or MODEL_ID_BEDROCK_MME, shots, calibration, duration_s=duration))
+        call_latency_s += ESTIMATE_EMBEDDING_CALL_LATENCY_S
+
+    # Each shot's prompts and embedding run concurrently within a batch
+    visual_wall_s = duration * ESTIMATE_SHOT_DETECTION_REALTIME_FACTOR + shots * call_latency_s / (SHOT_BATCH_MAP_CONCURRENCY * SHOT_BATCH_MAX_WORKERS)
+    audio, audio_wall_s = estimate_transcribe(request, video_metadata["Duration"], stale_stages)
+    stages += audio
+
+    result = summarize(stages, ESTIMATE_WORKFLOW_OVERHEAD_S + max(visual_wall_s, audio_wall_s), warnings)
+    result["Shots"] = shots
+    return result
+
+
+def summarize(stages, wall_s, warnings):
+    for stage in stages:
+        if stage["CostUsd"] is None:
+            warnings.append(f'No pricing for {stage["ModelId"]} ({stage["Type"]}), its cost is not included.')
+    return {
+        "Stages": stages,
+        "Total": {
+            "Calls": sum(s["Calls"] for s in stages if s["Type"] != "transcribe"),
+            "InputTokens": sum(s["InputTokens"] for s in stages),
+            "OutputTokens": sum(s["OutputTokens"] for s in stages),
+            "CostUsd": round(sum(s["CostUsd"] or 0 for s in stages), 6),
+            "EstimatedWallS": round(wall_s)
+        },
+        "Warnings": warnings
+    }
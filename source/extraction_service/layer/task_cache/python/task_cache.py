@@ -0,0 +1,67 @@
+# Per-container cache of workflow task documents
+# Shared by the workflow Lambdas (as a layer). Map iterations of the same task usually land on a warm
+# container, so the task document is read from DynamoDB once instead of once per iteration.
+import os
+import time
+import copy
+
+TASK_CACHE_TTL_S = float(os.environ.get("TASK_CACHE_TTL_S", 300))
+
+_cache = {}
+
+
+def new_version():
+    """
+    Return a new task version. Writers that change the task configuration or status set it on the task
+    and pass it downstream in the state payload, so cached copies of older versions are not used.
+    """
+    return str(int(time.time() * 1000))
+
+
+def get_task(task_id, loader, version=None):
+    """
+    Get a task document from the cache, or load it with loader() on a miss.
+
+    Parameters:
+    - task_id: Task Id
+    - loader: Callable returning the task document from the task table, or None
+    - version: Task version carried in the state payload. A cached copy with another version is reloaded.
+
+    Returns:
+    - A copy of the task document, safe to modify, or None if the task does not exist
+    """
+    entry = _cache.get(task_id)
+    if entry and time.time() - entry["loaded_at"] < TASK_CACHE_TTL_S \
+            and (version is None or entry["version"] == version):
+        return copy.deepcopy(entry["task"])
+
+    task = loader()
+    if task is None:
+        _cache.pop(task_id, None)
+        return None
+    put_task(task_id, task)
+    if version is not None and task.get("Version") != version:
+        # The payload is newer than the table read, do not keep the stale copy
+        _cache.pop(task_id, None)
+    return task
+
+
+def put_task(task_id, task):
+    """
+    Store a task document just written by this container.
+    """
+    _cache[task_id] = {
+        "task": copy.deepcopy(task),
+        "version": task.get("Version"),
+        "loaded_at": time.time(),
+    }
+
+
+def invalidate(task_id=None):
+    """
+    Drop a task, or all tasks, from the cache. Call after changing the task status.
+    """
+    if task_id is None:
+        _cache.clear()
+    else:
+        _cache.pop(task_id, None)
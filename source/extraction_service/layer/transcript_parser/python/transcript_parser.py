@@ -0,0 +1,69 @@
+# Streaming parser for Amazon Transcribe WebVTT subtitles
+# Shared by the transcription post-process Lambda (as a layer) and the analytics sample tools.
+
+TIMECODE_SEPARATOR = "-->"
+
+
+def timecode_to_s(timecode):
+    """
+    Convert a WebVTT timecode ("HH:MM:SS.mmm" or "MM:SS.mmm") to seconds, rounded to 2 decimals.
+    Returns None if the timecode is malformed.
+    """
+    try:
+        timecode = timecode.strip()
+        seconds_ms = timecode[-6:]
+        if seconds_ms[2] != "." or (len(timecode) > 6 and timecode[-7] != ":"):
+            return None
+        seconds = int(seconds_ms[0:2]) + int(seconds_ms[3:6]) / 1000
+        head = timecode[:-7]
+        if head:
+            parts = head.split(":")
+            if len(parts) == 1:
+                seconds += int(parts[0]) * 60
+            elif len(parts) == 2:
+                seconds += int(parts[0]) * 3600 + int(parts[1]) * 60
+            else:
+                return None
+        return round(seconds, 2)
+    except (ValueError, IndexError):
+        return None
+
+
+def iter_vtt_cues(lines):
+    """
+    Parse WebVTT cues one at a time from an iterable of lines (str or bytes).
+    Only the current cue is held in memory, so the input can be an S3 body stream.
+
+    Yields:
+        dict: {'start_ts': float, 'end_ts': float, 'transcription': str}
+    """
+    start_ts, end_ts, text = None, None, None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r\n")
+
+        if not line.strip():
+            # Blank line closes the current cue
+            if text:
+                yield {"start_ts": start_ts, "end_ts": end_ts, "transcription": "\n".join(text).strip()}
+            start_ts, end_ts, text = None, None, None
+        elif TIMECODE_SEPARATOR in line:
+            start, _, end = line.partition(TIMECODE_SEPARATOR)
+            # Drop cue settings following the end timecode, e.g. "align:start"
+            end = end.strip().split(" ", 1)[0]
+            start_ts, end_ts = timecode_to_s(start), timecode_to_s(end)
+            text = [] if start_ts is not None and end_ts is not None else None
+        elif text is not None:
+            text.append(line)
+
+    if text:
+        yield {"start_ts": start_ts, "end_ts": end_ts, "transcription": "\n".join(text).strip()}
+
+
+def iter_s3_vtt_cues(s3_client, s3_bucket, s3_key):
+    """
+    Stream a VTT object from S3 and yield its cues without reading the whole file into memory.
+    """
+    response = s3_client.get_object(Bucket=s3_bucket, Key=s3_key)
+    return iter_vtt_cues(response["Body"].iter_lines())
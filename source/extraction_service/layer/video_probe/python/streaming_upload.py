@@ -0,0 +1,104 @@
+# Streaming uploads: each part of the video is a separate S3 object, so the uploaded prefix of a fragmented MP4
+# can be processed before the upload completes. The parts are assembled into the video object on completion.
+import video_probe
+from concurrent.futures import ThreadPoolExecutor
+
+PARTS_SUFFIX = ".parts/"
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Parts are copied concurrently, the assembly runs within the API timeout
+ASSEMBLE_CONCURRENCY = 16
+
+def part_key(video_key, part_number):
+    return f"{video_key}{PARTS_SUFFIX}{part_number:05d}"
+
+def list_parts(s3, s3_bucket, video_key):
+    """
+    Return the contiguous uploaded parts from part 1, [{"PartNumber", "Key", "Size"}]. Parts after a missing one are
+    not readable as a prefix yet.
+    """
+    parts = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=s3_bucket, Prefix=video_key + PARTS_SUFFIX):
+        for obj in page.get('Contents', []):
+            number = obj['Key'].rsplit('/', 1)[-1]
+            if number.isdigit():
+                parts[int(number)] = {"PartNumber": int(number), "Key": obj['Key'], "Size": obj['Size']}
+
+    contiguous = []
+    while len(contiguous) + 1 in parts:
+        contiguous.append(parts[len(contiguous) + 1])
+    return contiguous
+
+class PrefixReader:
+    """Ranged reads over the contiguous parts, as one byte string."""
+    def __init__(self, s3, s3_bucket, parts):
+        self.s3 = s3
+        self.s3_bucket = s3_bucket
+        self.parts = parts
+        self.size = sum(p["Size"] for p in parts)
+
+    def read(self, offset, length):
+        data = b""
+        start = 0
+        for part in self.parts:
+            end = start + part["Size"]
+            if offset < end and offset + length > start:
+                first = max(offset, start) - start
+                last = min(offset + length, end) - start - 1
+                data += self.s3.get_object(Bucket=self.s3_bucket, Key=part["Key"], Range=f"bytes={first}-{last}")["Body"].read()
+            start = end
+        return data
+
+def scan(s3, s3_bucket, video_key, state=None):
+    """
+    Scan the fragments of the uploaded prefix from the state of the previous scan.
+
+    Returns:
+    - (state, size): the video_probe.scan_fragments state and the number of bytes of the prefix
+    """
+    reader = PrefixReader(s3, s3_bucket, list_parts(s3, s3_bucket, video_key))
+    return video_probe.scan_fragments(reader.read, reader.size, state), reader.size
+
+def download_prefix(s3, s3_bucket, video_key, file_path):
+    """
+    Download the contiguous uploaded parts as one local file. Returns the number of bytes written.
+    """
+    size = 0
+    with open(file_path, "wb") as f:
+        for part in list_parts(s3, s3_bucket, video_key):
+            for chunk in s3.get_object(Bucket=s3_bucket, Key=part["Key"])["Body"].iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+            size += part["Size"]
+    return size
+
+def assemble(s3, s3_bucket, video_key, part_count):
+    """
+    Copy the parts into the video object with a server-side multipart copy and delete them.
+    Returns False if a part is missing.
+    """
+    parts = list_parts(s3, s3_bucket, video_key)
+    if len(parts) < part_count:
+        return False
+
+    upload_id = s3.create_multipart_upload(Bucket=s3_bucket, Key=video_key)["UploadId"]
+    try:
+        def copy_part(part):
+            response = s3.upload_part_copy(Bucket=s3_bucket, Key=video_key, UploadId=upload_id, PartNumber=part["PartNumber"],
+                                           CopySource={"Bucket": s3_bucket, "Key": part["Key"]})
+            return {"ETag": response["CopyPartResult"]["ETag"], "PartNumber": part["PartNumber"]}
+        with ThreadPoolExecutor(max_workers=ASSEMBLE_CONCURRENCY) as executor:
+            copied = list(executor.map(copy_part, parts[:part_count]))
+        s3.complete_multipart_upload(Bucket=s3_bucket, Key=video_key, UploadId=upload_id, MultipartUpload={"Parts": copied})
+    except Exception:
+        s3.abort_multipart_upload(Bucket=s3_bucket, Key=video_key, UploadId=upload_id)
+        raise
+
+    delete_parts(s3, s3_bucket, video_key)
+    return True
+
+def delete_parts(s3, s3_bucket, video_key):
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=s3_bucket, Prefix=video_key + PARTS_SUFFIX):
+        objects = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+        if objects:
+            s3.delete_objects(Bucket=s3_bucket, Delete={'Objects': objects})
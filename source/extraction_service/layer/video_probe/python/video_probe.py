@@ -0,0 +1,222 @@
+# Lightweight video probe: reads container headers only, no frame decoding
+import lambda_runtime
+import os
+import struct
+
+ffmpeg_reader = lambda_runtime.lazy_import("moviepy.video.io.ffmpeg_reader")
+
+def probe_video(file_path):
+    """
+    Probe a local video file once and return its metadata.
+
+    Parameters:
+    - file_path: Local path of the video file
+
+    Returns:
+    - Dictionary with Duration, Fps, Resolution, Codec, HasAudio and KeyframesS
+      (keyframe timestamps in seconds, None if the container has no sync sample table)
+    """
+    infos = ffmpeg_reader.ffmpeg_parse_infos(file_path, decode_file=False)
+    # Match VideoFileClip: ffmpeg applies the rotation metadata when decoding
+    resolution = infos.get("video_size")
+    if resolution and abs(infos.get("video_rotation", 0)) in [90, 270]:
+        resolution = [resolution[1], resolution[0]]
+
+    keyframes = None
+    try:
+        keyframes = read_mp4_keyframes(file_path)
+    except Exception as ex:
+        print(f"Unable to read keyframe index: {ex}")
+
+    return {
+        'Duration': infos.get("video_duration", infos.get("duration")),
+        'Fps': infos.get("video_fps"),
+        'Resolution': resolution,
+        'Codec': infos.get("video_codec_name"),
+        'HasAudio': bool(infos.get("audio_found")),
+        'KeyframesS': keyframes,
+    }
+
+def read_mp4_keyframes(file_path):
+    """
+    Read keyframe timestamps of the first video track from the MP4/MOV sample tables
+    (mdhd timescale, stts sample durations and stss sync samples).
+    Returns None for other containers, fragmented MP4 or all-intra video.
+    """
+    moov = read_top_level_box(file_path, b"moov")
+    if moov is None:
+        return None
+
+    for trak in iter_boxes(moov, b"trak"):
+        mdia = find_box(trak, b"mdia")
+        hdlr = find_box(mdia, b"hdlr") if mdia else None
+        if not hdlr or hdlr[8:12] != b"vide":
+            continue
+
+        mdhd = find_box(mdia, b"mdhd")
+        timescale = struct.unpack(">I", mdhd[20:24] if mdhd[0] == 1 else mdhd[12:16])[0]
+        stbl = find_box(find_box(mdia, b"minf"), b"stbl")
+        stts = find_box(stbl, b"stts")
+        stss = find_box(stbl, b"stss")
+        if not stts or not stss or not timescale:
+            return None
+
+        sync_samples = struct.unpack(f">{struct.unpack('>I', stss[4:8])[0]}I", stss[8:])
+        stts_count = struct.unpack(">I", stts[4:8])[0]
+        stts_entries = struct.unpack(f">{stts_count * 2}I", stts[8:8 + stts_count * 8])
+
+        # Walk the run-length coded sample durations alongside the sorted sync sample numbers
+        keyframes = []
+        sample, dts, i = 1, 0, 0
+        for e in range(0, len(stts_entries), 2):
+            count, delta = stts_entries[e], stts_entries[e + 1]
+            while i < len(sync_samples) and sync_samples[i] < sample + count:
+                keyframes.append(round((dts + (sync_samples[i] - sample) * delta) / timescale, 3))
+                i += 1
+            sample += count
+            dts += count * delta
+        return keyframes
+
+    return None
+
+def scan_fragments(read, size, state=None):
+    """
+    Index the complete fragments of a fragmented MP4 prefix, e.g. the uploaded part of a streaming upload.
+    Only box headers and the moov and moof payloads are read. A scan resumes from the state of the previous scan,
+    so a growing prefix is read once.
+
+    Parameters:
+    - read: read(offset, length) returning the bytes of the prefix at offset
+    - size: Number of bytes of the prefix
+    - state: State returned by the scan of a shorter prefix of the same file, or None
+
+    Returns:
+    - Dictionary with Fragmented (None until the moov box is complete, False for a regular MP4 or another
+      container), AvailableS (media time covered by the complete fragments of the first video track) and
+      the scan position
+    """
+    state = dict(state or {"Offset": 0, "Fragmented": None, "AvailableS": 0})
+    offset = state["Offset"]
+    while state["Fragmented"] != False and offset + 8 <= size:
+        header = read(offset, min(16, size - offset))
+        box_size, typ = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if box_size == 1:
+            if len(header) < 16:
+                break
+            box_size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif box_size == 0:
+            # Box up to the end of the file, its end is unknown until the upload completes
+            break
+        if box_size < header_size:
+            state["Fragmented"] = False
+            break
+        if offset + box_size > size:
+            break
+
+        if typ == b"moov":
+            state.update(read_fragment_track(read(offset + header_size, box_size - header_size)))
+        elif typ == b"moof" and state["Fragmented"]:
+            end_s = read_fragment_end_s(read(offset + header_size, box_size - header_size), state)
+            if end_s is not None:
+                state["PendingS"] = end_s
+        elif typ == b"mdat" and state.get("PendingS") is not None:
+            # A fragment is complete with its media data
+            state["AvailableS"] = max(state["AvailableS"], state.pop("PendingS"))
+        elif state["Fragmented"] is None and typ not in (b"ftyp", b"free", b"skip", b"styp", b"uuid"):
+            # Media data before the movie box: a regular MP4 that is only playable once complete
+            state["Fragmented"] = False
+        offset += box_size
+        state["Offset"] = offset
+    return state
+
+def read_fragment_track(moov):
+    # The first video track and its default sample duration. Movie extends (mvex) marks a fragmented MP4
+    mvex = find_box(moov, b"mvex")
+    if mvex is None:
+        return {"Fragmented": False}
+    for trak in iter_boxes(moov, b"trak"):
+        mdia = find_box(trak, b"mdia")
+        hdlr = find_box(mdia, b"hdlr") if mdia else None
+        if not hdlr or hdlr[8:12] != b"vide":
+            continue
+        tkhd = find_box(trak, b"tkhd")
+        track_id = struct.unpack(">I", tkhd[20:24] if tkhd[0] == 1 else tkhd[12:16])[0]
+        mdhd = find_box(mdia, b"mdhd")
+        timescale = struct.unpack(">I", mdhd[20:24] if mdhd[0] == 1 else mdhd[12:16])[0]
+        default_duration = 0
+        for trex in iter_boxes(mvex, b"trex"):
+            if struct.unpack(">I", trex[4:8])[0] == track_id:
+                default_duration = struct.unpack(">I", trex[12:16])[0]
+        return {"Fragmented": True, "TrackId": track_id, "Timescale": timescale, "DefaultDuration": default_duration}
+    return {"Fragmented": False}
+
+def read_fragment_end_s(moof, state):
+    # End time of the video track in a movie fragment: decode time (tfdt) plus the sample durations (trun)
+    for traf in iter_boxes(moof, b"traf"):
+        tfhd = find_box(traf, b"tfhd")
+        flags = struct.unpack(">I", tfhd[0:4])[0] & 0xFFFFFF
+        if struct.unpack(">I", tfhd[4:8])[0] != state["TrackId"]:
+            continue
+        position = 8 + (8 if flags & 0x01 else 0) + (4 if flags & 0x02 else 0)
+        default_duration = struct.unpack(">I", tfhd[position:position + 4])[0] if flags & 0x08 else state["DefaultDuration"]
+
+        tfdt = find_box(traf, b"tfdt")
+        if tfdt is None:
+            return None
+        decode_time = struct.unpack(">Q", tfdt[4:12])[0] if tfdt[0] == 1 else struct.unpack(">I", tfdt[4:8])[0]
+
+        for trun in iter_boxes(traf, b"trun"):
+            flags = struct.unpack(">I", trun[0:4])[0] & 0xFFFFFF
+            sample_count = struct.unpack(">I", trun[4:8])[0]
+            if not flags & 0x100:
+                decode_time += sample_count * default_duration
+                continue
+            # Per sample fields: duration, size, flags and composition offset, each present with its flag
+            position = 8 + (4 if flags & 0x01 else 0) + (4 if flags & 0x04 else 0)
+            stride = 4 * sum(1 for f in (0x100, 0x200, 0x400, 0x800) if flags & f)
+            for i in range(sample_count):
+                decode_time += struct.unpack(">I", trun[position + i * stride:position + i * stride + 4])[0]
+        return round(decode_time / state["Timescale"], 3)
+    return None
+
+def read_top_level_box(file_path, box_type):
+    # Scan top level box headers and only read the payload of the requested box
+    file_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            size, typ = struct.unpack(">I4s", f.read(8))
+            header = 8
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+                header = 16
+            elif size == 0:
+                size = file_size - offset
+            if size < header:
+                return None
+            if typ == box_type:
+                return f.read(size - header)
+            offset += size
+    return None
+
+def iter_boxes(data, box_type=None):
+    offset = 0
+    while data and offset + 8 <= len(data):
+        size, typ = struct.unpack(">I4s", data[offset:offset + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[offset + 8:offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header:
+            return
+        if box_type is None or typ == box_type:
+            yield data[offset + header:offset + size]
+        offset += size
+
+def find_box(data, box_type):
+    return next(iter_boxes(data, box_type), None)
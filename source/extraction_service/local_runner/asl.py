@@ -0,0 +1,689 @@
+# Amazon States Language interpreter for the local runner
+# Runs the code.txt definitions as Step Functions does: input and output processing (InputPath, Parameters,
+# ResultSelector, ResultPath, OutputPath), the context object, intrinsic functions, Retry and Catch, Choice rules,
+# Wait, Parallel branches, and Map states over an items path or an S3 listing with ItemBatcher and ResultWriter.
+# Task states invoke the Lambdas through the local host, so the concurrency of the Map states and of the Lambda
+# account limit both apply. Waits and retry delays are multiplied by wait_scale.
+import re
+import json
+import time
+import uuid
+import random
+import base64
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from errors import ClientExceptions
+
+MAX_PAYLOAD_SIZE = 256 * 1024
+DEFAULT_RETRY_INTERVAL_S = 1
+DEFAULT_RETRY_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF_RATE = 2.0
+DEFAULT_MAP_CONCURRENCY = 64
+
+
+class StatesError(Exception):
+    """A state failure, matched by Retry and Catch ErrorEquals."""
+    def __init__(self, error, cause=""):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+class _Stopped(Exception):
+    # The execution was aborted or timed out, no Retry or Catch applies
+    def __init__(self, status, error=None, cause=None):
+        super().__init__(status)
+        self.status = status
+        self.error = error
+        self.cause = cause
+
+
+def _iso(moment=None):
+    return (moment or datetime.now(timezone.utc)).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+# -- Paths ---------------------------------------------------------------------------------------------------------
+
+_PATH_TOKEN = re.compile(r"\.([^.\[\]]+)|\[(\d+)\]|\['([^']*)'\]|\[\"([^\"]*)\"\]")
+
+
+def _path_steps(path):
+    if path in ("$", "$$"):
+        return []
+    root = "$$" if path.startswith("$$") else "$"
+    rest, steps, position = path[len(root):], [], 0
+    while position < len(rest):
+        match = _PATH_TOKEN.match(rest, position)
+        if not match:
+            raise StatesError("States.Runtime", f"Unsupported path: {path}")
+        name, index, quoted, double_quoted = match.groups()
+        steps.append(int(index) if index is not None else name or quoted or double_quoted)
+        position = match.end()
+    return steps
+
+
+def get_path(data, path, context=None):
+    """Value at a reference path. Raises States.Runtime when the path does not exist."""
+    value = context if path.startswith("$$") else data
+    for step in _path_steps(path):
+        if isinstance(step, int) and isinstance(value, list) and step < len(value):
+            value = value[step]
+        elif isinstance(step, str) and isinstance(value, dict) and step in value:
+            value = value[step]
+        else:
+            raise StatesError("States.Runtime", f"The JSONPath '{path}' could not be found in the input")
+    return value
+
+
+def is_present(data, path, context=None):
+    try:
+        get_path(data, path, context)
+        return True
+    except StatesError:
+        return False
+
+
+def set_path(data, path, value):
+    """Return a copy of data with value placed at the ResultPath."""
+    if path is None:
+        return data
+    steps = _path_steps(path)
+    if not steps:
+        return value
+    if not isinstance(data, dict):
+        raise StatesError("States.ResultPathMatchFailure", f"Unable to apply ResultPath '{path}' to a non object input")
+    root = json.loads(json.dumps(data))
+    target = root
+    for step in steps[:-1]:
+        if not isinstance(target.get(step), dict):
+            target[step] = {}
+        target = target[step]
+    target[steps[-1]] = value
+    return root
+
+
+# -- Intrinsic functions -------------------------------------------------------------------------------------------
+
+_INTRINSIC_TOKEN = re.compile(r"\s*(?:(?P<string>'(?:\\.|[^'\\])*')|(?P<number>-?\d+(?:\.\d+)?)|(?P<path>\$\$?[^,()\s]*)"
+                              r"|(?P<function>States\.[A-Za-z]+)\s*\(|(?P<literal>null|true|false)|(?P<close>\))|(?P<comma>,))")
+
+
+def evaluate_intrinsic(expression, data, context):
+    value, position = _intrinsic(expression, 0, data, context)
+    if expression[position:].strip():
+        raise StatesError("States.IntrinsicFailure", f"Unexpected input in {expression}")
+    return value
+
+
+def _intrinsic(expression, position, data, context):
+    match = _INTRINSIC_TOKEN.match(expression, position)
+    if not match:
+        raise StatesError("States.IntrinsicFailure", f"Malformed intrinsic function: {expression}")
+    kind = match.lastgroup
+    token = match.group(kind)
+    if kind == "string":
+        return re.sub(r"\\(.)", r"\1", token[1:-1]), match.end()
+    if kind == "number":
+        return (float(token) if "." in token else int(token)), match.end()
+    if kind == "path":
+        return get_path(data, token, context), match.end()
+    if kind == "literal":
+        return {"null": None, "true": True, "false": False}[token], match.end()
+    if kind != "function":
+        raise StatesError("States.IntrinsicFailure", f"Malformed intrinsic function: {expression}")
+
+    args, position = [], match.end()
+    while True:
+        closing = _INTRINSIC_TOKEN.match(expression, position)
+        if closing and closing.lastgroup == "close":
+            position = closing.end()
+            break
+        value, position = _intrinsic(expression, position, data, context)
+        args.append(value)
+        separator = _INTRINSIC_TOKEN.match(expression, position)
+        if separator and separator.lastgroup == "comma":
+            position = separator.end()
+    return _call_intrinsic(token, args), position
+
+
+def _call_intrinsic(name, args):
+    try:
+        if name == "States.Format":
+            parts = re.split(r"(?<!\\)\{\}", args[0])
+            if len(parts) - 1 != len(args) - 1:
+                raise StatesError("States.IntrinsicFailure", "States.Format: the number of arguments does not match the template")
+            text = parts[0]
+            for value, part in zip(args[1:], parts[1:]):
+                text += (value if isinstance(value, str) else json.dumps(value)) + part
+            return text
+        if name == "States.StringToJson":
+            return json.loads(args[0])
+        if name == "States.JsonToString":
+            return json.dumps(args[0], separators=(",", ":"))
+        if name == "States.Array":
+            return list(args)
+        if name == "States.ArrayLength":
+            return len(args[0])
+        if name == "States.ArrayGetItem":
+            return args[0][args[1]]
+        if name == "States.ArrayContains":
+            return args[1] in args[0]
+        if name == "States.ArrayRange":
+            return list(range(args[0], args[1] + (1 if args[2] > 0 else -1), args[2]))
+        if name == "States.ArrayPartition":
+            return [args[0][i:i + args[1]] for i in range(0, len(args[0]), args[1])]
+        if name == "States.ArrayUnique":
+            return [v for i, v in enumerate(args[0]) if v not in args[0][:i]]
+        if name == "States.MathAdd":
+            return args[0] + args[1]
+        if name == "States.MathRandom":
+            return random.randint(args[0], args[1])
+        if name == "States.StringSplit":
+            return [p for p in re.split("[" + re.escape(args[1]) + "]", args[0]) if p]
+        if name == "States.UUID":
+            return str(uuid.uuid4())
+        if name == "States.Base64Encode":
+            return base64.b64encode(args[0].encode("utf-8")).decode("ascii")
+        if name == "States.Base64Decode":
+            return base64.b64decode(args[0]).decode("utf-8")
+    except StatesError:
+        raise
+    except Exception as ex:
+        raise StatesError("States.IntrinsicFailure", f"{name}: {ex}")
+    raise StatesError("States.IntrinsicFailure", f"Unsupported intrinsic function: {name}")
+
+
+def evaluate_template(template, data, context):
+    """Parameters, ItemSelector, ResultSelector and BatchInput templates."""
+    if isinstance(template, dict):
+        result = {}
+        for key, value in template.items():
+            if key.endswith(".$"):
+                if value.startswith("States."):
+                    result[key[:-2]] = evaluate_intrinsic(value, data, context)
+                else:
+                    result[key[:-2]] = get_path(data, value, context)
+            else:
+                result[key] = evaluate_template(value, data, context)
+        return result
+    if isinstance(template, list):
+        return [evaluate_template(v, data, context) for v in template]
+    return template
+
+
+# -- Choice rules --------------------------------------------------------------------------------------------------
+
+def _timestamp(value):
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _string_matches(value, pattern):
+    regex = "".join(".*" if part == "*" else re.escape(part.replace("\\*", "*"))
+                    for part in re.split(r"(?<!\\)(\*)", pattern))
+    return re.fullmatch(regex, value, re.DOTALL) is not None
+
+
+_COMPARISONS = {
+    "Equals": lambda a, b: a == b,
+    "LessThan": lambda a, b: a < b,
+    "GreaterThan": lambda a, b: a > b,
+    "LessThanEquals": lambda a, b: a <= b,
+    "GreaterThanEquals": lambda a, b: a >= b,
+}
+
+
+def evaluate_rule(rule, data, context):
+    if "And" in rule:
+        return all(evaluate_rule(r, data, context) for r in rule["And"])
+    if "Or" in rule:
+        return any(evaluate_rule(r, data, context) for r in rule["Or"])
+    if "Not" in rule:
+        return not evaluate_rule(rule["Not"], data, context)
+
+    variable = rule["Variable"]
+    if "IsPresent" in rule:
+        return is_present(data, variable, context) == rule["IsPresent"]
+    value = get_path(data, variable, context)
+    for operator, operand in rule.items():
+        if operator in ("Variable", "Next"):
+            continue
+        if operator.endswith("Path"):
+            operator, operand = operator[:-len("Path")], get_path(data, operand, context)
+        if operator == "IsNull":
+            return (value is None) == operand
+        if operator == "IsBoolean":
+            return isinstance(value, bool) == operand
+        if operator == "IsNumeric":
+            return (isinstance(value, (int, float)) and not isinstance(value, bool)) == operand
+        if operator == "IsString":
+            return isinstance(value, str) == operand
+        if operator == "IsTimestamp":
+            return (_timestamp(value) is not None) == operand
+        if operator == "BooleanEquals":
+            return isinstance(value, bool) and value == operand
+        if operator == "StringMatches":
+            return isinstance(value, str) and _string_matches(value, operand)
+        for prefix, valid in (("String", lambda v: isinstance(v, str)),
+                              ("Numeric", lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)),
+                              ("Timestamp", lambda v: _timestamp(v) is not None)):
+            if operator.startswith(prefix) and operator[len(prefix):] in _COMPARISONS:
+                if not valid(value) or not valid(operand):
+                    return False
+                if prefix == "Timestamp":
+                    value, operand = _timestamp(value), _timestamp(operand)
+                return _COMPARISONS[operator[len(prefix):]](value, operand)
+        raise StatesError("States.Runtime", f"Unsupported Choice operator: {operator}")
+    raise StatesError("States.Runtime", f"Choice rule without a comparison: {rule}")
+
+
+def _error_matches(error_equals, error):
+    if error in error_equals:
+        return True
+    if "States.TaskFailed" in error_equals and error != "States.Timeout":
+        return True
+    return "States.ALL" in error_equals and error not in ("States.Runtime", "States.DataLimitExceeded")
+
+
+# -- Interpreter ---------------------------------------------------------------------------------------------------
+
+class _Cancelled(Exception):
+    # A sibling Parallel branch or Map iteration failed
+    pass
+
+
+class _Run:
+    """Execution scoped state: stop conditions, with a child scope per Parallel and Map state."""
+    def __init__(self, execution, stepfunctions, timeout_s=None, parent=None):
+        self.execution = execution
+        self.stepfunctions = stepfunctions
+        self.parent = parent
+        self.deadline = parent.deadline if parent else time.monotonic() + timeout_s if timeout_s else None
+        self.cancelled = threading.Event()
+
+    def child(self):
+        return _Run(self.execution, self.stepfunctions, parent=self)
+
+    def check(self):
+        scope = self
+        while scope is not None:
+            if scope.cancelled.is_set():
+                raise _Cancelled()
+            scope = scope.parent
+        if not self.stepfunctions.is_running(self.execution["executionArn"]):
+            raise _Stopped("ABORTED")
+        if self.deadline and time.monotonic() > self.deadline:
+            raise _Stopped("TIMED_OUT", "States.Timeout", "The execution timed out")
+
+    def sleep(self, seconds):
+        end = time.monotonic() + seconds
+        while True:
+            self.check()
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 0.5))
+
+
+class Interpreter:
+    """
+    Runs executions of LocalStepFunctions.
+
+    Parameters:
+    - host: LambdaHost, for the lambda:invoke tasks
+    - s3: LocalS3, for the Map ItemReader and ResultWriter
+    - call: call(service, operation, kwargs), for the aws-sdk tasks (usually LocalServices.call)
+    - stepfunctions: LocalStepFunctions, for the task tokens and stop checks
+    - wait_scale: Multiplier of Wait states, retry delays and task timeouts
+    - map_concurrency: Cap of concurrent Map iterations when the state sets no limit
+    """
+    def __init__(self, host, s3, call, stepfunctions, wait_scale=1.0, map_concurrency=DEFAULT_MAP_CONCURRENCY):
+        self.host = host
+        self.s3 = s3
+        self.call = call
+        self.stepfunctions = stepfunctions
+        self.wait_scale = wait_scale
+        self.map_concurrency = map_concurrency
+        self.records = []
+        self._lock = threading.Lock()
+
+    def run(self, execution):
+        """Returns (status, output, error, cause) with output a JSON string."""
+        definition = json.loads(execution["definition"])
+        run = _Run(execution, self.stepfunctions, definition.get("TimeoutSeconds"))
+        state_machine_name = execution["stateMachineArn"].split(":")[-1]
+        context = {
+            "Execution": {
+                "Id": execution["executionArn"],
+                "Input": json.loads(execution["input"]),
+                "Name": execution["name"],
+                "RoleArn": f"arn:aws:iam::000000000000:role/{state_machine_name}",
+                "StartTime": _iso(execution["startDate"]),
+            },
+            "StateMachine": {"Id": execution["stateMachineArn"], "Name": state_machine_name},
+        }
+        try:
+            output = self._run_states(definition, json.loads(execution["input"]), context, run)
+            return "SUCCEEDED", json.dumps(output), None, None
+        except StatesError as ex:
+            return "FAILED", None, ex.error, ex.cause
+        except _Stopped as ex:
+            return ex.status, None, ex.error, ex.cause
+
+    def _record(self, run, name, state, start, error=None, **extra):
+        with self._lock:
+            self.records.append({
+                "execution": run.execution["name"],
+                "state": name,
+                "type": state["Type"],
+                "start": start,
+                "duration_s": time.perf_counter() - start,
+                "error": error,
+                **extra,
+            })
+
+    def _run_states(self, definition, data, context, run):
+        name = definition["StartAt"]
+        while True:
+            run.check()
+            state = definition["States"][name]
+            state_context = {**context, "State": {"Name": name, "EnteredTime": _iso(), "RetryCount": 0}}
+            start = time.perf_counter()
+            try:
+                next_name, data = self._state(name, state, data, state_context, run)
+            except StatesError as ex:
+                self._record(run, name, state, start, ex.error)
+                raise
+            self._record(run, name, state, start)
+            _check_size(data, name)
+            if next_name is None:
+                return data
+            name = next_name
+
+    def _state(self, name, state, data, context, run):
+        kind = state["Type"]
+        if kind == "Fail":
+            raise StatesError(state.get("Error", "States.Fail"), state.get("Cause", ""))
+        if kind == "Succeed":
+            return None, self._output(state, self._input(state, data))
+        if kind == "Pass":
+            effective = self._input(state, data)
+            result = state["Result"] if "Result" in state else evaluate_template(state.get("Parameters", effective), effective, context)
+            return self._next(state), self._output(state, set_path(data, state.get("ResultPath", "$"), result))
+        if kind == "Wait":
+            effective = self._input(state, data)
+            if "Seconds" in state:
+                seconds = state["Seconds"]
+            elif "SecondsPath" in state:
+                seconds = get_path(effective, state["SecondsPath"], context)
+            else:
+                timestamp = _timestamp(state["Timestamp"] if "Timestamp" in state else get_path(effective, state["TimestampPath"], context))
+                seconds = (timestamp - datetime.now(timezone.utc)).total_seconds()
+            run.sleep(max(seconds, 0) * self.wait_scale)
+            return self._next(state), self._output(state, effective)
+        if kind == "Choice":
+            effective = self._input(state, data)
+            for rule in state.get("Choices", []):
+                if evaluate_rule(rule, effective, context):
+                    return rule["Next"], self._output(state, effective)
+            if "Default" not in state:
+                raise StatesError("States.NoChoiceMatched", f"No Choice rule matched in state '{name}'")
+            return state["Default"], self._output(state, effective)
+        if kind in ("Task", "Parallel", "Map"):
+            work = {"Task": self._task, "Parallel": self._parallel, "Map": self._map}[kind]
+            try:
+                result = self._with_retry(state, lambda: work(name, state, data, context, run), context, run)
+            except StatesError as ex:
+                for catcher in state.get("Catch", []):
+                    if _error_matches(catcher["ErrorEquals"], ex.error):
+                        return catcher["Next"], set_path(data, catcher.get("ResultPath", "$"), {"Error": ex.error, "Cause": ex.cause})
+                raise
+            if "ResultSelector" in state:
+                result = evaluate_template(state["ResultSelector"], result, context)
+            return self._next(state), self._output(state, set_path(data, state.get("ResultPath", "$"), result))
+        raise StatesError("States.Runtime", f"Unsupported state type: {kind}")
+
+    @staticmethod
+    def _input(state, data):
+        path = state.get("InputPath", "$")
+        return {} if path is None else get_path(data, path)
+
+    @staticmethod
+    def _output(state, data):
+        path = state.get("OutputPath", "$")
+        return {} if path is None else get_path(data, path)
+
+    @staticmethod
+    def _next(state):
+        return None if state.get("End") else state["Next"]
+
+    def _with_retry(self, state, work, context, run):
+        attempts = {}
+        while True:
+            try:
+                return work()
+            except StatesError as ex:
+                index = next((i for i, r in enumerate(state.get("Retry", [])) if _error_matches(r["ErrorEquals"], ex.error)), None)
+                if index is None:
+                    raise
+                retrier = state["Retry"][index]
+                attempt = attempts.get(index, 0)
+                if attempt >= retrier.get("MaxAttempts", DEFAULT_RETRY_MAX_ATTEMPTS):
+                    raise
+                attempts[index] = attempt + 1
+                delay = retrier.get("IntervalSeconds", DEFAULT_RETRY_INTERVAL_S) * retrier.get("BackoffRate", DEFAULT_BACKOFF_RATE) ** attempt
+                if "MaxDelaySeconds" in retrier:
+                    delay = min(delay, retrier["MaxDelaySeconds"])
+                if retrier.get("JitterStrategy") == "FULL":
+                    delay = random.uniform(0, delay)
+                context["State"]["RetryCount"] = attempt + 1
+                run.sleep(delay * self.wait_scale)
+
+    # Task
+
+    def _task(self, name, state, data, context, run):
+        effective = self._input(state, data)
+        resource = state["Resource"]
+        wait_for_token = resource.endswith(".waitForTaskToken")
+        task_context = context
+        token = None
+        if wait_for_token:
+            token = self.stepfunctions.create_token()
+            task_context = {**context, "Task": {"Token": token}}
+        params = evaluate_template(state.get("Parameters", effective), effective, task_context)
+
+        if resource.startswith("arn:aws:states:::lambda:invoke"):
+            payload = self._invoke(params["FunctionName"], params.get("Payload", {}))
+            if not wait_for_token:
+                return {"ExecutedVersion": "$LATEST", "Payload": payload, "StatusCode": 200}
+            return self._wait_token(token, state, run)
+        if resource.startswith("arn:aws:lambda:"):
+            return self._invoke(resource, params)
+        if resource.startswith("arn:aws:states:::aws-sdk:"):
+            service, action = resource[len("arn:aws:states:::aws-sdk:"):].split(":", 1)
+            operation = re.sub(r"(?<!^)(?=[A-Z])", "_", action).lower()
+            try:
+                response = self.call(service, operation, params)
+            except ClientExceptions.ClientError as ex:
+                code = ex.response.get("Error", {}).get("Code", "ServiceException")
+                raise StatesError(f"{service.capitalize()}.{code}", ex.response.get("Error", {}).get("Message", ""))
+            response.pop("ResponseMetadata", None)
+            return json.loads(json.dumps(response, default=_iso))
+        raise StatesError("States.Runtime", f"Unsupported task resource: {resource}")
+
+    def _invoke(self, function, payload):
+        body = json.dumps(payload)
+        if len(body) > MAX_PAYLOAD_SIZE:
+            raise StatesError("States.DataLimitExceeded", "The Lambda payload exceeds the maximum size of 256 KB")
+        try:
+            response, function_error = self.host.invoke(function, body.encode("utf-8"))
+        except ClientExceptions.ClientError as ex:
+            code = ex.response.get("Error", {}).get("Code", "ServiceException")
+            raise StatesError(f"Lambda.{code}", ex.response.get("Error", {}).get("Message", ""))
+        result = json.loads(response) if response else None
+        if function_error:
+            error = result.get("errorType", "Lambda.Unknown") if isinstance(result, dict) else "Lambda.Unknown"
+            raise StatesError(error, json.dumps(result))
+        return result
+
+    def _wait_token(self, token, state, run):
+        timeout_s = state.get("TimeoutSeconds")
+        outcome = self.stepfunctions.wait_token(token, timeout_s * self.wait_scale if timeout_s else None)
+        run.check()
+        if outcome is None:
+            raise StatesError("States.Timeout", "The task did not report back before TimeoutSeconds")
+        kind, value = outcome
+        if kind == "failure":
+            raise StatesError(value[0] or "States.TaskFailed", value[1] or "")
+        return json.loads(value)
+
+    # Parallel
+
+    def _parallel(self, name, state, data, context, run):
+        effective = evaluate_template(state.get("Parameters", self._input(state, data)), self._input(state, data), context)
+        branches = state["Branches"]
+        branch_run = run.child()
+        with ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix=f"parallel-{run.execution['name']}") as pool:
+            futures = [pool.submit(self._run_states, branch, effective, context, branch_run) for branch in branches]
+            results, failure = [], None
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except StatesError as ex:
+                    # A failed branch stops the others
+                    failure = failure or ex
+                    branch_run.cancelled.set()
+                except _Cancelled:
+                    pass
+        if failure:
+            raise failure
+        return results
+
+    # Map
+
+    def _map(self, name, state, data, context, run):
+        effective = self._input(state, data)
+        processor = state.get("ItemProcessor") or state.get("Iterator")
+        distributed = (processor.get("ProcessorConfig") or {}).get("Mode") == "DISTRIBUTED"
+
+        if "ItemReader" in state:
+            items = self._read_items(state["ItemReader"], effective, context)
+        else:
+            items = get_path(effective, state.get("ItemsPath", "$"), context)
+            if not isinstance(items, list):
+                raise StatesError("States.Runtime", f"The ItemsPath of state '{name}' does not reference an array")
+
+        selector = state.get("ItemSelector", state.get("Parameters"))
+        inputs = []
+        for index, value in enumerate(items):
+            item_context = {**context, "Map": {"Item": {"Index": index, "Value": value}}}
+            inputs.append(evaluate_template(selector, effective, item_context) if selector is not None else value)
+
+        if "ItemBatcher" in state:
+            batcher = state["ItemBatcher"]
+            size = batcher.get("MaxItemsPerBatch") or len(inputs) or 1
+            batch_input = evaluate_template(batcher["BatchInput"], effective, context) if "BatchInput" in batcher else None
+            inputs = [{"Items": inputs[i:i + size], **({"BatchInput": batch_input} if batch_input is not None else {})}
+                      for i in range(0, len(inputs), size)]
+
+        concurrency = state.get("MaxConcurrency")
+        if "MaxConcurrencyPath" in state:
+            concurrency = get_path(effective, state["MaxConcurrencyPath"], context)
+        workers = max(min(concurrency or self.map_concurrency, self.map_concurrency, len(inputs)), 1)
+
+        tolerated_count = state.get("ToleratedFailureCount", 0)
+        tolerated_percentage = state.get("ToleratedFailurePercentage", 0)
+        child_run = run.child()
+        results, failures = [None] * len(inputs), []
+        started = [None] * len(inputs)
+
+        def iterate(index):
+            started[index] = datetime.now(timezone.utc)
+            iteration_context = {**context, "Map": {"Item": {"Index": index, "Value": inputs[index]}}}
+            try:
+                results[index] = self._run_states(processor, inputs[index], iteration_context, child_run)
+            except StatesError as ex:
+                failures.append((index, ex))
+                if len(failures) > tolerated_count and len(failures) * 100 > tolerated_percentage * len(inputs):
+                    child_run.cancelled.set()
+                raise
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"map-{run.execution['name']}") as pool:
+            futures = [pool.submit(iterate, i) for i in range(len(inputs))]
+            for future in futures:
+                try:
+                    future.result()
+                except (StatesError, _Cancelled):
+                    pass
+        self._record(run, name, {"Type": "MapRun"}, start, items=len(items), iterations=len(inputs), concurrency=workers,
+                     failures=len(failures))
+
+        if len(failures) > tolerated_count and len(failures) * 100 > tolerated_percentage * len(inputs):
+            if distributed:
+                raise StatesError("States.ExceedToleratedFailureThreshold",
+                                  f"The failure threshold of the Map Run was exceeded: {failures[0][1].error}")
+            raise min(failures, key=lambda f: f[0])[1]
+
+        if "ResultWriter" in state:
+            return self._write_results(state["ResultWriter"], effective, context, inputs, results, started, failures)
+        return results
+
+    def _read_items(self, reader, effective, context):
+        if reader["Resource"] != "arn:aws:states:::s3:listObjectsV2":
+            raise StatesError("States.Runtime", f"Unsupported ItemReader: {reader['Resource']}")
+        params = evaluate_template(reader.get("Parameters", {}), effective, context)
+        items, token = [], None
+        while True:
+            kwargs = {"Bucket": params["Bucket"], "Prefix": params.get("Prefix", "")}
+            if token:
+                kwargs["ContinuationToken"] = token
+            try:
+                response = self.s3.list_objects_v2(**kwargs)
+            except ClientExceptions.ClientError as ex:
+                raise StatesError("States.ItemReaderFailed", str(ex))
+            for content in response.get("Contents", []):
+                items.append({
+                    "Etag": content.get("ETag"),
+                    "Key": content["Key"],
+                    "LastModified": _iso(content["LastModified"]) if isinstance(content.get("LastModified"), datetime) else content.get("LastModified"),
+                    "Size": content.get("Size"),
+                    "StorageClass": content.get("StorageClass", "STANDARD"),
+                })
+            token = response.get("NextContinuationToken")
+            if not response.get("IsTruncated") or not token:
+                return items
+
+    def _write_results(self, writer, effective, context, inputs, results, started, failures):
+        params = evaluate_template(writer.get("Parameters", {}), effective, context)
+        run_id = str(uuid.uuid4())
+        prefix = f"{params['Prefix'].rstrip('/')}/{run_id}" if params.get("Prefix") else run_id
+        failed = dict(failures)
+        succeeded = [{
+            "Input": json.dumps(inputs[i]),
+            "Output": json.dumps(results[i]),
+            "StartDate": _iso(started[i]),
+            "Status": "SUCCEEDED",
+        } for i in range(len(inputs)) if i not in failed]
+        result_key = f"{prefix}/SUCCEEDED_0.json"
+        manifest_key = f"{prefix}/manifest.json"
+        try:
+            self.s3.put_object(Bucket=params["Bucket"], Key=result_key, Body=json.dumps(succeeded).encode("utf-8"))
+            manifest = {
+                "DestinationBucket": params["Bucket"],
+                "MapRunArn": f"{context['Execution']['Id']}:{run_id}",
+                "ResultFiles": {"FAILED": [], "PENDING": [], "SUCCEEDED": [{"Key": result_key, "Size": len(succeeded)}]},
+            }
+            self.s3.put_object(Bucket=params["Bucket"], Key=manifest_key, Body=json.dumps(manifest).encode("utf-8"))
+        except ClientExceptions.ClientError as ex:
+            raise StatesError("States.ResultWriterFailed", str(ex))
+        return {"MapRunArn": manifest["MapRunArn"], "ResultWriterDetails": {"Bucket": params["Bucket"], "Key": manifest_key}}
+
+
+def _check_size(data, name):
+    if len(json.dumps(data)) > MAX_PAYLOAD_SIZE:
+        raise StatesError("States.DataLimitExceeded", f"The state/task '{name}' returned a result with a size exceeding the maximum number of bytes service limit")
@@ -0,0 +1,268 @@
+# Model latency simulator for load testing the workflows
+# SimulatedBedrock answers like LocalBedrock, but each call takes the time a latency profile gives the model, the
+# output token counts follow the profile, calls over the per model requests and tokens per minute quotas are
+# throttled, and errors are injected at the profile's rates. The Lambda clients retry as botocore's standard retry
+# mode does with the lambda_runtime client config, so throttling reaches the Lambda code the way it does in AWS.
+#
+# Latencies, token counts and injected errors are drawn from a generator seeded with the profile seed and the
+# request, so the same workload draws the same values in every run. Quota throttling depends on the timing of the
+# run. All durations and quotas are in model time: time_scale 0.1 runs the models ten times faster.
+#
+# Profile (JSON):
+# {
+#   "seed": 7,
+#   "models": {
+#     "amazon.nova-lite*": {
+#       "Converse": {
+#         "latency_ms": {"distribution": "lognormal", "median": 600, "p95": 1800},
+#         "per_output_token_ms": 6,
+#         "output_tokens": {"distribution": "uniform", "min": 80, "max": 400},
+#         "errors": {"ServiceUnavailableException": 0.01},
+#         "requests_per_minute": 400,
+#         "tokens_per_minute": 800000
+#       }
+#     }
+#   }
+# }
+# Model patterns are fnmatch patterns, the first match wins and "*" is the fallback. Operations are Converse,
+# InvokeModel and StartAsyncInvoke; StartAsyncInvoke takes "job_s_per_input_s" for the job duration. A quota
+# admits bursts of up to "burst_s" seconds of its rate (default 60), "throttle_latency_ms" is the time to reject.
+import math
+import time
+import random
+import hashlib
+import fnmatch
+import threading
+
+from errors import client_error
+from local_bedrock import LocalBedrock
+
+# lambda_runtime.CLIENT_MAX_ATTEMPTS and botocore's standard retry mode
+CLIENT_MAX_ATTEMPTS = 5
+MAX_BACKOFF_S = 20
+DEFAULT_BURST_S = 60
+RETRYABLE_ERRORS = ["ThrottlingException", "ServiceUnavailableException", "InternalServerException",
+                    "ModelNotReadyException", "TooManyRequestsException"]
+ERROR_MESSAGES = {
+    "ThrottlingException": "Too many requests, please wait before trying again.",
+    "ServiceUnavailableException": "Bedrock is unable to process your request.",
+    "InternalServerException": "The server encountered an internal error while processing the request.",
+    "ModelTimeoutException": "The request took too long to process. Processing time exceeded the model timeout length.",
+    "ModelNotReadyException": "The model is not ready to serve inference requests.",
+    "ModelErrorException": "The model could not process the request.",
+}
+Z_95 = 1.6449
+
+
+def sample(spec, rng):
+    """
+    Draw a value from a distribution spec: a number (fixed), or {"distribution": ..., parameters} with
+    fixed (value), uniform (min, max), normal (mean, stdev), lognormal (median, p95) or exponential (mean).
+    Values are never negative.
+    """
+    if spec is None:
+        return 0.0
+    if isinstance(spec, (int, float)):
+        return float(spec)
+    kind = spec.get("distribution", "fixed")
+    if kind == "fixed":
+        value = spec["value"]
+    elif kind == "uniform":
+        value = rng.uniform(spec["min"], spec["max"])
+    elif kind == "normal":
+        value = rng.gauss(spec["mean"], spec["stdev"])
+    elif kind == "lognormal":
+        sigma = math.log(spec["p95"] / spec["median"]) / Z_95 if spec["p95"] > spec["median"] else 0.0
+        value = spec["median"] * math.exp(rng.gauss(0, 1) * sigma)
+    elif kind == "exponential":
+        value = rng.expovariate(1 / spec["mean"])
+    else:
+        raise ValueError(f"Unknown distribution: {kind}")
+    return max(float(value), 0.0)
+
+
+class _Quota:
+    # Token bucket refilled continuously, holding burst_s seconds of capacity
+    def __init__(self, per_minute, burst_s):
+        self.rate = per_minute / 60
+        self.capacity = self.rate * burst_s
+        self.level = self.capacity
+        self.updated = None
+
+    def take(self, amount, now):
+        if self.updated is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        if amount > self.level:
+            return False
+        self.level -= amount
+        return True
+
+
+def _digest(value, digest):
+    if isinstance(value, (bytes, bytearray)):
+        digest.update(value)
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(str(key).encode("utf-8"))
+            _digest(value[key], digest)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _digest(item, digest)
+    else:
+        digest.update(repr(value).encode("utf-8"))
+    return digest
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class SimulatedBedrock(LocalBedrock):
+    """
+    LocalBedrock with model latency, quotas, injected errors and client retries from a latency profile.
+
+    Parameters:
+    - profile: Latency profile, see the module comment
+    - s3: LocalS3 of the async invocations
+    - time_scale: Multiplier of the simulated durations and divisor of the quotas
+    - max_attempts: Attempts of the emulated client retries, 1 to turn them off
+    """
+    def __init__(self, profile, s3=None, time_scale=1.0, max_attempts=CLIENT_MAX_ATTEMPTS):
+        super().__init__(s3)
+        self.profile = profile
+        self.seed = profile.get("seed", 0)
+        self.time_scale = time_scale
+        self.max_attempts = max_attempts
+        self.stats_by_call = {}
+        self._quotas = {}
+        self._draws = {}
+        self._sim_lock = threading.Lock()
+
+    def _settings(self, operation, model_id):
+        for pattern, operations in self.profile.get("models", {}).items():
+            if fnmatch.fnmatchcase(model_id or "", pattern):
+                return operations.get(operation, {})
+        return {}
+
+    def _rng(self, operation, model_id, request):
+        # Repeated identical requests (retries, duplicate tasks) draw the next values of the same sequence
+        key = _digest(request, hashlib.sha256(f"{self.seed}:{operation}:{model_id}".encode("utf-8"))).hexdigest()
+        with self._sim_lock:
+            count = self._draws.get(key, 0)
+            self._draws[key] = count + 1
+        return random.Random(f"{key}:{count}")
+
+    def _stats(self, operation, model_id):
+        return self.stats_by_call.setdefault(f"{operation}:{model_id}", {
+            "calls": 0, "attempts": 0, "retries": 0, "throttled": 0, "errors": {}, "failed": 0, "latency_ms": []})
+
+    def _admit(self, settings, model_id, tokens):
+        # Quotas are per model and counted in model time, the tokens of a call are its input plus max tokens
+        now = time.monotonic() / self.time_scale
+        with self._sim_lock:
+            for name, amount in (("requests_per_minute", 1), ("tokens_per_minute", tokens)):
+                if not settings.get(name):
+                    continue
+                quota = self._quotas.get((model_id, name))
+                if quota is None:
+                    quota = self._quotas[(model_id, name)] = _Quota(settings[name], settings.get("burst_s", DEFAULT_BURST_S))
+                if not quota.take(amount, now):
+                    return "Too many tokens, please wait before trying again." if name == "tokens_per_minute" else ERROR_MESSAGES["ThrottlingException"]
+        return None
+
+    def _simulate(self, operation, model_id, request, respond, tokens=0):
+        """Run respond() as a client call: queued behind the quotas, delayed, failed or retried per the profile."""
+        settings = self._settings(operation, model_id)
+        rng = self._rng(operation, model_id, request)
+        with self._sim_lock:
+            stats = self._stats(operation, model_id)
+            stats["calls"] += 1
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            with self._sim_lock:
+                stats["attempts"] += 1
+            try:
+                response = self._attempt(operation, settings, model_id, rng, respond, tokens, stats)
+                with self._sim_lock:
+                    stats["latency_ms"].append((time.perf_counter() - start) * 1000 / self.time_scale)
+                return response
+            except self.exceptions.ClientError as ex:
+                code = ex.response["Error"]["Code"]
+                if code not in RETRYABLE_ERRORS or attempt >= self.max_attempts:
+                    with self._sim_lock:
+                        stats["failed"] += 1
+                    raise
+                with self._sim_lock:
+                    stats["retries"] += 1
+                # botocore standard mode: full jitter, exponential base 2, capped at 20 s
+                time.sleep(rng.random() * min(2 ** (attempt - 1), MAX_BACKOFF_S) * self.time_scale)
+
+    def _attempt(self, operation, settings, model_id, rng, respond, tokens, stats):
+        message = self._admit(settings, model_id, tokens)
+        if message:
+            with self._sim_lock:
+                stats["throttled"] += 1
+            # A throttled request is rejected without running the model
+            time.sleep(sample(settings.get("throttle_latency_ms", 20), rng) / 1000 * self.time_scale)
+            raise self._error("ThrottlingException", message, operation)
+        for code, rate in sorted(settings.get("errors", {}).items()):
+            if rng.random() < rate:
+                with self._sim_lock:
+                    stats["errors"][code] = stats["errors"].get(code, 0) + 1
+                time.sleep(sample(settings.get("latency_ms"), rng) / 1000 * self.time_scale)
+                raise self.exceptions.from_error(client_error(code, ERROR_MESSAGES.get(code, code), operation))
+        response = respond()
+        output_tokens = response.get("usage", {}).get("outputTokens", 0)
+        if "output_tokens" in settings and "usage" in response:
+            usage = response["usage"]
+            delta = int(sample(settings["output_tokens"], rng)) - usage["outputTokens"]
+            output_tokens = usage["outputTokens"] + delta
+            usage.update(outputTokens=output_tokens, totalTokens=usage["inputTokens"] + output_tokens)
+            with self._lock:
+                self.usage[f"{operation}:{model_id}"]["outputTokens"] += delta
+        latency_ms = sample(settings.get("latency_ms"), rng) + output_tokens * settings.get("per_output_token_ms", 0)
+        if "metrics" in response:
+            response["metrics"]["latencyMs"] = int(latency_ms)
+        time.sleep(latency_ms / 1000 * self.time_scale)
+        return response
+
+    def converse(self, modelId, messages, inferenceConfig=None, toolConfig=None, system=None, **kwargs):
+        request = {"messages": messages, "inferenceConfig": inferenceConfig, "toolConfig": toolConfig, "system": system}
+        max_tokens = (inferenceConfig or {}).get("maxTokens", 512)
+        return self._simulate("Converse", modelId, request, tokens=max_tokens + sum(
+            len(b.get("text", "")) // 4 for m in messages or [] for b in m.get("content", [])),
+            respond=lambda: super(SimulatedBedrock, self).converse(modelId, messages, inferenceConfig, toolConfig, system, **kwargs))
+
+    def invoke_model(self, modelId, body, accept="application/json", contentType="application/json", **kwargs):
+        return self._simulate("InvokeModel", modelId, body, tokens=len(body) // 4 if isinstance(body, (str, bytes)) else 0,
+                              respond=lambda: super(SimulatedBedrock, self).invoke_model(modelId, body, accept, contentType, **kwargs))
+
+    def start_async_invoke(self, modelId, modelInput, outputDataConfig, clientRequestToken=None, tags=None, **kwargs):
+        settings = self._settings("StartAsyncInvoke", modelId)
+        if not settings:
+            return super().start_async_invoke(modelId, modelInput, outputDataConfig, clientRequestToken, tags, **kwargs)
+        return self._simulate("StartAsyncInvoke", modelId, {"modelInput": modelInput, "outputDataConfig": outputDataConfig},
+                              respond=lambda: super(SimulatedBedrock, self).start_async_invoke(
+                                  modelId, modelInput, outputDataConfig, clientRequestToken, tags, **kwargs))
+
+    def _async_job_s(self, model_id, duration):
+        settings = self._settings("StartAsyncInvoke", model_id)
+        if "job_s_per_input_s" not in settings:
+            return super()._async_job_s(model_id, duration)
+        return duration * sample(settings["job_s_per_input_s"], random.Random(f"{self.seed}:{model_id}:{duration}")) * self.time_scale
+
+    def stats(self):
+        """Per operation and model: calls, attempts, retries, quota throttles, injected errors, failures and latency."""
+        with self._sim_lock:
+            result = {}
+            for key, stats in sorted(self.stats_by_call.items()):
+                latency = stats["latency_ms"]
+                result[key] = {k: v for k, v in stats.items() if k != "latency_ms"}
+                result[key]["errors"] = dict(stats["errors"])
+                if latency:
+                    result[key].update({f"p{p}_ms": round(_percentile(latency, p), 1) for p in (50, 95, 99)})
+            return result
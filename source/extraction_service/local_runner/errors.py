@@ -0,0 +1,47 @@
+# AWS error shapes for the local stand-ins
+# Stand-ins raise botocore ClientError with the service error code, as boto3 does. The client side wrappers
+# re-raise them as the per-code subclasses the Lambdas catch (client.exceptions.ConditionalCheckFailedException),
+# since only the base class survives pickling between processes.
+from botocore.exceptions import ClientError
+
+HTTP_STATUS = {
+    "NoSuchKey": 404,
+    "NoSuchBucket": 404,
+    "NoSuchUpload": 404,
+    "404": 404,
+    "ResourceNotFoundException": 400,
+    "ExecutionDoesNotExist": 400,
+    "ThrottlingException": 400,
+    "ServiceUnavailableException": 503,
+    "InternalServerException": 500,
+}
+
+
+def client_error(code, message, operation_name):
+    return ClientError({
+        "Error": {"Code": code, "Message": message},
+        "ResponseMetadata": {"HTTPStatusCode": HTTP_STATUS.get(code, 400)},
+    }, operation_name)
+
+
+class ClientExceptions:
+    """client.exceptions: the ClientError subclass of any error code, created on first use."""
+    ClientError = ClientError
+
+    def __init__(self):
+        self._classes = {}
+
+    def __getattr__(self, code):
+        if code.startswith("_"):
+            raise AttributeError(code)
+        if code not in self._classes:
+            self._classes[code] = type(code, (ClientError,), {})
+        return self._classes[code]
+
+    def from_error(self, error):
+        """Return the ClientError as an instance of its code's subclass."""
+        code = error.response.get("Error", {}).get("Code", "")
+        cls = getattr(self, code) if code.isidentifier() else ClientError
+        if type(error) is cls:
+            return error
+        return cls(error.response, error.operation_name)
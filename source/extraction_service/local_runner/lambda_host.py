@@ -0,0 +1,535 @@
+# Lambda host for the local runner
+# Runs the function handlers in containers that behave like Lambda execution environments: each container loads
+# its own copy of the function module and of every layer module (so module level state such as the instrumentation
+# stages, the task cache and the pooled clients is per container), sees its function's environment variables,
+# gets its own /tmp, and is reused for warm invocations. The account concurrency limit and the reserved concurrency
+# of the functions are enforced, invocations over the payload limits are rejected, and handlers that run past the
+# function timeout fail with Sandbox.Timedout.
+#
+# Thread mode runs the containers in this process (fast, shared GIL). Process mode starts one process per container,
+# for true parallelism and per container peak memory; the shared services are then reached through a manager.
+import os
+import sys
+import json
+import time
+import uuid
+import types
+import socket
+import shutil
+import builtins
+import decimal
+import threading
+import traceback
+import importlib.util
+import importlib.machinery
+import multiprocessing
+from multiprocessing.managers import BaseManager
+
+from errors import client_error
+from local_bedrock import LocalBedrock
+from local_dynamodb import DynamoDBResource
+from local_s3 import LocalS3
+from local_services import ServiceClient
+from stack_model import EXTRACTION_SERVICE_DIR, LOCAL_REGION
+
+LAMBDA_DIR = os.path.join(EXTRACTION_SERVICE_DIR, "lambda")
+LAYER_DIR = os.path.join(EXTRACTION_SERVICE_DIR, "layer")
+LOCAL_RUNNER_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_SYNC_PAYLOAD = 6 * 1024 * 1024
+MAX_ASYNC_PAYLOAD = 256 * 1024
+ASYNC_RETRY_DELAYS_S = [60, 120]
+SERVICE_CLIENTS = ["s3vectors", "transcribe", "stepfunctions", "lambda", "events"]
+
+
+def layer_paths():
+    return [os.path.join(LAYER_DIR, name, "python") for name in sorted(os.listdir(LAYER_DIR))
+            if os.path.isdir(os.path.join(LAYER_DIR, name, "python"))]
+
+
+def block_network():
+    # The pipeline must not reach AWS. Fail fast instead of waiting for a timeout.
+    connect = socket.socket.connect
+
+    def blocked(self, address):
+        if self.family in (socket.AF_INET, socket.AF_INET6):
+            raise RuntimeError(f"Network access is disabled in the local runner: {address}")
+        return connect(self, address)
+    socket.socket.connect = blocked
+
+
+def make_client_factory(s3, bedrock, call):
+    """
+    The lambda_runtime client factory of a container: S3 and Bedrock stand-ins, the shared services through call.
+    """
+    def factory(kind, service_name, kwargs):
+        if kind == "resource" and service_name == "dynamodb":
+            return DynamoDBResource(lambda operation, params: call("dynamodb", operation, params))
+        if kind == "client" and service_name == "s3":
+            return s3
+        if kind == "client" and service_name == "bedrock-runtime":
+            return bedrock
+        if kind == "client" and service_name in SERVICE_CLIENTS:
+            return ServiceClient(call, service_name)
+        raise ValueError(f"The local runner has no stand-in for the {service_name} {kind}")
+    return factory
+
+
+def _json_default(value):
+    # As the Lambda Python runtime: Decimal values from DynamoDB are returned as numbers
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _error_payload(error_type, message, stack_trace=None):
+    return json.dumps({"errorMessage": message, "errorType": error_type, "stackTrace": stack_trace or []}).encode("utf-8")
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class LambdaContext:
+    def __init__(self, function, request_id, deadline):
+        self.function_name = function["name"]
+        self.function_version = "$LATEST"
+        self.invoked_function_arn = function["arn"]
+        self.memory_limit_in_mb = str(function["memory_size"])
+        self.aws_request_id = request_id
+        self.log_group_name = f"/aws/lambda/{function['name']}"
+        self.log_stream_name = "local"
+        self._deadline = deadline
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+class _OsProxy(types.ModuleType):
+    """The os module with the container's own environ."""
+    def __init__(self, environ):
+        super().__init__("os")
+        self.environ = environ
+
+    def getenv(self, key, default=None):
+        return self.environ.get(key, default)
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+
+class Container:
+    """
+    One execution environment of a function. The function and layer modules are loaded with an import hook of
+    their own (__builtins__.__import__), not through sys.modules, so containers of the same function in one
+    process do not share module state.
+
+    Parameters:
+    - function_key: Lambda directory name
+    - function: StackModel.functions entry
+    - tmp_dir: The container's /tmp
+    - client_factory: lambda_runtime client factory, see make_client_factory
+    - log: log(function_key, line), receives the print output of the function
+    """
+    def __init__(self, function_key, function, tmp_dir, client_factory, log):
+        self.function_key = function_key
+        self.function = function
+        self.tmp_dir = tmp_dir
+        self.paths = [os.path.join(LAMBDA_DIR, function_key)] + layer_paths()
+        self.isolated = set()
+        for path in self.paths:
+            for entry in os.listdir(path):
+                if entry.endswith(".py"):
+                    self.isolated.add(entry[:-3])
+                elif os.path.isfile(os.path.join(path, entry, "__init__.py")):
+                    self.isolated.add(entry)
+
+        self.environ = dict(os.environ)
+        self.environ.update(function["environment"])
+        self.environ.update({
+            "AWS_LAMBDA_FUNCTION_NAME": function["name"],
+            "AWS_LAMBDA_FUNCTION_MEMORY_SIZE": str(function["memory_size"]),
+            "AWS_LAMBDA_FUNCTION_VERSION": "$LATEST",
+            "AWS_REGION": LOCAL_REGION,
+            "AWS_DEFAULT_REGION": LOCAL_REGION,
+        })
+        self.os = _OsProxy(self.environ)
+        self.modules = {}
+        self._lock = threading.RLock()
+        self.builtins = dict(vars(builtins))
+        self.builtins["__import__"] = self._import
+        self.builtins["print"] = self._print
+        self._log = log
+
+        os.makedirs(tmp_dir, exist_ok=True)
+        start = time.perf_counter()
+        self._load("lambda_runtime").set_client_factory(client_factory)
+        self.module = self._load(function_key)
+        # The Lambdas keep their scratch files in /tmp
+        for name in ("local_path", "LOCAL_PATH"):
+            if isinstance(getattr(self.module, name, None), str):
+                setattr(self.module, name, tmp_dir.rstrip("/") + "/")
+        self.init_s = time.perf_counter() - start
+
+    def _print(self, *args, sep=" ", end="\n", file=None, flush=False):
+        # print() of the function goes to its log, as to CloudWatch Logs
+        if file not in (None, sys.stdout, sys.stderr):
+            return print(*args, sep=sep, end=end, file=file, flush=flush)
+        self._log(self.function_key, sep.join(str(a) for a in args))
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level > 0:
+            package = (globals or {}).get("__package__") or (globals or {}).get("__name__", "").rpartition(".")[0]
+            fullname = importlib.util.resolve_name("." * level + name, package)
+        else:
+            fullname = name
+        top = fullname.partition(".")[0]
+        if top == "os":
+            return builtins.__import__(fullname, fromlist=fromlist) if fromlist and fullname != "os" else self.os
+        if top not in self.isolated:
+            return builtins.__import__(name, globals, locals, fromlist, level)
+
+        with self._lock:
+            module = self._load(fullname)
+            if not fromlist:
+                return self.modules[top] if level == 0 else module
+            for item in fromlist:
+                if item != "*" and not hasattr(module, item) and hasattr(module, "__path__"):
+                    try:
+                        self._load(f"{fullname}.{item}")
+                    except ModuleNotFoundError:
+                        pass
+            return module
+
+    def _load(self, fullname):
+        with self._lock:
+            if fullname in self.modules:
+                return self.modules[fullname]
+            parent_name, _, child = fullname.rpartition(".")
+            parent = self._load(parent_name) if parent_name else None
+            spec = importlib.machinery.PathFinder.find_spec(fullname, parent.__path__ if parent else self.paths)
+            if spec is None:
+                raise ModuleNotFoundError(f"No module named '{fullname}'", name=fullname)
+            module = importlib.util.module_from_spec(spec)
+            module.__builtins__ = self.builtins
+            self.modules[fullname] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                del self.modules[fullname]
+                raise
+            if parent:
+                setattr(parent, child, module)
+            return module
+
+    def invoke(self, payload, deadline):
+        """Run the handler. Returns (response payload, function error or None)."""
+        request_id = str(uuid.uuid4())
+        try:
+            event = json.loads(payload) if payload else {}
+            response = self.module.lambda_handler(event, LambdaContext(self.function, request_id, deadline))
+        except Exception as ex:
+            return _error_payload(type(ex).__name__, str(ex), traceback.format_exception(ex)[1:]), "Unhandled"
+        try:
+            return json.dumps(response, default=_json_default).encode("utf-8"), None
+        except (TypeError, ValueError) as ex:
+            return _error_payload("Runtime.MarshalError", f"Unable to marshal response: {ex}"), "Unhandled"
+
+
+class _ThreadContainer:
+    # A container in this process. The handler runs in a thread of its own so the timeout can be enforced; a
+    # container that timed out is discarded, as Lambda does, while its thread finishes in the background.
+    def __init__(self, function_key, function, tmp_dir, client_factory, log):
+        self.container = Container(function_key, function, tmp_dir, client_factory, log)
+        self.init_s = self.container.init_s
+
+    def invoke(self, payload, timeout_s):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.container.invoke(payload, time.monotonic() + timeout_s)),
+                                  name=f"lambda-{self.container.function_key}", daemon=True)
+        thread.start()
+        thread.join(timeout_s)
+        if not result:
+            return None
+        return result[0] + ({},)
+
+    def close(self):
+        pass
+
+
+class _ServicesManager(BaseManager):
+    pass
+
+
+def serve_services(services, address, authkey):
+    """Serve LocalServices.call to process mode containers, from a background thread."""
+    _ServicesManager.register("services", callable=lambda: services, exposed=("call",))
+    server = _ServicesManager(address=address, authkey=authkey).get_server()
+    thread = threading.Thread(target=server.serve_forever, name="services", daemon=True)
+    thread.start()
+    return server
+
+
+def _container_main(conn, function_key, function, tmp_dir, log_path, s3_root, address, authkey, shared_bedrock):
+    # Entry point of a process mode container
+    sys.path.insert(0, LOCAL_RUNNER_DIR)
+    block_network()
+    log_file = open(log_path, "a", buffering=1)
+    sys.stdout = sys.stderr = log_file
+
+    _ServicesManager.register("services")
+    manager = _ServicesManager(address=address, authkey=authkey)
+    manager.connect()
+    services = manager.services()
+    s3 = LocalS3(s3_root)
+    bedrock = ServiceClient(services.call, "bedrock-runtime") if shared_bedrock else LocalBedrock(s3)
+
+    def log(key, line):
+        log_file.write(f"{line}\n")
+
+    try:
+        container = Container(function_key, function, tmp_dir, make_client_factory(s3, bedrock, services.call), log)
+    except Exception as ex:
+        error_type = "Runtime.ImportModuleError" if isinstance(ex, ImportError) else type(ex).__name__
+        conn.send(("error", _error_payload(error_type, str(ex), traceback.format_exception(ex)[1:])))
+        return
+    conn.send(("ready", None))
+    while True:
+        message = conn.recv()
+        if message is None:
+            return
+        payload, timeout_s = message
+        response, function_error = container.invoke(payload, time.monotonic() + timeout_s)
+        conn.send((response, function_error, {
+            "peak_rss_mb": peak_rss_mb(),
+            "s3": {"operations": dict(s3.operation_counts), "bytes_read": s3.bytes_read, "bytes_written": s3.bytes_written},
+            "bedrock": {} if shared_bedrock else json.loads(json.dumps(bedrock.usage)),
+        }))
+
+
+class _ProcessContainer:
+    # A container in a spawned process of its own, killed on timeout
+    def __init__(self, function_key, function, tmp_dir, log_path, s3_root, address, authkey, shared_bedrock):
+        start = time.perf_counter()
+        context = multiprocessing.get_context("spawn")
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_container_main, name=f"lambda-{function_key}", daemon=True,
+                                       args=(child, function_key, function, tmp_dir, log_path, s3_root, address, authkey, shared_bedrock))
+        self.process.start()
+        child.close()
+        status, value = self.conn.recv()
+        if status == "error":
+            self.close()
+            raise InitError(value)
+        # The interpreter start counts towards the init, as the runtime start does in Lambda
+        self.init_s = time.perf_counter() - start
+
+    def invoke(self, payload, timeout_s):
+        self.conn.send((payload, timeout_s))
+        if not self.conn.poll(timeout_s):
+            self.close()
+            return None
+        return self.conn.recv()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class InitError(Exception):
+    """The function module failed to load. payload is the Lambda error payload."""
+    def __init__(self, payload):
+        super().__init__(json.loads(payload)["errorMessage"])
+        self.payload = payload
+
+
+class LambdaHost:
+    """
+    Invokes the functions of the stack in local containers.
+
+    Parameters:
+    - stack: StackModel
+    - work_dir: Directory for the container /tmp directories and the function logs
+    - mode: "thread" or "process"
+    - concurrency: Account concurrency limit
+    - throttle: Reject invocations over the limits with TooManyRequestsException instead of waiting for a slot
+    - wait_scale: Multiplier of the async retry delays
+    - s3, bedrock, call: Stand-ins for the thread mode containers (call is LocalServices.call)
+    - s3_root, address, authkey: Local S3 root and services manager of the process mode containers
+    - shared_bedrock: Process mode containers call the Bedrock of the services instead of one of their own
+    """
+    def __init__(self, stack, work_dir, mode="thread", concurrency=None, throttle=False, wait_scale=1.0,
+                 s3=None, bedrock=None, call=None, s3_root=None, address=None, authkey=None, shared_bedrock=False):
+        self.stack = stack
+        self.work_dir = work_dir
+        self.mode = mode
+        self.concurrency = concurrency or 2 * (os.cpu_count() or 1)
+        self.throttle = throttle
+        self.wait_scale = wait_scale
+        self.s3_root, self.address, self.authkey = s3_root, address, authkey
+        self.shared_bedrock = shared_bedrock
+        self.client_factory = make_client_factory(s3, bedrock, call) if mode == "thread" else None
+        self.log_dir = os.path.join(work_dir, "logs")
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        self.reserved_concurrency = sum(f["reserved_concurrency"] or 0 for f in stack.functions.values())
+        self._account = threading.BoundedSemaphore(self.concurrency)
+        self._reserved = {key: threading.BoundedSemaphore(f["reserved_concurrency"])
+                          for key, f in stack.functions.items() if f["reserved_concurrency"]}
+        self._idle = {}
+        self._running = {}
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._pending = 0
+        self._pending_changed = threading.Condition()
+        self._containers = []
+        self.records = []
+        self.container_stats = {}
+
+    def log(self, function_key, line):
+        with self._log_lock:
+            with open(os.path.join(self.log_dir, f"{function_key}.log"), "a") as f:
+                f.write(f"{line}\n")
+
+    def _function(self, name, operation):
+        key = self.stack.function_key(name)
+        if key is None:
+            raise client_error("ResourceNotFoundException", f"Function not found: {name}", operation)
+        return key
+
+    def _acquire(self, key):
+        semaphores = [s for s in (self._reserved.get(key), self._account) if s is not None]
+        acquired = []
+        for semaphore in semaphores:
+            if not semaphore.acquire(blocking=not self.throttle):
+                for s in acquired:
+                    s.release()
+                raise client_error("TooManyRequestsException", "Rate Exceeded.", "Invoke")
+            acquired.append(semaphore)
+        return acquired
+
+    def _take(self, key):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if idle:
+                return idle.pop(), False
+        container_id = uuid.uuid4().hex[:8]
+        tmp_dir = os.path.join(self.work_dir, "containers", f"{key}-{container_id}", "tmp")
+        function = self.stack.functions[key]
+        if self.mode == "process":
+            container = _ProcessContainer(key, function, tmp_dir, os.path.join(self.log_dir, f"{key}.log"),
+                                          self.s3_root, self.address, self.authkey, self.shared_bedrock)
+        else:
+            try:
+                container = _ThreadContainer(key, function, tmp_dir, self.client_factory, self.log)
+            except Exception as ex:
+                error_type = "Runtime.ImportModuleError" if isinstance(ex, ImportError) else type(ex).__name__
+                raise InitError(_error_payload(error_type, str(ex), traceback.format_exception(ex)[1:]))
+        container.id = container_id
+        with self._lock:
+            self._containers.append(container)
+        return container, True
+
+    def invoke(self, function_name, payload):
+        """
+        Synchronous invocation. Returns (response payload, function error or None); raises ClientError for
+        invocations Lambda rejects (unknown function, payload too large, throttled).
+        """
+        key = self._function(function_name, "Invoke")
+        if len(payload) > MAX_SYNC_PAYLOAD:
+            raise client_error("RequestEntityTooLargeException", f"Request must be smaller than {MAX_SYNC_PAYLOAD} bytes for the InvokeFunction operation", "Invoke")
+        queued = time.perf_counter()
+        slots = self._acquire(key)
+        start = time.perf_counter()
+        container, cold, response, function_error, stats = None, False, None, None, {}
+        with self._lock:
+            self._running[key] = self._running.get(key, 0) + 1
+            running = self._running[key]
+        try:
+            try:
+                container, cold = self._take(key)
+            except InitError as ex:
+                response, function_error = ex.payload, "Unhandled"
+            if container is not None:
+                timeout_s = self.stack.functions[key]["timeout_s"]
+                result = container.invoke(payload, timeout_s)
+                if result is None:
+                    response, function_error = _error_payload("Sandbox.Timedout", f"Task timed out after {timeout_s:.2f} seconds"), "Unhandled"
+                    container.close()
+                else:
+                    response, function_error, stats = result
+                    with self._lock:
+                        self._idle[key].append(container)
+                        if stats:
+                            self.container_stats[container.id] = stats
+        finally:
+            with self._lock:
+                self._running[key] -= 1
+            for slot in slots:
+                slot.release()
+
+        error = json.loads(response).get("errorType") if function_error else None
+        # As in the Lambda REPORT line, the duration excludes the init of a cold start
+        init_s = container.init_s if cold and container is not None else 0
+        with self._lock:
+            self.records.append({
+                "function": key,
+                "start": start + init_s,
+                "queued_s": start - queued,
+                "duration_s": time.perf_counter() - start - init_s,
+                "init_s": init_s,
+                "cold_start": cold,
+                "concurrency": running,
+                "error": error,
+                "container": getattr(container, "id", None),
+                "peak_rss_mb": stats.get("peak_rss_mb"),
+            })
+        return response, function_error
+
+    def invoke_async(self, function_name, payload):
+        """Event invocation: queued and run in the background, retried twice on function errors."""
+        key = self._function(function_name, "Invoke")
+        if len(payload) > MAX_ASYNC_PAYLOAD:
+            raise client_error("RequestEntityTooLargeException", f"Request must be smaller than {MAX_ASYNC_PAYLOAD} bytes for the InvokeFunction operation", "Invoke")
+        with self._pending_changed:
+            self._pending += 1
+        thread = threading.Thread(target=self._run_async, args=(key, payload), name=f"event-{key}", daemon=True)
+        thread.start()
+
+    def _run_async(self, key, payload):
+        try:
+            for delay_s in [0] + ASYNC_RETRY_DELAYS_S:
+                time.sleep(delay_s * self.wait_scale)
+                try:
+                    _, function_error = self.invoke(key, payload)
+                except Exception as ex:
+                    self.log(key, f"Async invocation failed: {ex}")
+                    continue
+                if not function_error:
+                    return
+        finally:
+            with self._pending_changed:
+                self._pending -= 1
+                self._pending_changed.notify_all()
+
+    def wait_async(self, timeout_s=None):
+        """Wait until no event invocation is queued or running. Returns False on timeout."""
+        with self._pending_changed:
+            return self._pending_changed.wait_for(lambda: self._pending == 0, timeout_s)
+
+    def close(self):
+        for container in self._containers:
+            container.close()
+        shutil.rmtree(os.path.join(self.work_dir, "containers"), ignore_errors=True)
@@ -0,0 +1,305 @@
+# Deterministic Bedrock runtime for the local runner
+# converse answers with text, or with a tool call whose input is generated from the tool's JSON schema, so the
+# structured output paths of the Lambdas are exercised. invoke_model answers Nova multimodal embedding requests:
+# images are downsampled and projected with a fixed random matrix, so similar frames get close embeddings and the
+# similarity based frame dedup behaves as with the real model. start_async_invoke runs Nova segmented embedding
+# jobs on videos in the local S3 and writes their results next to the requested output URI. The same request always
+# gets the same response.
+import io
+import json
+import uuid
+import base64
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from errors import ClientExceptions, client_error
+
+IMAGE_INPUT_TOKENS = 1300
+VIDEO_INPUT_TOKENS_PER_MB = 2000
+VIDEO_INPUT_TOKENS_PER_S = 300
+CHARS_PER_TOKEN = 4
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_EMBEDDING_DIMENSION = 3072
+EMBEDDING_DIMENSIONS = (256, 384, 1024, 3072)
+IMAGE_FEATURE_SIZE = 16
+DEFAULT_SEGMENT_DURATION_S = 5
+ASYNC_JOB_S = 0.5
+
+
+class LocalBedrock:
+    """
+    Stand-in for boto3.client("bedrock-runtime").
+
+    Parameters:
+    - s3: LocalS3 the async invocations read their input from and write their output to
+    """
+    def __init__(self, s3=None):
+        self.s3 = s3
+        self.exceptions = ClientExceptions()
+        self.usage = {}
+        self._projections = {}
+        self._async_invokes = {}
+        self._lock = threading.Lock()
+
+    def _error(self, code, message, operation):
+        return self.exceptions.from_error(client_error(code, message, operation))
+
+    def _record(self, operation, model_id, input_tokens=0, output_tokens=0):
+        with self._lock:
+            usage = self.usage.setdefault(f"{operation}:{model_id}", {"calls": 0, "inputTokens": 0, "outputTokens": 0})
+            usage["calls"] += 1
+            usage["inputTokens"] += input_tokens
+            usage["outputTokens"] += output_tokens
+
+    def converse(self, modelId, messages, inferenceConfig=None, toolConfig=None, system=None, **kwargs):
+        if not modelId:
+            raise self._error("ValidationException", "modelId is required", "Converse")
+        if not messages:
+            raise self._error("ValidationException", "A conversation must start with a user message", "Converse")
+
+        digest = hashlib.sha256(modelId.encode("utf-8"))
+        input_tokens = 0
+        for block in [b for m in messages for b in m.get("content", [])] + list(system or []):
+            if "text" in block:
+                digest.update(block["text"].encode("utf-8"))
+                input_tokens += _tokens(block["text"])
+            elif "image" in block:
+                content = block["image"].get("source", {}).get("bytes")
+                if not isinstance(content, (bytes, bytearray)):
+                    raise self._error("ValidationException", "The image source must be bytes", "Converse")
+                digest.update(content)
+                input_tokens += IMAGE_INPUT_TOKENS
+            elif "video" in block:
+                source = block["video"].get("source", {})
+                content = source.get("bytes") or json.dumps(source.get("s3Location", {})).encode("utf-8")
+                digest.update(content)
+                input_tokens += max(len(content) * VIDEO_INPUT_TOKENS_PER_MB // (1024 * 1024), 1)
+        seed = digest.hexdigest()
+        max_tokens = (inferenceConfig or {}).get("maxTokens", DEFAULT_MAX_TOKENS)
+
+        tool = _select_tool(toolConfig)
+        if tool:
+            tool_input = _instance(tool.get("inputSchema", {}).get("json", {}), tool["name"], seed)
+            content = [{"toolUse": {"toolUseId": f"tooluse_{seed[:20]}", "name": tool["name"], "input": tool_input}}]
+            output_tokens, stop_reason = _tokens(json.dumps(tool_input)), "tool_use"
+        else:
+            text = f"Local response {seed[:12]}: a deterministic description of the input."
+            text = text[:max_tokens * CHARS_PER_TOKEN]
+            content = [{"text": text}]
+            output_tokens, stop_reason = _tokens(text), "end_turn"
+        if tool:
+            input_tokens += _tokens(json.dumps(toolConfig))
+
+        self._record("Converse", modelId, input_tokens, output_tokens)
+        return {
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+            "output": {"message": {"role": "assistant", "content": content}},
+            "stopReason": stop_reason,
+            "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens, "totalTokens": input_tokens + output_tokens},
+            "metrics": {"latencyMs": 0},
+        }
+
+    def invoke_model(self, modelId, body, accept="application/json", contentType="application/json", **kwargs):
+        try:
+            request = json.loads(body)
+        except (TypeError, ValueError):
+            raise self._error("ValidationException", "Malformed input request, the body must be JSON", "InvokeModel")
+        params = request.get("singleEmbeddingParams")
+        if request.get("taskType") != "SINGLE_EMBEDDING" or not params:
+            raise self._error("ValidationException", f"The local Bedrock only supports Nova multimodal embeddings, not: {modelId}", "InvokeModel")
+
+        dimension = params.get("embeddingDimension", DEFAULT_EMBEDDING_DIMENSION)
+        if dimension not in EMBEDDING_DIMENSIONS:
+            raise self._error("ValidationException", f"embeddingDimension must be one of {EMBEDDING_DIMENSIONS}", "InvokeModel")
+
+        if "image" in params:
+            content = self._source(params["image"])
+            embedding = self._image_embedding(content, dimension)
+            input_tokens = IMAGE_INPUT_TOKENS
+        elif "video" in params:
+            content = self._source(params["video"])
+            embedding = _hashed_embedding(content, dimension)
+            input_tokens = max(len(content) * VIDEO_INPUT_TOKENS_PER_MB // (1024 * 1024), 1)
+        elif "text" in params:
+            content = params["text"].get("value", "").encode("utf-8")
+            embedding = _hashed_embedding(content, dimension)
+            input_tokens = _tokens(params["text"].get("value", ""))
+        else:
+            raise self._error("ValidationException", "One of image, video or text is required", "InvokeModel")
+
+        self._record("InvokeModel", modelId, input_tokens)
+        response = {"embeddings": [{"embeddingType": "TEXT" if "text" in params else "AUDIO_VIDEO_COMBINED" if "video" in params else "IMAGE",
+                                    "embedding": embedding}]}
+        return {
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+            "contentType": "application/json",
+            "body": io.BytesIO(json.dumps(response).encode("utf-8")),
+        }
+
+    def start_async_invoke(self, modelId, modelInput, outputDataConfig, clientRequestToken=None, tags=None, **kwargs):
+        params = (modelInput or {}).get("segmentedEmbeddingParams")
+        if (modelInput or {}).get("taskType") != "SEGMENTED_EMBEDDING" or not params:
+            raise self._error("ValidationException", f"The local Bedrock only supports Nova segmented embeddings, not: {modelId}", "StartAsyncInvoke")
+        output_uri = (outputDataConfig or {}).get("s3OutputDataConfig", {}).get("s3Uri", "")
+        if self.s3 is None or not output_uri.startswith("s3://"):
+            raise self._error("ValidationException", "outputDataConfig.s3OutputDataConfig.s3Uri must be an S3 URI", "StartAsyncInvoke")
+        dimension = params.get("embeddingDimension", DEFAULT_EMBEDDING_DIMENSION)
+        if dimension not in EMBEDDING_DIMENSIONS:
+            raise self._error("ValidationException", f"embeddingDimension must be one of {EMBEDDING_DIMENSIONS}", "StartAsyncInvoke")
+        media = params.get("video") or params.get("audio")
+        input_uri = ((media or {}).get("source", {}).get("s3Location") or {}).get("uri", "")
+        if not input_uri.startswith("s3://"):
+            raise self._error("ValidationException", "The async input must be a video or audio s3Location", "StartAsyncInvoke")
+        bucket, key = input_uri[5:].split("/", 1)
+        path = self.s3._existing(bucket, key, "StartAsyncInvoke")
+
+        with self._lock:
+            for job in self._async_invokes.values():
+                if clientRequestToken and job["clientRequestToken"] == clientRequestToken:
+                    return {"invocationArn": job["invocationArn"]}
+            invocation_id = uuid.uuid4().hex[:12]
+            job = {
+                "invocationArn": f"arn:aws:bedrock:us-east-1:000000000000:async-invoke/{invocation_id}",
+                "modelArn": f"arn:aws:bedrock:us-east-1::foundation-model/{modelId}",
+                "clientRequestToken": clientRequestToken or uuid.uuid4().hex,
+                "status": "InProgress",
+                "submitTime": datetime.now(timezone.utc),
+                "outputDataConfig": outputDataConfig,
+            }
+            self._async_invokes[job["invocationArn"]] = job
+
+        from local_services import media_duration
+        duration = media_duration(path)
+        timer = threading.Timer(self._async_job_s(modelId, duration), self._complete_async,
+                                args=(job, modelId, params, media, path, duration, f"{output_uri.rstrip('/')}/{invocation_id}"))
+        timer.daemon = True
+        timer.start()
+        return {"invocationArn": job["invocationArn"]}
+
+    def _async_job_s(self, model_id, duration):
+        return ASYNC_JOB_S
+
+    def _complete_async(self, job, model_id, params, media, path, duration, output_uri):
+        try:
+            with open(path, "rb") as f:
+                seed = hashlib.sha256(f.read()).digest()
+            segment_s = media.get("segmentationConfig", {}).get("durationSeconds", DEFAULT_SEGMENT_DURATION_S)
+            dimension = params.get("embeddingDimension", DEFAULT_EMBEDDING_DIMENSION)
+            mode = media.get("embeddingMode", "AUDIO_VIDEO_COMBINED")
+            lines, start, index = [], 0.0, 0
+            while start < duration or index == 0:
+                end = min(start + segment_s, duration)
+                lines.append(json.dumps({
+                    "embedding": _hashed_embedding(seed + index.to_bytes(4, "big"), dimension),
+                    "segmentMetadata": {"segmentIndex": index, "segmentStartSeconds": round(start, 3), "segmentEndSeconds": round(end, 3)},
+                    "status": "SUCCESS",
+                }))
+                start, index = start + segment_s, index + 1
+
+            bucket, prefix = output_uri[5:].split("/", 1)
+            embedding_key = f"{prefix}/embedding-{mode.lower().replace('_', '-')}.jsonl"
+            self.s3.put_object(Bucket=bucket, Key=embedding_key, Body="\n".join(lines).encode("utf-8"))
+            self.s3.put_object(Bucket=bucket, Key=f"{prefix}/segmented-embedding-result.json", Body=json.dumps({
+                "sourceFileUri": media["source"]["s3Location"]["uri"],
+                "embeddingDimension": dimension,
+                "embeddingResults": [{"embeddingType": mode, "status": "SUCCESS", "outputFileUri": f"s3://{bucket}/{embedding_key}"}],
+            }).encode("utf-8"))
+            self._record("StartAsyncInvoke", model_id, max(int(duration * VIDEO_INPUT_TOKENS_PER_S), 1))
+            status, message = "Completed", None
+        except Exception as ex:
+            status, message = "Failed", str(ex)
+        with self._lock:
+            job.update(status=status, endTime=datetime.now(timezone.utc), lastModifiedTime=datetime.now(timezone.utc))
+            if message:
+                job["failureMessage"] = message
+
+    def get_async_invoke(self, invocationArn):
+        with self._lock:
+            job = self._async_invokes.get(invocationArn)
+            if job is None:
+                raise self._error("ResourceNotFoundException", f"Async invocation not found: {invocationArn}", "GetAsyncInvoke")
+            return dict(job)
+
+    def list_async_invokes(self, statusEquals=None, maxResults=1000, nextToken=None, **kwargs):
+        with self._lock:
+            jobs = [dict(j) for j in self._async_invokes.values() if statusEquals in (None, j["status"])]
+        start = int(nextToken or 0)
+        response = {"asyncInvokeSummaries": jobs[start:start + maxResults]}
+        if start + maxResults < len(jobs):
+            response["nextToken"] = str(start + maxResults)
+        return response
+
+    def _source(self, media):
+        source = media.get("source", {})
+        if "bytes" in source:
+            try:
+                return base64.b64decode(source["bytes"], validate=True)
+            except (TypeError, ValueError):
+                raise self._error("ValidationException", "The media source bytes must be base64 encoded", "InvokeModel")
+        if "s3Location" in source:
+            return source["s3Location"].get("uri", "").encode("utf-8")
+        raise self._error("ValidationException", "The media source must have bytes or s3Location", "InvokeModel")
+
+    def _image_embedding(self, content, dimension):
+        import cv2
+        import numpy as np
+
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise self._error("ValidationException", "The image could not be decoded", "InvokeModel")
+        features = cv2.resize(image, (IMAGE_FEATURE_SIZE, IMAGE_FEATURE_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+        features = features - features.mean()
+
+        with self._lock:
+            projection = self._projections.get(dimension)
+            if projection is None:
+                projection = np.random.default_rng(dimension).standard_normal((dimension, features.size)).astype(np.float32)
+                self._projections[dimension] = projection
+        vector = projection @ features
+        # A flat image would be a zero vector, which the cosine distance rejects
+        vector = vector + 1e-3 * projection[:, 0]
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _tokens(text):
+    return max(len(text) // CHARS_PER_TOKEN, 1)
+
+
+def _hashed_embedding(content, dimension):
+    import numpy as np
+
+    seed = int.from_bytes(hashlib.sha256(content).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(dimension)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _select_tool(tool_config):
+    tools = [t["toolSpec"] for t in (tool_config or {}).get("tools", []) if "toolSpec" in t]
+    if not tools:
+        return None
+    chosen = (tool_config.get("toolChoice") or {}).get("tool", {}).get("name")
+    return next((t for t in tools if t["name"] == chosen), tools[0])
+
+
+def _instance(schema, name, seed):
+    """A value matching the JSON schema: enums take their first value, strings are derived from the seed."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    for combinator in ("anyOf", "oneOf", "allOf"):
+        if combinator in schema:
+            return _instance(schema[combinator][0], name, seed)
+    schema_type = schema.get("type", "object" if "properties" in schema else "string")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != "null"), "string")
+    if schema_type == "object":
+        return {key: _instance(value, key, seed) for key, value in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        count = max(schema.get("minItems", 1), 1)
+        return [_instance(schema.get("items", {}), name, f"{seed}{i}") for i in range(count)]
+    if schema_type == "boolean":
+        return True
+    if schema_type in ("integer", "number"):
+        value = schema.get("minimum", schema.get("exclusiveMinimum", 0))
+        return int(value) if schema_type == "integer" else float(value)
+    return f"{name} {hashlib.sha256(f'{name}{seed}'.encode('utf-8')).hexdigest()[:8]}"
@@ -0,0 +1,861 @@
+# In-memory DynamoDB for the local runner
+# Tables and global secondary indexes come from the stack. Items are kept as deserialized Python values (Decimal
+# numbers, sets, Binary), validated and copied through the boto3 type serializer, so the Lambdas see the same
+# types and the same errors as with the boto3 resource: float values are rejected, a condition failure raises
+# ConditionalCheckFailedException, an update through a missing map raises ValidationException, and queries and
+# scans return 1 MB pages.
+import re
+import copy
+import threading
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+
+from errors import ClientExceptions, client_error
+
+MAX_ITEM_SIZE = 400 * 1024
+MAX_PAGE_SIZE = 1024 * 1024
+MAX_BATCH_WRITE_ITEMS = 25
+
+_MISSING = object()
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+class ValidationError(Exception):
+    pass
+
+
+# -- Expressions ---------------------------------------------------------------------------------------------------
+
+_TOKEN = re.compile(r"\s*(?:(<>|<=|>=|[=<>(),.\[\]+-])|([#:]?[A-Za-z0-9_]+))")
+_KEYWORDS = {"AND", "OR", "NOT", "BETWEEN", "IN", "SET", "ADD", "REMOVE", "DELETE"}
+_COMPARATORS = {"=", "<>", "<", "<=", ">", ">="}
+
+
+def _tokenize(expression):
+    tokens, position = [], 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise ValidationError(f"Invalid expression: syntax error near: {expression[position:position + 20]!r}")
+        tokens.append(match.group(1) or match.group(2))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser for condition, update and projection expressions.
+    Paths are parsed into lists of attribute names and list indexes, with #name placeholders resolved.
+    """
+    def __init__(self, expression, names, values):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def peek_keyword(self):
+        token = self.peek()
+        return token.upper() if token and token.upper() in _KEYWORDS else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise ValidationError("Invalid expression: unexpected end of expression")
+        self.position += 1
+        return token
+
+    def expect(self, token):
+        found = self.next()
+        if found.upper() != token:
+            raise ValidationError(f"Invalid expression: expected {token!r}, found {found!r}")
+
+    def done(self):
+        if self.peek() is not None:
+            raise ValidationError(f"Invalid expression: unexpected token {self.peek()!r}")
+
+    # Conditions
+    def condition(self):
+        node = self.conjunction()
+        while self.peek_keyword() == "OR":
+            self.next()
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek_keyword() == "AND":
+            self.next()
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek_keyword() == "NOT":
+            self.next()
+            return ("not", self.negation())
+        return self.predicate()
+
+    def predicate(self):
+        if self.peek() == "(":
+            self.next()
+            node = self.condition()
+            self.expect(")")
+            return node
+        token = self.peek()
+        if self.peek(1) == "(" and token.lower() in ("attribute_exists", "attribute_not_exists", "attribute_type", "begins_with", "contains"):
+            name = self.next().lower()
+            self.expect("(")
+            args = [self.operand()]
+            while self.peek() == ",":
+                self.next()
+                args.append(self.operand())
+            self.expect(")")
+            return ("function", name, args)
+
+        left = self.operand()
+        keyword = self.peek_keyword()
+        if keyword == "BETWEEN":
+            self.next()
+            low = self.operand()
+            self.expect("AND")
+            return ("between", left, low, self.operand())
+        if keyword == "IN":
+            self.next()
+            self.expect("(")
+            options = [self.operand()]
+            while self.peek() == ",":
+                self.next()
+                options.append(self.operand())
+            self.expect(")")
+            return ("in", left, options)
+        comparator = self.next()
+        if comparator not in _COMPARATORS:
+            raise ValidationError(f"Invalid expression: expected a comparator, found {comparator!r}")
+        return ("compare", comparator, left, self.operand())
+
+    def operand(self):
+        token = self.peek()
+        if token and token.lower() == "size" and self.peek(1) == "(":
+            self.next()
+            self.expect("(")
+            node = ("size", self.operand())
+            self.expect(")")
+            return node
+        if token and token.startswith(":"):
+            return ("value", self.value(self.next()))
+        return ("path", self.path())
+
+    def value(self, placeholder):
+        if placeholder not in self.values:
+            raise ValidationError(f"An expression attribute value used in expression is not defined; attribute value: {placeholder}")
+        return self.values[placeholder]
+
+    def path(self):
+        elements = [self.name(self.next())]
+        while self.peek() in (".", "["):
+            if self.next() == ".":
+                elements.append(self.name(self.next()))
+            else:
+                index = self.next()
+                if not index.isdigit():
+                    raise ValidationError(f"Invalid expression: list index must be a number, found {index!r}")
+                elements.append(int(index))
+                self.expect("]")
+        return elements
+
+    def name(self, token):
+        if token.startswith("#"):
+            if token not in self.names:
+                raise ValidationError(f"An expression attribute name used in the document path is not defined; attribute name: {token}")
+            return self.names[token]
+        if token.startswith(":") or not re.match(r"[A-Za-z_]", token) or token in _COMPARATORS:
+            raise ValidationError(f"Invalid expression: unexpected token {token!r}")
+        return token
+
+    # Updates
+    def update(self):
+        actions = []
+        while self.peek() is not None:
+            clause = self.next().upper()
+            if clause not in ("SET", "ADD", "REMOVE", "DELETE"):
+                raise ValidationError(f"Invalid UpdateExpression: unexpected token {clause!r}")
+            while True:
+                path = self.path()
+                if clause == "SET":
+                    self.expect("=")
+                    actions.append(("set", path, self.set_value()))
+                elif clause == "REMOVE":
+                    actions.append(("remove", path, None))
+                else:
+                    actions.append((clause.lower(), path, ("value", self.value(self.next()))))
+                if self.peek() != ",":
+                    break
+                self.next()
+        return actions
+
+    def set_value(self):
+        node = self.set_operand()
+        if self.peek() in ("+", "-"):
+            node = (self.next(), node, self.set_operand())
+        return node
+
+    def set_operand(self):
+        token = self.peek()
+        if token and token.lower() in ("if_not_exists", "list_append") and self.peek(1) == "(":
+            name = self.next().lower()
+            self.expect("(")
+            first = self.set_operand() if name == "list_append" else ("path", self.path())
+            self.expect(",")
+            second = self.set_operand()
+            self.expect(")")
+            return (name, first, second)
+        return self.operand()
+
+    def projection(self):
+        paths = [self.path()]
+        while self.peek() == ",":
+            self.next()
+            paths.append(self.path())
+        return paths
+
+
+def _parse(expression, names, values, kind):
+    parser = _Parser(expression, names, values)
+    node = getattr(parser, kind)()
+    parser.done()
+    return node, parser
+
+
+def _get_path(item, path):
+    value = item
+    for element in path:
+        if isinstance(element, int):
+            if not isinstance(value, list) or element >= len(value):
+                return _MISSING
+            value = value[element]
+        else:
+            if not isinstance(value, dict) or element not in value:
+                return _MISSING
+            value = value[element]
+    return value
+
+
+def _set_path(item, path, value):
+    parent = _get_path(item, path[:-1])
+    last = path[-1]
+    if isinstance(last, int):
+        if not isinstance(parent, list):
+            raise ValidationError("The document path provided in the update expression is invalid for update")
+        if last < len(parent):
+            parent[last] = value
+        else:
+            parent.append(value)
+    else:
+        if not isinstance(parent, dict):
+            raise ValidationError("The document path provided in the update expression is invalid for update")
+        parent[last] = value
+
+
+def _remove_path(item, path):
+    parent = _get_path(item, path[:-1])
+    last = path[-1]
+    if isinstance(last, int) and isinstance(parent, list) and last < len(parent):
+        del parent[last]
+    elif isinstance(last, str) and isinstance(parent, dict):
+        parent.pop(last, None)
+
+
+def _type_of(value):
+    if isinstance(value, bool):
+        return "BOOL"
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, Decimal)):
+        return "N"
+    if isinstance(value, str):
+        return "S"
+    if isinstance(value, (bytes, bytearray, Binary)):
+        return "B"
+    if isinstance(value, dict):
+        return "M"
+    if isinstance(value, list):
+        return "L"
+    if isinstance(value, (set, frozenset)):
+        kinds = {_type_of(v) for v in value}
+        return (kinds.pop() if len(kinds) == 1 else "N") + "S"
+    return None
+
+
+def _comparable(value):
+    return value.value if isinstance(value, Binary) else value
+
+
+def _compare(operator, left, right):
+    if left is _MISSING or right is _MISSING:
+        return operator == "<>"
+    if operator in ("=", "<>"):
+        equal = _type_of(left) == _type_of(right) and _comparable(left) == _comparable(right)
+        return equal if operator == "=" else not equal
+    if _type_of(left) != _type_of(right) or _type_of(left) not in ("N", "S", "B"):
+        return False
+    left, right = _comparable(left), _comparable(right)
+    return {"<": left < right, "<=": left <= right, ">": left > right, ">=": left >= right}[operator]
+
+
+def _operand(node, item):
+    kind = node[0]
+    if kind == "value":
+        return node[1]
+    if kind == "path":
+        return _get_path(item, node[1])
+    if kind == "size":
+        value = _operand(node[1], item)
+        if value is _MISSING:
+            return _MISSING
+        if isinstance(value, str):
+            return Decimal(len(value.encode("utf-8")))
+        if isinstance(value, Binary):
+            return Decimal(len(value.value))
+        if isinstance(value, (bytes, bytearray, list, dict, set, frozenset)):
+            return Decimal(len(value))
+        return _MISSING
+    raise ValidationError(f"Invalid operand: {kind}")
+
+
+def _evaluate(node, item):
+    kind = node[0]
+    if kind == "or":
+        return _evaluate(node[1], item) or _evaluate(node[2], item)
+    if kind == "and":
+        return _evaluate(node[1], item) and _evaluate(node[2], item)
+    if kind == "not":
+        return not _evaluate(node[1], item)
+    if kind == "compare":
+        return _compare(node[1], _operand(node[2], item), _operand(node[3], item))
+    if kind == "between":
+        value = _operand(node[1], item)
+        return _compare(">=", value, _operand(node[2], item)) and _compare("<=", value, _operand(node[3], item))
+    if kind == "in":
+        value = _operand(node[1], item)
+        return any(_compare("=", value, _operand(option, item)) for option in node[2])
+    if kind == "function":
+        name, args = node[1], node[2]
+        if name == "attribute_exists":
+            return _operand(args[0], item) is not _MISSING
+        if name == "attribute_not_exists":
+            return _operand(args[0], item) is _MISSING
+        value = _operand(args[0], item)
+        argument = _operand(args[1], item) if len(args) > 1 else _MISSING
+        if value is _MISSING or argument is _MISSING:
+            return False
+        if name == "attribute_type":
+            return _type_of(value) == argument
+        if name == "begins_with":
+            return _type_of(value) == _type_of(argument) and _type_of(value) in ("S", "B") \
+                and _comparable(value).startswith(_comparable(argument))
+        if name == "contains":
+            if isinstance(value, str):
+                return isinstance(argument, str) and argument in value
+            if isinstance(value, (list, set, frozenset)):
+                return argument in value
+            return False
+    raise ValidationError(f"Invalid condition: {kind}")
+
+
+def _update_value(node, item):
+    kind = node[0]
+    if kind in ("+", "-"):
+        left, right = _update_value(node[1], item), _update_value(node[2], item)
+        if _type_of(left) != "N" or _type_of(right) != "N":
+            raise ValidationError("An operand in the update expression has an incorrect data type")
+        return Decimal(left) + Decimal(right) if kind == "+" else Decimal(left) - Decimal(right)
+    if kind == "if_not_exists":
+        value = _get_path(item, node[1][1])
+        return _update_value(node[2], item) if value is _MISSING else value
+    if kind == "list_append":
+        first, second = _update_value(node[1], item), _update_value(node[2], item)
+        if not isinstance(first, list) or not isinstance(second, list):
+            raise ValidationError("An operand in the update expression has an incorrect data type")
+        return first + second
+    value = _operand(node, item)
+    if value is _MISSING:
+        raise ValidationError("The provided expression refers to an attribute that does not exist in the item")
+    return value
+
+
+def _project(item, paths):
+    result = {}
+    for path in paths:
+        value = _get_path(item, path)
+        if value is _MISSING:
+            continue
+        target = result
+        for element in path[:-1]:
+            if isinstance(element, int):
+                break
+            target = target.setdefault(element, {})
+        else:
+            if isinstance(path[-1], str):
+                target[path[-1]] = value
+    return result
+
+
+def _item_size(value, name=""):
+    # Approximate DynamoDB item size: attribute names plus values
+    size = len(name.encode("utf-8"))
+    if isinstance(value, str):
+        return size + len(value.encode("utf-8"))
+    if isinstance(value, bool) or value is None:
+        return size + 1
+    if isinstance(value, (int, Decimal)):
+        return size + len(str(value).lstrip("-").replace(".", "")) // 2 + 1
+    if isinstance(value, Binary):
+        return size + len(value.value)
+    if isinstance(value, (bytes, bytearray)):
+        return size + len(value)
+    if isinstance(value, dict):
+        return size + 3 + sum(_item_size(v, k) + 1 for k, v in value.items())
+    if isinstance(value, (list, set, frozenset)):
+        return size + 3 + sum(_item_size(v) + 1 for v in value)
+    return size
+
+
+def _copy_values(values):
+    # Serializing validates the values as boto3 does (TypeError on float); deserializing returns copies
+    try:
+        return {k: _deserializer.deserialize(_serializer.serialize(v)) for k, v in values.items()}
+    except TypeError as ex:
+        raise ValidationError(str(ex))
+
+
+# -- Tables --------------------------------------------------------------------------------------------------------
+
+class _Table:
+    def __init__(self, name, schema):
+        self.name = name
+        self.key = [k for k in schema["key"] if k]
+        self.key_names = [k[0] for k in self.key]
+        self.indexes = {name: [k for k in key if k] for name, key in schema.get("indexes", {}).items()}
+        self.items = {}
+        # partition key value -> primary keys, for the table and for each index
+        self.partitions = {None: {}}
+        for index in self.indexes:
+            self.partitions[index] = {}
+
+    def primary_key(self, key, operation):
+        if set(key) != set(self.key_names):
+            raise client_error("ValidationException", "The provided key element does not match the schema", operation)
+        for name, key_type in self.key:
+            if _type_of(key[name]) != key_type:
+                raise client_error("ValidationException", "The provided key element does not match the schema", operation)
+        return tuple(key[name] for name in self.key_names)
+
+    def schema(self, index):
+        if index is None:
+            return self.key
+        if index not in self.indexes:
+            raise client_error("ValidationException", f"The table does not have the specified index: {index}", "Query")
+        return self.indexes[index]
+
+    def write(self, primary_key, item):
+        old = self.items.pop(primary_key, None)
+        if old is not None:
+            self._unindex(primary_key, old)
+        if item is not None:
+            self.items[primary_key] = item
+            self._index(primary_key, item)
+        return old
+
+    def _index(self, primary_key, item):
+        for index, partitions in self.partitions.items():
+            key = self.schema(index)
+            # Indexes are sparse: items without the index key attributes are not in the index
+            if all(name in item and _type_of(item[name]) == key_type for name, key_type in key):
+                partitions.setdefault(item[key[0][0]], set()).add(primary_key)
+
+    def _unindex(self, primary_key, item):
+        for index, partitions in self.partitions.items():
+            partition = partitions.get(item.get(self.schema(index)[0][0]))
+            if partition is not None:
+                partition.discard(primary_key)
+
+    def last_key(self, item, index):
+        names = self.key_names + [name for name, _ in (self.schema(index) if index else [])]
+        return {name: copy.deepcopy(item[name]) for name in names}
+
+
+class LocalDynamoDB:
+    """
+    In-memory DynamoDB. Operations take the resource style arguments (Python values, string expressions)
+    and return resource style responses.
+
+    Parameters:
+    - tables: {table name: {"key": [partition, sort], "indexes": {index name: [partition, sort]}}}, each key
+      attribute a (name, type) tuple, the sort key optional. Usually StackModel.tables.
+    """
+    def __init__(self, tables):
+        self._lock = threading.RLock()
+        self._tables = {name: _Table(name, schema) for name, schema in tables.items()}
+        self.operation_counts = {}
+
+    def call(self, operation, kwargs):
+        method = getattr(self, operation, None)
+        if operation.startswith("_") or method is None:
+            raise client_error("UnknownOperationException", f"Unsupported operation: {operation}", operation)
+        with self._lock:
+            self.operation_counts[operation] = self.operation_counts.get(operation, 0) + 1
+            try:
+                return method(**kwargs)
+            except ValidationError as ex:
+                raise client_error("ValidationException", str(ex), _operation_name(operation))
+
+    def table(self, name, operation):
+        if name not in self._tables:
+            raise client_error("ResourceNotFoundException", f"Requested resource not found: Table: {name} not found", operation)
+        return self._tables[name]
+
+    def stats(self):
+        """Item count and approximate size of every table."""
+        with self._lock:
+            return {name: {"items": len(table.items), "bytes": sum(_item_size(i) for i in table.items.values())}
+                    for name, table in self._tables.items()}
+
+    def get_item(self, TableName, Key, ProjectionExpression=None, ExpressionAttributeNames=None, ConsistentRead=False):
+        table = self.table(TableName, "GetItem")
+        item = table.items.get(table.primary_key(_copy_values(Key), "GetItem"))
+        if item is None:
+            return {}
+        if ProjectionExpression:
+            paths, _ = _parse(ProjectionExpression, ExpressionAttributeNames, None, "projection")
+            item = _project(item, paths)
+        return {"Item": copy.deepcopy(item)}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues="NONE"):
+        table = self.table(TableName, "PutItem")
+        item = _copy_values(Item)
+        primary_key = table.primary_key({k: item.get(k) for k in table.key_names if k in item}, "PutItem")
+        self._check_item(table, item, "PutItem")
+        old = table.items.get(primary_key)
+        self._check_condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, old, "PutItem")
+        table.write(primary_key, item)
+        return {"Attributes": copy.deepcopy(old)} if ReturnValues == "ALL_OLD" and old else {}
+
+    def delete_item(self, TableName, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE"):
+        table = self.table(TableName, "DeleteItem")
+        primary_key = table.primary_key(_copy_values(Key), "DeleteItem")
+        old = table.items.get(primary_key)
+        self._check_condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, old, "DeleteItem")
+        table.write(primary_key, None)
+        return {"Attributes": copy.deepcopy(old)} if ReturnValues == "ALL_OLD" and old else {}
+
+    def update_item(self, TableName, Key, UpdateExpression=None, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE"):
+        table = self.table(TableName, "UpdateItem")
+        key = _copy_values(Key)
+        primary_key = table.primary_key(key, "UpdateItem")
+        values = _copy_values(ExpressionAttributeValues or {})
+        old = table.items.get(primary_key)
+        actions = []
+        if UpdateExpression:
+            actions, _ = _parse(UpdateExpression, ExpressionAttributeNames, values, "update")
+        self._check_condition(ConditionExpression, ExpressionAttributeNames, values, old, "UpdateItem")
+
+        item = copy.deepcopy(old) if old is not None else dict(key)
+        updated = []
+        for action, path, operand in actions:
+            if path[0] in table.key_names:
+                raise ValidationError(f"Cannot update attribute {path[0]}. This attribute is part of the key")
+            updated.append(path[0])
+            if action == "set":
+                _set_path(item, path, _update_value(operand, old if old is not None else {}))
+            elif action == "remove":
+                _remove_path(item, path)
+            elif action == "add":
+                current, value = _get_path(item, path), operand[1]
+                if current is _MISSING:
+                    _set_path(item, path, copy.deepcopy(value))
+                elif _type_of(current) == "N" and _type_of(value) == "N":
+                    _set_path(item, path, Decimal(current) + Decimal(value))
+                elif isinstance(current, set) and isinstance(value, set) and _type_of(current) == _type_of(value):
+                    _set_path(item, path, current | value)
+                else:
+                    raise ValidationError("An operand in the update expression has an incorrect data type")
+            elif action == "delete":
+                current, value = _get_path(item, path), operand[1]
+                if isinstance(current, set) and isinstance(value, set):
+                    remaining = current - value
+                    if remaining:
+                        _set_path(item, path, remaining)
+                    else:
+                        _remove_path(item, path)
+                elif current is not _MISSING:
+                    raise ValidationError("An operand in the update expression has an incorrect data type")
+
+        self._check_item(table, item, "UpdateItem")
+        table.write(primary_key, item)
+        if ReturnValues == "ALL_NEW":
+            return {"Attributes": copy.deepcopy(item)}
+        if ReturnValues == "ALL_OLD" and old:
+            return {"Attributes": copy.deepcopy(old)}
+        if ReturnValues in ("UPDATED_NEW", "UPDATED_OLD"):
+            source = item if ReturnValues == "UPDATED_NEW" else (old or {})
+            return {"Attributes": {k: copy.deepcopy(source[k]) for k in updated if k in source}}
+        return {}
+
+    def query(self, TableName, KeyConditionExpression, IndexName=None, FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None,
+              ScanIndexForward=True, Select="ALL_ATTRIBUTES", ConsistentRead=False):
+        table = self.table(TableName, "Query")
+        schema = table.schema(IndexName)
+        values = _copy_values(ExpressionAttributeValues or {})
+        condition, _ = _parse(KeyConditionExpression, ExpressionAttributeNames, values, "condition")
+        partition_value = _partition_value(condition, schema[0][0])
+        if partition_value is _MISSING:
+            raise ValidationError("Query condition missed key schema element: " + schema[0][0])
+
+        sort_name = schema[1][0] if len(schema) > 1 else None
+        primary_keys = table.partitions[IndexName].get(partition_value, ())
+        items = [(pk, table.items[pk]) for pk in primary_keys]
+        items.sort(key=lambda entry: (_sort_value(entry[1].get(sort_name)) if sort_name else (), _sort_value(entry[0])))
+        if not ScanIndexForward:
+            items.reverse()
+        items = [entry for entry in items if _evaluate(condition, entry[1])]
+        return self._page(table, items, IndexName, FilterExpression, ProjectionExpression, ExpressionAttributeNames,
+                          values, ExclusiveStartKey, Limit, Select)
+
+    def scan(self, TableName, IndexName=None, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None, Select="ALL_ATTRIBUTES", ConsistentRead=False):
+        table = self.table(TableName, "Scan")
+        if IndexName is None:
+            items = list(table.items.items())
+        else:
+            table.schema(IndexName)
+            items = [(pk, table.items[pk]) for partition in table.partitions[IndexName].values() for pk in partition]
+        items.sort(key=lambda entry: _sort_value(entry[0]))
+        return self._page(table, items, IndexName, FilterExpression, ProjectionExpression, ExpressionAttributeNames,
+                          _copy_values(ExpressionAttributeValues or {}), ExclusiveStartKey, Limit, Select)
+
+    def batch_write_item(self, RequestItems):
+        for table_name, requests in RequestItems.items():
+            if len(requests) > MAX_BATCH_WRITE_ITEMS:
+                raise ValidationError(f"Too many items requested for the BatchWriteItem call, maximum {MAX_BATCH_WRITE_ITEMS}")
+            for request in requests:
+                if "PutRequest" in request:
+                    self.put_item(TableName=table_name, Item=request["PutRequest"]["Item"])
+                else:
+                    self.delete_item(TableName=table_name, Key=request["DeleteRequest"]["Key"])
+        return {"UnprocessedItems": {}}
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        for table_name, request in RequestItems.items():
+            responses[table_name] = []
+            for key in request["Keys"]:
+                item = self.get_item(TableName=table_name, Key=key, ProjectionExpression=request.get("ProjectionExpression"),
+                                     ExpressionAttributeNames=request.get("ExpressionAttributeNames")).get("Item")
+                if item:
+                    responses[table_name].append(item)
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def _check_item(self, table, item, operation):
+        for index, key in [(None, table.key)] + list(table.indexes.items()):
+            for name, key_type in key:
+                if name in item and _type_of(item[name]) != key_type:
+                    raise client_error("ValidationException", "One or more parameter values were invalid: Type mismatch for "
+                                       f"{'Index' if index else ''} Key {name} expected: {key_type} actual: {_type_of(item[name])}", operation)
+        if _item_size(item) > MAX_ITEM_SIZE:
+            raise client_error("ValidationException", "Item size has exceeded the maximum allowed size", operation)
+
+    def _check_condition(self, expression, names, values, item, operation):
+        if not expression:
+            return
+        condition, _ = _parse(expression, names, _copy_values(values or {}), "condition")
+        if not _evaluate(condition, item or {}):
+            raise client_error("ConditionalCheckFailedException", "The conditional request failed", operation)
+
+    def _page(self, table, items, index, filter_expression, projection, names, values, start_key, limit, select):
+        if start_key:
+            start = table.primary_key({k: v for k, v in _copy_values(start_key).items() if k in table.key_names}, "Query")
+            positions = [i for i, (pk, _) in enumerate(items) if pk == start]
+            items = items[positions[0] + 1:] if positions else items
+        condition = _parse(filter_expression, names, values, "condition")[0] if filter_expression else None
+        paths = _parse(projection, names, None, "projection")[0] if projection else None
+
+        result, scanned, size, last = [], 0, 0, None
+        for i, (primary_key, item) in enumerate(items):
+            scanned += 1
+            size += _item_size(item)
+            if condition is None or _evaluate(condition, item):
+                result.append(_project(item, paths) if paths else item)
+            if (limit and scanned >= limit) or size >= MAX_PAGE_SIZE:
+                if i + 1 < len(items):
+                    last = table.last_key(item, index)
+                break
+
+        response = {"Count": len(result), "ScannedCount": scanned}
+        if select != "COUNT":
+            response["Items"] = copy.deepcopy(result)
+        if last:
+            response["LastEvaluatedKey"] = last
+        return response
+
+
+def _partition_value(condition, name):
+    if condition[0] == "and":
+        value = _partition_value(condition[1], name)
+        return value if value is not _MISSING else _partition_value(condition[2], name)
+    if condition[0] == "compare" and condition[1] == "=":
+        sides = condition[2:]
+        for path, value in (sides, sides[::-1]):
+            if path == ("path", [name]) and value[0] == "value":
+                return value[1]
+    return _MISSING
+
+
+def _sort_value(value):
+    # Orders mixed key types deterministically: numbers, then strings, then binary
+    if isinstance(value, tuple):
+        return tuple(_sort_value(v) for v in value)
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, Decimal)):
+        return (1, value)
+    if isinstance(value, Binary):
+        return (3, value.value)
+    return (2, value)
+
+
+def _operation_name(operation):
+    return "".join(part.capitalize() for part in operation.split("_"))
+
+
+# -- boto3 resource stand-in ---------------------------------------------------------------------------------------
+
+class DynamoDBResource:
+    """
+    Stand-in for boto3.resource("dynamodb"): Table objects with the resource methods and batch_writer,
+    and meta.client.exceptions.
+
+    Parameters:
+    - call: call(operation, kwargs), e.g. LocalDynamoDB.call or a proxy to it in another process
+    """
+    def __init__(self, call):
+        self._call = call
+        self.meta = _Meta(ClientExceptions())
+
+    def Table(self, name):
+        return Table(self, name)
+
+    def call(self, operation, kwargs):
+        try:
+            return self._call(operation, kwargs)
+        except ClientExceptions.ClientError as ex:
+            raise self.meta.client.exceptions.from_error(ex) from None
+
+
+class _Meta:
+    def __init__(self, exceptions):
+        self.client = _MetaClient(exceptions)
+
+
+class _MetaClient:
+    def __init__(self, exceptions):
+        self.exceptions = exceptions
+
+
+class Table:
+    def __init__(self, resource, name):
+        self.resource = resource
+        self.name = self.table_name = name
+        self.meta = resource.meta
+
+    def _request(self, operation, kwargs):
+        kwargs = _build_conditions(dict(kwargs))
+        kwargs["TableName"] = self.name
+        return self.resource.call(operation, kwargs)
+
+    def get_item(self, **kwargs):
+        return self._request("get_item", kwargs)
+
+    def put_item(self, **kwargs):
+        return self._request("put_item", kwargs)
+
+    def update_item(self, **kwargs):
+        return self._request("update_item", kwargs)
+
+    def delete_item(self, **kwargs):
+        return self._request("delete_item", kwargs)
+
+    def query(self, **kwargs):
+        return self._request("query", kwargs)
+
+    def scan(self, **kwargs):
+        return self._request("scan", kwargs)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return BatchWriter(self, overwrite_by_pkeys)
+
+
+class BatchWriter:
+    """Buffers puts and deletes and writes them 25 at a time, as boto3's batch_writer."""
+    def __init__(self, table, overwrite_by_pkeys=None):
+        self.table = table
+        self.overwrite_by_pkeys = overwrite_by_pkeys
+        self.buffer = []
+
+    def put_item(self, Item):
+        self._add({"PutRequest": {"Item": Item}}, Item)
+
+    def delete_item(self, Key):
+        self._add({"DeleteRequest": {"Key": Key}}, Key)
+
+    def _add(self, request, item):
+        if self.overwrite_by_pkeys:
+            key = [item.get(k) for k in self.overwrite_by_pkeys]
+            self.buffer = [r for r in self.buffer if [(r.get("PutRequest", {}).get("Item") or r["DeleteRequest"]["Key"]).get(k)
+                                                      for k in self.overwrite_by_pkeys] != key]
+        self.buffer.append(request)
+        if len(self.buffer) >= MAX_BATCH_WRITE_ITEMS:
+            self.flush()
+
+    def flush(self):
+        while self.buffer:
+            batch, self.buffer = self.buffer[:MAX_BATCH_WRITE_ITEMS], self.buffer[MAX_BATCH_WRITE_ITEMS:]
+            self.table.resource.call("batch_write_item", {"RequestItems": {self.table.name: batch}})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+def _build_conditions(kwargs):
+    # boto3.dynamodb.conditions objects to expression strings, as the boto3 resource does before sending
+    builder = ConditionExpressionBuilder()
+    names = dict(kwargs.get("ExpressionAttributeNames") or {})
+    values = dict(kwargs.get("ExpressionAttributeValues") or {})
+    converted = False
+    for argument in ("KeyConditionExpression", "FilterExpression", "ConditionExpression"):
+        condition = kwargs.get(argument)
+        if isinstance(condition, ConditionBase):
+            built = builder.build_expression(condition, is_key_condition=argument == "KeyConditionExpression")
+            kwargs[argument] = built.condition_expression
+            names.update(built.attribute_name_placeholders)
+            values.update(built.attribute_value_placeholders)
+            converted = True
+    if converted:
+        if names:
+            kwargs["ExpressionAttributeNames"] = names
+        if values:
+            kwargs["ExpressionAttributeValues"] = values
+    return kwargs
@@ -0,0 +1,359 @@
+# Filesystem S3 for the local runner
+# Objects are files under root/<bucket>/<key>, so the flow outputs (frames, clips, transcripts, Map results) can be
+# inspected after a run. Writes go to a temporary file and are renamed into place, so a reader never sees a partial
+# object. Several processes can share the same root.
+import os
+import uuid
+import shutil
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from errors import ClientExceptions, client_error
+
+FOLDER_MARKER = "_$folder$"
+TEMP_SUFFIX = ".s3tmp"
+MULTIPART_DIR = ".multipart"
+MAX_KEYS = 1000
+
+
+class Body:
+    """The streaming body of a get_object response."""
+    def __init__(self, path, start=0, length=None):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = length if length is not None else os.fstat(self._file.fileno()).st_size - start
+
+    def read(self, amt=None):
+        if self._file.closed:
+            return b""
+        if amt is None or amt > self._remaining:
+            amt = self._remaining
+        data = self._file.read(amt)
+        self._remaining -= len(data)
+        if self._remaining <= 0:
+            self.close()
+        return data
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def iter_lines(self, chunk_size=1024, keepends=False):
+        pending = b""
+        for chunk in self.iter_chunks(chunk_size):
+            lines = (pending + chunk).splitlines(True)
+            for line in lines[:-1]:
+                yield line if keepends else line.splitlines()[0]
+            pending = lines[-1]
+        if pending:
+            yield pending if keepends else pending.splitlines()[0]
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Paginator:
+    def __init__(self, s3, operation):
+        self.s3 = s3
+        self.operation = operation
+
+    def paginate(self, PaginationConfig=None, **kwargs):
+        while True:
+            page = getattr(self.s3, self.operation)(**kwargs)
+            yield page
+            if not page.get("IsTruncated"):
+                break
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+class LocalS3:
+    """
+    Stand-in for boto3.client("s3") with the calls the extraction service makes.
+
+    Parameters:
+    - root: Directory holding one sub directory per bucket
+    - buckets: Buckets to create
+    """
+    def __init__(self, root, buckets=()):
+        self.root = os.path.abspath(root)
+        self.exceptions = ClientExceptions()
+        self.operation_counts = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        for bucket in buckets:
+            self.create_bucket(Bucket=bucket)
+
+    def _count(self, operation, read=0, written=0):
+        with self._lock:
+            self.operation_counts[operation] = self.operation_counts.get(operation, 0) + 1
+            self.bytes_read += read
+            self.bytes_written += written
+
+    def _error(self, code, message, operation):
+        return self.exceptions.from_error(client_error(code, message, operation))
+
+    def _bucket_dir(self, bucket, operation):
+        path = os.path.join(self.root, bucket)
+        if not bucket or "/" in bucket or not os.path.isdir(path):
+            raise self._error("NoSuchBucket", f"The specified bucket does not exist: {bucket}", operation)
+        return path
+
+    def _path(self, bucket, key, operation):
+        if not key or key.startswith("/") or ".." in key.split("/"):
+            raise self._error("InvalidArgument", f"Unsupported key for the local S3: {key!r}", operation)
+        bucket_dir = self._bucket_dir(bucket, operation)
+        return os.path.join(bucket_dir, key + FOLDER_MARKER if key.endswith("/") else key)
+
+    def _existing(self, bucket, key, operation, code="NoSuchKey"):
+        path = self._path(bucket, key, operation)
+        if not os.path.isfile(path):
+            raise self._error(code, "Not Found" if code == "404" else "The specified key does not exist.", operation)
+        return path
+
+    def _write(self, path, source, operation):
+        temp = f"{path}.{uuid.uuid4().hex}{TEMP_SUFFIX}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if isinstance(source, str) and os.path.isfile(source):
+                shutil.copyfile(source, temp)
+            else:
+                with open(temp, "wb") as f:
+                    if hasattr(source, "read"):
+                        shutil.copyfileobj(source, f)
+                    else:
+                        f.write(source)
+            size = os.path.getsize(temp)
+            os.replace(temp, path)
+        except (IsADirectoryError, NotADirectoryError, FileExistsError):
+            raise self._error("InvalidArgument", "The local S3 cannot store a key that is also a prefix of other keys", operation)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        self._count(operation, written=size)
+        return size
+
+    @staticmethod
+    def _etag(path):
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return f'"{digest.hexdigest()}"'
+
+    @staticmethod
+    def _modified(path):
+        return datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+
+    def create_bucket(self, Bucket, **kwargs):
+        os.makedirs(os.path.join(self.root, Bucket), exist_ok=True)
+        return {"Location": f"/{Bucket}"}
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        path = self._path(Bucket, Key, "PutObject")
+        self._write(path, Body.encode("utf-8") if isinstance(Body, str) else Body, "PutObject")
+        return {"ETag": self._etag(path), "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        size = self._write(self._path(Bucket, Key, "PutObject"), Filename, "PutObject")
+        if Callback:
+            Callback(size)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        size = self._write(self._path(Bucket, Key, "PutObject"), Fileobj, "PutObject")
+        if Callback:
+            Callback(size)
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        path = self._existing(Bucket, Key, "HeadObject", code="404")
+        directory = os.path.dirname(os.path.abspath(Filename))
+        temp = os.path.join(directory, f".{os.path.basename(Filename)}.{uuid.uuid4().hex}{TEMP_SUFFIX}")
+        shutil.copyfile(path, temp)
+        os.replace(temp, Filename)
+        size = os.path.getsize(Filename)
+        self._count("GetObject", read=size)
+        if Callback:
+            Callback(size)
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        path = self._existing(Bucket, Key, "GetObject")
+        size = os.path.getsize(path)
+        start, length = 0, size
+        if Range:
+            # bytes=start-end, bytes=start- or bytes=-suffix
+            first, last = Range.split("=", 1)[1].split("-", 1)
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(size - int(last), 0)
+                end = size - 1
+            length = max(end - start + 1, 0)
+        self._count("GetObject", read=length)
+        return {
+            "Body": Body(path, start, length),
+            "ContentLength": length,
+            "ContentType": "binary/octet-stream",
+            "ETag": self._etag(path),
+            "LastModified": self._modified(path),
+            "ResponseMetadata": {"HTTPStatusCode": 206 if Range else 200},
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        path = self._existing(Bucket, Key, "HeadObject", code="404")
+        self._count("HeadObject")
+        return {"ContentLength": os.path.getsize(path), "ContentType": "binary/octet-stream", "ETag": self._etag(path),
+                "LastModified": self._modified(path), "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        path = self._path(Bucket, Key, "DeleteObject")
+        if os.path.isfile(path):
+            os.remove(path)
+        self._count("DeleteObject")
+        return {"ResponseMetadata": {"HTTPStatusCode": 204}}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        if len(Delete["Objects"]) > MAX_KEYS:
+            raise self._error("MalformedXML", f"At most {MAX_KEYS} keys can be deleted per request", "DeleteObjects")
+        deleted = []
+        for obj in Delete["Objects"]:
+            path = self._path(Bucket, obj["Key"], "DeleteObjects")
+            if os.path.isfile(path):
+                os.remove(path)
+            deleted.append({"Key": obj["Key"]})
+        self._count("DeleteObjects")
+        return {"Deleted": deleted, "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        source = CopySource if isinstance(CopySource, dict) else dict(zip(("Bucket", "Key"), CopySource.split("/", 1)))
+        path = self._existing(source["Bucket"], source["Key"], "CopyObject")
+        self._write(self._path(Bucket, Key, "CopyObject"), path, "CopyObject")
+        return {"CopyObjectResult": {"ETag": self._etag(path)}}
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, MaxKeys=MAX_KEYS, ContinuationToken=None, StartAfter=None, **kwargs):
+        bucket_dir = self._bucket_dir(Bucket, "ListObjectsV2")
+        self._count("ListObjectsV2")
+        keys = sorted(self._keys(bucket_dir, Prefix))
+        after = ContinuationToken or StartAfter
+        if after:
+            keys = [k for k in keys if k > after]
+
+        contents, prefixes, last = [], [], None
+        for key in keys:
+            if len(contents) + len(prefixes) >= MaxKeys:
+                break
+            if Delimiter and Delimiter in key[len(Prefix):]:
+                common = key[:len(Prefix) + key[len(Prefix):].index(Delimiter) + len(Delimiter)]
+                if not prefixes or prefixes[-1] != common:
+                    prefixes.append(common)
+                last = key
+                continue
+            path = os.path.join(bucket_dir, key + FOLDER_MARKER if key.endswith("/") else key)
+            contents.append({"Key": key, "Size": os.path.getsize(path), "LastModified": self._modified(path),
+                             "ETag": self._etag(path), "StorageClass": "STANDARD"})
+            last = key
+        # Skip the remaining keys of the last common prefix
+        remaining = [k for k in keys if k > (last or "") and not (prefixes and k.startswith(prefixes[-1]))]
+
+        response = {"Name": Bucket, "Prefix": Prefix, "KeyCount": len(contents) + len(prefixes), "MaxKeys": MaxKeys,
+                    "IsTruncated": bool(remaining), "ResponseMetadata": {"HTTPStatusCode": 200}}
+        if contents:
+            response["Contents"] = contents
+        if prefixes:
+            response["CommonPrefixes"] = [{"Prefix": p} for p in prefixes]
+        if remaining:
+            # Past every key of a common prefix, so the next page does not repeat it
+            response["NextContinuationToken"] = prefixes[-1] + "\uffff" if prefixes and last.startswith(prefixes[-1]) else last
+        return response
+
+    def _keys(self, bucket_dir, prefix):
+        # Walk from the deepest directory the prefix names
+        start = os.path.join(bucket_dir, os.path.dirname(prefix))
+        if not os.path.isdir(start):
+            return
+        for directory, dirs, files in os.walk(start):
+            dirs[:] = [d for d in dirs if d != MULTIPART_DIR]
+            relative = os.path.relpath(directory, bucket_dir)
+            relative = "" if relative == "." else relative.replace(os.sep, "/") + "/"
+            for name in files:
+                if name.endswith(TEMP_SUFFIX):
+                    continue
+                key = relative + (name[:-len(FOLDER_MARKER)] if name.endswith(FOLDER_MARKER) else name)
+                if key.startswith(prefix):
+                    yield key
+
+    def get_paginator(self, operation_name):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(f"The local S3 has no paginator for {operation_name}")
+        return Paginator(self, operation_name)
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, HttpMethod=None):
+        params = Params or {}
+        path = os.path.join(self.root, params.get("Bucket", ""), params.get("Key", ""))
+        query = "&".join(f"{k}={v}" for k, v in params.items() if k not in ("Bucket", "Key"))
+        return f"file://{path}" + (f"?{query}" if query else "")
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._path(Bucket, Key, "CreateMultipartUpload")
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, Bucket, MULTIPART_DIR, upload_id))
+        return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+
+    def _upload_dir(self, Bucket, UploadId, operation):
+        path = os.path.join(self._bucket_dir(Bucket, operation), MULTIPART_DIR, UploadId)
+        if not os.path.isdir(path):
+            raise self._error("NoSuchUpload", "The specified upload does not exist.", operation)
+        return path
+
+    def upload_part(self, Bucket, Key, PartNumber, UploadId, Body, **kwargs):
+        path = os.path.join(self._upload_dir(Bucket, UploadId, "UploadPart"), f"{PartNumber:05d}")
+        self._write(path, Body.encode("utf-8") if isinstance(Body, str) else Body, "UploadPart")
+        return {"ETag": self._etag(path)}
+
+    def upload_part_copy(self, Bucket, Key, PartNumber, UploadId, CopySource, **kwargs):
+        source = self._existing(CopySource["Bucket"], CopySource["Key"], "UploadPartCopy")
+        path = os.path.join(self._upload_dir(Bucket, UploadId, "UploadPartCopy"), f"{PartNumber:05d}")
+        self._write(path, source, "UploadPartCopy")
+        return {"CopyPartResult": {"ETag": self._etag(path), "LastModified": self._modified(path)}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        upload_dir = self._upload_dir(Bucket, UploadId, "CompleteMultipartUpload")
+        path = self._path(Bucket, Key, "CompleteMultipartUpload")
+        parts = sorted(MultipartUpload["Parts"], key=lambda p: p["PartNumber"])
+        combined = os.path.join(upload_dir, "combined")
+        with open(combined, "wb") as f:
+            for part in parts:
+                part_path = os.path.join(upload_dir, f"{part['PartNumber']:05d}")
+                if not os.path.isfile(part_path):
+                    raise self._error("InvalidPart", f"Part {part['PartNumber']} was not uploaded", "CompleteMultipartUpload")
+                with open(part_path, "rb") as p:
+                    shutil.copyfileobj(p, f)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(combined, path)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return {"Bucket": Bucket, "Key": Key, "ETag": self._etag(path)}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        shutil.rmtree(self._upload_dir(Bucket, UploadId, "AbortMultipartUpload"), ignore_errors=True)
+        return {"ResponseMetadata": {"HTTPStatusCode": 204}}
+
+    def stats(self):
+        """Object count and bytes stored per bucket."""
+        result = {}
+        for bucket in sorted(os.listdir(self.root)):
+            bucket_dir = os.path.join(self.root, bucket)
+            if os.path.isdir(bucket_dir):
+                sizes = [os.path.getsize(os.path.join(bucket_dir, k + FOLDER_MARKER if k.endswith("/") else k))
+                         for k in self._keys(bucket_dir, "")]
+                result[bucket] = {"objects": len(sizes), "bytes": sum(sizes)}
+        return result
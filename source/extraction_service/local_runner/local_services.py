@@ -0,0 +1,619 @@
+# Shared AWS stand-ins for the local runner: S3 Vectors, Transcribe, Step Functions, Lambda and EventBridge
+# These hold state every Lambda container must see (vector indexes, executions, task tokens, job states), so they
+# live in the runner process and containers reach them through LocalServices.call, directly in thread mode or
+# through a multiprocessing manager proxy in process mode. S3 (a directory tree) and Bedrock (deterministic) are
+# created per container instead, except a simulated Bedrock, whose quotas all the containers share.
+import io
+import json
+import uuid
+import threading
+from datetime import datetime, timezone
+
+from errors import ClientExceptions, client_error
+from local_dynamodb import LocalDynamoDB
+
+MAX_PUT_VECTORS = 500
+MAX_TOP_K = 100
+MAX_VECTOR_METADATA_SIZE = 40 * 1024
+TRANSCRIBE_CUE_S = 2.5
+EXECUTION_FINAL_STATUS = ["SUCCEEDED", "FAILED", "TIMED_OUT", "ABORTED"]
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+# -- S3 Vectors ----------------------------------------------------------------------------------------------------
+
+class LocalS3Vectors:
+    """
+    Vector indexes with exact cosine or euclidean search and the S3 Vectors metadata filter operators.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def create_index(self, vectorBucketName, indexName, dimension, distanceMetric="cosine", dataType="float32", **kwargs):
+        with self._lock:
+            if (vectorBucketName, indexName) in self._indexes:
+                raise client_error("ConflictException", f"Index already exists: {indexName}", "CreateIndex")
+            self._indexes[(vectorBucketName, indexName)] = {"dimension": dimension, "distanceMetric": distanceMetric, "vectors": {}}
+        return {}
+
+    def _index(self, bucket, name, operation):
+        index = self._indexes.get((bucket, name))
+        if index is None:
+            raise client_error("NotFoundException", f"The specified index could not be found: {bucket}/{name}", operation)
+        return index
+
+    def put_vectors(self, vectorBucketName, indexName, vectors):
+        import numpy as np
+
+        if not 1 <= len(vectors) <= MAX_PUT_VECTORS:
+            raise client_error("ValidationException", f"vectors must have between 1 and {MAX_PUT_VECTORS} items", "PutVectors")
+        with self._lock:
+            index = self._index(vectorBucketName, indexName, "PutVectors")
+            for vector in vectors:
+                data = vector.get("data", {}).get("float32")
+                if data is None or len(data) != index["dimension"]:
+                    raise client_error("ValidationException", f"Invalid vector dimension, expected {index['dimension']}", "PutVectors")
+                metadata = vector.get("metadata") or {}
+                if len(json.dumps(metadata)) > MAX_VECTOR_METADATA_SIZE:
+                    raise client_error("ValidationException", "The vector metadata exceeds the size limit", "PutVectors")
+                values = np.asarray(data, dtype=np.float32)
+                if index["distanceMetric"] == "cosine" and not np.any(values):
+                    raise client_error("ValidationException", "A zero vector is not supported with the cosine distance", "PutVectors")
+                index["vectors"][vector["key"]] = (values, json.loads(json.dumps(metadata)))
+        return {}
+
+    def get_vectors(self, vectorBucketName, indexName, keys, returnData=False, returnMetadata=False):
+        with self._lock:
+            index = self._index(vectorBucketName, indexName, "GetVectors")
+            return {"vectors": [self._output(key, index["vectors"][key], returnData, returnMetadata)
+                                for key in keys if key in index["vectors"]]}
+
+    def delete_vectors(self, vectorBucketName, indexName, keys):
+        if len(keys) > MAX_PUT_VECTORS:
+            raise client_error("ValidationException", f"keys must have at most {MAX_PUT_VECTORS} items", "DeleteVectors")
+        with self._lock:
+            index = self._index(vectorBucketName, indexName, "DeleteVectors")
+            for key in keys:
+                index["vectors"].pop(key, None)
+        return {}
+
+    def list_vectors(self, vectorBucketName, indexName, maxResults=500, nextToken=None, returnData=False, returnMetadata=False):
+        with self._lock:
+            index = self._index(vectorBucketName, indexName, "ListVectors")
+            keys = sorted(index["vectors"])
+            start = int(nextToken or 0)
+            page = keys[start:start + maxResults]
+            response = {"vectors": [self._output(k, index["vectors"][k], returnData, returnMetadata) for k in page]}
+            if start + maxResults < len(keys):
+                response["nextToken"] = str(start + maxResults)
+            return response
+
+    def query_vectors(self, vectorBucketName, indexName, queryVector, topK, filter=None, returnMetadata=False, returnDistance=False):
+        import numpy as np
+
+        if not 1 <= topK <= MAX_TOP_K:
+            raise client_error("ValidationException", f"topK must be between 1 and {MAX_TOP_K}", "QueryVectors")
+        with self._lock:
+            index = self._index(vectorBucketName, indexName, "QueryVectors")
+            query = np.asarray(queryVector.get("float32", []), dtype=np.float32)
+            if query.shape != (index["dimension"],):
+                raise client_error("ValidationException", f"Invalid query vector dimension, expected {index['dimension']}", "QueryVectors")
+            candidates = [(k, v) for k, v in index["vectors"].items() if filter is None or _match_filter(filter, v[1])]
+            if not candidates:
+                return {"vectors": [], "distanceMetric": index["distanceMetric"]}
+            matrix = np.stack([v[0] for _, v in candidates])
+            if index["distanceMetric"] == "cosine":
+                distances = 1 - (matrix @ query) / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+            else:
+                distances = np.linalg.norm(matrix - query, axis=1)
+            order = np.argsort(distances, kind="stable")[:topK]
+            vectors = []
+            for i in order:
+                key, value = candidates[i]
+                output = self._output(key, value, False, returnMetadata)
+                if returnDistance:
+                    output["distance"] = float(distances[i])
+                vectors.append(output)
+            return {"vectors": vectors, "distanceMetric": index["distanceMetric"]}
+
+    @staticmethod
+    def _output(key, value, return_data, return_metadata):
+        output = {"key": key}
+        if return_data:
+            output["data"] = {"float32": value[0].tolist()}
+        if return_metadata:
+            output["metadata"] = json.loads(json.dumps(value[1]))
+        return output
+
+    def stats(self):
+        with self._lock:
+            return {f"{b}/{i}": {"vectors": len(index["vectors"])} for (b, i), index in self._indexes.items()}
+
+
+def _match_filter(condition, metadata):
+    for field, expected in condition.items():
+        if field == "$and":
+            if not all(_match_filter(c, metadata) for c in expected):
+                return False
+        elif field == "$or":
+            if not any(_match_filter(c, metadata) for c in expected):
+                return False
+        elif not isinstance(expected, dict):
+            if not _match_value(metadata.get(field), "$eq", expected, field in metadata):
+                return False
+        elif not all(_match_value(metadata.get(field), op, operand, field in metadata) for op, operand in expected.items()):
+            return False
+    return True
+
+
+def _match_value(value, operator, operand, present):
+    # Array metadata values match when any element matches, as in S3 Vectors
+    values = value if isinstance(value, list) else [value]
+    if operator == "$exists":
+        return present == operand
+    if not present:
+        return operator in ("$ne", "$nin")
+    if operator == "$eq":
+        return operand in values
+    if operator == "$ne":
+        return operand not in values
+    if operator == "$in":
+        return any(v in operand for v in values)
+    if operator == "$nin":
+        return not any(v in operand for v in values)
+    comparisons = {"$gt": lambda a, b: a > b, "$gte": lambda a, b: a >= b, "$lt": lambda a, b: a < b, "$lte": lambda a, b: a <= b}
+    if operator in comparisons:
+        return any(isinstance(v, (int, float)) and comparisons[operator](v, operand) for v in values)
+    raise client_error("ValidationException", f"Unsupported filter operator: {operator}", "QueryVectors")
+
+
+# -- Transcribe ----------------------------------------------------------------------------------------------------
+
+class LocalTranscribe:
+    """
+    Transcription jobs that write a deterministic transcript JSON and WebVTT subtitles to the local S3 after
+    delay_s, then publish the Transcribe Job State Change event.
+
+    Parameters:
+    - s3: LocalS3 the media is read from and the output written to
+    - publish: publish(source, detail_type, detail), usually EventBus.publish
+    - delay_s: Time a job stays IN_PROGRESS
+    """
+    def __init__(self, s3, publish, delay_s=1.0):
+        self.s3 = s3
+        self.publish = publish
+        self.delay_s = delay_s
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def start_transcription_job(self, TranscriptionJobName, Media, OutputBucketName=None, OutputKey=None, Subtitles=None,
+                                Tags=None, **kwargs):
+        with self._lock:
+            if TranscriptionJobName in self._jobs:
+                raise client_error("ConflictException", "The requested job name already exists. Use a different job name.", "StartTranscriptionJob")
+            job = {
+                "TranscriptionJobName": TranscriptionJobName,
+                "TranscriptionJobStatus": "IN_PROGRESS",
+                "Media": Media,
+                "CreationTime": _now(),
+                "StartTime": _now(),
+                "Tags": list(Tags or []),
+                "Subtitles": {"Formats": list((Subtitles or {}).get("Formats", []))},
+            }
+            self._jobs[TranscriptionJobName] = job
+        timer = threading.Timer(self.delay_s, self._complete, (TranscriptionJobName, OutputBucketName, OutputKey))
+        timer.daemon = True
+        timer.start()
+        return {"TranscriptionJob": dict(job)}
+
+    def get_transcription_job(self, TranscriptionJobName):
+        with self._lock:
+            job = self._jobs.get(TranscriptionJobName)
+            if job is None:
+                raise client_error("BadRequestException", "The requested job couldn't be found. Check the job name and try your request again.", "GetTranscriptionJob")
+            return {"TranscriptionJob": json.loads(json.dumps(job, default=str))}
+
+    def delete_transcription_job(self, TranscriptionJobName):
+        with self._lock:
+            self._jobs.pop(TranscriptionJobName, None)
+        return {}
+
+    def _complete(self, job_name, bucket, key):
+        with self._lock:
+            job = self._jobs.get(job_name)
+        if job is None:
+            return
+        status = "COMPLETED"
+        try:
+            uri = job["Media"]["MediaFileUri"]
+            media_bucket, _, media_key = uri[len("s3://"):].partition("/")
+            duration = media_duration(self.s3._existing(media_bucket, media_key, "StartTranscriptionJob"))
+            key = key or f"{job_name}.json"
+            transcript, subtitles = _transcript(job_name, duration)
+            self.s3.put_object(Bucket=bucket, Key=key, Body=json.dumps(transcript).encode("utf-8"))
+            if "vtt" in job["Subtitles"]["Formats"]:
+                self.s3.put_object(Bucket=bucket, Key=key.rsplit(".", 1)[0] + ".vtt", Body=subtitles.encode("utf-8"))
+            job["Transcript"] = {"TranscriptFileUri": f"s3://{bucket}/{key}"}
+            job["LanguageCode"] = transcript["results"]["language_code"]
+        except Exception as ex:
+            status = "FAILED"
+            job["FailureReason"] = str(ex)
+        with self._lock:
+            job["TranscriptionJobStatus"] = status
+            job["CompletionTime"] = _now()
+        self.publish("aws.transcribe", "Transcribe Job State Change",
+                     {"TranscriptionJobName": job_name, "TranscriptionJobStatus": status})
+
+
+def media_duration(path):
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0
+        frames = capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+        return frames / fps if fps > 0 else 0
+    finally:
+        capture.release()
+
+
+def _transcript(job_name, duration):
+    def timecode(seconds):
+        return f"{int(seconds // 3600):02d}:{int(seconds % 3600 // 60):02d}:{seconds % 60:06.3f}"
+
+    cues, start = [], 0.0
+    while start < duration:
+        end = min(start + TRANSCRIBE_CUE_S, duration)
+        cues.append((start, end, f"Local transcript segment {len(cues) + 1} of {job_name}."))
+        start = end
+    vtt = "WEBVTT\n\n" + "".join(f"{i}\n{timecode(s)} --> {timecode(e)}\n{text}\n\n" for i, (s, e, text) in enumerate(cues, 1))
+    transcript = {
+        "jobName": job_name,
+        "status": "COMPLETED",
+        "results": {
+            "language_code": "en-US",
+            "transcripts": [{"transcript": " ".join(c[2] for c in cues)}],
+            "items": [],
+        },
+    }
+    return transcript, vtt
+
+
+# -- Step Functions ------------------------------------------------------------------------------------------------
+
+class LocalStepFunctions:
+    """
+    Standard workflow executions run by the ASL interpreter, one thread per execution, with the task token
+    callbacks of waitForTaskToken states.
+
+    Parameters:
+    - definitions: {state machine ARN: definition JSON string}
+    - run: run(execution), runs the execution to completion and returns (status, output, error, cause)
+    - publish: publish(source, detail_type, detail), usually EventBus.publish
+    """
+    def __init__(self, definitions, run, publish):
+        self.definitions = definitions
+        self.run = run
+        self.publish = publish
+        self.executions = {}
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def start_execution(self, stateMachineArn, name=None, input="{}", **kwargs):
+        if stateMachineArn not in self.definitions:
+            raise client_error("StateMachineDoesNotExist", f"State Machine Does Not Exist: '{stateMachineArn}'", "StartExecution")
+        name = name or str(uuid.uuid4())
+        arn = f'{stateMachineArn.replace(":stateMachine:", ":execution:")}:{name}'
+        try:
+            json.loads(input)
+        except ValueError:
+            raise client_error("InvalidExecutionInput", "Invalid State Machine Execution Input: 'Invalid JSON'", "StartExecution")
+        with self._lock:
+            existing = self.executions.get(arn)
+            if existing is not None:
+                # Idempotent for a running execution started with the same input
+                if existing["status"] == "RUNNING" and existing["input"] == input:
+                    return {"executionArn": arn, "startDate": existing["startDate"]}
+                raise client_error("ExecutionAlreadyExists", f"Execution Already Exists: '{arn}'", "StartExecution")
+            execution = {
+                "executionArn": arn,
+                "stateMachineArn": stateMachineArn,
+                "name": name,
+                "status": "RUNNING",
+                "startDate": _now(),
+                "input": input,
+                "definition": self.definitions[stateMachineArn],
+                "done": threading.Event(),
+            }
+            self.executions[arn] = execution
+        thread = threading.Thread(target=self._run, args=(execution,), name=f"execution-{name}", daemon=True)
+        thread.start()
+        return {"executionArn": arn, "startDate": execution["startDate"]}
+
+    def _run(self, execution):
+        try:
+            status, output, error, cause = self.run(execution)
+        except Exception as ex:
+            status, output, error, cause = "FAILED", None, "States.Runtime", str(ex)
+        with self._lock:
+            if execution["status"] == "RUNNING":
+                execution.update(status=status, stopDate=_now(), output=output, error=error, cause=cause)
+        execution["done"].set()
+        self.publish("aws.states", "Step Functions Execution Status Change", {
+            "executionArn": execution["executionArn"],
+            "stateMachineArn": execution["stateMachineArn"],
+            "name": execution["name"],
+            "status": execution["status"],
+            "startDate": int(execution["startDate"].timestamp() * 1000),
+            "stopDate": int(execution["stopDate"].timestamp() * 1000),
+            "input": execution["input"],
+            "output": execution.get("output"),
+        })
+
+    def describe_execution(self, executionArn):
+        with self._lock:
+            execution = self.executions.get(executionArn)
+            if execution is None:
+                raise client_error("ExecutionDoesNotExist", f"Execution Does Not Exist: '{executionArn}'", "DescribeExecution")
+            return {k: v for k, v in execution.items() if k not in ("definition", "done") and v is not None}
+
+    def stop_execution(self, executionArn, error=None, cause=None):
+        with self._lock:
+            execution = self.executions.get(executionArn)
+            if execution is None:
+                raise client_error("ExecutionDoesNotExist", f"Execution Does Not Exist: '{executionArn}'", "StopExecution")
+            if execution["status"] == "RUNNING":
+                execution.update(status="ABORTED", stopDate=_now(), error=error, cause=cause)
+            return {"stopDate": execution["stopDate"]}
+
+    def is_running(self, execution_arn):
+        with self._lock:
+            return self.executions[execution_arn]["status"] == "RUNNING"
+
+    # Task tokens
+
+    def create_token(self):
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = {"event": threading.Event(), "result": None}
+        return token
+
+    def wait_token(self, token, timeout_s):
+        """Wait for the callback. Returns ("success", output) or ("failure", (error, cause)), or None on timeout."""
+        entry = self._tokens[token]
+        entry["event"].wait(timeout_s)
+        with self._lock:
+            self._tokens.pop(token, None)
+        return entry["result"]
+
+    def _complete_token(self, token, result, operation):
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None:
+                raise client_error("TaskTimedOut", "Task Timed Out: 'Provided task does not exist anymore'", operation)
+            if entry["result"] is not None:
+                raise client_error("InvalidToken", "Invalid Token: 'The token has already been used'", operation)
+            entry["result"] = result
+        entry["event"].set()
+        return {}
+
+    def send_task_success(self, taskToken, output):
+        try:
+            json.loads(output)
+        except ValueError:
+            raise client_error("InvalidOutput", "Invalid Output: 'Invalid JSON'", "SendTaskSuccess")
+        return self._complete_token(taskToken, ("success", output), "SendTaskSuccess")
+
+    def send_task_failure(self, taskToken, error=None, cause=None):
+        return self._complete_token(taskToken, ("failure", (error, cause)), "SendTaskFailure")
+
+    def send_task_heartbeat(self, taskToken):
+        with self._lock:
+            if taskToken not in self._tokens:
+                raise client_error("TaskTimedOut", "Task Timed Out: 'Provided task does not exist anymore'", "SendTaskHeartbeat")
+        return {}
+
+
+# -- Lambda --------------------------------------------------------------------------------------------------------
+
+class LocalLambda:
+    """
+    The Lambda API over the local host (lambda_host.LambdaHost).
+    """
+    def __init__(self, host):
+        self.host = host
+
+    def invoke(self, FunctionName, InvocationType="RequestResponse", Payload=b"", **kwargs):
+        if isinstance(Payload, str):
+            Payload = Payload.encode("utf-8")
+        elif hasattr(Payload, "read"):
+            Payload = Payload.read()
+        if InvocationType == "Event":
+            self.host.invoke_async(FunctionName, Payload)
+            return {"StatusCode": 202, "Payload": b""}
+        payload, function_error = self.host.invoke(FunctionName, Payload)
+        response = {"StatusCode": 200, "Payload": payload, "ExecutedVersion": "$LATEST"}
+        if function_error:
+            response["FunctionError"] = function_error
+        return response
+
+    def get_account_settings(self):
+        return {"AccountLimit": {"ConcurrentExecutions": self.host.concurrency,
+                                 "UnreservedConcurrentExecutions": self.host.concurrency - self.host.reserved_concurrency}}
+
+
+# -- EventBridge ---------------------------------------------------------------------------------------------------
+
+class EventBus:
+    """
+    The default event bus with the stack's rules: events matching a rule pattern are delivered to its target
+    Lambdas with async invokes, scheduled rules fire every schedule_s * schedule_scale seconds once started.
+
+    Parameters:
+    - rules: StackModel.rules
+    - invoke_async: invoke_async(function, payload), usually LambdaHost.invoke_async
+    """
+    def __init__(self, rules, invoke_async, account_id, region):
+        self.rules = rules
+        self.invoke_async = invoke_async
+        self.account_id = account_id
+        self.region = region
+        self.delivered = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def publish(self, source, detail_type, detail):
+        return self.put_events([{"Source": source, "DetailType": detail_type, "Detail": json.dumps(detail, default=str)}])
+
+    def put_events(self, Entries):
+        results = []
+        for entry in Entries:
+            event = {
+                "version": "0",
+                "id": str(uuid.uuid4()),
+                "detail-type": entry["DetailType"],
+                "source": entry["Source"],
+                "account": self.account_id,
+                "time": _now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "region": self.region,
+                "resources": entry.get("Resources", []),
+                "detail": json.loads(entry.get("Detail") or "{}"),
+            }
+            for name, rule in self.rules.items():
+                if rule["pattern"] and _match_pattern(rule["pattern"], event):
+                    self._deliver(name, rule, event)
+            results.append({"EventId": event["id"]})
+        return {"FailedEntryCount": 0, "Entries": results}
+
+    def _deliver(self, name, rule, event):
+        with self._lock:
+            self.delivered[name] = self.delivered.get(name, 0) + 1
+        payload = json.dumps(event).encode("utf-8")
+        for target in rule["targets"]:
+            self.invoke_async(target, payload)
+
+    def start_schedules(self, schedule_scale):
+        """Fire the scheduled rules in the background until stop()."""
+        for name, rule in self.rules.items():
+            if rule["schedule_s"]:
+                thread = threading.Thread(target=self._schedule, args=(name, rule, rule["schedule_s"] * schedule_scale),
+                                          name=f"schedule-{name}", daemon=True)
+                thread.start()
+
+    def _schedule(self, name, rule, interval_s):
+        while not self._stop.wait(interval_s):
+            self._deliver(name, rule, {
+                "version": "0",
+                "id": str(uuid.uuid4()),
+                "detail-type": "Scheduled Event",
+                "source": "aws.events",
+                "account": self.account_id,
+                "time": _now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "region": self.region,
+                "resources": [f"arn:aws:events:{self.region}:{self.account_id}:rule/{name}"],
+                "detail": {},
+            })
+
+    def stop(self):
+        self._stop.set()
+
+
+def _match_pattern(pattern, event):
+    for field, expected in pattern.items():
+        value = event.get(field) if isinstance(event, dict) else None
+        if isinstance(expected, dict):
+            if not isinstance(value, dict) or not _match_pattern(expected, value):
+                return False
+        elif not any(_match_rule_value(m, value, isinstance(event, dict) and field in event) for m in expected):
+            return False
+    return True
+
+
+def _match_rule_value(matcher, value, present):
+    values = value if isinstance(value, list) else [value]
+    if not isinstance(matcher, dict):
+        return present and matcher in values
+    if "exists" in matcher:
+        return present == matcher["exists"]
+    if not present:
+        return False
+    if "prefix" in matcher:
+        return any(isinstance(v, str) and v.startswith(matcher["prefix"]) for v in values)
+    if "suffix" in matcher:
+        return any(isinstance(v, str) and v.endswith(matcher["suffix"]) for v in values)
+    if "anything-but" in matcher:
+        excluded = matcher["anything-but"]
+        excluded = excluded if isinstance(excluded, list) else [excluded]
+        return all(v not in excluded for v in values)
+    return False
+
+
+# -- Entry point ---------------------------------------------------------------------------------------------------
+
+class LocalServices:
+    """
+    The shared stand-ins, reached with call(service, operation, kwargs). Responses and errors are plain data and
+    botocore ClientError, so they can cross a process boundary.
+    """
+    def __init__(self, tables):
+        self.dynamodb = LocalDynamoDB(tables)
+        self.s3vectors = LocalS3Vectors()
+        self.transcribe = None
+        self.stepfunctions = None
+        self.lambda_ = None
+        self.events = None
+        self.bedrock = None
+
+    def call(self, service, operation, kwargs):
+        target = {
+            "bedrock-runtime": self.bedrock,
+            "dynamodb": self.dynamodb,
+            "s3vectors": self.s3vectors,
+            "transcribe": self.transcribe,
+            "stepfunctions": self.stepfunctions,
+            "lambda": self.lambda_,
+            "events": self.events,
+        }.get(service)
+        if target is None:
+            raise client_error("UnrecognizedClientException", f"The local runner has no {service} service", operation)
+        if service == "dynamodb":
+            return target.call(operation, kwargs)
+        method = getattr(target, operation, None)
+        if operation.startswith("_") or method is None or operation in ("create_token", "wait_token", "is_running", "start_schedules", "stop", "stats"):
+            raise client_error("InvalidAction", f"Unsupported {service} operation: {operation}", operation)
+        response = method(**kwargs)
+        if service == "bedrock-runtime" and operation == "invoke_model":
+            response = dict(response, body=response["body"].read())
+        return response
+
+
+class ServiceClient:
+    """
+    boto3 client stand-in forwarding every operation to call(service, operation, kwargs), with client.exceptions
+    and the StreamingBody payloads of lambda invoke and bedrock-runtime invoke_model.
+    """
+    def __init__(self, call, service):
+        self._call = call
+        self._service = service
+        self.exceptions = ClientExceptions()
+
+    def __getattr__(self, operation):
+        if operation.startswith("_"):
+            raise AttributeError(operation)
+
+        def method(**kwargs):
+            try:
+                response = self._call(self._service, operation, kwargs)
+            except ClientExceptions.ClientError as ex:
+                raise self.exceptions.from_error(ex) from None
+            if self._service == "lambda" and operation == "invoke":
+                response["Payload"] = io.BytesIO(response["Payload"])
+            elif self._service == "bedrock-runtime" and operation == "invoke_model":
+                response["body"] = io.BytesIO(response["body"])
+            return response
+        method.__name__ = operation
+        return method
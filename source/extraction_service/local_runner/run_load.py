@@ -0,0 +1,156 @@
+'''
+Load driver: replay N tasks through the local pipeline and report their end-to-end latency percentiles.
+
+Tasks arrive all at once or as a Poisson process of --arrival-rate tasks per minute, go through start-task, the
+task queue and the state machines, and call a simulated Bedrock with the latencies, quotas and error rates of a
+latency profile. For each task the report has the time from submission to the end of its execution, split into the
+time queued behind the task scheduler and the time in the state machine, followed by the pipeline report of
+run_pipeline.py. Runs with the same profile, arrivals and settings draw the same model latencies and errors, so
+Map concurrency, retry policies or quotas can be changed one at a time and compared.
+
+Examples:
+    python run_load.py --tasks 20                                   # 20 concurrent frame tasks, default profile
+    python run_load.py --tasks 50 --arrival-rate 30 --report load.json
+    python run_load.py --tasks 20 --bedrock-profile bedrock_profiles/throttled.json --latency-scale 0.2
+    python run_load.py --tasks 20 --task-type clip --workers process --lambda-concurrency 32
+'''
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+from datetime import datetime
+
+from lambda_host import block_network
+from run_pipeline import LOCAL_RUNNER_DIR, Pipeline, add_pipeline_arguments, build_report, input_videos, load_request, print_report
+
+DEFAULT_PROFILE = os.path.join(LOCAL_RUNNER_DIR, "bedrock_profiles", "default.json")
+DEFAULT_TASKS = 10
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_pipeline_arguments(parser)
+    parser.add_argument("--tasks", type=int, default=DEFAULT_TASKS, help="Tasks to submit, cycling through the videos")
+    parser.add_argument("--arrival-rate", type=float, default=0, help="Poisson arrivals in tasks per minute (default: all at once)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the arrival times")
+    args = parser.parse_args()
+    args.bedrock_profile = args.bedrock_profile or DEFAULT_PROFILE
+    return args
+
+
+def arrival_offsets(count, rate_per_min, seed):
+    """Submission times in seconds from the start: all 0, or the arrivals of a seeded Poisson process."""
+    if rate_per_min <= 0:
+        return [0.0] * count
+    rng = random.Random(seed)
+    offsets, now = [], 0.0
+    for _ in range(count):
+        offsets.append(now)
+        now += rng.expovariate(rate_per_min / 60)
+    return offsets
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    result = {f"p{p}_s": round(ordered[min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)], 3) for p in PERCENTILES}
+    result.update(mean_s=round(sum(ordered) / len(ordered), 3), max_s=round(ordered[-1], 3), count=len(ordered))
+    return result
+
+
+def task_latencies(pipeline, submitted):
+    """Per task: status, queued time before the execution started, execution time and end-to-end time."""
+    executions = {e["name"]: e for e in pipeline.stepfunctions.executions.values()}
+    tasks = {}
+    for task_id, submit_ts in submitted.items():
+        execution = executions.get(task_id)
+        task = {"status": execution["status"] if execution else "QUEUED", "queued_s": None, "execution_s": None, "end_to_end_s": None}
+        if execution:
+            start_ts = execution["startDate"].timestamp()
+            task["queued_s"] = start_ts - submit_ts
+            if execution.get("stopDate"):
+                task["execution_s"] = execution["stopDate"].timestamp() - start_ts
+                task["end_to_end_s"] = execution["stopDate"].timestamp() - submit_ts
+            if execution.get("error"):
+                task["error"] = execution["error"]
+        tasks[task_id] = task
+    return tasks
+
+
+def latency_report(tasks, wall_s):
+    succeeded = [t for t in tasks.values() if t["status"] == "SUCCEEDED"]
+    statuses, errors = {}, {}
+    for task in tasks.values():
+        statuses[task["status"]] = statuses.get(task["status"], 0) + 1
+        if task.get("error"):
+            errors[task["error"]] = errors.get(task["error"], 0) + 1
+    return {
+        "tasks": len(tasks),
+        "statuses": statuses,
+        "errors": errors,
+        "succeeded_per_min": round(len(succeeded) / wall_s * 60, 2) if wall_s else None,
+        "end_to_end": _percentiles([t["end_to_end_s"] for t in succeeded]),
+        "queued": _percentiles([t["queued_s"] for t in succeeded]),
+        "execution": _percentiles([t["execution_s"] for t in succeeded]),
+    }
+
+
+def print_latency(report):
+    print(f'\n{report["tasks"]} tasks: {report["statuses"]}, {report["succeeded_per_min"]} succeeded/min')
+    if report["errors"]:
+        print(f'Errors: {report["errors"]}')
+    print(f'{"latency":<14}' + "".join(f'{f"p{p} s":>10}' for p in PERCENTILES) + f'{"mean s":>10}{"max s":>10}')
+    for name in ("end_to_end", "queued", "execution"):
+        values = report[name]
+        if values:
+            print(f'{name:<14}' + "".join(f'{values[f"p{p}_s"]:>10.2f}' for p in PERCENTILES) + f'{values["mean_s"]:>10.2f}{values["max_s"]:>10.2f}')
+
+
+def main():
+    args = parse_args()
+    block_network()
+    os.makedirs(args.work_dir, exist_ok=True)
+    videos = input_videos(args, args.work_dir)
+    request = load_request(args)
+    offsets = arrival_offsets(args.tasks, args.arrival_rate, args.seed)
+
+    run_dir = os.path.join(args.work_dir, datetime.now().strftime("load-%Y%m%d-%H%M%S-") + os.urandom(3).hex())
+    os.makedirs(run_dir)
+    pipeline = Pipeline(args, run_dir)
+    submitted = {}
+    try:
+        start = time.perf_counter()
+        for index, offset in enumerate(offsets):
+            time.sleep(max(offset - (time.perf_counter() - start), 0))
+            video = videos[index % len(videos)]
+            submit_ts = time.time()
+            submitted[pipeline.submit(video, request, f"load {index} {os.path.basename(video)}")] = submit_ts
+        completed = pipeline.wait(list(submitted), args.timeout)
+        wall_s = time.perf_counter() - start
+        tasks = task_latencies(pipeline, submitted)
+        report = build_report(pipeline, list(submitted), videos, wall_s, args)
+    finally:
+        pipeline.close()
+
+    report["load"] = latency_report(tasks, wall_s)
+    report["load"].update(arrival_rate_per_min=args.arrival_rate, bedrock_profile=args.bedrock_profile, latency_scale=args.latency_scale)
+    print_report(report)
+    print_latency(report["load"])
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(dict(report, task_latencies=tasks), f, indent=2, default=str)
+    if not args.keep:
+        shutil.rmtree(os.path.join(run_dir, "s3"), ignore_errors=True)
+
+    if not completed:
+        print(f"Timed out after {args.timeout} s waiting for the tasks")
+    sys.exit(0 if completed and report["load"]["statuses"].get("SUCCEEDED") == len(submitted) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+'''
+Run the extraction workflows end to end on this machine, with local stand-ins for S3, DynamoDB, Bedrock,
+S3 Vectors, Transcribe, Step Functions, Lambda and EventBridge.
+
+Tasks go through the same path as in the cloud: the video is uploaded, start-task enqueues the task, the task
+scheduler admits it into the state machine, and the state machine invokes the Lambdas, with the Map concurrency,
+the Lambda concurrency limits and the EventBridge rules of the stack. The report has the wall time, per function
+and per state latencies, cold starts and concurrency, the task stage metrics and the storage written, so the
+throughput of the whole pipeline can be profiled and concurrency changes tested without an AWS account.
+
+Examples:
+    python run_pipeline.py                                      # frame flow on a synthetic 10 s video
+    python run_pipeline.py --task-type clip --video sample.mp4
+    python run_pipeline.py --copies 8 --lambda-concurrency 16 --report report.json
+    python run_pipeline.py --workers process                    # one process per Lambda container
+    python run_pipeline.py --bedrock-profile bedrock_profiles/default.json   # with model latency and quotas
+    python run_pipeline.py --streaming --video fragmented.mp4   # start on the uploaded prefix of a streaming upload
+'''
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import statistics
+from datetime import datetime
+
+import asl
+from bedrock_simulator import SimulatedBedrock
+from lambda_host import LambdaHost, block_network, serve_services
+from local_bedrock import LocalBedrock
+from local_s3 import LocalS3
+from local_services import EventBus, LocalLambda, LocalServices, LocalStepFunctions, LocalTranscribe, media_duration
+from stack_model import EXTRACTION_SERVICE_DIR, LOCAL_ACCOUNT_ID, LOCAL_REGION, load_stack
+
+LOCAL_RUNNER_DIR = os.path.dirname(os.path.abspath(__file__))
+REQUEST_DIR = os.path.join(LOCAL_RUNNER_DIR, "requests")
+BENCHMARK_DIR = os.path.join(EXTRACTION_SERVICE_DIR, "benchmark")
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), "bedrock-video-local-runner")
+DEFAULT_BUCKET = "bedrock-mm-extraction-local"
+DEFAULT_SYNTHETIC_VIDEO = "10s_360p"
+DEFAULT_TIMEOUT_S = 3600
+API_FUNCTION_START_TASK = "extr-srv-api-start-task"
+API_FUNCTION_UPLOAD = "extr-srv-api-manage-s3-presigned-url"
+QUEUE_FINAL_STATUS = "done"
+
+
+def add_pipeline_arguments(parser):
+    """The options of the local deployment and of the submitted tasks, shared with the load driver."""
+    parser.add_argument("--video", action="append", default=[], help="Video file, repeatable (default: a synthetic video)")
+    parser.add_argument("--synthetic", default=DEFAULT_SYNTHETIC_VIDEO, help="Synthetic video preset used when no --video is given")
+    parser.add_argument("--task-type", choices=["frame", "clip"], default="frame")
+    parser.add_argument("--request", help="start-task request JSON (default: requests/<task type>.json)")
+    parser.add_argument("--workers", choices=["thread", "process"], default="thread", help="Lambda containers as threads or processes")
+    parser.add_argument("--lambda-concurrency", type=int, help="Account concurrency limit (default: 2 x CPU count)")
+    parser.add_argument("--throttle", action="store_true", help="Reject invocations over the concurrency limits instead of queuing them")
+    parser.add_argument("--map-concurrency", type=int, default=asl.DEFAULT_MAP_CONCURRENCY, help="Cap of concurrent Map iterations")
+    parser.add_argument("--wait-scale", type=float, default=0.01, help="Multiplier of waits, retry delays, callback timeouts and schedules")
+    parser.add_argument("--transcribe-delay", type=float, default=1.0, help="Seconds a transcription job runs")
+    parser.add_argument("--bedrock-profile", help="Model latency profile, e.g. bedrock_profiles/default.json (default: instant responses)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier of the model latencies of the profile")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Upload through streaming upload parts, a fragmented MP4 starts before its upload completes "
+                             "(ffmpeg -i in.mp4 -c copy -movflags frag_keyframe+empty_moov+default_base_moof out.mp4)")
+    parser.add_argument("--part-size", type=int, default=1024 * 1024, help="Bytes per part of a streaming upload")
+    parser.add_argument("--part-delay", type=float, default=0.5, help="Seconds between the parts of a streaming upload")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_S, help="Seconds to wait for the tasks")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR)
+    parser.add_argument("--keep", action="store_true", help="Keep the local S3 and the logs of the run")
+    parser.add_argument("--report", help="Write the report JSON to this file")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_pipeline_arguments(parser)
+    parser.add_argument("--copies", type=int, default=1, help="Tasks submitted per video")
+    return parser.parse_args()
+
+
+def load_request(args):
+    with open(args.request or os.path.join(REQUEST_DIR, f"{args.task_type}.json")) as f:
+        request = json.load(f)
+    request["TaskType"] = args.task_type
+    return request
+
+
+def input_videos(args, work_dir):
+    if args.video:
+        return [os.path.abspath(v) for v in args.video]
+    sys.path.insert(0, BENCHMARK_DIR)
+    import media
+    return [media.synthetic_video(work_dir, args.synthetic).path]
+
+
+class Pipeline:
+    """The local deployment of the stack: stand-ins, Lambda host, interpreter and event bus, wired together."""
+    def __init__(self, args, run_dir):
+        self.run_dir = run_dir
+        self.stack = load_stack(DEFAULT_BUCKET)
+        self.s3_root = os.path.join(run_dir, "s3")
+        self.s3 = LocalS3(self.s3_root, [DEFAULT_BUCKET])
+        if args.bedrock_profile:
+            with open(args.bedrock_profile) as f:
+                self.bedrock = SimulatedBedrock(json.load(f), self.s3, time_scale=args.latency_scale)
+        else:
+            self.bedrock = LocalBedrock(self.s3)
+        self.services = LocalServices(self.stack.tables)
+        self.services.bedrock = self.bedrock
+        constants = self.stack.constants
+        for index_name, dim in (("S3_VECTOR_INDEX_NAME", "EMBEDDING_DIM_DEFAULT"), ("S3_VECTOR_INDEX_NAME_COARSE", "EMBEDDING_DIM_COARSE")):
+            if index_name in constants:
+                self.services.s3vectors.create_index(vectorBucketName=constants["S3_VECTOR_BUCKET_NAME"], indexName=constants[index_name],
+                                                     dimension=int(constants[dim]))
+
+        self.server, address, authkey = None, None, None
+        if args.workers == "process":
+            # AF_UNIX socket paths are limited to about 100 characters
+            address = os.path.join(tempfile.mkdtemp(prefix="local-runner-"), "services.sock")
+            authkey = uuid.uuid4().bytes
+            self.server = serve_services(self.services, address, authkey)
+
+        self.host = LambdaHost(self.stack, run_dir, mode=args.workers, concurrency=args.lambda_concurrency, throttle=args.throttle,
+                               wait_scale=args.wait_scale, s3=self.s3, bedrock=self.bedrock, call=self.services.call,
+                               s3_root=self.s3_root, address=address, authkey=authkey,
+                               shared_bedrock=isinstance(self.bedrock, SimulatedBedrock))
+        self.events = EventBus(self.stack.rules, self.host.invoke_async, LOCAL_ACCOUNT_ID, LOCAL_REGION)
+        definitions = {sm["arn"]: self.stack.state_machine_definition(key) for key, sm in self.stack.state_machines.items()}
+        self.stepfunctions = LocalStepFunctions(definitions, lambda execution: self.interpreter.run(execution), self.events.publish)
+        self.interpreter = asl.Interpreter(self.host, self.s3, self.services.call, self.stepfunctions,
+                                           wait_scale=args.wait_scale, map_concurrency=args.map_concurrency)
+        self.services.events = self.events
+        self.services.stepfunctions = self.stepfunctions
+        self.services.transcribe = LocalTranscribe(self.s3, self.events.publish, delay_s=args.transcribe_delay)
+        self.services.lambda_ = LocalLambda(self.host)
+        self.events.start_schedules(args.wait_scale)
+
+    def submit(self, video, request, task_name):
+        """Upload the video and call start-task, as the upload API does. Returns the task Id."""
+        task_id = str(uuid.uuid4())
+        file_name = os.path.basename(video)
+        key = f'tasks/{task_id}/{self.stack.constants["VIDEO_UPLOAD_S3_PREFIX"]}/{file_name}'
+        self.s3.upload_file(video, DEFAULT_BUCKET, key)
+        event = dict(request, TaskId=task_id, FileName=file_name, TaskName=task_name, RequestBy="local-runner",
+                     Video={"S3Object": {"Bucket": DEFAULT_BUCKET, "Key": key}})
+        response, function_error = self.host.invoke(API_FUNCTION_START_TASK, json.dumps(event).encode("utf-8"))
+        response = json.loads(response)
+        if function_error or response.get("statusCode") != 200:
+            raise RuntimeError(f"start-task failed: {response}")
+        return task_id
+
+    def submit_streaming(self, video, request, task_name, part_size, part_delay_s):
+        """Upload the video part by part through the upload API, as the web UI does. Returns the task Id."""
+        file_name = os.path.basename(video)
+        size = os.path.getsize(video)
+        num_parts = max((size + part_size - 1) // part_size, 1)
+        created = self._invoke_api(API_FUNCTION_UPLOAD, {"Action": "create", "FileName": file_name, "NumParts": num_parts, "Streaming": True})
+        task_id = created["TaskId"]
+        # The object does not exist when the task starts, the client sends the duration for the estimate, as the web UI does
+        start_task = dict(request, FileName=file_name, TaskName=task_name, RequestBy="local-runner",
+                          VideoMetaData=dict(request.get("VideoMetaData") or {}, Duration=media_duration(video)))
+        upload = {"Action": "part", "TaskId": task_id, "FileName": file_name, "Streaming": True, "StartTask": start_task}
+        bucket_dir = os.path.join(self.s3_root, DEFAULT_BUCKET) + os.sep
+        parts = []
+        with open(video, "rb") as f:
+            for part_number, url in enumerate(created["UploadPartUrls"], start=1):
+                # The presigned URLs of the local S3 are file paths
+                self.s3.put_object(Bucket=DEFAULT_BUCKET, Key=url[len("file://"):].split("?")[0][len(bucket_dir):], Body=f.read(part_size))
+                self._invoke_api(API_FUNCTION_UPLOAD, upload)
+                parts.append({"PartNumber": part_number})
+                time.sleep(part_delay_s)
+        self._invoke_api(API_FUNCTION_UPLOAD, dict(upload, Action="complete", MultipartUpload=parts))
+        return task_id
+
+    def _invoke_api(self, function_name, event):
+        response, function_error = self.host.invoke(function_name, json.dumps(event).encode("utf-8"))
+        response = json.loads(response)
+        if function_error or response.get("statusCode") != 200:
+            raise RuntimeError(f"{function_name} failed: {response}")
+        return response["body"]
+
+    def queue_status(self, task_id):
+        item = self.services.dynamodb.call("get_item", {"TableName": self.stack.constants["DYNAMO_VIDEO_TASK_QUEUE_TABLE"],
+                                                         "Key": {"Id": task_id}}).get("Item") or {}
+        return item.get("queue_status")
+
+    def wait(self, task_ids, timeout_s):
+        """Wait until the scheduler released every task and no event invocation is left. Returns False on timeout."""
+        deadline = time.monotonic() + timeout_s
+        while time.monotonic() < deadline:
+            if all(self.queue_status(t) == QUEUE_FINAL_STATUS for t in task_ids):
+                return self.host.wait_async(max(deadline - time.monotonic(), 0))
+            time.sleep(0.2)
+        return False
+
+    def close(self):
+        self.events.stop()
+        self.host.close()
+        if self.server is not None:
+            self.server.stop_event.set()
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _max_overlap(intervals):
+    # Highest number of intervals open at the same time
+    points = sorted([(s, 1) for s, _ in intervals] + [(e, -1) for _, e in intervals], key=lambda p: (p[0], p[1]))
+    current = peak = 0
+    for _, delta in points:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def _summary(durations):
+    return {
+        "count": len(durations),
+        "total_s": round(sum(durations), 3),
+        "p50_s": round(_percentile(durations, 50), 3),
+        "p95_s": round(_percentile(durations, 95), 3),
+        "max_s": round(max(durations), 3),
+    }
+
+
+def build_report(pipeline, task_ids, videos, wall_s, args):
+    stack = pipeline.stack
+    functions = {}
+    for record in pipeline.host.records:
+        functions.setdefault(record["function"], []).append(record)
+    function_report = {}
+    for key, records in sorted(functions.items()):
+        memory_size = stack.functions[key]["memory_size"]
+        peaks = [r["peak_rss_mb"] for r in records if r["peak_rss_mb"]]
+        function_report[key] = {
+            **_summary([r["duration_s"] for r in records]),
+            "errors": sum(1 for r in records if r["error"]),
+            "cold_starts": sum(1 for r in records if r["cold_start"]),
+            "init_p50_s": round(statistics.median([r["init_s"] for r in records if r["cold_start"]] or [0]), 3),
+            "queued_max_s": round(max(r["queued_s"] for r in records), 3),
+            "max_concurrency": _max_overlap([(r["start"], r["start"] + r["duration_s"]) for r in records]),
+            "containers": len({r["container"] for r in records if r["container"]}),
+            "memory_size_mb": memory_size,
+            "peak_rss_mb": max(peaks) if peaks else None,
+        }
+
+    states = {}
+    for record in pipeline.interpreter.records:
+        states.setdefault((record["type"], record["state"]), []).append(record)
+    state_report = {}
+    for (kind, name), records in sorted(states.items(), key=lambda s: -sum(r["duration_s"] for r in s[1])):
+        entry = {"type": kind, **_summary([r["duration_s"] for r in records]), "errors": sum(1 for r in records if r["error"])}
+        if kind == "MapRun":
+            entry.update(iterations=sum(r["iterations"] for r in records), concurrency=max(r["concurrency"] for r in records))
+        state_report[f"{name} ({kind})" if kind == "MapRun" else name] = entry
+
+    tasks = {}
+    task_table = stack.constants["DYNAMO_VIDEO_TASK_TABLE"]
+    for task_id in task_ids:
+        task = pipeline.services.dynamodb.call("get_item", {"TableName": task_table, "Key": {"Id": task_id}}).get("Item") or {}
+        tasks[task_id] = json.loads(json.dumps({"Status": task.get("Status"), "Metrics": task.get("Metrics")}, default=float))
+    executions = {e["name"]: {"status": e["status"], "error": e.get("error"), "cause": e.get("cause"),
+                              "duration_s": round((e["stopDate"] - e["startDate"]).total_seconds(), 3) if e.get("stopDate") else None}
+                  for e in pipeline.stepfunctions.executions.values()}
+
+    # S3 and Bedrock counters of this process and, in process mode, of every container
+    s3_operations, s3_read, s3_written = dict(pipeline.s3.operation_counts), pipeline.s3.bytes_read, pipeline.s3.bytes_written
+    bedrock_usage = json.loads(json.dumps(pipeline.bedrock.usage))
+    for stats in pipeline.host.container_stats.values():
+        for operation, count in stats["s3"]["operations"].items():
+            s3_operations[operation] = s3_operations.get(operation, 0) + count
+        s3_read += stats["s3"]["bytes_read"]
+        s3_written += stats["s3"]["bytes_written"]
+        for key, usage in stats["bedrock"].items():
+            total = bedrock_usage.setdefault(key, {"calls": 0, "inputTokens": 0, "outputTokens": 0})
+            for field, value in usage.items():
+                total[field] += value
+
+    video_s = sum(media_duration(v) for v in videos) * len(task_ids) / len(videos)
+    return {
+        "task_type": args.task_type,
+        "workers": args.workers,
+        "lambda_concurrency": pipeline.host.concurrency,
+        "tasks": len(task_ids),
+        "wall_s": round(wall_s, 3),
+        "tasks_per_min": round(len(task_ids) / wall_s * 60, 2) if wall_s else None,
+        "video_s_per_min": round(video_s / wall_s * 60, 2) if wall_s else None,
+        "invocations": len(pipeline.host.records),
+        "max_concurrency": _max_overlap([(r["start"], r["start"] + r["duration_s"]) for r in pipeline.host.records]),
+        "executions": executions,
+        "task_results": tasks,
+        "functions": function_report,
+        "states": state_report,
+        "dynamodb": {"operations": dict(pipeline.services.dynamodb.operation_counts), "tables": pipeline.services.dynamodb.stats()},
+        "s3": {"operations": s3_operations, "bytes_read": s3_read, "bytes_written": s3_written, "buckets": pipeline.s3.stats()},
+        "s3vectors": pipeline.services.s3vectors.stats(),
+        "bedrock": bedrock_usage,
+        "bedrock_simulation": pipeline.bedrock.stats() if isinstance(pipeline.bedrock, SimulatedBedrock) else None,
+        "events": dict(pipeline.events.delivered),
+    }
+
+
+def print_report(report):
+    print(f'\n{report["tasks"]} {report["task_type"]} task(s) in {report["wall_s"]} s, {report["tasks_per_min"]} tasks/min, '
+          f'{report["video_s_per_min"]} video s/min, {report["invocations"]} invocations, max concurrency {report["max_concurrency"]}')
+    for name, execution in report["executions"].items():
+        failure = f' {execution["error"]}: {execution["cause"]}' if execution["error"] else ""
+        print(f'  execution {name}: {execution["status"]} in {execution["duration_s"]} s{failure}')
+
+    print(f'\n{"function":<42}{"count":>7}{"p50 s":>9}{"p95 s":>9}{"total s":>9}{"cold":>6}{"conc":>6}{"errors":>8}{"rss/mem MB":>13}')
+    for key, f in report["functions"].items():
+        memory = f'{f["peak_rss_mb"]:.0f}/{f["memory_size_mb"]}' if f["peak_rss_mb"] else f'-/{f["memory_size_mb"]}'
+        print(f'{key:<42}{f["count"]:>7}{f["p50_s"]:>9.3f}{f["p95_s"]:>9.3f}{f["total_s"]:>9.2f}{f["cold_starts"]:>6}'
+              f'{f["max_concurrency"]:>6}{f["errors"]:>8}{memory:>13}')
+
+    print(f'\n{"state":<66}{"count":>7}{"p50 s":>9}{"p95 s":>9}{"total s":>9}')
+    for name, s in report["states"].items():
+        print(f'{name[:65]:<66}{s["count"]:>7}{s["p50_s"]:>9.3f}{s["p95_s"]:>9.3f}{s["total_s"]:>9.2f}')
+
+    print(f'\nS3: {report["s3"]["bytes_written"]} bytes written, {report["s3"]["bytes_read"]} bytes read, {report["s3"]["operations"]}')
+    print(f'DynamoDB: {report["dynamodb"]["operations"]}')
+    print(f'Bedrock: {report["bedrock"]}')
+    for key, stats in (report["bedrock_simulation"] or {}).items():
+        print(f'  {key}: {stats}')
+
+
+def main():
+    args = parse_args()
+    block_network()
+    os.makedirs(args.work_dir, exist_ok=True)
+    videos = input_videos(args, args.work_dir)
+    request = load_request(args)
+
+    run_dir = os.path.join(args.work_dir, datetime.now().strftime("run-%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6])
+    os.makedirs(run_dir)
+    pipeline = Pipeline(args, run_dir)
+    try:
+        start = time.perf_counter()
+        if args.streaming:
+            task_ids = [pipeline.submit_streaming(video, request, f"{os.path.basename(video)} #{copy}", args.part_size, args.part_delay)
+                        for copy in range(args.copies) for video in videos]
+        else:
+            task_ids = [pipeline.submit(video, request, f"{os.path.basename(video)} #{copy}")
+                        for copy in range(args.copies) for video in videos]
+        completed = pipeline.wait(task_ids, args.timeout)
+        wall_s = time.perf_counter() - start
+        report = build_report(pipeline, task_ids, videos, wall_s, args)
+    finally:
+        pipeline.close()
+
+    print_report(report)
+    print(f"\nFunction logs: {os.path.join(run_dir, 'logs')}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    if not args.keep:
+        shutil.rmtree(os.path.join(run_dir, "s3"), ignore_errors=True)
+
+    failed = [name for name, e in report["executions"].items() if e["status"] != "SUCCEEDED"]
+    if not completed:
+        print(f"Timed out after {args.timeout} s waiting for the tasks")
+    sys.exit(0 if completed and not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# Deployment model read from the CDK stack source: Lambda environments and limits, DynamoDB tables and their
+# GSIs, and the state machine placeholders. The stack is parsed (not synthesized), so the local runner stays in
+# sync with the deployment without depending on aws_cdk.
+import os
+import ast
+import importlib.util
+
+EXTRACTION_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIR = os.path.dirname(EXTRACTION_SERVICE_DIR)
+DEPLOYMENT_DIR = os.path.join(os.path.dirname(SOURCE_DIR), "deployment", "extraction_service")
+STACK_FILE = os.path.join(DEPLOYMENT_DIR, "extraction_service_stack.py")
+CONSTANT_FILE = os.path.join(DEPLOYMENT_DIR, "constant.py")
+STATE_MACHINE_DIR = os.path.join(EXTRACTION_SERVICE_DIR, "stepfunctions")
+
+LOCAL_REGION = "us-east-1"
+LOCAL_ACCOUNT_ID = "000000000000"
+
+ATTRIBUTE_TYPES = {"STRING": "S", "NUMBER": "N", "BINARY": "B"}
+
+
+class _Resource:
+    """Stand-in for a CDK construct in environment expressions, e.g. lambda_x.function_name."""
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class _Events:
+    """Stand-in for aws_events in rule expressions: patterns become dicts and schedules a rate in seconds."""
+    class Schedule:
+        @staticmethod
+        def rate(seconds):
+            return seconds
+
+    @staticmethod
+    def EventPattern(**kwargs):
+        return {k.replace("_", "-"): v for k, v in kwargs.items()}
+
+
+class _Duration:
+    seconds = staticmethod(lambda n: n)
+    minutes = staticmethod(lambda n: n * 60)
+    hours = staticmethod(lambda n: n * 3600)
+    days = staticmethod(lambda n: n * 86400)
+
+
+class StackModel:
+    def __init__(self, constants, functions, tables, placeholders, state_machines, rules):
+        self.constants = constants
+        self.functions = functions
+        self.tables = tables
+        self.placeholders = placeholders
+        self.state_machines = state_machines
+        self.rules = rules
+
+    def function_key(self, name_or_arn):
+        """Return the Lambda directory name for a function name, prefixed name or ARN, or None."""
+        name = name_or_arn.split(":function:")[-1].split(":")[0]
+        prefix = self.constants.get("LAMBDA_NAME_PREFIX", "")
+        if name.startswith(prefix) and name[len(prefix):] in self.functions:
+            return name[len(prefix):]
+        return name if name in self.functions else None
+
+    def state_machine_definition(self, key):
+        """Return the state machine definition with the Lambda placeholders replaced by function ARNs."""
+        with open(os.path.join(STATE_MACHINE_DIR, key, "code.txt")) as f:
+            definition = f.read()
+        for placeholder, function_key in self.placeholders.items():
+            definition = definition.replace(placeholder, self.functions[function_key]["arn"])
+        return definition
+
+
+def load_constants():
+    spec = importlib.util.spec_from_file_location("extraction_service_constant", CONSTANT_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return {k: v for k, v in vars(module).items() if k.isupper()}
+
+
+def load_stack(bucket_name):
+    """
+    Read the extraction service stack.
+
+    Parameters:
+    - bucket_name: Local name of the extraction bucket (the stack's s3_bucket_name_extraction)
+
+    Returns:
+    - StackModel with:
+      - functions: {function directory: {"name", "arn", "environment", "timeout_s", "memory_size", "reserved_concurrency"}}
+      - tables: {table name: {"key": [partition, sort], "indexes": {index name: [partition, sort]}}}, where each key
+        attribute is a (name, type) tuple and the sort key may be None
+      - placeholders: {"##LAMBDA_...##": function directory}
+      - state_machines: {state machine directory: {"name", "arn"}}
+      - rules: {rule id: {"pattern": event pattern or None, "schedule_s": rate or None, "targets": [function directory]}}
+    """
+    constants = load_constants()
+    with open(STACK_FILE) as f:
+        tree = ast.parse(f.read())
+
+    prefix = constants.get("LAMBDA_NAME_PREFIX", "")
+    sm_prefix = constants.get("STEP_FUNCTIONS_NAME_PREFIX", "")
+    state_machines = {}
+    for key in sorted(os.listdir(STATE_MACHINE_DIR)):
+        if os.path.exists(os.path.join(STATE_MACHINE_DIR, key, "code.txt")):
+            name = f"{sm_prefix}{key}"
+            state_machines[key] = {"name": name, "arn": f"arn:aws:states:{LOCAL_REGION}:{LOCAL_ACCOUNT_ID}:stateMachine:{name}"}
+
+    def function_resource(key):
+        name = f"{prefix}{key}"
+        return _Resource(function_name=name, function_arn=f"arn:aws:lambda:{LOCAL_REGION}:{LOCAL_ACCOUNT_ID}:function:{name}")
+
+    stack_self = _Resource(s3_bucket_name_extraction=bucket_name, region=LOCAL_REGION, account_id=LOCAL_ACCOUNT_ID)
+    variables = {}
+    functions, tables, placeholders = {}, {}, {}
+    table_vars = {}
+    rules, rule_vars = {}, {}
+
+    def evaluate(node):
+        namespace = {**constants, **variables, "self": stack_self, "_events": _Events, "Duration": _Duration}
+        return eval(compile(ast.Expression(node), STACK_FILE, "eval"), {"__builtins__": {"int": int, "str": str, "float": float}}, namespace)
+
+    def try_evaluate(node, default=None):
+        try:
+            return evaluate(node)
+        except Exception:
+            return default
+
+    def add_function(key, environment_node, keywords):
+        environment = {}
+        if isinstance(environment_node, ast.Dict):
+            for k, v in zip(environment_node.keys, environment_node.values):
+                value = try_evaluate(v)
+                if k is not None and value is not None:
+                    environment[evaluate(k)] = str(value)
+        resource = function_resource(key)
+        functions[key] = {
+            "name": resource.function_name,
+            "arn": resource.function_arn,
+            "environment": environment,
+            "timeout_s": try_evaluate(keywords.get("timeout_s"), 30) if "timeout_s" in keywords else 30,
+            "memory_size": try_evaluate(keywords.get("memory_size") or keywords.get("memory_m"), 128),
+            "reserved_concurrency": None,
+        }
+        return resource
+
+    def attribute(call, name):
+        for keyword in call.keywords:
+            if keyword.arg == name:
+                return keyword.value
+        return None
+
+    def visit(statements):
+        for statement in statements:
+            for node in ast.walk(statement):
+                if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+                    continue
+                method = node.func.attr
+                keywords = {k.arg: k.value for k in node.keywords}
+                if method == "create_lambda" and node.args:
+                    key = evaluate(node.args[0])
+                    environment = node.args[2] if len(node.args) > 2 else keywords.get("environment")
+                    resource = add_function(key, environment, keywords)
+                    target = _assigned_name(statement, node)
+                    if target:
+                        variables[target] = resource
+                elif method == "create_api_endpoint" and "lambda_file_name" in keywords:
+                    add_function(evaluate(keywords["lambda_file_name"]), keywords.get("evns"), keywords)
+                elif method == "Table" and "table_name" in keywords:
+                    table = {"key": [_attribute(keywords.get("partition_key")), _attribute(keywords.get("sort_key"))], "indexes": {}}
+                    tables[evaluate(keywords["table_name"])] = table
+                    target = _assigned_name(statement, node)
+                    if target:
+                        table_vars[target] = table
+                elif method == "add_global_secondary_index" and isinstance(node.func.value, ast.Name) and node.func.value.id in table_vars:
+                    table_vars[node.func.value.id]["indexes"][evaluate(keywords["index_name"])] = [
+                        _attribute(keywords.get("partition_key")), _attribute(keywords.get("sort_key"))]
+                elif method == "Rule" and len(node.args) > 1 and ("event_pattern" in keywords or "schedule" in keywords):
+                    rule = {"pattern": try_evaluate(keywords.get("event_pattern")), "schedule_s": try_evaluate(keywords.get("schedule")), "targets": []}
+                    rules[evaluate(node.args[1])] = rule
+                    target = _assigned_name(statement, node)
+                    if target:
+                        rule_vars[target] = rule
+                elif method == "add_target" and isinstance(node.func.value, ast.Name) and node.func.value.id in rule_vars \
+                        and node.args and isinstance(node.args[0], ast.Call) and node.args[0].args:
+                    # rule.add_target(_targets.LambdaFunction(lambda_x))
+                    function = variables.get(getattr(node.args[0].args[0], "id", None))
+                    if function is not None:
+                        rule_vars[node.func.value.id]["targets"].append(
+                            next(k for k, f in functions.items() if f["name"] == function.function_name))
+                elif method == "replace" and len(node.args) == 2 and isinstance(node.args[0], ast.Constant) \
+                        and isinstance(node.args[1], ast.Attribute) and isinstance(node.args[1].value, ast.Name):
+                    function = variables.get(node.args[1].value.id)
+                    if function is not None:
+                        placeholders[node.args[0].value] = next(k for k, f in functions.items() if f["name"] == function.function_name)
+
+            if isinstance(statement, ast.Assign) and len(statement.targets) == 1:
+                target = statement.targets[0]
+                if isinstance(target, ast.Name) and isinstance(statement.value, ast.Constant):
+                    variables[target.id] = statement.value.value
+                elif isinstance(target, ast.Attribute) and target.attr == "reserved_concurrent_executions":
+                    # lambda_x.node.default_child.reserved_concurrent_executions = N
+                    owner = target.value
+                    while isinstance(owner, ast.Attribute):
+                        owner = owner.value
+                    function = variables.get(getattr(owner, "id", None))
+                    if function is not None:
+                        key = next(k for k, f in functions.items() if f["name"] == function.function_name)
+                        functions[key]["reserved_concurrency"] = try_evaluate(statement.value)
+                elif isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == "self" \
+                        and isinstance(statement.value, ast.Call) and getattr(statement.value.func, "attr", None) == "StateMachine":
+                    # self.sf_x = StateMachine(..., state_machine_name=f'{STEP_FUNCTIONS_NAME_PREFIX}{sf_key}')
+                    name = try_evaluate(attribute(statement.value, "state_machine_name"))
+                    for state_machine in state_machines.values():
+                        if state_machine["name"] == name:
+                            setattr(stack_self, target.attr, _Resource(state_machine_arn=state_machine["arn"], state_machine_name=name))
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            visit(_flatten(node.body))
+
+    # Environment values referencing resources defined later in the stack (e.g. state machine ARNs)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            for statement in _flatten(node.body):
+                for call in ast.walk(statement):
+                    if isinstance(call, ast.Call) and getattr(call.func, "attr", None) == "create_api_endpoint":
+                        keywords = {k.arg: k.value for k in call.keywords}
+                        if "lambda_file_name" in keywords and isinstance(keywords.get("evns"), ast.Dict):
+                            key = evaluate(keywords["lambda_file_name"])
+                            for k, v in zip(keywords["evns"].keys, keywords["evns"].values):
+                                value = try_evaluate(v)
+                                if k is not None and value is not None:
+                                    functions[key]["environment"].setdefault(evaluate(k), str(value))
+
+    return StackModel(constants, functions, tables, placeholders, state_machines, rules)
+
+
+def _flatten(statements):
+    # Statements in source order, including the bodies of if/with/for blocks
+    for statement in statements:
+        yield statement
+        for field in ("body", "orelse", "finalbody"):
+            block = getattr(statement, field, None)
+            if isinstance(block, list) and not isinstance(statement, (ast.FunctionDef, ast.ClassDef)):
+                yield from _flatten(block)
+
+
+def _assigned_name(statement, call):
+    if isinstance(statement, ast.Assign) and statement.value is call and len(statement.targets) == 1 \
+            and isinstance(statement.targets[0], ast.Name):
+        return statement.targets[0].id
+    return None
+
+
+def _attribute(node):
+    # _dynamodb.Attribute(name='Id', type=_dynamodb.AttributeType.STRING) -> ("Id", "S")
+    if not isinstance(node, ast.Call):
+        return None
+    name, attribute_type = None, "S"
+    for keyword in node.keywords:
+        if keyword.arg == "name" and isinstance(keyword.value, ast.Constant):
+            name = keyword.value.value
+        elif keyword.arg == "type" and isinstance(keyword.value, ast.Attribute):
+            attribute_type = ATTRIBUTE_TYPES.get(keyword.value.attr, "S")
+    return (name, attribute_type) if name else None
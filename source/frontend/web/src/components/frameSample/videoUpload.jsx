@@ -5,6 +5,10 @@ import { Textarea, Tabs, RadioGroup, Link, FileUpload, Select, ExpandableSection
 import { getCurrentUser } from 'aws-amplify/auth';
 import VideoFrameSampleSetting from './videoFrameSampleSetting'
 
+const PART_UPLOAD_CONCURRENCY = 4;
+// Fragmented MP4 uploads are processed while the rest of the file is uploading
+const STREAMING_FORMATS = ['mp4'];
+
 class VideoUpload extends React.Component {
 
     constructor(props) {
@@ -85,7 +89,8 @@ class VideoUpload extends React.Component {
         this.setState({numChunks: numChunks});  
 
         this.setState({status: "generateurl"});
-        FetchPost("/extraction/video/manage-s3-presigned-url", {"FileName": file.name, "NumParts": numChunks, "Action": "create"}, "ExtrService")
+        const streaming = STREAMING_FORMATS.includes(file.name.split('.').pop().toLowerCase());
+        FetchPost("/extraction/video/manage-s3-presigned-url", {"FileName": file.name, "NumParts": numChunks, "Action": "create", "Streaming": streaming}, "ExtrService")
             .then((data) => {
                   //console.log(resp);
                   if (data.statusCode !== 200) {
@@ -102,6 +107,7 @@ class VideoUpload extends React.Component {
                             alert: null,
                             uploadId: data.body.UploadId,
                             uploadPartUrls: data.body.UploadPartUrls,
+                            streaming: data.body.Streaming === true,
                             numChunks: numChunks
                         })
                       }
@@ -112,117 +118,137 @@ class VideoUpload extends React.Component {
               });  
     }
 
-    async submitTask (urlResp) {
-        //console.log(urlResp);
-        var payload = this.state.request;
+    getTaskRequest (urlResp, username, duration) {
+        var payload = {...this.state.request};
         payload.TaskId = urlResp.taskId;
         payload.FileName = this.state.uploadFiles[0].name;
         payload.TaskName = this.state.taskName;
         payload.TaskType = this.props.taskType;
-        payload.Video = {
-              "S3Object": {
-                "Bucket": urlResp.uploadedS3Bucket,
-                "Key": urlResp.uploadedS3KeyVideo,
-              },
-            };
-        //console.log(payload)
-
-        this.setState({status: "loading"});
-        getCurrentUser().then((user) => {
-            payload["RequestBy"] = user.username;
-            // Start task
-            FetchPost('/extraction/video/start-task', payload, "ExtrService")
-                .then((data) => {
-                    this.setState({currentUploadingFileName: null})
-                    var resp = data.body;
-                    if (data.statusCode !== 200) {
-                        //console.log(data.body);
-                        // Handle error response - check if it's an object with error property
-                        const errorMessage = typeof data.body === 'object' && data.body.error 
-                            ? data.body.error 
-                            : data.body;
-                        this.setState( {status: null, alert: errorMessage});
-                    }
-                    else {
-                        if (this.state.fileUploadedCounter == this.state.uploadFiles.length) {
-                            this.resetState(null);
-                            this.props.onSubmit();
-                        }
-                    }
-                })
-                .catch((err) => {
-                    this.setState({currentUploadingFileName: null})
-                    //console.log(err.message);
-                    this.setState( {status: null, alert: err.message});
-                });                      
-            }
-        )
+        payload.RequestBy = username;
+        // A streaming task starts before the video is complete, the estimate uses the duration read by the browser
+        if (duration) payload.VideoMetaData = {"Duration": duration};
+        return payload;
+    }
 
+    getVideoDuration (file) {
+        return new Promise((resolve) => {
+            const video = document.createElement('video');
+            const url = URL.createObjectURL(file);
+            const done = (duration) => {
+                URL.revokeObjectURL(url);
+                resolve(duration);
+            };
+            video.preload = 'metadata';
+            video.onloadedmetadata = () => done(isFinite(video.duration) ? video.duration : null);
+            video.onerror = () => done(null);
+            video.src = url;
+        });
     }
 
     async uploadFile(urlResp) {
         this.setState({status: "uploading"});
         let file = this.state.uploadFiles[0];
         if (urlResp.uploadPartUrls === null || urlResp.uploadPartUrls.length === 0) return;
-            //console.log(this.state);
-            // Upload each part to the corresponding pre-signed URL
-            const uploadPromises = [];
-            let parts = [];
-            for (let i = 0; i < urlResp.numChunks; i++) {
-              const startByte = i * (5 * 1024 * 1024);
-              const endByte = Math.min(startByte + (5 * 1024 * 1024), file.size);
-              const chunk = file.slice(startByte, endByte);
-        
-              const formData = new FormData();
-              formData.append('file', chunk);
-        
-              let retries = 0;
-              const uploadPromise = await fetch(urlResp.uploadPartUrls[i], {
-                method: 'PUT',
-                body: chunk,
-                credentials: 'omit'
-              }).then((response) => {
-                if (response.ok) {
-                    const etag = response.headers.get('ETag');
-                    parts.push({'ETag': etag || 'unknown', 'PartNumber': i + 1})
-                    this.setState({uploadedChunks: this.state.uploadedChunks + 1})
-                } else {
-                    throw new Error(`Upload failed with status ${response.status}`);
-                }
-              }).catch((err) => {
-                console.error(`Upload part ${i + 1} failed:`, err);
-                throw err;
-              });
-              uploadPromises.push(uploadPromise);
-            };
 
-            await Promise.all(uploadPromises).then(() => {
-                    this.setState({fileUploadedCounter: this.state.fileUploadedCounter + 1});
-                    //console.log("all completed");
+        const user = await getCurrentUser();
+        const duration = urlResp.streaming ? await this.getVideoDuration(file) : null;
+        const taskRequest = this.getTaskRequest(urlResp, user.username, duration);
+
+        // Upload parts concurrently, a few at a time. The first failure stops the other parts
+        let parts = [];
+        let nextPart = 0;
+        const controller = new AbortController();
+        const uploadWorker = async () => {
+            while (nextPart < urlResp.numChunks && !controller.signal.aborted) {
+                const i = nextPart++;
+                const startByte = i * (5 * 1024 * 1024);
+                const endByte = Math.min(startByte + (5 * 1024 * 1024), file.size);
+                const chunk = file.slice(startByte, endByte);
+
+                const response = await fetch(urlResp.uploadPartUrls[i], {
+                    method: 'PUT',
+                    body: chunk,
+                    credentials: 'omit',
+                    signal: controller.signal
+                });
+                if (!response.ok) {
+                    throw new Error(`Upload part ${i + 1} failed with status ${response.status}`);
                 }
-            ).then((response) => {
-                // Call complete endpoint
-                let payload = {
-                    "TaskId": urlResp.taskId,
-                    "FileName": file.name, 
-                    "MultipartUpload": parts, 
-                    "UploadId": urlResp.uploadId, 
-                    "Action": "complete"
-                };
-                FetchPost("/extraction/video/manage-s3-presigned-url", payload, "ExtrService")
-                .then((result) => {
+                parts.push({'ETag': response.headers.get('ETag'), 'PartNumber': i + 1});
+                this.setState((prev) => ({uploadedChunks: prev.uploadedChunks + 1}));
+
+                // Streaming upload: the task starts once the uploaded parts hold a complete time range
+                if (urlResp.streaming) {
+                    const result = await FetchPost("/extraction/video/manage-s3-presigned-url", {
+                        "TaskId": urlResp.taskId,
+                        "FileName": file.name,
+                        "Streaming": true,
+                        "Action": "part",
+                        "StartTask": taskRequest
+                    }, "ExtrService");
                     if (result.statusCode !== 200) {
-                        this.setState( {alert: result.body});
+                        throw new Error(typeof result.body === 'string' ? result.body : JSON.stringify(result.body));
                     }
-                    else {
-                        this.setState( {alert: null});
-                        this.submitTask(urlResp);
-                    }   
-                })
-                .catch((err) => {
-                    this.setState( {alert: err.message});
-                })
-            });
+                }
+            }
+        };
+
+        try {
+            const workers = [];
+            for (let w = 0; w < Math.min(PART_UPLOAD_CONCURRENCY, urlResp.numChunks); w++) {
+                workers.push(uploadWorker().catch((err) => {
+                    controller.abort();
+                    throw err;
+                }));
+            }
+            await Promise.all(workers);
+        }
+        catch (err) {
+            console.error(err);
+            controller.abort();
+            this.abortUpload(urlResp, file);
+            this.setState({status: null, currentUploadingFileName: null, uploadedChunks: 0, alert: err.message});
+            return;
+        }
+        this.setState({fileUploadedCounter: this.state.fileUploadedCounter + 1, status: "loading"});
+        parts.sort((a, b) => a.PartNumber - b.PartNumber);
+
+        // Complete the upload and start the task in the same call, a streaming task is already running
+        let payload = {
+            "TaskId": urlResp.taskId,
+            "FileName": file.name,
+            "MultipartUpload": parts,
+            "UploadId": urlResp.uploadId,
+            "Streaming": urlResp.streaming,
+            "Action": "complete",
+            "StartTask": taskRequest
+        };
+        FetchPost("/extraction/video/manage-s3-presigned-url", payload, "ExtrService")
+            .then((result) => {
+                this.setState({currentUploadingFileName: null})
+                if (result.statusCode !== 200) {
+                    this.setState( {status: null, alert: result.body});
+                }
+                else if (this.state.fileUploadedCounter == this.state.uploadFiles.length) {
+                    this.resetState(null);
+                    this.props.onSubmit();
+                }
+            })
+            .catch((err) => {
+                this.setState({currentUploadingFileName: null})
+                this.setState( {status: null, alert: err.message});
+            })
+    }
+
+    abortUpload (urlResp, file) {
+        // Remove the uploaded parts, a streaming task started on them fails
+        FetchPost("/extraction/video/manage-s3-presigned-url", {
+            "TaskId": urlResp.taskId,
+            "FileName": file.name,
+            "UploadId": urlResp.uploadId,
+            "Streaming": urlResp.streaming,
+            "Action": "abort"
+        }, "ExtrService").catch((err) => console.error(err));
     }
 
     handelFileChange = (e) => {
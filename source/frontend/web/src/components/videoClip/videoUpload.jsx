@@ -5,6 +5,8 @@ import { Textarea, Tabs, RadioGroup, Link, FileUpload, Select, ExpandableSection
 import { getCurrentUser } from 'aws-amplify/auth';
 import VideoSampleSetting from './videoSampleSetting'
 
+const PART_UPLOAD_CONCURRENCY = 4;
+
 class VideoUpload extends React.Component {
 
     constructor(props) {
@@ -112,114 +114,101 @@ class VideoUpload extends React.Component {
               });  
     }
 
-    async submitTask (urlResp) {
-        //console.log(urlResp);
+    getTaskRequest (urlResp, username) {
         var payload = this.state.request;
         payload.TaskId = urlResp.taskId;
         payload.FileName = this.state.uploadFiles[0].name;
         payload.TaskName = this.state.taskName;
         payload.TaskType = "clip";
-        payload.Video = {
-              "S3Object": {
-                "Bucket": urlResp.uploadedS3Bucket,
-                "Key": urlResp.uploadedS3KeyVideo,
-              },
-            };
-        //console.log(payload)
-
-        this.setState({status: "loading"});
-        const { username } = getCurrentUser().then((username) => {
-            payload["RequestBy"] = username.username;
-            // Start task
-            FetchPost('/extraction/video/start-task', payload, "ExtrService")
-                .then((data) => {
-                    this.setState({currentUploadingFileName: null})
-                    var resp = data.body;
-                    if (data.statusCode !== 200) {
-                        //console.log(data.body);
-                        // Handle error response - check if it's an object with error property
-                        const errorMessage = typeof data.body === 'object' && data.body.error 
-                            ? data.body.error 
-                            : data.body;
-                        this.setState( {status: null, alert: errorMessage});
-                    }
-                    else {
-                        if (this.state.fileUploadedCounter == this.state.uploadFiles.length) {
-                            this.resetState(null);
-                            this.props.onSubmit();
-                        }
-                    }
-                })
-                .catch((err) => {
-                    this.setState({currentUploadingFileName: null})
-                    //console.log(err.message);
-                    this.setState( {status: null, alert: err.message});
-                });                      
-            }
-        )
-
+        payload.RequestBy = username;
+        return payload;
     }
 
     async uploadFile(urlResp) {
         this.setState({status: "uploading"});
         let file = this.state.uploadFiles[0];
         if (urlResp.uploadPartUrls === null || urlResp.uploadPartUrls.length === 0) return;
-            //console.log(this.state);
-            // Upload each part to the corresponding pre-signed URL
-            const uploadPromises = [];
-            let parts = [];
-            for (let i = 0; i < urlResp.numChunks; i++) {
-              const startByte = i * (5 * 1024 * 1024);
-              const endByte = Math.min(startByte + (5 * 1024 * 1024), file.size);
-              const chunk = file.slice(startByte, endByte);
-        
-              const formData = new FormData();
-              formData.append('file', chunk);
-        
-              let retries = 0;
-              const uploadPromise = await fetch(urlResp.uploadPartUrls[i], {
-                method: 'PUT',
-                headers: {'Content-Type': ''},
-                body: chunk,
-              }).then((response) => {
-                if (response.ok) {
-                    //console.log(response.headers.get('Etag'));
-                    parts.push({'ETag': response.headers.get('Etag'), 'PartNumber': i + 1})
-                    this.setState({uploadedChunks: this.state.uploadedChunks + 1})
-                    //console.log("uploaded", i, parts);
-                    //console.log(this.state);
+
+        // Upload parts concurrently, a few at a time. The first failure stops the other parts
+        let parts = [];
+        let nextPart = 0;
+        const controller = new AbortController();
+        const uploadWorker = async () => {
+            while (nextPart < urlResp.numChunks && !controller.signal.aborted) {
+                const i = nextPart++;
+                const startByte = i * (5 * 1024 * 1024);
+                const endByte = Math.min(startByte + (5 * 1024 * 1024), file.size);
+                const chunk = file.slice(startByte, endByte);
+
+                const response = await fetch(urlResp.uploadPartUrls[i], {
+                    method: 'PUT',
+                    body: chunk,
+                    headers: {'Content-Type': ''},
+                    signal: controller.signal
+                });
+                if (!response.ok) {
+                    throw new Error(`Upload part ${i + 1} failed with status ${response.status}`);
                 }
-              });
-              uploadPromises.push(uploadPromise);
-            };
+                parts.push({'ETag': response.headers.get('ETag'), 'PartNumber': i + 1});
+                this.setState((prev) => ({uploadedChunks: prev.uploadedChunks + 1}));
+            }
+        };
 
-            await Promise.all(uploadPromises).then(() => {
-                    this.setState({fileUploadedCounter: this.state.fileUploadedCounter + 1});
-                    //console.log("all completed");
+        try {
+            const workers = [];
+            for (let w = 0; w < Math.min(PART_UPLOAD_CONCURRENCY, urlResp.numChunks); w++) {
+                workers.push(uploadWorker().catch((err) => {
+                    controller.abort();
+                    throw err;
+                }));
+            }
+            await Promise.all(workers);
+        }
+        catch (err) {
+            console.error(err);
+            controller.abort();
+            this.abortUpload(urlResp, file);
+            this.setState({status: null, currentUploadingFileName: null, uploadedChunks: 0, alert: err.message});
+            return;
+        }
+        this.setState({fileUploadedCounter: this.state.fileUploadedCounter + 1, status: "loading"});
+        parts.sort((a, b) => a.PartNumber - b.PartNumber);
+
+        // Complete the upload and start the task in the same call
+        const user = await getCurrentUser();
+        let payload = {
+            "TaskId": urlResp.taskId,
+            "FileName": file.name,
+            "MultipartUpload": parts,
+            "UploadId": urlResp.uploadId,
+            "Action": "complete",
+            "StartTask": this.getTaskRequest(urlResp, user.username)
+        };
+        FetchPost("/extraction/video/manage-s3-presigned-url", payload, "ExtrService")
+            .then((result) => {
+                this.setState({currentUploadingFileName: null})
+                if (result.statusCode !== 200) {
+                    this.setState( {status: null, alert: result.body});
+                }
+                else if (this.state.fileUploadedCounter == this.state.uploadFiles.length) {
+                    this.resetState(null);
+                    this.props.onSubmit();
                 }
-            ).then((response) => {
-                // Call complete endpoint
-                let payload = {
-                    "TaskId": urlResp.taskId,
-                    "FileName": file.name, 
-                    "MultipartUpload": parts, 
-                    "UploadId": urlResp.uploadId, 
-                    "Action": "complete"
-                };
-                FetchPost("/extraction/video/manage-s3-presigned-url", payload, "ExtrService")
-                .then((result) => {
-                    if (result.statusCode !== 200) {
-                        this.setState( {alert: result.body});
-                    }
-                    else {
-                        this.setState( {alert: null});
-                        this.submitTask(urlResp);
-                    }   
-                })
-                .catch((err) => {
-                    this.setState( {alert: err.message});
-                })
-            });
+            })
+            .catch((err) => {
+                this.setState({currentUploadingFileName: null})
+                this.setState( {status: null, alert: err.message});
+            })
+    }
+
+    abortUpload (urlResp, file) {
+        // Remove the uploaded parts
+        FetchPost("/extraction/video/manage-s3-presigned-url", {
+            "TaskId": urlResp.taskId,
+            "FileName": file.name,
+            "UploadId": urlResp.uploadId,
+            "Action": "abort"
+        }, "ExtrService").catch((err) => console.error(err));
     }
 
     handelFileChange = (e) => {